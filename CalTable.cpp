@@ -53,9 +53,12 @@ CalTable::CalTable(int kind, FILE *logF){
 
 
 // Constructor for normal calibration table.
+// If copyData is false, the gains, times, frequencies and flags are not copied.
+// Only the gains and flags of the antennas with flagged data are copied
+// (since fillGaps will modify them):
 CalTable::CalTable(int kind, double **R1, double **P1,double **R2,double **P2, 
                    double *freqs, double **times, int Na, long *Nt, long Nc, 
-                   bool **flag, bool islinear, FILE *logF, bool verbose)
+                   bool **flag, bool islinear, FILE *logF, bool verbose, bool copyData)
 {
 
 
@@ -85,16 +88,34 @@ CalTable::CalTable(int kind, double **R1, double **P1,double **R2,double **P2,
   flags = new bool*[Nants];
 
   int ia;
+  long ib;
+  bool *isCopied = new bool[Nants];
   for (ia=0; ia<Nants; ia++){
     firstTime[ia] = true;
-    Time[ia] = new double[Ntimes[ia]];
-    flags[ia] = new bool[Ntimes[ia]*Nchan];
-    std::memcpy(Time[ia],times[ia],sizeof(double)*Ntimes[ia]);
-    std::memcpy(flags[ia],flag[ia],sizeof(bool)*Ntimes[ia]*Nchan);
+    isCopied[ia] = copyData;
+    for (ib=0; ib<Ntimes[ia]*Nchan && !isCopied[ia]; ib++){
+      if (flag[ia][ib]){isCopied[ia] = true;};
+    };
+    if (copyData){
+      Time[ia] = new double[Ntimes[ia]];
+      std::memcpy(Time[ia],times[ia],sizeof(double)*Ntimes[ia]);
+    } else {
+      Time[ia] = times[ia];
+    };
+    if (isCopied[ia]){
+      flags[ia] = new bool[Ntimes[ia]*Nchan];
+      std::memcpy(flags[ia],flag[ia],sizeof(bool)*Ntimes[ia]*Nchan);
+    } else {
+      flags[ia] = flag[ia];
+    };
   };
 
-  Freqs = new double[Nchan];
-  std::memcpy(Freqs,freqs,sizeof(double)*Nchan);
+  if (copyData){
+    Freqs = new double[Nchan];
+    std::memcpy(Freqs,freqs,sizeof(double)*Nchan);
+  } else {
+    Freqs = freqs;
+  };
 
 
 
@@ -114,6 +135,14 @@ CalTable::CalTable(int kind, double **R1, double **P1,double **R2,double **P2,
     GainPhase[0][i] = new double*[Nchan];
     GainPhase[1][i] = new double*[Nchan];
     for (j=0; j<Nchan; j++) {
+      if (!isCopied[i]){
+        auxI = j*Ntimes[i];
+        GainAmp[0][i][j] = &R1[i][auxI];
+        GainAmp[1][i][j] = &R2[i][auxI];
+        GainPhase[0][i][j] = &P1[i][auxI];
+        GainPhase[1][i][j] = &P2[i][auxI];
+        continue;
+      };
       GainAmp[0][i][j] = new double[Ntimes[i]];
       GainAmp[1][i][j] = new double[Ntimes[i]];
       GainPhase[0][i][j] = new double[Ntimes[i]];
@@ -127,6 +156,7 @@ CalTable::CalTable(int kind, double **R1, double **P1,double **R2,double **P2,
       };
     };
   };
+  delete[] isCopied;
 
   if (Nchan>1) {
     SignFreq = (Freqs[1]>Freqs[0]);
@@ -142,16 +172,30 @@ CalTable::CalTable(int kind, double **R1, double **P1,double **R2,double **P2,
   preKt = new double[Nants];
   pret0 = new long[Nants];
   pret1 = new long[Nants];
+  tCursor = new long[Nants];
+  bufKt = new double[Nants];
+  buft0 = new long[Nants];
+  buft1 = new long[Nants];
+  rowt[0] = new long[Nants];
+  rowt[1] = new long[Nants];
   currTime = -1.0;
-  bufferGain[0] = new std::complex<float>*[Nants];
-  bufferGain[1] = new std::complex<float>*[Nants];
+  bufferGain[0] = new cplxJones*[Nants];
+  bufferGain[1] = new cplxJones*[Nants];
+  BuffRow[0] = new double*[Nants];
+  BuffRow[1] = new double*[Nants];
 
   for (auxI=0;auxI<Nants;auxI++) {
     pret0[auxI] = 0;
     pret1[auxI] = 0;
     preKt[auxI] = -1.0;
-    bufferGain[0][auxI] = new std::complex<float>[Nchan];
-    bufferGain[1][auxI] = new std::complex<float>[Nchan];
+    tCursor[auxI] = 0;
+    buft0[auxI] = -1;
+    rowt[0][auxI] = -1;
+    rowt[1][auxI] = -1;
+    BuffRow[0][auxI] = NULL;
+    BuffRow[1][auxI] = NULL;
+    bufferGain[0][auxI] = new cplxJones[Nchan];
+    bufferGain[1][auxI] = new cplxJones[Nchan];
   };
   K0 = new double[Nchan];
   I0 = new long[Nchan];
@@ -168,6 +212,61 @@ CalTable::CalTable(int kind, double **R1, double **P1,double **R2,double **P2,
 
 
 
+// Constructor for a copy of a table. The gains, times and flags are shared 
+// with the parent (they are not modified after fillGaps), but the frequency 
+// mapping and the time interpolation are independent:
+CalTable::CalTable(CalTable *parent){
+
+  *this = *parent;
+
+  gainChanged = true;
+
+  if(Nants<0){return;};
+
+  long auxI;
+
+  firstTime = new bool[Nants];
+  preKt = new double[Nants];
+  pret0 = new long[Nants];
+  pret1 = new long[Nants];
+  tCursor = new long[Nants];
+  bufKt = new double[Nants];
+  buft0 = new long[Nants];
+  buft1 = new long[Nants];
+  rowt[0] = new long[Nants];
+  rowt[1] = new long[Nants];
+  currTime = -1.0;
+  bufferGain[0] = new cplxJones*[Nants];
+  bufferGain[1] = new cplxJones*[Nants];
+  BuffRow[0] = new double*[Nants];
+  BuffRow[1] = new double*[Nants];
+
+  for (auxI=0;auxI<Nants;auxI++) {
+    firstTime[auxI] = true;
+    pret0[auxI] = 0;
+    pret1[auxI] = 0;
+    preKt[auxI] = -1.0;
+    tCursor[auxI] = 0;
+    buft0[auxI] = -1;
+    rowt[0][auxI] = -1;
+    rowt[1][auxI] = -1;
+    BuffRow[0][auxI] = NULL;
+    BuffRow[1][auxI] = NULL;
+    bufferGain[0][auxI] = new cplxJones[MSChan];
+    bufferGain[1][auxI] = new cplxJones[MSChan];
+  };
+
+  K0 = new double[MSChan];
+  I0 = new long[MSChan];
+  I1 = new long[MSChan];
+  std::memcpy(K0,parent->K0,sizeof(double)*MSChan);
+  std::memcpy(I0,parent->I0,sizeof(long)*MSChan);
+  std::memcpy(I1,parent->I1,sizeof(long)*MSChan);
+
+};
+
+
+
 // Is this a bandpass gain or a time gain?
 bool CalTable::isBandpass() {
   return Nchan>1;
@@ -454,10 +553,17 @@ void CalTable::setMapping(long mschan, double *freqs)
 
   for (i=0; i<Nants; i++) {
     preKt[i] = -1.0 ;
+    buft0[i] = -1;
+    rowt[0][i] = -1;
+    rowt[1][i] = -1;
     delete[] bufferGain[0][i];
     delete[] bufferGain[1][i];
-    bufferGain[0][i] = new std::complex<float>[mschan];
-    bufferGain[1][i] = new std::complex<float>[mschan];
+    delete[] BuffRow[0][i];
+    delete[] BuffRow[1][i];
+    bufferGain[0][i] = new cplxJones[mschan];
+    bufferGain[1][i] = new cplxJones[mschan];
+    BuffRow[0][i] = NULL;
+    BuffRow[1][i] = NULL;
   };
 
 
@@ -534,7 +640,7 @@ bool CalTable::setInterpolationTime(double itime) {
 
   if(Nants<0){gainChanged = currTime>0.0; currTime=itime; return gainChanged;};
 
-  long i; //, auxI;
+  long i, lo, hi, mid;
   long ti0 = 0;
   long ti1 = 0; 
   double Kt = 0.0;
@@ -564,20 +670,33 @@ bool CalTable::setInterpolationTime(double itime) {
      else if (itime>=Time[iant][Nts-1]) {
        ti0 = Nts-1; ti1 = 0; Kt = 1.0;}
      else {
-       for (i=Nts-1; i>=0; i--) {
-         if (itime>Time[iant][i]) {
-           ti1 = i+1;
-           ti0 = i;
-           auxD = Time[iant][i];
-           auxD2 = Time[iant][i+1];
-           if (isLinear){
-             Kt = (1.0 - (itime - auxD)/(auxD2-auxD));
-           } else {
-             Kt = 1.0;
+
+// Visibilities come in time order, so the bracket is almost always the 
+// previous one (or the next). Otherwise, do a binary search:
+       i = tCursor[iant];
+       if (i>Nts-2){i = Nts-2;};
+       if (!(itime>Time[iant][i] && itime<=Time[iant][i+1])) {
+         if (i<Nts-2 && itime>Time[iant][i+1] && itime<=Time[iant][i+2]) {
+           i += 1;
+         } else {
+           lo = 0; hi = Nts-1;
+           while (hi-lo>1) {
+             mid = (lo+hi)/2;
+             if (itime>Time[iant][mid]) {lo = mid;} else {hi = mid;};
            };
-           break;    
+           i = lo;
          };
        };
+       tCursor[iant] = i;
+       ti1 = i+1;
+       ti0 = i;
+       auxD = Time[iant][i];
+       auxD2 = Time[iant][i+1];
+       if (isLinear){
+         Kt = (1.0 - (itime - auxD)/(auxD2-auxD));
+       } else {
+         Kt = 1.0;
+       };
      };
 
      pret0[iant] = ti0;
@@ -601,6 +720,32 @@ bool CalTable::setInterpolationTime(double itime) {
 
 
 
+// Frequency interpolation of the gains of antenna iant at the time index ti.
+// The row is filled with the amplitudes (X,Y) and phases (X,Y), one after the other:
+void CalTable::interpolateRow(int iant, long ti, double *row) {
+
+  long i;
+
+  for (i=0; i<MSChan; i++) {
+
+     row[i] = GainAmp[0][iant][I0[i]][ti]*K0[i];
+     row[MSChan+i] = GainAmp[1][iant][I0[i]][ti]*K0[i];
+     row[2*MSChan+i] = GainPhase[0][iant][I0[i]][ti]*K0[i];
+     row[3*MSChan+i] = GainPhase[1][iant][I0[i]][ti]*K0[i];
+
+     if (I1[i] >0) {
+       row[i] += GainAmp[0][iant][I1[i]][ti]*(1.-K0[i]);
+       row[MSChan+i] += GainAmp[1][iant][I1[i]][ti]*(1.-K0[i]);
+       row[2*MSChan+i] += GainPhase[0][iant][I1[i]][ti]*(1.-K0[i]);
+       row[3*MSChan+i] += GainPhase[1][iant][I1[i]][ti]*(1.-K0[i]);
+     };
+
+  };
+
+};
+
+
+
 /* Interpolates the gains of an antenna (iant) at a given time, itime, 
    and applies them to the arrays re[2] and im[2] (elements of these arrays
    are the different polarizations (X,Y)). User should have run "setMapping" before,
@@ -612,14 +757,16 @@ bool CalTable::setInterpolationTime(double itime) {
  -------------------
 */
 
-void CalTable::applyInterpolation(int iant, int mode, std::complex<float> *gain[2]) {
+void CalTable::applyInterpolation(int iant, int mode, cplxJones *gain[2]) {
 
   long i;
   long ti0, ti1;
   double auxD;
   double Kt, Kt2;
+  double *auxP;
 
-  double auxF0, auxF1, auxF2, auxF3, auxT0, auxT1, auxT2, auxT3;
+  double auxF0, auxF1, auxF2, auxF3;
+  double *row0, *row1;
   if (Verbose){printf("Apply interpolation for antenna %i\n",iant);fflush(stdout);};
 
   if(Nants<0){return;};
@@ -632,56 +779,55 @@ void CalTable::applyInterpolation(int iant, int mode, std::complex<float> *gain[
   if (Verbose){printf("indexes: %li %li  -  %.3f\n",ti0, ti1, Kt);fflush(stdout);};
 
 
-// Interpolate in frequency (first) and time (second):
+// Interpolate in frequency (first) and time (second). Nothing to do if
+// the time interpolation of this antenna is the same as in bufferGain:
 
 
-  if (gainChanged || firstTime[iant]) {
+  if (firstTime[iant] || ti0 != buft0[iant] || ti1 != buft1[iant] || Kt != bufKt[iant]) {
 
    firstTime[iant]=false;
+   buft0[iant] = ti0; buft1[iant] = ti1; bufKt[iant] = Kt;
 
- // if (true) {
+   if (BuffRow[0][iant] == NULL){
+     BuffRow[0][iant] = new double[4*MSChan];
+     BuffRow[1][iant] = new double[4*MSChan];
+   };
 
-  for (i=0; i<MSChan; i++) {
+// The frequency interpolation is only redone when the time bracket changes
+// (the start of the new bracket may be the end of the previous one):
+   if (rowt[0][iant] != ti0 && rowt[1][iant] == ti0){
+     auxP = BuffRow[0][iant]; BuffRow[0][iant] = BuffRow[1][iant]; BuffRow[1][iant] = auxP;
+     rowt[1][iant] = rowt[0][iant]; rowt[0][iant] = ti0;
+   };
+   if (rowt[0][iant] != ti0){
+     interpolateRow(iant,ti0,BuffRow[0][iant]); rowt[0][iant] = ti0;
+   };
+   if (ti1 > 0 && rowt[1][iant] != ti1){
+     interpolateRow(iant,ti1,BuffRow[1][iant]); rowt[1][iant] = ti1;
+   };
 
-     auxF0 = GainAmp[0][iant][I0[i]][ti0]*K0[i];
-     auxF1 = GainAmp[1][iant][I0[i]][ti0]*K0[i];
-     auxF2 = GainPhase[0][iant][I0[i]][ti0]*K0[i];
-     auxF3 = GainPhase[1][iant][I0[i]][ti0]*K0[i];
+   row0 = BuffRow[0][iant];
+   row1 = BuffRow[1][iant];
 
-     if (I1[i] >0) {
-       auxF0 += GainAmp[0][iant][I1[i]][ti0]*(1.-K0[i]);
-       auxF1 += GainAmp[1][iant][I1[i]][ti0]*(1.-K0[i]);
-       auxF2 += GainPhase[0][iant][I1[i]][ti0]*(1.-K0[i]);
-       auxF3 += GainPhase[1][iant][I1[i]][ti0]*(1.-K0[i]);
-     };
+  for (i=0; i<MSChan; i++) {
 
+     auxF0 = row0[i];
+     auxF1 = row0[MSChan+i];
+     auxF2 = row0[2*MSChan+i];
+     auxF3 = row0[3*MSChan+i];
 
      if (ti1 > 0) {
-
-     auxT0 = GainAmp[0][iant][I0[i]][ti1]*K0[i];
-     auxT1 = GainAmp[1][iant][I0[i]][ti1]*K0[i];
-     auxT2 = GainPhase[0][iant][I0[i]][ti1]*K0[i];
-     auxT3 = GainPhase[1][iant][I0[i]][ti1]*K0[i];
-
-     if (I1[i] >0) {
-       auxT0 += GainAmp[0][iant][I1[i]][ti1]*(1.-K0[i]);
-       auxT1 += GainAmp[1][iant][I1[i]][ti1]*(1.-K0[i]);
-       auxT2 += GainPhase[0][iant][I1[i]][ti1]*(1.-K0[i]);
-       auxT3 += GainPhase[1][iant][I1[i]][ti1]*(1.-K0[i]);
-     };
-        auxF0 = auxF0*Kt+auxT0*Kt2;
-        auxF1 = auxF1*Kt+auxT1*Kt2;
-        auxF2 = auxF2*Kt+auxT2*Kt2;
-        auxF3 = auxF3*Kt+auxT3*Kt2;
-
-
+        auxF0 = auxF0*Kt+row1[i]*Kt2;
+        auxF1 = auxF1*Kt+row1[MSChan+i]*Kt2;
+        auxF2 = auxF2*Kt+row1[2*MSChan+i]*Kt2;
+        auxF3 = auxF3*Kt+row1[3*MSChan+i]*Kt2;
      };
 
 
        if (isDelay){
          auxD = TWOPI*(((double)i + 0.5)*deltaNu+deltaNu0);
-         bufferGain[0][iant][i] = (std::complex<float>) std::polar(1.0,auxF0*auxD);
-         bufferGain[1][iant][i] = (std::complex<float>) std::polar(1.0,auxF1*auxD);
+         bufferGain[0][iant][i] = (cplxJones) std::polar(1.0,auxF0*auxD);
+         bufferGain[1][iant][i] = (cplxJones) std::polar(1.0,auxF1*auxD);
        } else if (isTsys) {
          bufferGain[0][iant][i].real(1./sqrt(auxF0));
          bufferGain[0][iant][i].imag(0.0);
@@ -693,16 +839,13 @@ void CalTable::applyInterpolation(int iant, int mode, std::complex<float> *gain[
          bufferGain[1][iant][i].real(auxF1);
          bufferGain[1][iant][i].imag(auxF3);
        } else {
-         bufferGain[0][iant][i] = (std::complex<float>) std::polar(auxF0,auxF2);
-         bufferGain[1][iant][i] = (std::complex<float>) std::polar(auxF1,auxF3);
+         bufferGain[0][iant][i] = (cplxJones) std::polar(auxF0,auxF2);
+         bufferGain[1][iant][i] = (cplxJones) std::polar(auxF1,auxF3);
        };
 
-        
-
-
   };
 
-  };  // Comes from if(gainChanged)
+  };  // Comes from if(time interpolation changed)
 
 
 
@@ -740,7 +883,7 @@ void CalTable::applyInterpolation(int iant, int mode, std::complex<float> *gain[
 
 
 
-bool CalTable::getInterpolation(int iant, int ichan, std::complex<float> gain[2]){
+bool CalTable::getInterpolation(int iant, int ichan, cplxJones gain[2]){
 
   success = true;
   
@@ -26,6 +26,20 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 #include <iostream>
 #include <complex> 
 
+
+// Precision of the Jones-matrix chain (gain interpolation, K matrices and
+// their inversion). The visibilities are always single precision. Build with
+// -DPOLCONVERT_DOUBLE (see setup.py) to do all the matrix algebra in double:
+#ifndef __JONES_PRECISION__
+#define __JONES_PRECISION__
+#ifdef POLCONVERT_DOUBLE
+typedef double realJones;
+#else
+typedef float realJones;
+#endif
+typedef std::complex<realJones> cplxJones;
+#endif
+
 /* Class to read a calibration table and interpolate
    its gains in frequency and time. */
 class CalTable {
@@ -34,8 +48,13 @@ class CalTable {
   // Constructor for dummy table:
      CalTable(int kind, FILE *logF);
 
-  // Consturctor for APP tables:
-     CalTable(int kind, double **R1,double **I1,double **R2,double **I2, double *freqs, double **times, int Na, long *Nt, long Nc, bool **flag, bool islinear, FILE *logF, bool verbose);
+  // Consturctor for APP tables. If copyData is false, the arrays are wrapped
+  // without copying them (the caller must keep them alive while the table is used):
+     CalTable(int kind, double **R1,double **I1,double **R2,double **I2, double *freqs, double **times, int Na, long *Nt, long Nc, bool **flag, bool islinear, FILE *logF, bool verbose, bool copyData=true);
+
+  // Constructor for a copy that shares the gains of another table
+  // (but has its own interpolation state, e.g. for another thread):
+     CalTable(CalTable *parent);
      ~CalTable();
      int getNant();
      long getNchan();
@@ -66,10 +85,10 @@ class CalTable {
    If mode==2, the gains are MULTIPLIED to the already-existing values in gain. 
  -------------------
 */
-     void applyInterpolation(int iant, int mode, std::complex<float>* gain[2]);
+     void applyInterpolation(int iant, int mode, cplxJones* gain[2]);
 
 // Same as above, but one gain (for one channel) is returned:
-     bool getInterpolation(int iant, int ichan, std::complex<float> gain[2]);
+     bool getInterpolation(int iant, int ichan, cplxJones gain[2]);
 
 
 
@@ -78,6 +97,7 @@ class CalTable {
      FILE *logFile;
      char message[512];
      void fillGaps();  // Fills flagged gains with interpolated values.
+     void interpolateRow(int iant, long ti, double *row); // Frequency interpolation at one time.
      static const int Nmax = 256; // Maximum number of antennas.
      std::string name;
      int Nants;
@@ -99,9 +119,14 @@ class CalTable {
      long MSChan;
      double *preKt;
      long *pret0, *pret1;
+     long *tCursor; // Last time bracket found for each antenna.
+     double *bufKt; // Time interpolation used in bufferGain:
+     long *buft0, *buft1;
+     double **BuffRow[2]; // Frequency-interpolated gains at the two times of the bracket:
+     long *rowt[2];
      bool isDelay, gainChanged, isLinear, isDterm, isTsys, Verbose;
      double deltaNu0, deltaNu;
-     std::complex<float>** bufferGain[2];
+     cplxJones** bufferGain[2];
 };
 
 
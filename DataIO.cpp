@@ -61,6 +61,10 @@ memcpy(output,Freqvals[currFreq],Freqs[currFreq].Nchan*sizeof(double));
 bool DataIO::succeed(){return success;};
 
 
+// BY DEFAULT, THE IFs CANNOT BE CONVERTED IN PARALLEL:
+DataIO *DataIO::newIFCursor(){return nullptr;};
+
+
 // GET FIRST DAY OF OBSERVATION (MODIFIED JULIAN DATE)
 double DataIO::getDay0(){return day0;};
 
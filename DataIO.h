@@ -29,6 +29,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 #include <math.h>
 #include <complex>
 #include "fitsio.h"
+#include "FringeFile.h"
 
 #ifndef __DATAIO_H__
 #define __DATAIO_H__
@@ -79,7 +80,7 @@ and iterate over all the baselines with mixed polarization. */
 class DataIO {
   public:
 
-   ~DataIO();
+   virtual ~DataIO();
 
    DataIO(); 
 
@@ -125,7 +126,7 @@ class DataIO {
 
  // Modify the visibilities read by "getNextMixedVis" by the calibration matrix supplied
  // Saves the result in the "bufferVis" pointer  
-  virtual void applyMatrix(std::complex<float> *M[2][2], bool swap, bool print, int thisAnt, FILE *plotFile) = 0;
+  virtual void applyMatrix(std::complex<float> *M[2][2], bool swap, bool print, int thisAnt, FringeWriter *plotFile) = 0;
 
 
  // Flag bad (unconvertable) data:
@@ -134,6 +135,11 @@ class DataIO {
 // Close all files.
    virtual void finish() = 0;
 
+// Returns a new reader over the same data (with its own file streams and buffers), 
+// so that different IFs can be converted at the same time. Returns a null pointer
+// if the format does not support it:
+   virtual DataIO *newIFCursor();
+
 
 
    static const int MAXIF = 256;
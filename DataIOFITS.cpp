@@ -43,8 +43,8 @@ DataIOFITS::~DataIOFITS() {
   delete[] currentVis;
   delete[] bufferVis;
   delete[] TwoLinearVis;
-  delete[] currentData;
-  delete[] bufferData;
+  delete[] blockData;
+  delete[] blockDirty;
 
   delete[] NAV;
   delete[] Freqs;
@@ -119,8 +119,11 @@ DataIOFITS::DataIOFITS(std::string outputfile, int NlinAnt, int *LinAnt,
   bufferVis = new std::complex<float>[8];
   TwoLinearVis = new std::complex<float>[8];
 
-  currentData = new float[12];
-  bufferData = new float[12];
+  rowSize = 1;
+  blockVis0 = 0; blockVis1 = 0;
+  blockRow0 = 0; blockNrows = 0; blockMaxRows = 0;
+  blockData = NULL;
+  blockDirty = NULL;
 
 /////////////////////////////////
 
@@ -167,6 +170,7 @@ DataIOFITS::DataIOFITS(std::string outputfile, int NlinAnt, int *LinAnt,
 
 // CLOSE FILE AT END:
 void DataIOFITS::finish(){
+   flushBlock();
    fits_close_file(ofile, &status);
  //  char *message;
    if (status){
@@ -191,7 +195,6 @@ void DataIOFITS::saveCirculars(std::string inputfile) {
   int i, j, a1, a2, i3, souidx, auxI;
   double AuxPA1, AuxPA2;
   long il, ii;
-  long a11, a12, a21, a22;
 
   double *UVW;
   UVW = new double[3];
@@ -206,14 +209,12 @@ void DataIOFITS::saveCirculars(std::string inputfile) {
 
 
 // AUXILIARY BINARY FILES TO STORE CIRCULAR VISIBILITIES:
-  FILE **circFile = new FILE*[nDoIF];
+  FringeWriter **circFile = new FringeWriter*[nDoIF];
 
 
 // AUXILIARY MEMORY SPACE TO WRITE CIRCULAR VISIBS:
    delete bufferVis ;
-   delete bufferData ;
    bufferVis = new std::complex<float>[4*(Freqs[0].Nchan+1)] ;
-   bufferData = new float[12*(Freqs[0].Nchan+1)] ;
 
 // OPEN AUXILIARY BINARY FILES:
   if (doWriteCirc){
@@ -222,21 +223,63 @@ void DataIOFITS::saveCirculars(std::string inputfile) {
 
     for (ii=0; ii<nDoIF; ii++){
       sprintf(message,"POLCONVERT.FRINGE/OTHERS.FRINGE_IF%i",DoIF[ii]+1);
-      circFile[ii] = fopen(message,"wb");
-      fwrite(&Freqs[DoIF[ii]].Nchan,sizeof(int),1,circFile[ii]);
-      fwrite(Freqvals[DoIF[ii]],Freqs[DoIF[ii]].Nchan*sizeof(double),1,circFile[ii]);
+      circFile[ii] = new FringeWriter(message,4,Freqs[DoIF[ii]].Nchan,false,
+                                      Freqs[DoIF[ii]].Nchan,Freqvals[DoIF[ii]]);
     };
   };
 
-   for (ii=0; ii<NVis2Save;ii++){
+// THE ROWS ARE READ IN BLOCKS (ALL THE METADATA AND VISIBILITIES OF EACH
+// BLOCK AT ONCE), UNLESS THE ROWS TO SAVE ARE SPARSE IN THE BLOCK:
+   long maxRows = ChunkBytes/(rowSize*((long) sizeof(float)));
+   if (maxRows<1){maxRows = 1;};
+   float *rowsData = new float[maxRows*rowSize];
+   int *souRows = new int[maxRows];
+   float *uvwRows[3];
+   for (i=0; i<3; i++){uvwRows[i] = new float[maxRows];};
+   float *rowData;
+   long iv0, iv1, row0, nrows, irow;
+
+   iv0 = 0;
+   while (iv0 < NVis2Save){
+
+     row0 = Vis2Save[iv0];
+     iv1 = iv0;
+     while (iv1 < NVis2Save && Vis2Save[iv1]-row0 < maxRows){iv1 += 1;};
+     nrows = Vis2Save[iv1-1]-row0+1;
+
+     if (4*(iv1-iv0) >= nrows){
+       fits_read_col(ofile, TFLOAT, uu, row0+1, 1, nrows, NULL, uvwRows[0], &auxI, &status);
+       fits_read_col(ofile, TFLOAT, vv, row0+1, 1, nrows, NULL, uvwRows[1], &auxI, &status);
+       fits_read_col(ofile, TFLOAT, ww, row0+1, 1, nrows, NULL, uvwRows[2], &auxI, &status);
+       fits_read_col(ofile, TINT, ss, row0+1, 1, nrows, NULL, souRows, &auxI, &status);
+       fits_read_col(ofile, TFLOAT, Flux, row0+1, 1, nrows*rowSize, NULL, rowsData, NULL, &status);
+     } else {
+       for (ii=iv0; ii<iv1; ii++){
+         irow = Vis2Save[ii]-row0;
+         fits_read_col(ofile, TFLOAT, uu, Vis2Save[ii]+1, 1, 1, NULL, &uvwRows[0][irow], &auxI, &status);
+         fits_read_col(ofile, TFLOAT, vv, Vis2Save[ii]+1, 1, 1, NULL, &uvwRows[1][irow], &auxI, &status);
+         fits_read_col(ofile, TFLOAT, ww, Vis2Save[ii]+1, 1, 1, NULL, &uvwRows[2][irow], &auxI, &status);
+         fits_read_col(ofile, TINT, ss, Vis2Save[ii]+1, 1, 1, NULL, &souRows[irow], &auxI, &status);
+         fits_read_col(ofile, TFLOAT, Flux, Vis2Save[ii]+1, 1, rowSize, NULL, &rowsData[irow*rowSize], NULL, &status);
+       };
+     };
+
+     if (status){
+       sprintf(message,"\n\nPROBLEM READING VISIBILITIES TO SAVE!  ERR: %i | row: %li\n\n",status,row0);
+       fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+       success=false; break;
+     };
+
+   for (ii=iv0; ii<iv1;ii++){
       il = Vis2Save[ii];
+      irow = il-row0;
       a1 = Basels[il]/256;
       a2 = Basels[il]%256;
 
-      fits_read_col(ofile, TFLOAT, uu, il+1, 1, 1, NULL, &FUVW[0], &auxI, &status);
-      fits_read_col(ofile, TFLOAT, vv, il+1, 1, 1, NULL, &FUVW[1], &auxI, &status);
-      fits_read_col(ofile, TFLOAT, ww, il+1, 1, 1, NULL, &FUVW[2], &auxI, &status);
-      fits_read_col(ofile, TINT, ss, il+1, 1, 1, NULL, &souidx, &auxI, &status);
+      FUVW[0] = uvwRows[0][irow];
+      FUVW[1] = uvwRows[1][irow];
+      FUVW[2] = uvwRows[2][irow];
+      souidx = souRows[irow];
 
       UVW[0] = (double) FUVW[0]; UVW[1] = (double) FUVW[1]; UVW[2] = (double) FUVW[2]; 
 
@@ -248,31 +291,27 @@ void DataIOFITS::saveCirculars(std::string inputfile) {
           jump += 4*((long) Freqs[j].Nchan);
         };
         Nentry = 4*((long) Freqs[currIF].Nchan);
-        fits_read_col(ofile, TFLOAT, Flux, il+1, dsize*jump+1, dsize*Nentry, NULL, bufferData, NULL, &status);
+        rowData = &rowsData[irow*rowSize + dsize*jump];
 
         for (j=0; j<Nentry; j++){
-          i3 = dsize*j; bufferVis[j].real(bufferData[i3]);bufferVis[j].imag(bufferData[i3+1]); 
+          i3 = dsize*j; bufferVis[j].real(rowData[i3]);bufferVis[j].imag(rowData[i3+1]); 
         };
 
-       fwrite(&Times[il],sizeof(double),1,circFile[i]);
-       fwrite(&a1,sizeof(int),1,circFile[i]);
-       fwrite(&a2,sizeof(int),1,circFile[i]);
-       fwrite(&AuxPA1,sizeof(double),1,circFile[i]);
-       fwrite(&AuxPA2,sizeof(double),1,circFile[i]);
-
-     for (j=0; j<Freqs[i].Nchan; j++){
-       a11 = j*4;
-       a22 = a11+1;
-       a12 = a11+2;
-       a21 = a11+3;
-       fwrite(&bufferVis[a11],sizeof(std::complex<float>),1,circFile[i]);
-       fwrite(&bufferVis[a12],sizeof(std::complex<float>),1,circFile[i]);
-       fwrite(&bufferVis[a21],sizeof(std::complex<float>),1,circFile[i]);
-       fwrite(&bufferVis[a22],sizeof(std::complex<float>),1,circFile[i]);
-     };
+// (the products are interleaved as RR, LL, RL, LR in each channel):
+       std::complex<float> *circVis[4] = {&bufferVis[0], &bufferVis[2], &bufferVis[3], &bufferVis[1]};
+       long circStride[4] = {4, 4, 4, 4};
+       circFile[i]->addVis(0,Times[il],a1,a2,AuxPA1,AuxPA2,
+                           UVW[0]*UVW[0] + UVW[1]*UVW[1],circVis,circStride,false);
     };
   };
 
+     iv0 = iv1;
+   };
+
+   delete[] rowsData;
+   delete[] souRows;
+   for (i=0; i<3; i++){delete[] uvwRows[i];};
+
 
 
 
@@ -281,7 +320,7 @@ void DataIOFITS::saveCirculars(std::string inputfile) {
 // CLOSE AUXILIARY BINARY FILES:
   if (doWriteCirc){
     for (ii=0; ii<nDoIF; ii++){
-      fclose(circFile[ii]); 
+      delete circFile[ii];
     };
   };
 
@@ -517,8 +556,8 @@ void DataIOFITS::readInput(std::string inputfile, int saveSource) {
     fits_get_colnum(fptr, CASEINSEN, WW1, &ww, &status);
     };
   } else {
-  fits_get_colnum(fptr, CASEINSEN, VV0, &uu, &status);
-  fits_get_colnum(fptr, CASEINSEN, WW0, &uu, &status);
+  fits_get_colnum(fptr, CASEINSEN, VV0, &vv, &status);
+  fits_get_colnum(fptr, CASEINSEN, WW0, &ww, &status);
   };
 
 
@@ -559,16 +598,32 @@ void DataIOFITS::readInput(std::string inputfile, int saveSource) {
   NVis2Save = 0;
 
 
+// THE METADATA ARE READ IN CHUNKS OF ROWS:
+  long ichunk = 0, nchunk = 0;
+  int *souChunk = new int[MetaRows];
+  float *uvwChunk[3];
+  for (i=0; i<3; i++){uvwChunk[i] = new float[MetaRows];};
+
   for (il=0;il<Nvis;il++){
 
-// READ CURRENT VISIBIITY METADATA:
-    fits_read_col(fptr, TINT, ii, il+1, 1, 1, NULL, &Basels[il], &auxI, &status);
-    fits_read_col(fptr, TDOUBLE, kk, il+1, 1, 1, NULL, &Dates[il], &auxI, &status);
-    fits_read_col(fptr, TDOUBLE, ll, il+1, 1, 1, NULL, &Times[il], &auxI, &status);
+// READ THE METADATA OF THE NEXT CHUNK OF VISIBILITIES:
+    if (il == ichunk + nchunk){
+      ichunk = il;
+      nchunk = (Nvis-il < MetaRows) ? Nvis-il : MetaRows;
+      fits_read_col(fptr, TINT, ii, il+1, 1, nchunk, NULL, &Basels[il], &auxI, &status);
+      fits_read_col(fptr, TDOUBLE, kk, il+1, 1, nchunk, NULL, &Dates[il], &auxI, &status);
+      fits_read_col(fptr, TDOUBLE, ll, il+1, 1, nchunk, NULL, &Times[il], &auxI, &status);
+      fits_read_col(fptr, TINT, ss, il+1, 1, nchunk, NULL, souChunk, &auxI, &status);
+      fits_read_col(fptr, TFLOAT, uu, il+1, 1, nchunk, NULL, uvwChunk[0], &auxI, &status);
+      fits_read_col(fptr, TFLOAT, vv, il+1, 1, nchunk, NULL, uvwChunk[1], &auxI, &status);
+      fits_read_col(fptr, TFLOAT, ww, il+1, 1, nchunk, NULL, uvwChunk[2], &auxI, &status);
+    };
 
     if (status){
       sprintf(message,"\n\nPROBLEM READING METADATA!  ERR: %i | row: %li\n\n",status, il);
       fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+      for (i=0; i<3; i++){delete[] uvwChunk[i];};
+      delete[] souChunk;
       success=false;return;
     };
 
@@ -601,12 +656,12 @@ void DataIOFITS::readInput(std::string inputfile, int saveSource) {
 
       isLinVis = is1orig[NLinVis] || is2orig[NLinVis];
 
-      fits_read_col(fptr, TINT, ss, il+1, 1, 1, NULL, &souidx, &auxI, &status);
+      souidx = souChunk[il-ichunk];
 
       if(isLinVis){
-        fits_read_col(fptr, TFLOAT, uu, il+1, 1, 1, NULL, &FUVW[0], &auxI, &status);
-        fits_read_col(fptr, TFLOAT, vv, il+1, 1, 1, NULL, &FUVW[1], &auxI, &status);
-        fits_read_col(fptr, TFLOAT, ww, il+1, 1, 1, NULL, &FUVW[2], &auxI, &status);
+        FUVW[0] = uvwChunk[0][il-ichunk];
+        FUVW[1] = uvwChunk[1][il-ichunk];
+        FUVW[2] = uvwChunk[2][il-ichunk];
         UVW[0] = (double) FUVW[0]; UVW[1] = (double) FUVW[1]; UVW[2] = (double) FUVW[2]; 
 
 /////// TODO: SORT OUT a1-1 -> a1
@@ -634,7 +689,8 @@ void DataIOFITS::readInput(std::string inputfile, int saveSource) {
 
   };
 
-
+  for (i=0; i<3; i++){delete[] uvwChunk[i];};
+  delete[] souChunk;
 
 
 
@@ -672,6 +728,9 @@ bool DataIOFITS::setCurrentIF(int i){
   };
 
 
+// Write the visibilities of the previous IF that are still in memory:
+  if (!flushBlock()){return success;};
+
   currFreq = i;
   currVis = 0;
   jump = 0;
@@ -683,14 +742,17 @@ bool DataIOFITS::setCurrentIF(int i){
   delete currentVis ;
   delete bufferVis ;
   delete TwoLinearVis ;
-  delete bufferData ;
-  delete currentData ;
   currentVis = new std::complex<float>[4*(Freqs[currFreq].Nchan+1)] ;
   bufferVis = new std::complex<float>[4*(Freqs[currFreq].Nchan+1)] ;
   TwoLinearVis = new std::complex<float>[4*(Freqs[currFreq].Nchan+1)] ;
 
-  currentData = new float[12*(Freqs[currFreq].Nchan+1)] ;
-  bufferData = new float[12*(Freqs[currFreq].Nchan+1)] ;
+  delete[] blockData;
+  delete[] blockDirty;
+  blockMaxRows = ChunkBytes/(dsize*Nentry*((long) sizeof(float)));
+  if (blockMaxRows<1){blockMaxRows = 1;};
+  blockData = new float[blockMaxRows*dsize*Nentry];
+  blockDirty = new bool[blockMaxRows];
+  blockVis0 = 0; blockVis1 = 0; blockNrows = 0;
 
   memcpy(is1, is1orig, 2*Nvis*sizeof(bool));
   memcpy(is2, is2orig, 2*Nvis*sizeof(bool));
@@ -733,6 +795,7 @@ void DataIOFITS::openOutFile(std::string outputfile, bool Overwrite) {
    fits_get_coltype(ofile, Flux, &typecode, &NFlux, &repeat, &status);
 
    dsize = NFlux/TotSize;
+   rowSize = NFlux;
 
    sprintf(message,
           "\n\n\n   RECORD SIZE: %li ; VIS. SIZE: %li ; There are %li floats per visibility.\n\n",
@@ -766,6 +829,7 @@ bool DataIOFITS::getNextMixedVis(double &JDTime, int &antenna, int &otherAnt, bo
 
   bool found = false;
   long i,curridx, i3;
+  float *rowData = NULL;
 
   if (NLinVis==0){return false;};
 
@@ -783,8 +847,14 @@ bool DataIOFITS::getNextMixedVis(double &JDTime, int &antenna, int &otherAnt, bo
     };
     
     curridx = indexes[currVis];
+    if (is1[currVis] || is2[currVis]){
+      if (currVis < blockVis0 || currVis >= blockVis1){
+        if (!loadBlock(currVis)){return false;};
+      };
+      rowData = &blockData[(curridx-blockRow0)*dsize*Nentry];
+    };
+
     if (is1[currVis]){
-      fits_read_col(ofile, TFLOAT, Flux, curridx+1, dsize*jump+1, dsize*Nentry, NULL, currentData, NULL, &status);
       antenna = an1[currVis];
       calField = field[currVis];
       otherAnt = an2[currVis];
@@ -794,13 +864,12 @@ bool DataIOFITS::getNextMixedVis(double &JDTime, int &antenna, int &otherAnt, bo
       found = true; 
       for (i=0; i<Nentry; i++){
         i3 = dsize*i; 
-        currentVis[i].real(currentData[i3]); 
-        currentVis[i].imag(currentData[i3+1]); 
+        currentVis[i].real(rowData[i3]); 
+        currentVis[i].imag(rowData[i3+1]); 
       };
 
     } else if (is2[currVis]){
 
-      fits_read_col(ofile, TFLOAT, Flux, curridx+1, dsize*jump+1, dsize*Nentry, NULL, currentData, NULL, &status);
       antenna = an2[currVis];
       otherAnt = an1[currVis];
       JDTime = JDTimes[currVis];
@@ -810,8 +879,8 @@ bool DataIOFITS::getNextMixedVis(double &JDTime, int &antenna, int &otherAnt, bo
       found = true;
       for (i=0; i<Nentry; i++){
         i3 = dsize*i; 
-        currentVis[i].real(currentData[i3]); 
-        currentVis[i].imag(currentData[i3+1]); 
+        currentVis[i].real(rowData[i3]); 
+        currentVis[i].imag(rowData[i3+1]); 
       };
 
     } else {
@@ -820,6 +889,9 @@ bool DataIOFITS::getNextMixedVis(double &JDTime, int &antenna, int &otherAnt, bo
     if (currVis == NLinVis){break;};
   };
 
+// All the visibilities of this IF are done:
+  if (!found){flushBlock();};
+
 
     if(canPlot && isTwoLinear){
       for (i=0; i<Nentry; i++){
@@ -853,7 +925,8 @@ bool DataIOFITS::getNextMixedVis(double &JDTime, int &antenna, int &otherAnt, bo
 
 bool DataIOFITS::setCurrentMixedVis() {
 
-   long curridx = indexes[currVis];
+   long currow = indexes[currVis]-blockRow0;
+   float *rowData = &blockData[currow*dsize*Nentry];
    long i, i3;
 
 ////////////////////
@@ -863,25 +936,96 @@ bool DataIOFITS::setCurrentMixedVis() {
    };
 
    for (i=0; i<Nentry; i++){
-     i3=dsize*i; currentData[i3]=bufferVis[i].real(); 
-     currentData[i3+1]=bufferVis[i].imag();
+     i3=dsize*i; rowData[i3]=bufferVis[i].real(); 
+     rowData[i3+1]=bufferVis[i].imag();
    };
 ////////////////////
 
-   fits_write_col(ofile, TFLOAT, Flux, curridx+1, dsize*jump+1, dsize*Nentry, currentData, &status); 
-   fits_flush_file(ofile,&status);
-
-   if (status){
-     sprintf(message,"\n\nPROBLEM WRITING VISIBILITY DATA!  ERR: %i\n\n",status);
-     fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
-     success=false;
-   };
+// The row is written to the file with the rest of the block:
+   blockDirty[currow] = true;
    return success;
 
 };
 
 
 
+
+// READ THE VISIBILITIES OF THE CURRENT IF FOR A BLOCK OF ROWS, STARTING 
+// AT THE ROW OF THE MIXED-POL. VISIBILITY vis (THE PREVIOUS BLOCK IS WRITTEN FIRST).
+// IF THE MIXED-POL. ROWS ARE DENSE, THE IF SUBSET OF THE WHOLE BLOCK IS READ AT ONCE:
+bool DataIOFITS::loadBlock(long vis) {
+
+  long i, slice = dsize*Nentry;
+  int anynul;
+
+  if (!flushBlock()){return false;};
+
+  blockVis0 = vis;
+  blockRow0 = indexes[vis];
+  blockVis1 = vis;
+  while (blockVis1 < NLinVis && indexes[blockVis1]-blockRow0 < blockMaxRows){
+    blockVis1 += 1;
+  };
+  blockNrows = indexes[blockVis1-1]-blockRow0+1;
+  for (i=0; i<blockNrows; i++){blockDirty[i] = false;};
+
+  if (4*(blockVis1-blockVis0) >= blockNrows){
+    long naxes[1] = {rowSize};
+    long fpix[2] = {dsize*jump+1, blockRow0+1};
+    long lpix[2] = {dsize*jump+slice, blockRow0+blockNrows};
+    long inc[2] = {1, 1};
+    fits_read_subset_flt(ofile, Flux, 1, naxes, fpix, lpix, inc, 0., blockData, &anynul, &status);
+  } else {
+    for (i=blockVis0; i<blockVis1; i++){
+      fits_read_col(ofile, TFLOAT, Flux, indexes[i]+1, dsize*jump+1, slice, NULL, 
+                    &blockData[(indexes[i]-blockRow0)*slice], NULL, &status);
+    };
+  };
+
+  if (status){
+    sprintf(message,"\n\nPROBLEM ACCESSING VISIBILITY DATA!  ERR: %i\n\n",status);
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+    blockVis0 = 0; blockVis1 = 0; blockNrows = 0;
+    success=false; return false;
+  };
+
+  return true;
+
+};
+
+
+
+
+// WRITE THE CONVERTED ROWS OF THE CURRENT BLOCK (WHOLE RUNS OF ROWS AT ONCE,
+// IF THE IF SUBSET IS THE WHOLE FLUX COLUMN):
+bool DataIOFITS::flushBlock() {
+
+  long i, i0, slice = dsize*Nentry;
+
+  i = 0;
+  while (i < blockNrows){
+    if (!blockDirty[i]){i += 1; continue;};
+    i0 = i;
+    if (slice == rowSize){
+      while (i < blockNrows && blockDirty[i]){blockDirty[i] = false; i += 1;};
+      fits_write_col(ofile, TFLOAT, Flux, blockRow0+i0+1, 1, (i-i0)*slice, &blockData[i0*slice], &status);
+    } else {
+      blockDirty[i] = false; i += 1;
+      fits_write_col(ofile, TFLOAT, Flux, blockRow0+i0+1, dsize*jump+1, slice, &blockData[i0*slice], &status);
+    };
+  };
+
+  if (status){
+    sprintf(message,"\n\nPROBLEM WRITING VISIBILITY DATA!  ERR: %i\n\n",status);
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+    success=false; return false;
+  };
+  return true;
+
+};
+
+
+
 // Flag bad data:
 void DataIOFITS::zeroWeight(){
 
@@ -892,7 +1036,7 @@ void DataIOFITS::zeroWeight(){
 // Convert the data using the corresponding calibration matrix:
 
 void DataIOFITS::applyMatrix(std::complex<float> *M[2][2], bool swap, 
-                       bool print, int thisAnt, FILE *plotFile) {
+                       bool print, int thisAnt, FringeWriter *plotFile) {
  
   long k, a11, a12, a21, a22, ca11, ca12, ca21, ca22 ;
   std::complex<float>  auxVis;
@@ -936,71 +1080,31 @@ void DataIOFITS::applyMatrix(std::complex<float> *M[2][2], bool swap,
 
     };
 
-   int zero = 0;
-
-   if (print && canPlot) {
-     if (currConj){
-     if (k==0){
-       fwrite(&zero,sizeof(int),1,plotFile);
-       fwrite(&JDTimes[currVis],sizeof(double),1,plotFile);
-       fwrite(&an1[currVis],sizeof(int),1,plotFile);
-       fwrite(&an2[currVis],sizeof(int),1,plotFile);
-       fwrite(&ParAng[0][currVis],sizeof(double),1,plotFile);
-       fwrite(&ParAng[1][currVis],sizeof(double),1,plotFile);
-       fwrite(&UVDist[currVis],sizeof(double),1,plotFile);
-     };
-     fwrite(&currentVis[a11],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&currentVis[a12],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&currentVis[a21],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&currentVis[a22],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&bufferVis[ca11],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&bufferVis[ca12],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&bufferVis[ca21],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&bufferVis[ca22],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&M[0][0][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&M[0][1][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&M[1][0][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&M[1][1][k],sizeof(std::complex<float>),1,plotFile);
-     } else {
-     if(k==0){
-       fwrite(&zero,sizeof(int),1,plotFile);
-       fwrite(&JDTimes[currVis],sizeof(double),1,plotFile);
-       fwrite(&an2[currVis],sizeof(int),1,plotFile);
-       fwrite(&an1[currVis],sizeof(int),1,plotFile);
-       fwrite(&ParAng[1][currVis],sizeof(double),1,plotFile);
-       fwrite(&ParAng[0][currVis],sizeof(double),1,plotFile);
-       fwrite(&UVDist[currVis],sizeof(double),1,plotFile);
-     };
-     auxVis = std::conj(currentVis[a11]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(currentVis[a21]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(currentVis[a12]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(currentVis[a22]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(bufferVis[ca11]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(bufferVis[ca21]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(bufferVis[ca12]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(bufferVis[ca22]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(M[0][0][k]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(M[1][0][k]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(M[0][1][k]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     auxVis = std::conj(M[1][1][k]);
-     fwrite(&auxVis,sizeof(std::complex<float>),1,plotFile);
-     };
-
-   };
  };
 
 
+// Write the plot (and solver) file. The products are interleaved as
+// 11, 22, 12, 21 in each channel (the matrices are not):
+  if (print && canPlot) {
+    const long plotStride[12] = {4, 4, 4, 4, 4, 4, 4, 4, 1, 1, 1, 1};
+    if (currConj){
+      std::complex<float> *plotVis[12] = {
+        &currentVis[0], &currentVis[2], &currentVis[3], &currentVis[1],
+        &bufferVis[0], &bufferVis[2], &bufferVis[3], &bufferVis[1],
+        M[0][0], M[0][1], M[1][0], M[1][1]};
+      plotFile->addVis(0,JDTimes[currVis],an1[currVis],an2[currVis],
+        ParAng[0][currVis],ParAng[1][currVis],UVDist[currVis],plotVis,plotStride,false);
+    } else {
+      std::complex<float> *plotVis[12] = {
+        &currentVis[0], &currentVis[3], &currentVis[2], &currentVis[1],
+        &bufferVis[0], &bufferVis[3], &bufferVis[2], &bufferVis[1],
+        M[0][0], M[1][0], M[0][1], M[1][1]};
+      plotFile->addVis(0,JDTimes[currVis],an2[currVis],an1[currVis],
+        ParAng[1][currVis],ParAng[0][currVis],UVDist[currVis],plotVis,plotStride,true);
+    };
+  };
+
+
   if(isTwoLinear){
      if(canPlot){
          isTwoLinear=false;
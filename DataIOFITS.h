@@ -66,7 +66,7 @@ class DataIOFITS: public DataIO {
 
  // Modify the visibilities read by "getNextMixedVis" by the calibration matrix supplied
  // Saves the result in the "bufferVis" pointer  
-  void applyMatrix(std::complex<float> *M[2][2], bool swap, bool print, int thisAnt, FILE *plotFile);
+  void applyMatrix(std::complex<float> *M[2][2], bool swap, bool print, int thisAnt, FringeWriter *plotFile);
 
  // Flag bad (unconvertible) data:
   void zeroWeight();
@@ -81,6 +81,18 @@ class DataIOFITS: public DataIO {
     void openOutFile(std::string outputfile, bool Overwrite);   
     void saveCirculars(std::string inputfile);   
 
+// The visibilities of the current IF are read (and written back) in blocks of rows:
+    bool loadBlock(long vis);
+    bool flushBlock();
+
+    static const long ChunkBytes = 67108864; // Memory for a block of rows (64 MB).
+    static const long MetaRows = 16384; // Rows of metadata read at once.
+    long rowSize; // Number of floats in the FLUX column of a row.
+    long blockVis0, blockVis1; // Mixed-pol visibilities in the current block.
+    long blockRow0, blockNrows, blockMaxRows;
+    float *blockData;
+    bool *blockDirty;
+
     fitsfile *fptr, *ofile; 
     FILE *logFile ;
     long *Vis2Save;
@@ -99,7 +111,4 @@ class DataIOFITS: public DataIO {
     std::complex<float> *bufferVis ;
     std::complex<float> *TwoLinearVis ;
 
-    float *currentData ;
-    float *bufferData ;
-
 };
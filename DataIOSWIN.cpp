@@ -26,6 +26,10 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 #include <string.h>
 #include <math.h>
 #include <dirent.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 #include "./DataIOSWIN.h"
 
 
@@ -36,6 +40,21 @@ DataIOSWIN::~DataIOSWIN() {
 
   int i, j;
 
+// A cursor only owns its streams and buffers:
+  if (isCursor){
+    for (i=0; i<4; i++){
+      delete[] currentVis[i];
+      delete[] bufferVis[i];
+      delete[] auxVis[i];
+    };
+    delete[] soaVis;
+    delete[] newdifx;
+    return;
+  };
+
+  unmapFiles();
+  delete[] mappedFiles;
+
   free(Records);
   free(ParAng[0]);
   free(ParAng[1]);
@@ -61,6 +80,7 @@ DataIOSWIN::~DataIOSWIN() {
     delete[] bufferVis[i];
     delete[] auxVis[i];
   };
+  delete[] soaVis;
 
   for(i=0; i<NLinAnt;i++){
     for(j=0; j<Nfreqs; j++){delete[] averAutocorrs[i][j];};
@@ -98,6 +118,7 @@ DataIOSWIN::DataIOSWIN(int nfiledifx, std::string* difxfiles, int NlinAnt,
 
 
   isTwoLinear = false;
+  isCursor = false;
   success = true;
   NLinAnt = NlinAnt;
   linAnts = new int[NlinAnt];
@@ -152,6 +173,8 @@ DataIOSWIN::DataIOSWIN(int nfiledifx, std::string* difxfiles, int NlinAnt,
     bufferVis[i] = new std::complex<float>[MaxNChan+1];
     auxVis[i] = new std::complex<float>[MaxNChan+1];
   };
+  soaVis = new float[NSOA*(MaxNChan+1)];
+  soaStride = MaxNChan+1;
 
   isOverWrite = Overwrite ;
 
@@ -174,6 +197,64 @@ DataIOSWIN::DataIOSWIN(int nfiledifx, std::string* difxfiles, int NlinAnt,
 
 
 
+DataIOSWIN::DataIOSWIN(DataIOSWIN *parent) {
+
+  int i, MaxNChan = 0;
+
+  *this = *parent;
+
+  isCursor = true;
+  isAutoCorr = false;
+  isTwoLinear = false;
+  canPlot = false;
+  debugNewIF = false;
+  currFreq = 0;
+  currVis = 0;
+
+  for(i=0;i<Nfreqs;i++){
+    if (Freqs[i].Nchan>MaxNChan){MaxNChan = Freqs[i].Nchan;};
+  };
+
+  for (i=0; i<4; i++){
+    currentVis[i] = new std::complex<float>[MaxNChan+1];
+    bufferVis[i] = new std::complex<float>[MaxNChan+1];
+    auxVis[i] = new std::complex<float>[MaxNChan+1];
+  };
+  soaVis = new float[NSOA*(MaxNChan+1)];
+  soaStride = MaxNChan+1;
+
+  olddifx = nullptr;
+  newdifx = new std::fstream[nfiles];
+
+// The memory maps are shared with the parent:
+  if (isMapped){return;};
+
+  for (i=0; i<nfiles; i++){
+    newdifx[i].open(outFileNames[i].c_str(), std::ios::out | std::ios::binary | std::ios::in);
+    if (!newdifx[i].is_open()){
+      sprintf(message,"\nERROR! CANNOT REOPEN %s\n",outFileNames[i].c_str());
+      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+      success = false;
+    };
+  };
+
+};
+
+
+
+DataIO *DataIOSWIN::newIFCursor(){
+
+  int i;
+
+// Make sure that the new pol. labels are already in the files:
+  for (i=0; i<nfiles; i++){newdifx[i].flush();};
+
+  return new DataIOSWIN(this);
+
+};
+
+
+
 
 
 
@@ -276,9 +357,10 @@ void DataIOSWIN::averageAutocorrs(){
 void DataIOSWIN::finish(){
 
   int auxI;
+  if (!isCursor){unmapFiles();};
   for (auxI=0; auxI<nfiles; auxI++) {
      newdifx[auxI].close();
-     if (!isOverWrite){olddifx[auxI].close();};
+     if (!isOverWrite && !isCursor){olddifx[auxI].close();};
   };
 
 };
@@ -295,6 +377,7 @@ void DataIOSWIN::openOutFiles(std::string* difxfiles) {
 
   olddifx = new std::ifstream[nfiles];
   newdifx = new std::fstream[nfiles];
+  outFileNames = new std::string[nfiles];
 
   long begin, end;
   filesizes = new long[nfiles];
@@ -312,17 +395,269 @@ void DataIOSWIN::openOutFiles(std::string* difxfiles) {
 
 
    if (!isOverWrite) {
+     outFileNames[auxI] = SEP+difxfiles[auxI];
      newdifx[auxI].open((SEP+difxfiles[auxI]).c_str(), std::ios::out | std::ios::binary | std::ios::in);
      newdifx[auxI] << olddifx[auxI].rdbuf();
      newdifx[auxI].close();
      newdifx[auxI].open((SEP+difxfiles[auxI]).c_str(), std::ios::out | std::ios::binary | std::ios::in);
      olddifx[auxI].clear();
    } else {
+     outFileNames[auxI] = difxfiles[auxI];
      newdifx[auxI].open((difxfiles[auxI]).c_str(), std::ios::out | std::ios::binary | std::ios::in);
    };
 
  };
 
+ mapFiles();
+
+};
+
+
+
+
+void DataIOSWIN::mapFiles() {
+
+  int auxI, fd;
+  void *auxP;
+
+  isMapped = false;
+  mappedFiles = new char*[nfiles];
+  for (auxI=0; auxI<nfiles; auxI++){mappedFiles[auxI] = nullptr;};
+
+  for (auxI=0; auxI<nfiles; auxI++) {
+
+    auxP = MAP_FAILED;
+    fd = open(outFileNames[auxI].c_str(), O_RDWR);
+    if (fd>=0 && filesizes[auxI]>0){
+      auxP = mmap(NULL, filesizes[auxI], PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    };
+    if (fd>=0){close(fd);};
+
+    if (auxP == MAP_FAILED){
+      sprintf(message,"\nWARNING: CANNOT MAP %s INTO MEMORY. WILL USE STANDARD FILE I/O.\n",outFileNames[auxI].c_str());
+      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+      unmapFiles();
+      return;
+    };
+
+    mappedFiles[auxI] = (char *) auxP;
+
+  };
+
+  isMapped = true;
+
+};
+
+
+
+void DataIOSWIN::unmapFiles() {
+
+  int auxI;
+
+  for (auxI=0; auxI<nfiles; auxI++){
+    if (mappedFiles[auxI] != nullptr){
+      msync(mappedFiles[auxI], filesizes[auxI], MS_SYNC);
+      munmap(mappedFiles[auxI], filesizes[auxI]);
+      mappedFiles[auxI] = nullptr;
+    };
+  };
+
+  isMapped = false;
+
+};
+
+
+
+bool DataIOSWIN::readBytes(int fnum, long pos, void *dest, long n) {
+
+  if (isMapped){
+    if (pos<0 || pos+n>filesizes[fnum]){return false;};
+    memcpy(dest, &mappedFiles[fnum][pos], n);
+    return true;
+  };
+
+  newdifx[fnum].seekg(pos, newdifx[fnum].beg);
+  newdifx[fnum].read(reinterpret_cast<char*>(dest), n);
+  if (newdifx[fnum].gcount() != n){
+    newdifx[fnum].clear();
+    return false;
+  };
+  return true;
+
+};
+
+
+
+void DataIOSWIN::writeBytes(int fnum, long pos, const void *src, long n) {
+
+  if (isMapped){
+    memcpy(&mappedFiles[fnum][pos], src, n);
+    return;
+  };
+
+  newdifx[fnum].seekp(pos, newdifx[fnum].beg);
+  newdifx[fnum].write(reinterpret_cast<const char*>(src), n);
+  newdifx[fnum].flush();
+  newdifx[fnum].clear();
+
+};
+
+
+
+// The index of "dir/DIFX_xxx" is the (hidden) file "dir/.DIFX_xxx.pcidx"
+// (so that it is not taken as a visibility file by the DiFX tools):
+std::string DataIOSWIN::indexFileName(int fnum) {
+
+  std::string name = outFileNames[fnum];
+  size_t slash = name.rfind('/');
+
+  if (slash == std::string::npos){
+    return "." + name + ".pcidx";
+  };
+  return name.substr(0,slash+1) + "." + name.substr(slash+1) + ".pcidx";
+
+};
+
+
+
+// The key of an index has the file size. The record sizes also depend on 
+// the channels of each IF (and on the IF mapping, if there is an IF offset).
+// The modification time is not used, since the index must also be valid
+// for copies of the file (and PolConvert rewrites the pol. labels of the 
+// file that it indexes). The contents are checked by checkIndex:
+bool DataIOSWIN::makeIndexKey(int fnum, std::vector<long> &key) {
+
+  struct stat fileStat;
+  int i;
+
+  key.clear();
+  if (stat(outFileNames[fnum].c_str(), &fileStat) != 0){return false;};
+
+  key.push_back((long) INDEXVERSION);
+  key.push_back((long) fileStat.st_size);
+  key.push_back((long) sizeof(RecordHeader));
+  key.push_back(Nfreqs);
+  for (i=0; i<Nfreqs; i++){key.push_back(Freqs[i].Nchan);};
+  key.push_back(IFOffset);
+  if (IFOffset != 0){
+    key.push_back(nDoIF);
+    for (i=0; i<nDoIF; i++){key.push_back(DoIF[i]);};
+  };
+
+  return true;
+
+};
+
+
+
+bool DataIOSWIN::loadIndex(int fnum, std::vector<long> &key, std::vector<RecordHeader> &index) {
+
+  long nkey, nentries;
+  bool isValid;
+  std::vector<long> fileKey;
+
+  index.clear();
+  if (key.size()==0){return false;};
+
+  FILE *indexFile = fopen(indexFileName(fnum).c_str(),"rb");
+  if (!indexFile){return false;};
+
+  isValid = fread(&nkey,sizeof(long),1,indexFile)==1 && nkey==(long) key.size();
+  if (isValid){
+    fileKey.resize(nkey);
+    isValid = fread(fileKey.data(),sizeof(long),nkey,indexFile)==(size_t) nkey && fileKey==key;
+  };
+  if (isValid){
+    isValid = fread(&nentries,sizeof(long),1,indexFile)==1 && nentries>=0;
+  };
+  if (isValid){
+    index.resize(nentries);
+    isValid = fread(index.data(),sizeof(RecordHeader),nentries,indexFile)==(size_t) nentries;
+  };
+
+  fclose(indexFile);
+  if (isValid){isValid = checkIndex(fnum, index);};
+  if (!isValid){index.clear();};
+  return isValid;
+
+};
+
+
+
+// An index matches the file if its last record ends at the end of the file
+// and (a sample of) its record headers are those in the file. The pol. 
+// labels and weights are not compared, since PolConvert changes them:
+bool DataIOSWIN::checkIndex(int fnum, std::vector<RecordHeader> &index) {
+
+  long i, step, nentries = index.size();
+  int j, fridx;
+  char head[headsize];
+  RecordHeader *entry;
+
+  if (nentries==0){return filesizes[fnum]<=8;};
+
+  step = nentries/NINDEXCHECK; if (step<1){step=1;};
+
+  for (i=0; i<nentries; i+=step){
+    entry = &index[i];
+    if (!readBytes(fnum, entry->loc, head, headsize)){return false;};
+    if (memcmp(&entry->Baseline, &head[0], sizeof(int))!=0 ||
+        memcmp(&entry->MJD, &head[sizeof(int)], sizeof(int))!=0 ||
+        memcmp(&entry->Secs, &head[2*sizeof(int)], sizeof(double))!=0 ||
+        memcmp(&entry->cfIndex, &head[2*sizeof(int)+sizeof(double)], sizeof(int))!=0 ||
+        memcmp(&entry->Source, &head[3*sizeof(int)+sizeof(double)], sizeof(int))!=0 ||
+        memcmp(&entry->freqIndex, &head[4*sizeof(int)+sizeof(double)], sizeof(int))!=0 ||
+        memcmp(entry->UVW, &head[6*sizeof(int)+2*sizeof(double)+2*sizeof(char)], 3*sizeof(double))!=0){
+      return false;
+    };
+    if (i<nentries-1 && i+step>=nentries){i = nentries-1-step;}; // Always check the last one.
+  };
+
+// End of the last record (with the IF mapping of readHeader):
+  entry = &index[nentries-1];
+  fridx = entry->freqIndex;
+  for (j=0; j<nDoIF; j++){
+    if (fridx==DoIF[j] || fridx==DoIF[j]+IFOffset){fridx = DoIF[j]; break;};
+  };
+  if (fridx<0 || fridx>=Nfreqs){return false;};
+
+  return entry->loc + headsize + Freqs[fridx].Nchan*((long) sizeof(cplx32f)) == filesizes[fnum];
+
+};
+
+
+
+void DataIOSWIN::saveIndex(int fnum, std::vector<long> &key, std::vector<RecordHeader> &index) {
+
+  long nkey = key.size();
+  long nentries = index.size();
+  bool isWritten;
+
+  if (nkey==0){return;};
+
+// Write to a temporary file first (so that a broken index is never read):
+  std::string indexName = indexFileName(fnum);
+  std::string tempName = indexName + ".tmp";
+
+  FILE *indexFile = fopen(tempName.c_str(),"wb");
+  if (!indexFile){
+    sprintf(message,"\nWARNING: CANNOT WRITE RECORD INDEX %s\n",indexName.c_str());
+    fprintf(logFile,"%s",message); fflush(logFile);
+    return;
+  };
+
+  isWritten = fwrite(&nkey,sizeof(long),1,indexFile)==1;
+  isWritten = isWritten && fwrite(key.data(),sizeof(long),nkey,indexFile)==(size_t) nkey;
+  isWritten = isWritten && fwrite(&nentries,sizeof(long),1,indexFile)==1;
+  isWritten = isWritten && fwrite(index.data(),sizeof(RecordHeader),nentries,indexFile)==(size_t) nentries;
+  isWritten = (fclose(indexFile)==0) && isWritten;
+
+  if (!isWritten || rename(tempName.c_str(),indexName.c_str())!=0){
+    remove(tempName.c_str());
+    sprintf(message,"\nWARNING: CANNOT WRITE RECORD INDEX %s\n",indexName.c_str());
+    fprintf(logFile,"%s",message); fflush(logFile);
+  };
+
 };
 
 
@@ -341,8 +676,24 @@ bool DataIOSWIN::setCurrentIF(int i){
 
   currFreq = i;
   currVis = 0;
-  memcpy(is1, is1orig, nrec*sizeof(bool));
-  memcpy(is2, is2orig, nrec*sizeof(bool));
+
+// Nothing is carried over from the previous IF of this cursor:
+  isAutoCorr = false;
+  isTwoLinear = false;
+  int j, k;
+  for (j=0; j<4; j++){
+    for (k=0; k<=Freqs[i].Nchan; k++){auxVis[j][k] = (std::complex<float>)0.0;};
+  };
+
+// Only the records of this IF are reset (other cursors may be 
+// converting other IFs at the same time):
+  long rec;
+  for (rec=0; rec<nrec; rec++){
+    if (Records[rec].freqIndex==i){
+      is1[rec] = is1orig[rec];
+      is2[rec] = is2orig[rec];
+    };
+  };
   return success;
 };
 
@@ -352,19 +703,27 @@ bool DataIOSWIN::setCurrentIF(int i){
 
 void DataIOSWIN::readHeader(bool doTest, int saveSource) {
 
-  long loc, beg, end, polpos;
-  int basel, fridx, cfidx, mjd, sidx, ii, jj;
+  long loc, beg, end, polpos, hpos;
+  int basel, fridx, mjd, sidx, ii;
   double secs, daytemp, daytemp2;
   double *UVW = new double[3];
   int UVWsize = 3*sizeof(double);
   char *pol = new char[2];
+  char head[headsize];
   double AuxPA1, AuxPA2;
 
+// Record index of the current file:
+  std::vector<long> indexKey;
+  std::vector<RecordHeader> fileIndex;
+  RecordHeader auxHead;
+  bool useIndex;
+  long irec;
+
   bool isInIF = false;
   int isIFidx = 0;
 
 // AUXILIARY BINARY FILES TO STORE CIRCULAR VISIBILITIES:
-  FILE **circFile = new FILE*[nDoIF];
+  FringeWriter **circFile = new FringeWriter*[nDoIF];
 
 // AUXILIARY BINARY FILES TO STORE AUTO-CORRELATIONS:
   FILE **autoCorrs = new FILE*[nDoIF];
@@ -385,11 +744,8 @@ void DataIOSWIN::readHeader(bool doTest, int saveSource) {
 
     for (ii=0; ii<nDoIF; ii++){
       sprintf(message,"POLCONVERT.FRINGE/OTHERS.FRINGE_IF%i",DoIF[ii]+1);
-      circFile[ii] = fopen(message,"wb");
-      fwrite(&Freqs[DoIF[ii]].Nchan,sizeof(int),1,circFile[ii]);
-      for (jj=0;jj<Freqs[DoIF[ii]].Nchan;jj++){
-        fwrite(&Freqvals[DoIF[ii]][jj],sizeof(double),1,circFile[ii]);
-      };
+      circFile[ii] = new FringeWriter(message,4,Freqs[DoIF[ii]].Nchan,false,
+                                      Freqs[DoIF[ii]].Nchan,Freqvals[DoIF[ii]]);
     };
   };
 
@@ -443,19 +799,46 @@ void DataIOSWIN::readHeader(bool doTest, int saveSource) {
     sprintf(message,"\n\nReading file %i of %i (size %li MB)\n",auxI+1,nfiles,filesizes[auxI]/(1024*1024));
     fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
 
-    while(!newdifx[auxI].eof()) {
+// Use the record index of a previous run, if the file did not change:
+    useIndex = makeIndexKey(auxI, indexKey) && loadIndex(auxI, indexKey, fileIndex);
+    if (useIndex){
+      sprintf(message,"Using record index %s\n",indexFileName(auxI).c_str());
+      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+    };
+    irec = 0;
+
+    while(true) {
 
-     newdifx[auxI].seekg(loc,newdifx[auxI].beg);
-     newdifx[auxI].read(reinterpret_cast<char*>(&basel), sizeof(int));
-     newdifx[auxI].read(reinterpret_cast<char*>(&mjd), sizeof(int));
-     newdifx[auxI].read(reinterpret_cast<char*>(&secs), sizeof(double));
-     newdifx[auxI].read(reinterpret_cast<char*>(&cfidx), sizeof(int));
-     newdifx[auxI].read(reinterpret_cast<char*>(&sidx), sizeof(int));
-     newdifx[auxI].read(reinterpret_cast<char*>(&fridx), sizeof(int));
-     polpos = newdifx[auxI].tellg();
-     newdifx[auxI].read(pol, 2*sizeof(char));
-     newdifx[auxI].ignore(sizeof(int)+sizeof(double)); // Pulsar bin + Weight
-     newdifx[auxI].read(reinterpret_cast<char*>(UVW), UVWsize);
+     if (useIndex){
+       if (irec == (long) fileIndex.size()){break;};
+       auxHead = fileIndex[irec]; irec++;
+     } else {
+
+// Read the whole record header at once:
+       if (!readBytes(auxI, loc, head, headsize)){break;};
+       auxHead.loc = loc;
+       hpos = 0;
+       memcpy(&auxHead.Baseline, &head[hpos], sizeof(int)); hpos += sizeof(int);
+       memcpy(&auxHead.MJD, &head[hpos], sizeof(int)); hpos += sizeof(int);
+       memcpy(&auxHead.Secs, &head[hpos], sizeof(double)); hpos += sizeof(double);
+       memcpy(&auxHead.cfIndex, &head[hpos], sizeof(int)); hpos += sizeof(int);
+       memcpy(&auxHead.Source, &head[hpos], sizeof(int)); hpos += sizeof(int);
+       memcpy(&auxHead.freqIndex, &head[hpos], sizeof(int)); hpos += sizeof(int);
+       memcpy(auxHead.Pol, &head[hpos], 2*sizeof(char)); hpos += 2*sizeof(char);
+       hpos += sizeof(int)+sizeof(double); // Pulsar bin + Weight
+       memcpy(auxHead.UVW, &head[hpos], UVWsize);
+       fileIndex.push_back(auxHead);
+     };
+
+     loc = auxHead.loc;
+     basel = auxHead.Baseline;
+     mjd = auxHead.MJD;
+     secs = auxHead.Secs;
+     sidx = auxHead.Source;
+     fridx = auxHead.freqIndex;
+     polpos = loc + 5*sizeof(int) + sizeof(double);
+     memcpy(pol, auxHead.Pol, 2*sizeof(char));
+     memcpy(UVW, auxHead.UVW, UVWsize);
 
 // OBSOLETE! Now, source ids in SWIN are self-consistent among
 // (concatenated) scans:
@@ -466,7 +849,7 @@ void DataIOSWIN::readHeader(bool doTest, int saveSource) {
 ////////////////
 
 
-    beg = newdifx[auxI].tellg();
+    beg = loc + headsize;
 
 
     isInIF = false;
@@ -543,8 +926,7 @@ void DataIOSWIN::readHeader(bool doTest, int saveSource) {
 // Read auto-correlations:
         if (ant1==ant2){
           auxD = 0.0;
-          newdifx[auxI].seekg(beg,newdifx[auxI].beg);
-          newdifx[auxI].read(reinterpret_cast<char*>(currentVis[0]),end-beg);
+          readBytes(auxI, beg, currentVis[0], end-beg);
           auxJ = -1;
           if( (pol[0]=='R' || pol[0]=='X') && (pol[1]=='R' || pol[1]=='X')){auxJ=1;};
           if( (pol[0]=='L' || pol[0]=='Y') && (pol[1]=='L' || pol[1]=='Y')){auxJ=2;};
@@ -583,22 +965,14 @@ void DataIOSWIN::readHeader(bool doTest, int saveSource) {
 
 
            for (auxJ=0; auxJ<4; auxJ++){
-             newdifx[auxI].seekg(beg + (RecordSize + (Freqs[fridx].Nchan)*sizeof(cplx32f))*auxJ, newdifx[auxI].beg);
-             newdifx[auxI].read(reinterpret_cast<char*>(currentVis[auxJ]),end-beg);
+             readBytes(auxI, beg + (RecordSize + (Freqs[fridx].Nchan)*sizeof(cplx32f))*auxJ, currentVis[auxJ], end-beg);
            };
 
-           fwrite(&daytemp2,sizeof(double),1,circFile[isIFidx]);
-           fwrite(&ant1,sizeof(int),1,circFile[isIFidx]);
-           fwrite(&ant2,sizeof(int),1,circFile[isIFidx]);
-           fwrite(&AuxPA1,sizeof(double),1,circFile[isIFidx]);
-           fwrite(&AuxPA2,sizeof(double),1,circFile[isIFidx]);
-
-           for (auxJ=0;auxJ<Freqs[fridx].Nchan;auxJ++){
-             fwrite(&currentVis[0][auxJ],sizeof(std::complex<float>),1,circFile[isIFidx]);
-             fwrite(&currentVis[2][auxJ],sizeof(std::complex<float>),1,circFile[isIFidx]);
-             fwrite(&currentVis[3][auxJ],sizeof(std::complex<float>),1,circFile[isIFidx]);
-             fwrite(&currentVis[1][auxJ],sizeof(std::complex<float>),1,circFile[isIFidx]);
-          };
+// (products in RR, RL, LR, LL order):
+           std::complex<float> *circVis[4] = {currentVis[0], currentVis[2], currentVis[3], currentVis[1]};
+           long circStride[4] = {1, 1, 1, 1};
+           circFile[isIFidx]->addVis(auxI,daytemp2,ant1,ant2,AuxPA1,AuxPA2,
+                                     UVW[0]*UVW[0] + UVW[1]*UVW[1],circVis,circStride,false);
        };
 
 
@@ -628,8 +1002,7 @@ void DataIOSWIN::readHeader(bool doTest, int saveSource) {
          if(!doTest){
            if(pol[0]=='X'){pol[0]='R';} else if(pol[0]=='Y'){pol[0]='L';};
            if(pol[1]=='X'){pol[1]='R';} else if(pol[1]=='Y'){pol[1]='L';};
-           newdifx[auxI].seekp(polpos, newdifx[auxI].beg);
-           newdifx[auxI].write(reinterpret_cast<char*>(pol),2*sizeof(char));
+           writeBytes(auxI, polpos, pol, 2*sizeof(char));
          };
 /////////
          nrec ++;
@@ -640,6 +1013,10 @@ void DataIOSWIN::readHeader(bool doTest, int saveSource) {
 
 
 
+// Save the record index for the next runs:
+  if (!useIndex){saveIndex(auxI, indexKey, fileIndex);};
+  fileIndex.clear();
+
 // Rewind:
   newdifx[auxI].clear();
   newdifx[auxI].seekg(0,newdifx[auxI].beg);
@@ -674,7 +1051,7 @@ FREE:
 // CLOSE AUXILIARY BINARY FILES:
   if (doWriteCirc){
     for (ii=0; ii<nDoIF; ii++){
-      fclose(circFile[ii]);
+      delete circFile[ii];
       fclose(autoCorrs[ii]);
     };
   };
@@ -742,7 +1119,7 @@ bool DataIOSWIN::getNextMixedVis(double &JDTime, int &antenna, int &otherAnt, bo
 
       idx = 0;
       for (rec=0; rec<nrec; rec++) {
-        if (Records[rec].notUsed && (Records[rec].freqIndex==currFreq)) {
+        if ((Records[rec].freqIndex==currFreq) && Records[rec].notUsed) {
           indices[idx] = rec;
           complete = !(is1[rec] && is2[rec]);
           if(!complete){isTwoLinear=true;};
@@ -857,9 +1234,7 @@ bool DataIOSWIN::getNextMixedVis(double &JDTime, int &antenna, int &otherAnt, bo
       if (currEntries[currFreq][i]>=0){
         rec = currEntries[currFreq][i];
         fnum = Records[rec].fileNumber;
-        newdifx[fnum].seekg(Records[rec].byteIni, newdifx[fnum].beg);
-        newdifx[fnum].sync();
-        newdifx[fnum].read(reinterpret_cast<char*>(currentVis[i]),Records[rec].byteEnd-Records[rec].byteIni);
+        readBytes(fnum, Records[rec].byteIni, currentVis[i], Records[rec].byteEnd-Records[rec].byteIni);
       } else {
         // nuke values that would have been overwritten by the missing data
         for (k=0; k<Freqs[currFreq].Nchan; k++) {
@@ -985,10 +1360,7 @@ bool DataIOSWIN::setCurrentMixedVis() {
     if (currEntries[currFreq][i]>=0){
       rec = currEntries[currFreq][i];
       fnum = Records[rec].fileNumber;
-      newdifx[fnum].seekp(Records[rec].byteIni, newdifx[fnum].beg);
-      newdifx[fnum].write(reinterpret_cast<char*>(bufferVis[i]),Records[rec].byteEnd-Records[rec].byteIni);
-      newdifx[fnum].flush();
-      newdifx[fnum].clear();
+      writeBytes(fnum, Records[rec].byteIni, bufferVis[i], Records[rec].byteEnd-Records[rec].byteIni);
     };
   };
 
@@ -1010,13 +1382,10 @@ void DataIOSWIN::zeroWeight(){
     if (currEntries[currFreq][i]>=0){
       rec = currEntries[currFreq][i];
       fnum = Records[rec].fileNumber;
-      newdifx[fnum].seekp(Records[rec].byteIni - 4*sizeof(double), newdifx[fnum].beg);
-      newdifx[fnum].write(reinterpret_cast<char*>(&zero),sizeof(double));
-      newdifx[fnum].flush();
+      writeBytes(fnum, Records[rec].byteIni - 4*sizeof(double), &zero, sizeof(double));
     };
   };
 
-  newdifx[fnum].clear();
 };
 
 
@@ -1024,10 +1393,11 @@ void DataIOSWIN::zeroWeight(){
 
 
 void DataIOSWIN::applyMatrix(std::complex<float> *M[2][2], bool swap,
-               bool print, int thisAnt, FILE *plotFile) {
+               bool print, int thisAnt, FringeWriter *plotFile) {
 
   long k, a11, a12, a21, a22, ca11, ca12, ca21, ca22;
-  std::complex<float>  auxVisApply;
+  long Nchan = Freqs[currFreq].Nchan;
+  std::complex<float>  rowPhase[2];
   int i;
 
   a11 = 0;
@@ -1041,97 +1411,126 @@ void DataIOSWIN::applyMatrix(std::complex<float> *M[2][2], bool swap,
   ca21 = 3;
 
 
+// The conversion is written as two row vectors (A B) and (C D), applied 
+// to two pairs of products (X0 X1) and (Y0 Y1). The parallactic-angle 
+// phasor of each output row is absorbed into its matrix row. Then, the 
+// whole channel loop is a branch-free product over split (real, imag) 
+// arrays, which the compiler can vectorize.
+//
+// currConj:  out11,out21 = (A B),(C D)*(v11 v21)  ;  out12,out22 = ...*(v12 v22)
+//            with rows (M00 M01)*P and (M10 M11)/P.
+// !currConj: out11,out12 = (A B),(C D)*(v11 v12)  ;  out21,out22 = ...*(v21 v22)
+//            with rows conj(M00 M01)/P and conj(M10 M11)*P.
+
+  std::complex<float> *Xin[2], *Yin[2], *Xout[2], *Yout[2];
+  float *Are = &soaVis[0*soaStride], *Aim = &soaVis[1*soaStride];
+  float *Bre = &soaVis[2*soaStride], *Bim = &soaVis[3*soaStride];
+  float *Cre = &soaVis[4*soaStride], *Cim = &soaVis[5*soaStride];
+  float *Dre = &soaVis[6*soaStride], *Dim = &soaVis[7*soaStride];
+  float *X0re = &soaVis[8*soaStride], *X0im = &soaVis[9*soaStride];
+  float *X1re = &soaVis[10*soaStride], *X1im = &soaVis[11*soaStride];
+  float *Y0re = &soaVis[12*soaStride], *Y0im = &soaVis[13*soaStride];
+  float *Y1re = &soaVis[14*soaStride], *Y1im = &soaVis[15*soaStride];
+  float sgn, pre, pim, mre, mim;
+  float xre, xim, yre, yim;
+
+  rowPhase[0] = 1.0; rowPhase[1] = 1.0;
+
+  if (currConj) {
+    Xin[0] = currentVis[a11]; Xin[1] = currentVis[a21];
+    Yin[0] = currentVis[a12]; Yin[1] = currentVis[a22];
+    Xout[0] = bufferVis[ca11]; Xout[1] = bufferVis[ca21];
+    Yout[0] = bufferVis[ca12]; Yout[1] = bufferVis[ca22];
+    sgn = 1.0;
+    if (doParang && ParAng[0][currVis]>-1.e8){
+      rowPhase[0] = std::polar((float)1.,(float)ParAng[0][currVis]);
+      rowPhase[1] = std::conj(rowPhase[0]);
+    };
+  } else {
+    Xin[0] = currentVis[a11]; Xin[1] = currentVis[a12];
+    Yin[0] = currentVis[a21]; Yin[1] = currentVis[a22];
+    Xout[0] = bufferVis[ca11]; Xout[1] = bufferVis[ca12];
+    Yout[0] = bufferVis[ca21]; Yout[1] = bufferVis[ca22];
+    sgn = -1.0;
+    if (doParang && ParAng[1][currVis]>-1.e8){
+      rowPhase[1] = std::polar((float)1.,(float)ParAng[1][currVis]);
+      rowPhase[0] = std::conj(rowPhase[1]);
+    };
+  };
 
-  for (k=0; k<Freqs[currFreq].Nchan; k++) {
 
-   if (currConj) {
-      bufferVis[ca11][k] = M[0][0][k]*currentVis[a11][k]+M[0][1][k]*currentVis[a21][k];
-      bufferVis[ca12][k] = M[0][0][k]*currentVis[a12][k]+M[0][1][k]*currentVis[a22][k];
-      bufferVis[ca21][k] = M[1][0][k]*currentVis[a11][k]+M[1][1][k]*currentVis[a21][k];
-      bufferVis[ca22][k] = M[1][0][k]*currentVis[a12][k]+M[1][1][k]*currentVis[a22][k];
-      if (doParang && ParAng[0][currVis]>-1.e8){
-        auxVisApply = std::polar((float)1.,(float)ParAng[0][currVis]);
-        bufferVis[ca11][k] *= auxVisApply;
-        bufferVis[ca12][k] *= auxVisApply;
-        bufferVis[ca21][k] /= auxVisApply;
-        bufferVis[ca22][k] /= auxVisApply;
+// Load the matrix rows (times the row phasors) and the data into SoA buffers:
+  float *Rre[2][2] = {{Are, Bre}, {Cre, Dre}};
+  float *Rim[2][2] = {{Aim, Bim}, {Cim, Dim}};
+  int ir, ic;
+  for (ir=0; ir<2; ir++){
+    pre = rowPhase[ir].real(); pim = rowPhase[ir].imag();
+    for (ic=0; ic<2; ic++){
+      const float *Mf = reinterpret_cast<const float*>(M[ir][ic]);
+      float *Ore = Rre[ir][ic], *Oim = Rim[ir][ic];
+      for (k=0; k<Nchan; k++) {
+        mre = Mf[2*k]; mim = sgn*Mf[2*k+1];
+        Ore[k] = mre*pre - mim*pim;
+        Oim[k] = mre*pim + mim*pre;
       };
-   } else {
-      bufferVis[ca11][k] = std::conj(M[0][0][k])*currentVis[a11][k]+std::conj(M[0][1][k])*currentVis[a12][k];
-      bufferVis[ca12][k] = std::conj(M[1][0][k])*currentVis[a11][k]+std::conj(M[1][1][k])*currentVis[a12][k];
-      bufferVis[ca21][k] = std::conj(M[0][0][k])*currentVis[a21][k]+std::conj(M[0][1][k])*currentVis[a22][k];
-      bufferVis[ca22][k] = std::conj(M[1][0][k])*currentVis[a21][k]+std::conj(M[1][1][k])*currentVis[a22][k];
-      if (doParang && ParAng[1][currVis]>-1.e8){
-        auxVisApply = std::polar((float)1.,(float)ParAng[1][currVis]);
-        bufferVis[ca11][k] /= auxVisApply;
-        bufferVis[ca12][k] *= auxVisApply;
-        bufferVis[ca21][k] /= auxVisApply;
-        bufferVis[ca22][k] *= auxVisApply;
-      };
-   };
+    };
+  };
 
+  const float *In[4] = {reinterpret_cast<const float*>(Xin[0]), reinterpret_cast<const float*>(Xin[1]),
+                        reinterpret_cast<const float*>(Yin[0]), reinterpret_cast<const float*>(Yin[1])};
+  float *InRe[4] = {X0re, X1re, Y0re, Y1re};
+  float *InIm[4] = {X0im, X1im, Y0im, Y1im};
+  for (i=0; i<4; i++){
+    for (k=0; k<Nchan; k++) {
+      InRe[i][k] = In[i][2*k];
+      InIm[i][k] = In[i][2*k+1];
+    };
+  };
 
-   if (print && canPlot) {
-     if (currConj){
-     if (k==0){
-       fwrite(&Records[currVis].fileNumber,sizeof(int),1,plotFile);
-       fwrite(&Records[currVis].Time,sizeof(double),1,plotFile);
-       fwrite(&Records[currVis].Antennas[0],sizeof(int),1,plotFile);
-       fwrite(&Records[currVis].Antennas[1],sizeof(int),1,plotFile);
-       fwrite(&ParAng[0][currVis],sizeof(double),1,plotFile);
-       fwrite(&ParAng[1][currVis],sizeof(double),1,plotFile);
-       fwrite(&UVDist[currVis],sizeof(double),1,plotFile);
-     };
-     fwrite(&currentVis[a11][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&currentVis[a12][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&currentVis[a21][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&currentVis[a22][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&bufferVis[ca11][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&bufferVis[ca12][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&bufferVis[ca21][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&bufferVis[ca22][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&M[0][0][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&M[0][1][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&M[1][0][k],sizeof(std::complex<float>),1,plotFile);
-     fwrite(&M[1][1][k],sizeof(std::complex<float>),1,plotFile);
-     } else {
-     if (k==0){
-       fwrite(&Records[currVis].fileNumber,sizeof(int),1,plotFile);
-       fwrite(&Records[currVis].Time,sizeof(double),1,plotFile);
-       fwrite(&Records[currVis].Antennas[1],sizeof(int),1,plotFile);
-       fwrite(&Records[currVis].Antennas[0],sizeof(int),1,plotFile);
-       fwrite(&ParAng[1][currVis],sizeof(double),1,plotFile);
-       fwrite(&ParAng[0][currVis],sizeof(double),1,plotFile);
-       fwrite(&UVDist[currVis],sizeof(double),1,plotFile);
-     };
-     auxVisApply = std::conj(currentVis[a11][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(currentVis[a21][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(currentVis[a12][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(currentVis[a22][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(bufferVis[ca11][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(bufferVis[ca21][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(bufferVis[ca12][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(bufferVis[ca22][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(M[0][0][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(M[1][0][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(M[0][1][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     auxVisApply = std::conj(M[1][1][k]);
-     fwrite(&auxVisApply,sizeof(std::complex<float>),1,plotFile);
-     };
 
-   };  // end of print && canPlot
-  };  // end of for loop
+// Convert (outputs are written back interleaved, in one pass):
+  float *Xo0 = reinterpret_cast<float*>(Xout[0]), *Xo1 = reinterpret_cast<float*>(Xout[1]);
+  float *Yo0 = reinterpret_cast<float*>(Yout[0]), *Yo1 = reinterpret_cast<float*>(Yout[1]);
+  for (k=0; k<Nchan; k++) {
+    xre = Are[k]*X0re[k] - Aim[k]*X0im[k] + Bre[k]*X1re[k] - Bim[k]*X1im[k];
+    xim = Are[k]*X0im[k] + Aim[k]*X0re[k] + Bre[k]*X1im[k] + Bim[k]*X1re[k];
+    yre = Are[k]*Y0re[k] - Aim[k]*Y0im[k] + Bre[k]*Y1re[k] - Bim[k]*Y1im[k];
+    yim = Are[k]*Y0im[k] + Aim[k]*Y0re[k] + Bre[k]*Y1im[k] + Bim[k]*Y1re[k];
+    Xo0[2*k] = xre; Xo0[2*k+1] = xim;
+    Yo0[2*k] = yre; Yo0[2*k+1] = yim;
+    xre = Cre[k]*X0re[k] - Cim[k]*X0im[k] + Dre[k]*X1re[k] - Dim[k]*X1im[k];
+    xim = Cre[k]*X0im[k] + Cim[k]*X0re[k] + Dre[k]*X1im[k] + Dim[k]*X1re[k];
+    yre = Cre[k]*Y0re[k] - Cim[k]*Y0im[k] + Dre[k]*Y1re[k] - Dim[k]*Y1im[k];
+    yim = Cre[k]*Y0im[k] + Cim[k]*Y0re[k] + Dre[k]*Y1im[k] + Dim[k]*Y1re[k];
+    Xo1[2*k] = xre; Xo1[2*k+1] = xim;
+    Yo1[2*k] = yre; Yo1[2*k+1] = yim;
+  };
+
+
+
+// Write the plot (and solver) file (uncalibrated, converted and matrix
+// products). The baselines are written as Ant1-Ant2 if currConj, and
+// as the conjugate Ant2-Ant1 otherwise:
+  if (print && canPlot) {
+    const long plotStride[12] = {1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1};
+    if (currConj){
+      std::complex<float> *plotVis[12] = {
+        currentVis[a11], currentVis[a12], currentVis[a21], currentVis[a22],
+        bufferVis[ca11], bufferVis[ca12], bufferVis[ca21], bufferVis[ca22],
+        M[0][0], M[0][1], M[1][0], M[1][1]};
+      plotFile->addVis(Records[currVis].fileNumber,Records[currVis].Time,
+        Records[currVis].Antennas[0],Records[currVis].Antennas[1],
+        ParAng[0][currVis],ParAng[1][currVis],UVDist[currVis],plotVis,plotStride,false);
+    } else {
+      std::complex<float> *plotVis[12] = {
+        currentVis[a11], currentVis[a21], currentVis[a12], currentVis[a22],
+        bufferVis[ca11], bufferVis[ca21], bufferVis[ca12], bufferVis[ca22],
+        M[0][0], M[1][0], M[0][1], M[1][1]};
+      plotFile->addVis(Records[currVis].fileNumber,Records[currVis].Time,
+        Records[currVis].Antennas[1],Records[currVis].Antennas[0],
+        ParAng[1][currVis],ParAng[0][currVis],UVDist[currVis],plotVis,plotStride,true);
+    };
+  };  // end of print && canPlot
 
 
 
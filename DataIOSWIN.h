@@ -28,6 +28,8 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 #include <fstream>
 #include <math.h>
 #include <complex>
+#include <string>
+#include <vector>
 #include "DataIO.h"
 
 
@@ -46,6 +48,20 @@ typedef struct {
 
 
 
+/* Header of a SWIN record, as stored in the record index (sidecar) files: */
+typedef struct {
+ long loc;
+ int Baseline;
+ int MJD;
+ double Secs;
+ int cfIndex;
+ int Source;
+ int freqIndex;
+ char Pol[2];
+ double UVW[3];} RecordHeader;
+
+
+
 
 /* Class to read FITS-IDI files, setup the data streams,
 and iterate over all the baselines with mixed polarization. */
@@ -82,7 +98,7 @@ class DataIOSWIN: public DataIO {
 
  // Modify the visibilities read by "getNextMixedVis" by the calibration matrix supplied
  // Saves the result in the "bufferVis" pointer  
-  void applyMatrix(std::complex<float> *M[2][2], bool swap, bool print, int thisAnt, FILE *plotFile);
+  void applyMatrix(std::complex<float> *M[2][2], bool swap, bool print, int thisAnt, FringeWriter *plotFile);
 
 
  // Flag bad (unconvertible) data:
@@ -92,17 +108,42 @@ class DataIOSWIN: public DataIO {
 // Close all files.
    void finish();
 
+// Returns a cursor over the same SWIN files (to convert other IFs at the same time):
+   DataIO *newIFCursor();
+
   private:
 
+// Cursor constructor. Shares the record index of the parent,
+// but has its own file streams and visibility buffers:
+   DataIOSWIN(DataIOSWIN *parent);
+
    void openOutFiles(std::string* difxfiles);
    void readHeader(bool doTest, int saveSource);
 
+// Memory-map the output files (if possible). Otherwise, the fstreams are used:
+   void mapFiles();
+   void unmapFiles();
+
+// Read/write raw bytes at a given position of an output file:
+   bool readBytes(int fnum, long pos, void *dest, long n);
+   void writeBytes(int fnum, long pos, const void *src, long n);
+
+// Record index of a file, reused while the file (and the IF setup) does not change:
+   std::string indexFileName(int fnum);
+   bool makeIndexKey(int fnum, std::vector<long> &key);
+   bool loadIndex(int fnum, std::vector<long> &key, std::vector<RecordHeader> &index);
+   bool checkIndex(int fnum, std::vector<RecordHeader> &index);
+   void saveIndex(int fnum, std::vector<long> &key, std::vector<RecordHeader> &index);
+
 ////////
 // Only used for SWIN files. Not used here
     static const long RECBUFFER = 1024*1024;
     static const int NFRDATA = 8;
     static const int NCFDATA = 2;
     static const long endhead = sizeof(int) + 4*sizeof(double); // Useless info at the headers end.
+    static const long headsize = 5*sizeof(int) + sizeof(double) + 2*sizeof(char) + endhead; // Record header (after sync and version).
+    static const long INDEXVERSION = 2;
+    static const long NINDEXCHECK = 1024; // Record headers compared to the file (see checkIndex).
 
 ////////
 
@@ -116,13 +157,27 @@ class DataIOSWIN: public DataIO {
     int nfiles;
     std::ifstream *olddifx;
     std::fstream *newdifx;
-    bool isOverWrite, doWriteCirc, canPlot, isAutoCorr, isTwoLinear, doParang;
-    bool debugNewIF, convisok;
+    bool isOverWrite, doWriteCirc, canPlot, doParang;
+    bool debugNewIF, convisok, isCursor;
+// State of the visibility being converted (kept between the two rounds of
+// conversion of autocorrelations and of baselines with two linear-feed
+// antennas). Each cursor has its own, and setCurrentIF resets it, so that
+// an IF is converted the same way whatever the thread (and the IFs that 
+// the thread converted before):
+    bool isAutoCorr, isTwoLinear;
+    std::string *outFileNames;
+    bool isMapped;
+    char **mappedFiles;
     long currEntries[MAXIF][4], nrec;
     long *filesizes;
     std::complex<float> *currentVis[4] ;
     std::complex<float> *bufferVis[4] ;
     std::complex<float> *auxVis[4] ;
 
+// Scratch SoA (real, imag) buffers for applyMatrix:
+    static const int NSOA = 16;
+    float *soaVis;
+    long soaStride;
+
     Record *Records ;
 };
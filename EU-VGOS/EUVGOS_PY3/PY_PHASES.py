@@ -26,7 +26,12 @@ from PolConvert import _XPCalMF as XP
 import numpy as np
 import struct as stk
 import os, sys, glob
+import multiprocessing
 from multiprocessing import Pool
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
 import gc
 import scipy.interpolate as spint
 import scipy.optimize as spopt
@@ -448,6 +453,191 @@ def Quinn(FFT):
     return (DP + DM) / 2.0 + QuinnTau(DP * DP) - QuinnTau(DM * DM)
 
 
+## SHARED-MEMORY ENGINE FOR THE FRINGE SEARCHES:
+## The visibilities read by getDATA are copied once into shared memory, and
+## the pool workers map them as numpy arrays. So each task only carries the
+## rows of one baseline and IF (plus a few numbers), instead of the data.
+
+_SHARED = {}
+
+
+def shareDATA(DATA, keys=("VIS",)):
+    """Copy the arrays of DATA (given by keys) into shared memory.
+    Returns the handles (names, shapes and types) to attach them from
+    other processes, and the shared-memory blocks (to release them
+    with freeDATA)."""
+
+    handles = {}
+    blocks = []
+    for key in keys:
+        arr = np.ascontiguousarray(DATA[key])
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        blocks.append(shm)
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        handles[key] = (shm.name, arr.shape, arr.dtype.str)
+    return handles, blocks
+
+
+def freeDATA(blocks):
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+def _attachDATA(handles):
+    """Pool initializer: map the shared arrays in the worker. The creator
+    (not the workers) is the one that releases the memory (the workers use
+    the resource tracker of the creator, so they must not unregister)."""
+
+    for key in handles.keys():
+        name, shape, dtype = handles[key]
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13
+            shm = shared_memory.SharedMemory(name=name)
+        _SHARED[key] = (shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+
+
+def runTasks(FUNC, TASKS, DATA, NCPU=1, keys=("VIS",)):
+    """Run FUNC on each element of TASKS (results in the same order). FUNC
+    reads the arrays of DATA (given by keys) from _SHARED. With NCPU > 1,
+    the arrays are put in shared memory and the tasks go to a pool of NCPU
+    processes. Otherwise (or without multiprocessing.shared_memory, i.e.,
+    Python < 3.8), the tasks are run here, on DATA itself."""
+
+    if NCPU <= 1 or len(TASKS) < 2 or shared_memory is None:
+        for key in keys:
+            _SHARED[key] = (None, DATA[key])
+        try:
+            return [FUNC(task) for task in TASKS]
+        finally:
+            _SHARED.clear()
+
+    ## Fork (if possible), so that the scripts calling PY_PHASES do not need
+    ## a __main__ guard:
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+
+    handles, blocks = shareDATA(DATA, keys)
+    try:
+        with context.Pool(processes=min(NCPU, len(TASKS)), initializer=_attachDATA,
+                          initargs=(handles,)) as pool:
+            return pool.map(FUNC, TASKS)
+    finally:
+        freeDATA(blocks)
+
+
+def _fourfitFringe(task):
+    """GET_FOURFIT_PHASES: fringe search (delay and rate) of the RR and LL
+    visibilities of one baseline and IF. Returns the number of integrations
+    and [Delay, Rate, 1.0, SNR, Delay LL, Rate LL]."""
+
+    rowsRR, rowsLL, BW, SCDUR = task
+    VIS = _SHARED["VIS"][1][rowsRR, :]
+    VIS2 = _SHARED["VIS"][1][rowsLL, :]
+    FR = np.fft.fftshift(np.fft.fft2(VIS))
+    FR2 = np.fft.fftshift(np.fft.fft2(VIS2))
+    FRA = np.abs(FR)
+    FRA2 = np.abs(FR2)
+    Nt, Nch = np.shape(VIS)
+
+    Ntot = Nt * Nch
+    PEAK = np.unravel_index(np.argmax(FRA), np.shape(FR))
+    PEAK2 = np.unravel_index(np.argmax(FRA2), np.shape(FR))
+    RMS = np.sqrt(
+        (
+            (np.std(FRA) ** 2.0 + np.mean(FRA) ** 2.0)
+            - np.sum(
+                np.power(
+                    FRA[
+                        PEAK[0] - 1 : PEAK[0] + 2, PEAK[1] - 1 : PEAK[1] + 2
+                    ],
+                    2.0,
+                )
+            )
+            / Ntot
+        )
+    )
+    SNR = FRA[PEAK[0], PEAK[1]] / RMS
+    Taround = [PEAK[0] - 1, PEAK[0], PEAK[0] + 1]
+    Faround = [PEAK[1] - 1, PEAK[1], PEAK[1] + 1]
+    if Taround[1] == 0:
+        Taround[0] = Nt - 1
+    if Taround[1] == Nt - 1:
+        Taround[2] = 0
+    if Faround[1] == 0:
+        Faround[0] = Nch - 1
+    if Faround[1] == Nch - 1:
+        Faround[2] = 0
+
+    Taround2 = [PEAK2[0] - 1, PEAK2[0], PEAK2[0] + 1]
+    Faround2 = [PEAK2[1] - 1, PEAK2[1], PEAK2[1] + 1]
+    if Taround2[1] == 0:
+        Taround2[0] = Nt - 1
+    if Taround2[1] == Nt - 1:
+        Taround2[2] = 0
+    if Faround2[1] == 0:
+        Faround2[0] = Nch - 1
+    if Faround2[1] == Nch - 1:
+        Faround2[2] = 0
+
+    BLDelay = PEAK[1] - Nch / 2.0 + Quinn(FR[PEAK[0], Faround])
+    if bool(Nt % 2):
+        BLRate = PEAK[0] - (Nt - 1) / 2.0 + Quinn(FR[Taround, PEAK[1]])
+    else:
+        BLRate = PEAK[0] - Nt / 2.0 + Quinn(FR[Taround, PEAK[1]])
+
+    if BLDelay > Nch / 2.0:
+        BLDelay -= Nch
+    if BLRate > Nt / 2.0:
+        BLRate -= Nt
+    BLDelay /= BW * Nch / (Nch - 1.0)
+    BLRate /= SCDUR
+
+    BLDelay2 = PEAK2[1] - Nch / 2.0 + Quinn(FR2[PEAK2[0], Faround2])
+    if bool(Nt % 2):
+        BLRate2 = PEAK2[0] - (Nt - 1) / 2.0 + Quinn(FR2[Taround2, PEAK2[1]])
+    else:
+        BLRate2 = PEAK2[0] - Nt / 2.0 + Quinn(FR2[Taround2, PEAK2[1]])
+
+    if BLDelay2 > Nch / 2.0:
+        BLDelay2 -= Nch
+    if BLRate2 > Nt / 2.0:
+        BLRate2 -= Nt
+    BLDelay2 /= BW * Nch / (Nch - 1.0)
+    BLRate2 /= SCDUR
+
+    return [Nt, [BLDelay, BLRate, 1.0, SNR, BLDelay2, BLRate2]]
+
+
+def _gffRate(task):
+    """DO_GFF: fringe rate of the (pcal-corrected) Stokes I visibilities of
+    one baseline and IF, relative to the IF frequency."""
+
+    rowsRR, rowsLL, PHASOR, SCDUR, NuAv = task
+    IStokes = _SHARED["VIS"][1][rowsRR, :] + _SHARED["VIS"][1][rowsLL, :]
+    toFringe = np.fft.fftshift(np.fft.fft2(IStokes * PHASOR))
+    ### TODO: Add the correction from the SBD!!
+    Nt, Nch = np.shape(toFringe)
+    PEAK = np.unravel_index(np.argmax(np.abs(toFringe)), (Nt, Nch))
+    Taround = [PEAK[0] - 1, PEAK[0], PEAK[0] + 1]
+    if Taround[1] == 0:
+        Taround[0] = Nt - 1
+    if Taround[1] == Nt - 1:
+        Taround[2] = 0
+    if bool(Nt % 2):
+        BLRate = (
+            PEAK[0] - (Nt - 1) / 2.0 + Quinn(toFringe[Taround, PEAK[1]])
+        )
+    else:
+        BLRate = PEAK[0] - Nt / 2.0 + Quinn(toFringe[Taround, PEAK[1]])
+    if BLRate > Nt / 2.0:
+        BLRate -= Nt
+    return BLRate / SCDUR / NuAv
+
+
 # filename = 'DiFX/ev0287_030.difx'
 # FLAGBAS = [['OE','OW']]
 
@@ -938,6 +1128,7 @@ def GET_FOURFIT_PHASES(
     IF_OFFSET=2048,
     SAMP_DELAYS={},
     CALIB_BPASS=True,
+    NCPU=1,
 ):
 
     # try:
@@ -1042,6 +1233,11 @@ def GET_FOURFIT_PHASES(
     DELRAT_MATRIX = np.zeros((TimePad, FreqPad), dtype=np.complex64)
     #################
 
+    ## The fringe searches (one per baseline and IF) are run by runTasks,
+    ## serially or in a pool of NCPU processes (which read the visibilities
+    ## from shared memory):
+    TASKS = []
+    TASKID = []
     for bi in ALLBAS:
         mask = np.logical_and(DATA["ANTS"][:, 0] == bi[0], DATA["ANTS"][:, 1] == bi[1])
         bistr = "%i-%i" % (bi[0], bi[1])
@@ -1071,107 +1267,18 @@ def GET_FOURFIT_PHASES(
                 #########################
 
                 #########################
-                #### CODE USING THE QUINN ESTIMATOR:
+                #### CODE USING THE QUINN ESTIMATOR (see _fourfitFringe):
                 mask2 = np.logical_and(mask, DATA["IF"] == int(si))
-                VIS = np.copy(DATA["VIS"][mask2 * maskRR, :])
-                VIS2 = np.copy(DATA["VIS"][mask2 * maskLL, :])
-                FR = np.fft.fftshift(np.fft.fft2(VIS))
-                FR2 = np.fft.fftshift(np.fft.fft2(VIS2))
-                FRA = np.abs(FR)
-                FRA2 = np.abs(FR2)
-                Nt, Nch = np.shape(VIS)
-                ## We compute OBSTIMES for each baseline AND spectral window:
-               # if si == 0:
-               #     OBSTIMES[bistr] = [np.linspace(-SCDUR / 2.0, SCDUR / 2.0, Nt)]
-               # else:
-                OBSTIMES[bistr][si] = np.linspace(-SCDUR / 2.0, SCDUR / 2.0, Nt)
-
-                Ntot = Nt * Nch
-                PEAK = np.unravel_index(np.argmax(FRA), np.shape(FR))
-                PEAK2 = np.unravel_index(np.argmax(FRA2), np.shape(FR))
-                RMS = np.sqrt(
+                TASKS.append(
                     (
-                        (np.std(FRA) ** 2.0 + np.mean(FRA) ** 2.0)
-                        - np.sum(
-                            np.power(
-                                FRA[
-                                    PEAK[0] - 1 : PEAK[0] + 2, PEAK[1] - 1 : PEAK[1] + 2
-                                ],
-                                2.0,
-                            )
-                        )
-                        / Ntot
+                        np.where(mask2 * maskRR)[0],
+                        np.where(mask2 * maskLL)[0],
+                        BWs[int(si)],
+                        SCDUR,
                     )
                 )
-                SNR = FRA[PEAK[0], PEAK[1]] / RMS
-                Taround = [PEAK[0] - 1, PEAK[0], PEAK[0] + 1]
-                Faround = [PEAK[1] - 1, PEAK[1], PEAK[1] + 1]
-                if Taround[1] == 0:
-                    Taround[0] = Nt - 1
-                if Taround[1] == Nt - 1:
-                    Taround[2] = 0
-                if Faround[1] == 0:
-                    Faround[0] = Nch - 1
-                if Faround[1] == Nch - 1:
-                    Faround[2] = 0
-
-                Taround2 = [PEAK2[0] - 1, PEAK2[0], PEAK2[0] + 1]
-                Faround2 = [PEAK2[1] - 1, PEAK2[1], PEAK2[1] + 1]
-                if Taround2[1] == 0:
-                    Taround2[0] = Nt - 1
-                if Taround2[1] == Nt - 1:
-                    Taround2[2] = 0
-                if Faround2[1] == 0:
-                    Faround2[0] = Nch - 1
-                if Faround2[1] == Nch - 1:
-                    Faround2[2] = 0
-
-                BLDelay = PEAK[1] - Nch / 2.0 + Quinn(FR[PEAK[0], Faround])
-                if bool(Nt % 2):
-                    BLRate = PEAK[0] - (Nt - 1) / 2.0 + Quinn(FR[Taround, PEAK[1]])
-                else:
-                    BLRate = PEAK[0] - Nt / 2.0 + Quinn(FR[Taround, PEAK[1]])
-
-                if BLDelay > Nch / 2.0:
-                    BLDelay -= Nch
-                if BLRate > Nt / 2.0:
-                    BLRate -= Nt
-                BLDelay /= BWs[int(si)] * Nch / (Nch - 1.0)
-                BLRate /= SCDUR
-
-                BLDelay2 = PEAK2[1] - Nch / 2.0 + Quinn(FR2[PEAK2[0], Faround2])
-                if bool(Nt % 2):
-                    BLRate2 = PEAK2[0] - (Nt - 1) / 2.0 + Quinn(FR2[Taround2, PEAK2[1]])
-                else:
-                    BLRate2 = PEAK2[0] - Nt / 2.0 + Quinn(FR2[Taround2, PEAK2[1]])
-
-                if BLDelay2 > Nch / 2.0:
-                    BLDelay2 -= Nch
-                if BLRate2 > Nt / 2.0:
-                    BLRate2 -= Nt
-                BLDelay2 /= BWs[int(si)] * Nch / (Nch - 1.0)
-                BLRate2 /= SCDUR
-
-                RESIDUALS[bistr][si] = [BLDelay, BLRate, 1.0, SNR, BLDelay2, BLRate2]
-
-                #  if si==1: #(ANAMES[bi[0]]=='OE' and ANAMES[bi[1]]=='WF'):
-                #    print('IF %i, %s-%s:  %i, %i (%i, %i) |  %.3e  %.3e'%(si,ANAMES[bi[0]],ANAMES[bi[1]],PEAK[0],PEAK[1],Nch,Nt, BLDelay, BLRate))
-                del (
-                    VIS,
-                    FR,
-                    FRA,
-                    Taround,
-                    Faround,
-                    PEAK,
-                    mask2,
-                    VIS2,
-                    FR2,
-                    FRA2,
-                    Taround2,
-                    Faround2,
-                    PEAK2,
-                )
-                gc.collect()
+                TASKID.append((bistr, si, SCDUR))
+                del mask2
             #########################
 
             else:
@@ -1179,6 +1286,18 @@ def GET_FOURFIT_PHASES(
         del SCTIMES, mask
         gc.collect()
 
+    for (bistr, si, SCDUR), (Nt, RES) in zip(
+        TASKID, runTasks(_fourfitFringe, TASKS, DATA, NCPU=NCPU)
+    ):
+        ## We compute OBSTIMES for each baseline AND spectral window:
+        OBSTIMES[bistr][si] = np.linspace(-SCDUR / 2.0, SCDUR / 2.0, Nt)
+        RESIDUALS[bistr][si] = RES
+
+        #  if si==1: #(ANAMES[bi[0]]=='OE' and ANAMES[bi[1]]=='WF'):
+        #    print('IF %i, %s-%s:  %i, %i (%i, %i) |  %.3e  %.3e'%(si,ANAMES[bi[0]],ANAMES[bi[1]],PEAK[0],PEAK[1],Nch,Nt, BLDelay, BLRate))
+    del TASKS, TASKID
+    gc.collect()
+
     # for key in RESIDUALS.keys():
     #   print(' \n %s: '%key)
     #   for si in RESIDUALS[key].keys():
@@ -2185,7 +2304,8 @@ def DO_GFF(
     PADDING_FACTOR=32,
     SAMP_DELAYS={},
     IF_OFFSET=2048,
-    MAX_PCAL_RMS=1.e3
+    MAX_PCAL_RMS=1.e3,
+    NCPU=1
 ):
 
 
@@ -2421,10 +2541,13 @@ def DO_GFF(
 
     SCANTIMES = {}
 
+    ## The fringe searches (one per baseline and IF) are run by runTasks,
+    ## serially or in a pool of NCPU processes (which read the visibilities
+    ## from shared memory):
+    TASKS = []
+    TASKID = []
     for bi in ALLBAS:
         bistr = "%i-%i" % (bi[0], bi[1])
-        IFRATES[:] = 0.0
-        isFRATES[:] = False
         mask[:] = np.logical_and(
             DATA["ANTS"][:, 0] == bi[0], DATA["ANTS"][:, 1] == bi[1]
         )
@@ -2439,55 +2562,52 @@ def DO_GFF(
             mask2[:] = np.logical_and(mask, DATA["IF"] == int(spi))
             if PCALS[bi[0]][spi][3] and PCALS[bi[1]][spi][3] and np.sum(mask2) > 0:
                 BLObs[bistr][spi] = True
-                IStokes = (
-                    DATA["VIS"][mask2 * maskRR, :] + DATA["VIS"][mask2 * maskLL, :]
-                )
-                toFringe = np.fft.fftshift(
-                    np.fft.fft2(
-                        (
-                            IStokes
-                            * np.exp(
-                                1.0j
-                                * (
-                                    TWOPI
-                                    * (PCALS[bi[0]][spi][0] - PCALS[bi[1]][spi][0])
-                                    * (CHANFREQ[spi] - NuAv[spi])
-                                    + PCALS[bi[0]][spi][1]
-                                    - PCALS[bi[1]][spi][1]
-                                    - (
-                                        additivePhase[ANAMES[bi[0]]][spi]
-                                        - additivePhase[ANAMES[bi[1]]][spi]
-                                    )
-                                    * np.pi
-                                    / 180.0
-                                )
-                            )
+                PHASOR = np.exp(
+                    1.0j
+                    * (
+                        TWOPI
+                        * (PCALS[bi[0]][spi][0] - PCALS[bi[1]][spi][0])
+                        * (CHANFREQ[spi] - NuAv[spi])
+                        + PCALS[bi[0]][spi][1]
+                        - PCALS[bi[1]][spi][1]
+                        - (
+                            additivePhase[ANAMES[bi[0]]][spi]
+                            - additivePhase[ANAMES[bi[1]]][spi]
                         )
+                        * np.pi
+                        / 180.0
                     )
                 )
-### TODO: Add the correction from the SBD!!
-                Nt, Nch = np.shape(toFringe)
-                SCANTIMES[bistr][spi] = np.copy(DATA["JDT"][mask2] - SCAV)
-                PEAK = np.unravel_index(np.argmax(np.abs(toFringe)), (Nt, Nch))
-                Taround = [PEAK[0] - 1, PEAK[0], PEAK[0] + 1]
-                if Taround[1] == 0:
-                    Taround[0] = Nt - 1
-                if Taround[1] == Nt - 1:
-                    Taround[2] = 0
-                if bool(Nt % 2):
-                    BLRate = (
-                        PEAK[0] - (Nt - 1) / 2.0 + Quinn(toFringe[Taround, PEAK[1]])
+                TASKS.append(
+                    (
+                        np.where(mask2 * maskRR)[0],
+                        np.where(mask2 * maskLL)[0],
+                        PHASOR,
+                        SCDUR,
+                        NuAv[spi],
                     )
-                else:
-                    BLRate = PEAK[0] - Nt / 2.0 + Quinn(toFringe[Taround, PEAK[1]])
-                if BLRate > Nt / 2.0:
-                    BLRate -= Nt
-                IFRATES[spi] = BLRate / SCDUR / NuAv[spi]
-                isFRATES[spi] = True
-                del toFringe, IStokes
+                )
+                TASKID.append((bistr, spi))
+                SCANTIMES[bistr][spi] = np.copy(DATA["JDT"][mask2] - SCAV)
             else:
                 BLObs[bistr][spi] = False
         #     print(bistr,spi,SCANTIMES[bistr][spi])
+
+    FRATES = {}
+    for (bistr, spi), BLRate in zip(
+        TASKID, runTasks(_gffRate, TASKS, DATA, NCPU=NCPU)
+    ):
+        FRATES[(bistr, spi)] = BLRate
+    del TASKS, TASKID
+
+    for bi in ALLBAS:
+        bistr = "%i-%i" % (bi[0], bi[1])
+        IFRATES[:] = 0.0
+        isFRATES[:] = False
+        for spi in ALLSPW:
+            if BLObs[bistr][spi]:
+                IFRATES[spi] = FRATES[(bistr, spi)]
+                isFRATES[spi] = True
         if np.sum(isFRATES) > 0:
             BLRates[bistr] = [np.median(IFRATES[isFRATES]), 1.0]
         else:
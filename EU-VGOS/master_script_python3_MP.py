@@ -854,7 +854,7 @@ if 3 in mysteps:
     keyw = {'SCAN':SCAN, 'HOPSNAMES': HOPSNAMES, 'IFNAMES': IFNAMES, 'FLAGBAS': EXCLUDE_BASELINE,
            'CALIB_BPASS':CALIB_BPASS, 'PCALDELAYS': PCAL_DELAYS, 'REFANT':REFANT, 
            'FLAG_PCALS':FLAG_PCALS, 'IF_OFFSET':IF_OFFSET, 'SAMP_DELAYS':SAMP_DELAYS,
-           "MAX_PCAL_RMS":MAX_PCAL_RMS}
+           "MAX_PCAL_RMS":MAX_PCAL_RMS, 'NCPU':int(NCPU)}
 
     keys = open('keywords_%s.dat'%SCRIPT_NAME,'wb'); pk.dump(keyw, keys,protocol=0); keys.close()
 
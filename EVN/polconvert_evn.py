@@ -9,6 +9,8 @@ Written by Benito Marcote (marcote@jive.eu)
 """
 
 import os
+import sys
+import time
 import glob
 import shutil
 import argparse
@@ -30,7 +32,7 @@ __version__ = '2.1'
 
 def main(ref_idi, idi_files, linear_antennas, ref_antenna, exclude_antennas, exclude_baselines, do_ifs,
          time_range, chan_avg=1, time_avg=20, solve_weight=0.0, solve_amp=True, to_compute=True, to_apply=True,
-         suffix='.PCONVERT', logdir='polconvert_logs'):
+         suffix='.PCONVERT', logdir='polconvert_logs', nworkers=1):
     """Runs PolConvert on the given project.
     Inputs:
         - ref_idi : str
@@ -67,6 +69,11 @@ def main(ref_idi, idi_files, linear_antennas, ref_antenna, exclude_antennas, exc
             If empty, it will overwrite the original files (not recommended).
         - logdir : str  [default = 'polconvert_logs']
             Specifies the folder that will be created to keep the log files from this run.
+        - nworkers : int  [default = 1]
+            Number of FITS-IDI files that are converted in parallel (each one in a separate process).
+            The gains are always computed (from ref_idi) before, in the main process.
+
+    Returns the list of results from apply_to_idi (one per FITS-IDI file) if to_apply, otherwise None.
     """
     # Doing it here to avoid the slow importing and stdout messages before checking the inputs
     from PolConvert import polconvert_standalone as pconv
@@ -152,17 +159,50 @@ def main(ref_idi, idi_files, linear_antennas, ref_antenna, exclude_antennas, exc
             if an_idi_path.exists() and (suffix != ''):
                 an_idi_path.unlink()
 
+        pc_kwargs = {'doTest': False, 'linAntIdx': linear_antennas, 'plotAnt': -1, 'doIF': do_ifs,
+                     'doSolve': -1, 'saveArgs': True, 'plotRange': time_range, 'XYadd': XYadd,
+                     'XYratio': XYratio}
+        # Each file is converted in its own working directory, as PolConvert writes its
+        # temporary files (and the log) in the CWD.
+        workdirs = {an_idi: (path / f"apply_{Path(an_idi).name}").absolute() for an_idi in idi_files}
+        results = []
         try:
-            with futures.ProcessPoolExecutor(max_workers=8) as executor:
-                workers = []
+            if nworkers > 1:
+                with futures.ProcessPoolExecutor(max_workers=min(nworkers, len(idi_files))) as executor:
+                    workers = {executor.submit(apply_to_idi, an_idi, an_idi + suffix, workdirs[an_idi],
+                                               pc_kwargs): an_idi for an_idi in idi_files}
+                    for a_worker in futures.as_completed(workers):
+                        try:
+                            results.append(a_worker.result())
+                        except Exception as e:
+                            # The worker process died (e.g. a crash inside PolConvert)
+                            results.append({'idi': workers[a_worker], 'output': workers[a_worker] + suffix,
+                                            'success': False, 'error': f"{type(e).__name__}: {e}",
+                                            'time': np.nan})
+
+                        print(f"{results[-1]['idi']}: {'done' if results[-1]['success'] else 'FAILED'} "
+                              f"({len(results)}/{len(idi_files)})")
+            else:
                 for an_idi in idi_files:
-                    kwargs = {'IDI': an_idi, 'OUTPUTIDI': an_idi + suffix, 'doTest': False,
-                                        'linAntIdx': linear_antennas, 'plotAnt': -1, 'doIF': do_ifs,
-                                        'doSolve': -1, 'saveArgs': True, 'plotRange': time_range, 'XYadd': XYadd,
-                                        'XYratio': XYratio}
-                    workers.append(executor.submit(pconv.polconvert, **kwargs))
+                    results.append(apply_to_idi(an_idi, an_idi + suffix, workdirs[an_idi], pc_kwargs))
         finally:
-            # Move all created output files (but the IDIs) into the expected log folder
+            # Keep the log of each conversion in the log folder, and all other created files
+            # (CONVERSION.MATRIX, FRINGE.PLOTS, other logs...) in a subdirectory of the CWD per file
+            for an_idi, workdir in workdirs.items():
+                a_file = workdir / 'PolConvert.log'
+                if a_file.exists():
+                    shutil.move(a_file, path / f"PolConvert-apply-{Path(an_idi).name}.log")
+
+                if workdir.exists():
+                    outdir = Path(f"PolConvert-apply-{Path(an_idi).name}")
+                    if outdir.exists():
+                        shutil.rmtree(outdir)
+
+                    if any(workdir.iterdir()):
+                        shutil.move(workdir, outdir)
+                    else:
+                        workdir.rmdir()
+
             for a_path in _TEMP_FILES:
                 a_file = Path(a_path)
                 if a_file.exists():
@@ -174,6 +214,77 @@ def main(ref_idi, idi_files, linear_antennas, ref_antenna, exclude_antennas, exc
                         else:
                             shutil.rmtree(a_file)
 
+        write_report(results, idi_files, path / 'polconvert-apply.report')
+        return results
+
+
+def apply_to_idi(an_idi, output_idi, workdir, pc_kwargs):
+    """Applies the conversion to a single FITS-IDI file. It can run in a worker process.
+    PolConvert is executed inside workdir (created if needed), so several files can be
+    converted at the same time without overwriting the files that PolConvert creates in the CWD.
+    Inputs:
+        - an_idi : str
+            FITS-IDI file to convert.
+        - output_idi : str
+            Name of the converted FITS-IDI file.
+        - workdir : Path
+            Working directory for this conversion.
+        - pc_kwargs : dict
+            All other parameters to pass to PolConvert.
+    Returns a dict with the input ('idi') and output ('output') file names, if the conversion
+    succeeded ('success'), the error message if not ('error') and the time it took, in seconds ('time').
+    """
+    from PolConvert import polconvert_standalone as pconv
+
+    result = {'idi': an_idi, 'output': output_idi, 'success': False, 'error': None, 'time': 0.0}
+    cwd = os.getcwd()
+    t0 = time.time()
+    try:
+        Path(workdir).mkdir(parents=True, exist_ok=True)
+        os.chdir(workdir)
+        _ = pconv.polconvert(IDI=os.path.join(cwd, an_idi), OUTPUTIDI=os.path.join(cwd, output_idi),
+                             **pc_kwargs)
+        result['success'] = True
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        os.chdir(cwd)
+        result['time'] = time.time() - t0
+
+    return result
+
+
+def write_report(results, idi_files, report_file):
+    """Writes (and prints) a summary of the conversion of all FITS-IDI files.
+    Inputs:
+        - results : list of dict
+            Results from apply_to_idi for each converted file (in any order).
+        - idi_files : list of str
+            FITS-IDI files that were requested to be converted (defines the order in the report).
+        - report_file : Path
+            File where the report is written.
+    """
+    by_idi = {a_result['idi']: a_result for a_result in results}
+    lines = []
+    for an_idi in idi_files:
+        if an_idi not in by_idi:
+            lines.append(f"{an_idi:40s}  NOT RUN")
+            continue
+
+        a_result = by_idi[an_idi]
+        if a_result['success']:
+            lines.append(f"{an_idi:40s}  OK      {a_result['time']:9.1f} s  -> {a_result['output']}")
+        else:
+            lines.append(f"{an_idi:40s}  FAILED  {a_result['time']:9.1f} s  {a_result['error']}")
+
+    n_ok = len([r for r in results if r['success']])
+    lines.append(f"\n{n_ok} out of {len(idi_files)} FITS-IDI files converted successfully.")
+    with open(report_file, 'w') as report:
+        report.write('\n'.join(lines) + '\n')
+
+    print('\n'.join(lines))
+    print(f"Logs of each conversion in {report_file.parent}/PolConvert-apply-*.log")
+    print("Other files created by each conversion in ./PolConvert-apply-*/")
 
 if __name__ == '__main__':
     usage = "%(prog)s  [-h]  <ini_file>"
@@ -229,6 +340,11 @@ if __name__ == '__main__':
         del t0
         del t1
 
+    # Optional: number of FITS-IDI files to convert in parallel
+    args['config']['nworkers'] = args['config'].get('nworkers', 1)
+    assert (type(args['config']['nworkers']) == int) and (args['config']['nworkers'] > 0), \
+           'nworkers must be a positive integer.'
+
     if not isinstance(args['config']['suffix'], str):
         # e.g. In case it is just a number
         args['config']['suffix'] = str(args['config']['suffix'])
@@ -256,11 +372,14 @@ if __name__ == '__main__':
            f"The reference FITS-IDI file {args['inputs']['ref_idi']} does not exist or cannot be found."
 
     # Ready to go!
-    main(ref_idi=args['inputs']['ref_idi'], idi_files=args['inputs']['idi_files'],
+    results = main(ref_idi=args['inputs']['ref_idi'], idi_files=args['inputs']['idi_files'],
          linear_antennas=args['inputs']['linants'], ref_antenna=args['inputs']['refant'],
          exclude_antennas=args['inputs']['exclude_ants'], exclude_baselines=args['inputs']['exclude_baselines'],
          do_ifs=args['options']['do_if'], time_range=args['options']['time_range'],
          chan_avg=args['options']['chanavg'], time_avg=args['options']['timeavg'],
          solve_weight=args['options']['solve_weight'], solve_amp=args['options']['solve_amp'],
          to_compute=args['options']['to_compute'], to_apply=args['options']['to_apply'],
-         suffix=args['config']['suffix'], logdir=args['config']['logdir'])
+         suffix=args['config']['suffix'], logdir=args['config']['logdir'],
+         nworkers=args['config']['nworkers'])
+    if (results is not None) and not all([a_result['success'] for a_result in results]):
+        sys.exit(1)
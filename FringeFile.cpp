@@ -0,0 +1,118 @@
+/* FRINGEFILE - columnar POLCONVERT.FRINGE files of PolConvert
+
+             Copyright (C) 2015-2022  Ivan Marti-Vidal
+             Nordic Node of EU ALMA Regional Center (Onsala, Sweden)
+             Max-Planck-Institut fuer Radioastronomie (Bonn, Germany)
+             University of Valencia (Spain)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+*/
+
+
+
+#include <sys/types.h>
+#include <stdio.h>
+#include <string.h>
+#include <complex>
+#include "./FringeFile.h"
+
+
+
+FringeWriter::FringeWriter(const char *name, int ncomp, int nchan, bool doParang, int nfreq, double *freqs) {
+
+  memset(&header,0,sizeof(FringeHeader));
+  memcpy(header.magic,FRINGE_MAGIC,8);
+  header.version = FRINGE_VERSION;
+  header.ncomp = ncomp;
+  header.nchan = nchan;
+  header.nfreq = nfreq;
+  header.doParang = doParang;
+  header.visOffset = sizeof(FringeHeader) + nfreq*sizeof(double);
+
+  rowSize = ((long) ncomp)*((long) (nchan>0?nchan:0));
+  row = new std::complex<float>[rowSize+1];
+
+// The header is written again (with the number of records) at the end:
+  file = fopen(name,"wb");
+  if (file){
+    fwrite(&header,sizeof(FringeHeader),1,file);
+    if (nfreq>0){fwrite(freqs,sizeof(double),nfreq,file);};
+  };
+
+};
+
+
+FringeWriter::~FringeWriter() {
+  close();
+  delete[] row;
+};
+
+
+bool FringeWriter::isOpen() {
+  return file != NULL;
+};
+
+
+
+void FringeWriter::addVis(int fileNum, double time, int ant1, int ant2, double pa1, double pa2, double uvdist, std::complex<float> **vis, const long *stride, bool conjugate) {
+
+  long i, k, nchan;
+
+  if (!file){return;};
+
+  nchan = header.nchan>0?header.nchan:0;
+  for (i=0; i<header.ncomp; i++){
+    std::complex<float> *out = &row[i*nchan];
+    if (conjugate){
+      for (k=0; k<nchan; k++){out[k] = std::conj(vis[i][k*stride[i]]);};
+    } else {
+      for (k=0; k<nchan; k++){out[k] = vis[i][k*stride[i]];};
+    };
+  };
+  fwrite(row,sizeof(std::complex<float>),rowSize,file);
+
+  FileNum.push_back(fileNum);
+  Time.push_back(time);
+  Ant1.push_back(ant1);
+  Ant2.push_back(ant2);
+  PA1.push_back(pa1);
+  PA2.push_back(pa2);
+  UVDist.push_back(uvdist);
+
+};
+
+
+
+void FringeWriter::close() {
+
+  if (!file){return;};
+
+  header.nvis = Time.size();
+  header.metaOffset = header.visOffset + header.nvis*rowSize*sizeof(std::complex<float>);
+
+  fwrite(Time.data(),sizeof(double),header.nvis,file);
+  fwrite(PA1.data(),sizeof(double),header.nvis,file);
+  fwrite(PA2.data(),sizeof(double),header.nvis,file);
+  fwrite(UVDist.data(),sizeof(double),header.nvis,file);
+  fwrite(Ant1.data(),sizeof(int),header.nvis,file);
+  fwrite(Ant2.data(),sizeof(int),header.nvis,file);
+  fwrite(FileNum.data(),sizeof(int),header.nvis,file);
+
+  fseek(file,0,SEEK_SET);
+  fwrite(&header,sizeof(FringeHeader),1,file);
+  fclose(file);
+  file = NULL;
+
+};
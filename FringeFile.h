@@ -0,0 +1,94 @@
+/* FRINGEFILE - columnar POLCONVERT.FRINGE files of PolConvert
+
+             Copyright (C) 2015-2022  Ivan Marti-Vidal
+             Nordic Node of EU ALMA Regional Center (Onsala, Sweden)
+             Max-Planck-Institut fuer Radioastronomie (Bonn, Germany)
+             University of Valencia (Spain)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+*/
+
+
+
+#include <sys/types.h>
+#include <stdio.h>
+#include <stdint.h>
+#include <complex>
+#include <vector>
+
+#ifndef __FRINGEFILE_H__
+#define __FRINGEFILE_H__
+
+
+/* Layout of the POLCONVERT.FRINGE/OTHERS.FRINGE_IF* (circular data, 4 products)
+   and POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF* (uncalibrated, converted and
+   matrix products, 12 in all) files. Everything is little endian:
+
+     FringeHeader                                      (64 bytes)
+     double  Freqs[nfreq]                              (at 64)
+     complex<float> Vis[nvis][ncomp][nchan]            (at visOffset)
+     double  Time[nvis], PA1[nvis], PA2[nvis], UVDist[nvis]   (at metaOffset)
+     int     Ant1[nvis], Ant2[nvis], FileNum[nvis]
+
+   Each product of a record is contiguous in frequency, and each metadata
+   column is contiguous in the file. So the files can be mapped in memory
+   (by _PolGainSolve and numpy) and used without any parsing. */
+
+#define FRINGE_MAGIC "PCFRINGE"
+#define FRINGE_VERSION 1
+
+typedef struct {
+  char magic[8];
+  int32_t version;
+  int32_t ncomp;      // products per record (4 or 12)
+  int32_t nchan;      // channels (-1 for a non-converted IF)
+  int32_t nfreq;      // number of frequencies stored (nchan or 0)
+  int32_t doParang;   // was the parallactic angle applied?
+  int32_t pad;
+  int64_t nvis;
+  int64_t visOffset;
+  int64_t metaOffset;
+  int64_t reserved;
+} FringeHeader;
+
+
+
+/* Writes a fringe file as the records come. The visibilities are streamed
+   to the file and the (small) metadata columns are kept in memory, to be
+   written (together with the final header) when the file is closed. */
+class FringeWriter {
+  public:
+    FringeWriter(const char *name, int ncomp, int nchan, bool doParang, int nfreq, double *freqs);
+    ~FringeWriter();
+
+    bool isOpen();
+
+// Adds a record. vis[i] points to the first channel of product i, and
+// its successive channels are stride[i] elements apart:
+    void addVis(int fileNum, double time, int ant1, int ant2, double pa1, double pa2, double uvdist, std::complex<float> **vis, const long *stride, bool conjugate);
+
+    void close();
+
+  private:
+    FILE *file;
+    FringeHeader header;
+    long rowSize;
+    std::complex<float> *row;
+    std::vector<double> Time, PA1, PA2, UVDist;
+    std::vector<int> Ant1, Ant2, FileNum;
+};
+
+
+#endif
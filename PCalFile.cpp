@@ -0,0 +1,476 @@
+/* PCALFILE - columnar reader of the DiFX phasecal files for PolConvert
+
+             Copyright (C) 2015-2022  Ivan Marti-Vidal
+             Nordic Node of EU ALMA Regional Center (Onsala, Sweden)
+             Max-Planck-Institut fuer Radioastronomie (Bonn, Germany)
+             University of Valencia (Spain)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+*/
+
+
+
+#include <sys/types.h>
+#include <sys/stat.h>
+#include <sys/mman.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <algorithm>
+#include "./PCalFile.h"
+
+
+
+static inline bool isBlank(char c){
+  return c==' ' || c=='\t' || c=='\r' || c=='\v' || c=='\f';
+};
+
+
+// Finds the next n tokens of the line that ends at e (starting from q).
+// Returns how many were found:
+static int nextTokens(const char *text, long &q, long e, int n, long *tb, long *te){
+  int nt;
+  for (nt=0; nt<n; nt++){
+    while (q<e && isBlank(text[q])){q++;};
+    if (q>=e){break;};
+    tb[nt] = q;
+    while (q<e && !isBlank(text[q])){q++;};
+    te[nt] = q;
+  };
+  return nt;
+};
+
+
+// Exact powers of ten (as doubles):
+static const double Pow10[23] = {1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8,
+  1e9, 1e10, 1e11, 1e12, 1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20,
+  1e21, 1e22};
+
+
+// Reads a number. Decimal numbers with up to 15 digits and small exponents
+// (i.e., all the PCAL values) are the product (or ratio) of two exact
+// doubles, so one operation gives the correctly-rounded value (the same one
+// as strtod). Anything else goes through strtod (a token is followed by a
+// blank, a new line or the end of the file; in the last case, it is copied):
+static double tokenNumber(const char *text, size_t size, long tb, long te){
+
+  const char *c = &text[tb], *end = &text[te];
+  long long mant = 0;
+  int ndig = 0, exp10 = 0, expSign = 1, expVal = 0;
+  bool neg = false, digits = false;
+
+  if (c<end && (*c=='-' || *c=='+')){neg = *c=='-'; c++;};
+  while (c<end && *c>='0' && *c<='9'){
+    if (mant>0 || *c!='0'){ndig++;};
+    mant = 10*mant + (*c-'0'); c++; digits = true;
+    if (ndig>15){break;};
+  };
+  if (c<end && *c=='.' && ndig<=15){
+    c++;
+    while (c<end && *c>='0' && *c<='9'){
+      if (mant>0 || *c!='0'){ndig++;};
+      mant = 10*mant + (*c-'0'); exp10--; c++; digits = true;
+      if (ndig>15){break;};
+    };
+  };
+  if (c<end && (*c=='e' || *c=='E') && digits && ndig<=15){
+    c++;
+    if (c<end && (*c=='-' || *c=='+')){expSign = (*c=='-')?-1:1; c++;};
+    if (c<end && *c>='0' && *c<='9'){
+      while (c<end && *c>='0' && *c<='9' && expVal<1000){expVal = 10*expVal + (*c-'0'); c++;};
+      exp10 += expSign*expVal;
+    } else {c = end+1;};
+  };
+
+  if (c==end && digits && ndig<=15 && exp10>=-22 && exp10<=22){
+    double val = (double) mant;
+    val = (exp10<0)?(val/Pow10[-exp10]):(val*Pow10[exp10]);
+    return neg?-val:val;
+  };
+
+  char buff[64];
+  if (te < (long) size){return strtod(&text[tb],NULL);};
+  if (te-tb < 64){
+    memcpy(buff,&text[tb],te-tb); buff[te-tb] = 0;
+    return strtod(buff,NULL);
+  };
+  return strtod(std::string(&text[tb],te-tb).c_str(),NULL);
+};
+
+
+
+// Identifies the contents of a file (for the cache), as size, inode and
+// modification time:
+static void fileKey(struct stat &info, int64_t *key){
+  key[0] = info.st_size;
+  key[1] = info.st_ino;
+  key[2] = info.st_mtime;
+#if defined(__APPLE__)
+  key[3] = info.st_mtimespec.tv_nsec;
+#else
+  key[3] = info.st_mtim.tv_nsec;
+#endif
+};
+
+
+
+PCalFile::PCalFile(const char *name, bool useCache) {
+
+  struct stat info;
+
+  text = NULL; size = 0;
+  mapped = false; changed = false; cached = false;
+  nLines = 0; nTones = 0;
+
+  if (useCache && readCache(name)){return;};
+
+  int fd = open(name,O_RDONLY);
+  if (fd<0){return;};
+  if (fstat(fd,&info)!=0){close(fd); return;};
+  size = info.st_size;
+  fileKey(info,key);
+
+// An empty file is open (with no lines), but it cannot be mapped:
+  if (size>0){
+    void *map = mmap(NULL,size,PROT_READ,MAP_PRIVATE,fd,0);
+    if (map == MAP_FAILED){close(fd); size = 0; return;};
+    text = (char *) map;
+  };
+  close(fd);
+  mapped = true;
+
+  parse();
+
+  if (useCache){writeCache(name);};
+
+};
+
+
+
+PCalFile::~PCalFile() {
+  if (text){munmap(text,size);};
+};
+
+
+
+bool PCalFile::isOpen() {
+  return mapped || cached;
+};
+
+
+bool PCalFile::isCached() {
+  return cached;
+};
+
+
+
+void PCalFile::parse() {
+
+  long p = 0, b, e, q, k;
+  long tb[6], te[6];
+  int ant = -1;
+  char *nl;
+  std::string name;
+
+  while (p < (long) size){
+
+    b = p;
+    nl = (char *) memchr(&text[p],'\n',size-p);
+    e = nl?(nl-text):size;
+    p = e+1;
+
+    if (e-b <= 10 || text[b]=='#'){continue;};
+
+// Line header:
+    q = b;
+    if (nextTokens(text,q,e,6,tb,te)<6){continue;};
+
+    name.assign(&text[tb[0]],te[0]-tb[0]);
+    if (ant<0 || AntNames[ant] != name){
+      for (ant=0; ant<(int)AntNames.size(); ant++){
+        if (AntNames[ant] == name){break;};
+      };
+      if (ant==(int)AntNames.size()){AntNames.push_back(name);};
+    };
+
+    Ant.push_back(ant);
+    Time.push_back(tokenNumber(text,size,tb[1],te[1]));
+    IntTime.push_back(tokenNumber(text,size,tb[2],te[2]));
+    DsId.push_back((int) tokenNumber(text,size,tb[3],te[3]));
+    NBand.push_back((int) tokenNumber(text,size,tb[4],te[4]));
+    NToneBand.push_back((int) tokenNumber(text,size,tb[5],te[5]));
+    FirstTone.push_back(nTones);
+    LineStart.push_back(b);
+    LineEnd.push_back(e);
+
+// Tones (FREQ POL RE IM):
+    k = 0;
+    while (nextTokens(text,q,e,4,tb,te)==4){
+      Freq.push_back(tokenNumber(text,size,tb[0],te[0]));
+      Pol.push_back(text[tb[1]]);
+      Re.push_back(tokenNumber(text,size,tb[2],te[2]));
+      Im.push_back(tokenNumber(text,size,tb[3],te[3]));
+      PolEnd.push_back(te[1]);
+      ReEnd.push_back(te[2]);
+      ImEnd.push_back(te[3]);
+      k += 1;
+    };
+
+    NTones.push_back(k);
+    nTones += k;
+    nLines += 1;
+
+  };
+
+  newPol.assign(nTones,0);
+  newValue.assign(nTones,0);
+
+};
+
+
+
+void PCalFile::setPol(long tone, char pol) {
+  newPol[tone] = pol; changed = true;
+};
+
+
+void PCalFile::setValue(long tone, double re, double im) {
+  Re[tone] = re; Im[tone] = im;
+  newValue[tone] = 1; changed = true;
+};
+
+
+
+// Writes a value right-aligned in the field [pos,pos+width) of a line (a
+// longer value overwrites the next characters):
+static void putValue(std::string &line, long pos, long width, double value){
+
+  char buff[64];
+  int n = snprintf(buff,64,"%*.5e",(int)(width>0?width:0),value);
+  if (n>63){n = 63;};
+  if (pos > (long)line.size()){pos = line.size();};
+  line.replace(pos,std::min((long)n,(long)line.size()-pos),buff,n);
+
+};
+
+
+
+bool PCalFile::write(const char *name, bool original) {
+
+  long i, k, o, p = 0;
+  bool lineChanged;
+  std::string line;
+
+  if (cached){return false;};
+
+// The file is written aside and then renamed, since it may be the one
+// that is mapped:
+  std::string tmpName = std::string(name) + ".tmp";
+  FILE *out = fopen(tmpName.c_str(),"wb");
+  if (!out){return false;};
+
+  if (original || !changed){
+    if (size>0){fwrite(text,1,size,out);};
+    return fclose(out)==0 && rename(tmpName.c_str(),name)==0;
+  };
+
+  for (i=0; i<nLines; i++){
+
+    lineChanged = false;
+    for (k=FirstTone[i]; k<FirstTone[i]+NTones[i]; k++){
+      if (newPol[k] || newValue[k]){lineChanged = true; break;};
+    };
+    if (!lineChanged){continue;};
+
+    o = LineStart[i];
+    fwrite(&text[p],1,o-p,out);
+    line.assign(&text[o],LineEnd[i]-o);
+
+    for (k=FirstTone[i]; k<FirstTone[i]+NTones[i]; k++){
+      if (newPol[k]){line[PolEnd[k]-1-o] = newPol[k];};
+      if (newValue[k]){
+        putValue(line,PolEnd[k]+1-o,ReEnd[k]-PolEnd[k]-1,Re[k]);
+        putValue(line,ReEnd[k]+1-o,ImEnd[k]-ReEnd[k]-1,Im[k]);
+      };
+    };
+
+    fwrite(line.data(),1,line.size(),out);
+    p = LineEnd[i];
+
+  };
+
+  fwrite(&text[p],1,size-p,out);
+
+  return fclose(out)==0 && rename(tmpName.c_str(),name)==0;
+
+};
+
+
+
+// Column I/O of the cache (the columns may be empty):
+static bool getColumn(void *data, size_t itemSize, long n, FILE *in){
+  return n<=0 || (long) fread(data,itemSize,n,in)==n;
+};
+
+static void putColumn(const void *data, size_t itemSize, long n, FILE *out){
+  if (n>0){fwrite(data,itemSize,n,out);};
+};
+
+
+
+// Reads the columns from the cache, if it was made for the current
+// contents of the file:
+bool PCalFile::readCache(const char *name) {
+
+  struct stat info;
+  PCalCacheHeader header;
+  int64_t srcKey[4];
+  long i;
+
+  if (stat(name,&info)!=0){return false;};
+  fileKey(info,srcKey);
+
+  std::string cacheName = std::string(name) + PCALCACHE_SUFFIX;
+  FILE *in = fopen(cacheName.c_str(),"rb");
+  if (!in){return false;};
+
+  bool good = fread(&header,sizeof(PCalCacheHeader),1,in)==1
+    && memcmp(header.magic,PCALCACHE_MAGIC,8)==0
+    && header.version==PCALCACHE_VERSION
+    && header.srcSize==srcKey[0] && header.srcIno==srcKey[1]
+    && header.srcMtime==srcKey[2] && header.srcMtimeNs==srcKey[3]
+    && header.nLines>=0 && header.nTones>=0 && header.namesSize>=0;
+
+// A truncated (or otherwise broken) cache is not used:
+  if (good){
+    good = fstat(fileno(in),&info)==0 && header.nLines<=info.st_size
+      && header.nTones<=info.st_size && header.namesSize<=info.st_size
+      && (int64_t) info.st_size == (int64_t) sizeof(PCalCacheHeader) + header.namesSize
+      + header.nLines*(int64_t)(2*sizeof(double) + 4*sizeof(int32_t) + 2*sizeof(int64_t))
+      + header.nTones*(int64_t)(3*sizeof(double) + 1);
+  };
+  if (!good){fclose(in); return false;};
+
+  long nl = header.nLines, nt = header.nTones;
+  std::vector<char> names(header.namesSize+1,0);
+  std::vector<int32_t> i32(nl);
+  std::vector<int64_t> i64(nl);
+
+  good = getColumn(names.data(),1,header.namesSize,in);
+  Time.resize(nl); IntTime.resize(nl);
+  good = good && getColumn(Time.data(),sizeof(double),nl,in);
+  good = good && getColumn(IntTime.data(),sizeof(double),nl,in);
+
+  std::vector<int> *intCols[4] = {&Ant, &DsId, &NBand, &NToneBand};
+  for (int c=0; c<4; c++){
+    good = good && getColumn(i32.data(),sizeof(int32_t),nl,in);
+    intCols[c]->assign(i32.begin(),i32.end());
+  };
+  std::vector<long> *longCols[2] = {&FirstTone, &NTones};
+  for (int c=0; c<2; c++){
+    good = good && getColumn(i64.data(),sizeof(int64_t),nl,in);
+    longCols[c]->assign(i64.begin(),i64.end());
+  };
+
+  Freq.resize(nt); Re.resize(nt); Im.resize(nt); Pol.resize(nt);
+  good = good && getColumn(Freq.data(),sizeof(double),nt,in);
+  good = good && getColumn(Re.data(),sizeof(double),nt,in);
+  good = good && getColumn(Im.data(),sizeof(double),nt,in);
+  good = good && getColumn(Pol.data(),1,nt,in);
+  fclose(in);
+
+  for (i=0; good && i<header.namesSize; i += strlen(&names[i])+1){
+    AntNames.push_back(std::string(&names[i]));
+  };
+  good = good && (int) AntNames.size()==header.nAnts;
+  for (i=0; good && i<nl; i++){
+    good = Ant[i]>=0 && Ant[i]<header.nAnts && FirstTone[i]>=0
+      && NTones[i]>=0 && FirstTone[i]+NTones[i]<=nt;
+  };
+
+  if (!good){
+    AntNames.clear(); Ant.clear(); DsId.clear(); NBand.clear(); NToneBand.clear();
+    Time.clear(); IntTime.clear(); FirstTone.clear(); NTones.clear();
+    Freq.clear(); Re.clear(); Im.clear(); Pol.clear();
+    return false;
+  };
+
+  nLines = nl; nTones = nt;
+  newPol.assign(nTones,0);
+  newValue.assign(nTones,0);
+  cached = true;
+  return true;
+
+};
+
+
+
+// Writes the cache (failures are ignored: the file will just be parsed
+// again next time). Each process writes its own temporary file:
+void PCalFile::writeCache(const char *name) {
+
+  PCalCacheHeader header;
+  std::string names;
+  long i;
+
+  for (i=0; i<(long)AntNames.size(); i++){names += AntNames[i]; names += '\0';};
+
+  memset(&header,0,sizeof(PCalCacheHeader));
+  memcpy(header.magic,PCALCACHE_MAGIC,8);
+  header.version = PCALCACHE_VERSION;
+  header.nAnts = AntNames.size();
+  header.srcSize = key[0]; header.srcIno = key[1];
+  header.srcMtime = key[2]; header.srcMtimeNs = key[3];
+  header.nLines = nLines;
+  header.nTones = nTones;
+  header.namesSize = names.size();
+
+  char pid[32];
+  snprintf(pid,32,".%i.tmp",(int) getpid());
+  std::string cacheName = std::string(name) + PCALCACHE_SUFFIX;
+  std::string tmpName = cacheName + pid;
+  FILE *out = fopen(tmpName.c_str(),"wb");
+  if (!out){return;};
+
+  std::vector<int32_t> i32(nLines);
+  std::vector<int64_t> i64(nLines);
+
+  fwrite(&header,sizeof(PCalCacheHeader),1,out);
+  putColumn(names.data(),1,names.size(),out);
+  putColumn(Time.data(),sizeof(double),nLines,out);
+  putColumn(IntTime.data(),sizeof(double),nLines,out);
+  std::vector<int> *intCols[4] = {&Ant, &DsId, &NBand, &NToneBand};
+  for (int c=0; c<4; c++){
+    i32.assign(intCols[c]->begin(),intCols[c]->end());
+    putColumn(i32.data(),sizeof(int32_t),nLines,out);
+  };
+  std::vector<long> *longCols[2] = {&FirstTone, &NTones};
+  for (int c=0; c<2; c++){
+    i64.assign(longCols[c]->begin(),longCols[c]->end());
+    putColumn(i64.data(),sizeof(int64_t),nLines,out);
+  };
+  putColumn(Freq.data(),sizeof(double),nTones,out);
+  putColumn(Re.data(),sizeof(double),nTones,out);
+  putColumn(Im.data(),sizeof(double),nTones,out);
+  putColumn(Pol.data(),1,nTones,out);
+
+  bool good = !ferror(out);
+  if (fclose(out)!=0 || !good || rename(tmpName.c_str(),cacheName.c_str())!=0){
+    remove(tmpName.c_str());
+  };
+
+};
@@ -0,0 +1,132 @@
+/* PCALFILE - columnar reader of the DiFX phasecal files for PolConvert
+
+             Copyright (C) 2015-2022  Ivan Marti-Vidal
+             Nordic Node of EU ALMA Regional Center (Onsala, Sweden)
+             Max-Planck-Institut fuer Radioastronomie (Bonn, Germany)
+             University of Valencia (Spain)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+*/
+
+
+
+#include <sys/types.h>
+#include <stdio.h>
+#include <stdint.h>
+#include <string>
+#include <vector>
+
+#ifndef __PCALFILE_H__
+#define __PCALFILE_H__
+
+
+/* A DiFX PCAL file has one line per antenna, integration time and
+   datastream (lines with less than 11 characters, or starting with '#',
+   are skipped):
+
+     ANT  MJD  TINT  DSID  NBAND  NTONE   FREQ POL RE IM   FREQ POL RE IM ...
+
+   where NTONE is the number of tones per band (absent tones have FREQ<0).
+   The file is mapped in memory and tokenized in one pass, into columns
+   with one entry per line (Ant, Time, IntTime, DsId, NBand, NToneBand and
+   the range of tones of the line, FirstTone and NTones) and one entry per
+   tone (Freq, Pol, Re, Im). The position of each tone in the text is also
+   kept, so that the file can be written back with some tones modified. */
+
+
+
+/* The columns can also be saved to (and read from) a binary cache next to
+   the PCAL file (name + PCALCACHE_SUFFIX), which is only valid for the
+   file with the size, inode and modification time (in ns) of the header.
+   Any rewrite of the PCAL file (which PCalFile::write does by renaming a
+   new file) makes the cache stale. It is a local file, so all is in the
+   native byte order:
+
+     PCalCacheHeader                                   (80 bytes)
+     char    Names[namesSize]   (antenna names, each ended with a '\0')
+     double  Time[nLines], IntTime[nLines]
+     int32   Ant[nLines], DsId[nLines], NBand[nLines], NToneBand[nLines]
+     int64   FirstTone[nLines], NTones[nLines]
+     double  Freq[nTones], Re[nTones], Im[nTones]
+     char    Pol[nTones]                                                  */
+
+#define PCALCACHE_MAGIC "PCALCACH"
+#define PCALCACHE_VERSION 1
+#define PCALCACHE_SUFFIX ".PCALCACHE"
+
+typedef struct {
+  char magic[8];
+  int32_t version;
+  int32_t nAnts;
+  int64_t srcSize;    // size, inode and modification time of the PCAL file
+  int64_t srcIno;
+  int64_t srcMtime;
+  int64_t srcMtimeNs;
+  int64_t nLines;
+  int64_t nTones;
+  int64_t namesSize;
+  int64_t reserved;
+} PCalCacheHeader;
+
+
+
+class PCalFile {
+  public:
+// With useCache, the columns are taken from the cache if it is valid (and
+// the cache is written otherwise). A PCalFile read from the cache has no
+// text, so it cannot be written:
+    PCalFile(const char *name, bool useCache=false);
+    ~PCalFile();
+
+    bool isOpen();
+    bool isCached();
+
+// Line columns:
+    long nLines;
+    std::vector<std::string> AntNames;
+    std::vector<int> Ant, DsId, NBand, NToneBand;
+    std::vector<double> Time, IntTime;
+    std::vector<long> FirstTone, NTones;
+
+// Tone columns:
+    long nTones;
+    std::vector<double> Freq, Re, Im;
+    std::vector<char> Pol;
+
+// Changes to apply when the file is written (the values are written in
+// the width of the original fields, as "%.5e"):
+    void setPol(long tone, char pol);
+    void setValue(long tone, double re, double im);
+
+// Writes the file (with the changes) or its original contents. It can
+// be the file that was read:
+    bool write(const char *name, bool original);
+
+  private:
+    char *text;
+    size_t size;
+    bool mapped, changed, cached;
+    int64_t key[4];
+    std::vector<long> LineStart, LineEnd;
+    std::vector<long> PolEnd, ReEnd, ImEnd;
+    std::vector<char> newPol, newValue;
+
+    void parse();
+    bool readCache(const char *name);
+    void writeCache(const char *name);
+};
+
+
+#endif
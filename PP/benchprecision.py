@@ -0,0 +1,272 @@
+#!/usr/bin/python
+#
+# Copyright (c) Ivan Marti-Vidal 2015-2023, University of Valencia (Spain)
+#       and Geoffrey Crew 2015-2023, Massachusetts Institute of Technology
+#
+# Script to benchmark the single- and double-precision builds of _PolConvert
+#
+'''
+benchprecision.py -- compare the speed and accuracy of the Jones-matrix precisions
+'''
+
+from __future__ import absolute_import
+from __future__ import print_function
+import argparse
+import glob
+import os
+import pickle
+import struct
+import subprocess
+import sys
+
+import numpy as np
+
+def parseOptions():
+    '''
+    Parse the argument list.  The conversion that is benchmarked is the one
+    saved by polconvert (standalone) with saveArgs=True, which is replayed
+    with two builds of _PolConvert: one compiled as usual (single precision)
+    and one compiled with POLCONVERT_DOUBLE set (see setup.py).  Only the
+    time spent in _PolConvert.PolConvert is measured.  The fringe fitting
+    and the plots are disabled.
+    '''
+    des = parseOptions.__doc__
+    epi = '''
+    For example, build the two versions with
+      python setup.py build_ext -f --build-lib ../pc-single
+      POLCONVERT_DOUBLE=1 python setup.py build_ext -f --build-lib ../pc-double
+    and then (in the directory where polconvert was run with saveArgs=True)
+      benchprecision.py -s ../pc-single -d ../pc-double -n 3
+    '''
+    use = ''
+    parser = argparse.ArgumentParser(epilog=epi, description=des, usage=use)
+    parser.add_argument('-v', '--verbose', dest='verb',
+        default=False, action='store_true',
+        help='be chatty about the work (and show the polconvert output)')
+    parser.add_argument('-s', '--single', dest='single',
+        default='', metavar='DIR',
+        help='directory with the single-precision _PolConvert build')
+    parser.add_argument('-d', '--double', dest='double',
+        default='', metavar='DIR',
+        help='directory with the double-precision _PolConvert build')
+    parser.add_argument('-p', '--pcdir', dest='pcdir',
+        default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        metavar='DIR',
+        help='directory with polconvert_standalone.py (the parent of PP)')
+    parser.add_argument('-a', '--args', dest='args',
+        default='PolConvert_standalone.last', metavar='FILE',
+        help='the pickled polconvert arguments (PolConvert_standalone.last)')
+    parser.add_argument('-n', '--repeat', dest='repeat',
+        type=int, default=1, metavar='INT',
+        help='number of runs of each build (the fastest one is reported)')
+    parser.add_argument('-t', '--threads', dest='threads',
+        type=int, default=0, metavar='INT',
+        help='number of threads (0 to keep the one in the arguments)')
+    parser.add_argument('-k', '--keep', dest='keep',
+        default=False, action='store_true',
+        help='keep the converted data (OUTPUTIDI.single, OUTPUTIDI.double)')
+    parser.add_argument('--run', dest='run', nargs=2, default=None,
+        help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def checkOptions(o):
+    '''
+    Check that the builds and the arguments are there.
+    '''
+    o.status = 0
+    if o.run: return o
+    for label,bdir in [('single',o.single), ('double',o.double)]:
+        if len(glob.glob(os.path.join(bdir, '_PolConvert*.so'))) == 0:
+            print('no _PolConvert build found for %s precision in "%s"' %
+                (label, bdir))
+            o.status += 1
+    if not os.path.exists(os.path.join(o.pcdir, 'polconvert_standalone.py')):
+        print('polconvert_standalone.py is not in ' + o.pcdir)
+        o.status += 1
+    if not os.path.exists(o.args):
+        print('the polconvert arguments (%s) are missing' % o.args)
+        o.status += 1
+    if o.repeat < 1:
+        print('the number of runs (-n) must be positive')
+        o.status += 1
+    return o
+
+def benchArgs(o, label):
+    '''
+    The polconvert arguments for the run of one build.
+    '''
+    IFF = open(o.args, 'rb')
+    ARGS = pickle.load(IFF)
+    IFF.close()
+    ARGS['OUTPUTIDI'] = ARGS['OUTPUTIDI'].rstrip('/') + '.' + label
+    ARGS['plotSuffix'] = '_bench_' + label
+    ARGS['doTest'] = False
+    ARGS['doSolve'] = -1
+    ARGS['plotIF'] = []
+    ARGS['saveArgs'] = False
+    if o.threads > 0: ARGS['nthreads'] = o.threads
+    return ARGS
+
+def runBuild(o, label, bdir):
+    '''
+    Child process: run polconvert with the build in bdir, timing only
+    the calls to the C++ conversion.  The time is the last line printed.
+    '''
+    import time
+    sys.path.insert(0, os.path.abspath(bdir))
+    sys.path.insert(1, os.path.abspath(o.pcdir))
+    import polconvert_standalone as PCS
+    if not PCS.PC.__file__.startswith(os.path.abspath(bdir)):
+        print('wrong _PolConvert loaded: ' + PCS.PC.__file__)
+        sys.exit(1)
+    timing = [0.0]
+    PolConvert = PCS.PC.PolConvert
+    def timedPolConvert(*args):
+        tic = time.time()
+        ret = PolConvert(*args)
+        timing[0] += time.time() - tic
+        return ret
+    PCS.PC.PolConvert = timedPolConvert
+    PCS.polconvert(**benchArgs(o, label))
+    print('PCTIME %.6f' % timing[0])
+
+def swinRecords(fname):
+    '''
+    Returns the contents of a SWIN file and the positions and number of
+    visibilities of its records (the number of channels of a record
+    is found from the sync word of the next record).
+    '''
+    sync = struct.pack('<I', 0xFF00FF00)
+    hsize = 74
+    IFF = open(fname, 'rb')
+    raw = IFF.read()
+    IFF.close()
+    records = []
+    pos = 0
+    while pos + hsize <= len(raw):
+        if raw[pos:pos+4] != sync:
+            raise Exception('lost sync in %s at byte %d' % (fname, pos))
+        nxt = raw.find(sync, pos + hsize)
+        if nxt < 0: nxt = len(raw)
+        nvis = (nxt - pos - hsize)//8
+        records.append((pos, nvis))
+        pos += hsize + 8*nvis
+    return raw, records
+
+def visFiles(outdir):
+    '''
+    The visibility files of a conversion (SWIN directory or FITS-IDI file).
+    '''
+    if os.path.isdir(outdir):
+        return sorted([os.path.relpath(f, outdir) for f in
+            glob.glob(os.path.join(outdir, '*', 'DIFX_*')) +
+            glob.glob(os.path.join(outdir, 'DIFX_*'))])
+    return ['']
+
+def fitsVis(fname):
+    '''
+    The visibilities of a FITS-IDI file (as complex numbers).
+    '''
+    from astropy.io import fits as pf
+    ffile = pf.open(fname)
+    flux = np.array(ffile['UV_DATA'].data['FLUX'], dtype=np.float64)
+    ffile.close()
+    flux = flux.reshape((-1, 3))
+    return flux[:,0] + 1.j*flux[:,1]
+
+def compareOutputs(o, outS, outD):
+    '''
+    Maximum deviation between the single- and double-precision
+    conversions (the latter taken as the reference).  Returns the number
+    of visibilities and the maximum absolute, relative and rms deviations.
+    '''
+    nvis = 0
+    maxdev = 0.0; maxref = 0.0; sumsq = 0.0
+    for vf in visFiles(outD):
+        fS = os.path.join(outS, vf) if vf else outS
+        fD = os.path.join(outD, vf) if vf else outD
+        if vf:
+            rawD, records = swinRecords(fD)
+            IFF = open(fS, 'rb')
+            rawS = IFF.read()
+            IFF.close()
+            if len(rawS) != len(rawD):
+                print('%s and %s differ in size!' % (fS, fD))
+                continue
+            chunks = [(np.frombuffer(rawS, dtype=np.complex64, count=nv,
+                offset=pos+74), np.frombuffer(rawD, dtype=np.complex64,
+                count=nv, offset=pos+74)) for pos,nv in records]
+        else:
+            chunks = [(fitsVis(fS), fitsVis(fD))]
+        for vS,vD in chunks:
+            if len(vD) == 0: continue
+            dev = np.abs(vS.astype(np.complex128) - vD)
+            nvis += len(vD)
+            maxdev = max(maxdev, np.max(dev))
+            maxref = max(maxref, np.max(np.abs(vD)))
+            sumsq += np.sum(dev*dev)
+        if o.verb: print('  compared ' + fD)
+    if nvis == 0: return 0, 0.0, 0.0, 0.0
+    return nvis, maxdev, maxdev/max(maxref, 1.e-30), np.sqrt(sumsq/nvis)
+
+def benchmark(o):
+    '''
+    Run each build o.repeat times and compare the results.
+    '''
+    times = {}
+    outputs = {}
+    for label,bdir in [('single',o.single), ('double',o.double)]:
+        outputs[label] = benchArgs(o, label)['OUTPUTIDI']
+        times[label] = []
+        for rep in range(o.repeat):
+            cmd = [sys.executable, os.path.abspath(__file__), '--run',
+                label, bdir, '-p', o.pcdir, '-a', o.args,
+                '-t', str(o.threads)]
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT, universal_newlines=True)
+            out = proc.communicate()[0]
+            if o.verb: print(out)
+            tline = [l for l in out.split('\n') if l.startswith('PCTIME')]
+            if proc.returncode != 0 or len(tline) == 0:
+                if not o.verb: print(out)
+                print('polconvert failed with the %s-precision build' % label)
+                return 1
+            times[label].append(float(tline[-1].split()[1]))
+            print('%s precision, run %d: %.3f s' % (label, rep+1,
+                times[label][-1]))
+    nvis,maxdev,reldev,rmsdev = compareOutputs(o,
+        outputs['single'], outputs['double'])
+    if nvis == 0:
+        print('no converted visibilities to compare')
+        return 1
+    print('\n%d visibilities converted' % nvis)
+    for label in ['single', 'double']:
+        best = min(times[label])
+        print('%s precision: %.3f s  (%.3f Mvis/s)' % (label, best,
+            1.e-6*nvis/best))
+    print('speedup of single precision: %.2f' % (
+        min(times['double'])/min(times['single'])))
+    print('max. deviation: %.3e (%.3e relative to max. amplitude)' % (
+        maxdev, reldev))
+    print('rms. deviation: %.3e' % rmsdev)
+    if not o.keep:
+        for label in ['single', 'double']:
+            os.system('rm -rf %s' % outputs[label])
+    return 0
+
+#
+# enter here to do the work
+#
+if __name__ == '__main__':
+    opts = parseOptions()
+    if opts.run:
+        runBuild(opts, opts.run[0], opts.run[1])
+        sys.exit(0)
+    opts = checkOptions(opts)
+    if opts.status != 0:
+        sys.exit(opts.status)
+    sys.exit(benchmark(opts))
+
+#
+# eof
+#
@@ -0,0 +1,188 @@
+/* BENCHWEIGHTER - per-call cost of the Weighter lookups of PolConvert
+
+             Copyright (C) 2015-2022  Ivan Marti-Vidal
+             Nordic Node of EU ALMA Regional Center (Onsala, Sweden)
+             Max-Planck-Institut fuer Radioastronomie (Bonn, Germany)
+             University of Valencia (Spain)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+*/
+
+/* Builds a synthetic CALAPPPHASE table (as polconvert_CASA.py passes it to
+   _PolConvert) and times isPhased, getWeight and getRefAnt, as they are
+   called for each visibility, against the linear scans they replaced. The
+   answers of both are also compared. Build (from this directory) and run:
+
+     g++ -O3 -std=c++11 -I.. benchweighter.cpp ../Weighter.cpp -o benchweighter
+     ./benchweighter [hours] [seconds between entries] [antennas]
+
+   The defaults (4 h, one entry per baseband every 2 s, 45 antennas) give
+   28800 ASDM entries. Both isPhased times include writing the "Bad time"
+   message (for about 1 visibility in 18), as the linear scan also did. */
+
+
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <iostream>
+#include <fstream>
+#include <vector>
+#include <chrono>
+#include "./Weighter.h"
+
+
+
+// The lookups as they were (linear scans):
+static bool oldPhased(double t, double *bad, int nbad, FILE *logF){
+  char message[512];
+  for (int i=0; i<nbad; i++){
+    if (t>=bad[2*i] && t<=bad[2*i+1]){
+      sprintf(message,"Bad time %i: %.8f |  %.8f %.8f!\n",i,t,bad[2*i],bad[2*i+1]);
+      fprintf(logF,"%s",message);  std::cout<<message; fflush(logF);
+      return false;
+    };
+  };
+  return true;
+};
+
+static bool oldWeight(int iant, double t, int nants, int *ants, long *ntimes, double **times){
+  int j;
+  for (j=0; j<nants; j++){if (ants[j]==iant){break;};};
+  if (j<nants){
+    for (long i=0; i<ntimes[j]; i++){
+      if (times[j][2*i]<=t && times[j][2*i+1]>=t){return true;};
+    };
+  };
+  return false;
+};
+
+static int oldRefAnt(double t, long nent, double *t0, double *t1, int *refs){
+  for (long i=0; i<nent; i++){if (t0[i]<=t && t1[i]>=t){return refs[i];};};
+  return -1;
+};
+
+
+static double seconds(std::chrono::steady_clock::time_point a){
+  return std::chrono::duration<double>(std::chrono::steady_clock::now()-a).count();
+};
+
+
+
+int main(int argc, char *argv[]){
+
+  double hours = (argc>1)?atof(argv[1]):4.0;
+  double step = (argc>2)?atof(argv[2]):2.0;
+  int nants = (argc>3)?atoi(argv[3]):45;
+  const int NBB = 4;
+  const double PAD = 5.0;   // calAPPTime (widens and overlaps the entries)
+
+  long i, k, nrow = (long)(hours*3600./step);
+  long nent = NBB*nrow;
+  int j;
+
+  srand(1234);
+
+// ASDM entries (one per baseband), their reference and phased antennas:
+  std::vector<double> t0(nent), t1(nent);
+  std::vector<int> refs(nent);
+  std::vector<std::vector<double> > antimes(nants);
+  for (j=0; j<nants; j++){antimes[j].push_back(0.); antimes[j].push_back(0.);};
+
+  for (i=0; i<nrow; i++){
+    int ref = (i/900)%nants;
+    for (k=0; k<NBB; k++){
+      long e = i*NBB+k;
+      t0[e] = i*step - PAD; t1[e] = (i+1)*step + PAD; refs[e] = ref;
+    };
+    for (j=0; j<nants; j++){
+      if (rand()%100 < 2){continue;};  // antenna left out of the sum
+      antimes[j].push_back(i*step - PAD); antimes[j].push_back((i+1)*step + PAD);
+    };
+  };
+
+  std::vector<int> ants(nants);
+  std::vector<long> ntimes(nants);
+  std::vector<double*> times(nants);
+  for (j=0; j<nants; j++){
+    ants[j] = j; ntimes[j] = antimes[j].size()/2; times[j] = antimes[j].data();
+  };
+
+// Unphased time ranges:
+  std::vector<double> bad;
+  for (i=0; i<40; i++){double tb = (i+0.5)*hours*3600./40.; bad.push_back(tb); bad.push_back(tb+20.);};
+  int nbad = bad.size()/2;
+
+  FILE *logF = fopen("/dev/null","w");
+  Weighter W(nants,ntimes.data(),nent,ants.data(),times.data(),refs.data(),
+             t0.data(),t1.data(),bad.data(),nbad,logF);
+
+// Visibility times (and a silent std::cout for the bad-time messages):
+  std::vector<double> tv;
+  for (double t=0.; t<hours*3600.; t+=1.0){tv.push_back(t);};
+  long nt = tv.size();
+
+  std::ofstream devnull("/dev/null");
+  std::streambuf *coutbuf = std::cout.rdbuf(devnull.rdbuf());
+
+  long nbadv = 0, nbadw = 0, nbadr = 0, acc = 0;
+  std::chrono::steady_clock::time_point st;
+  double tOld[3], tNew[3];
+
+  st = std::chrono::steady_clock::now();
+  for (i=0; i<nt; i++){acc += oldPhased(tv[i],bad.data(),nbad,logF);};
+  tOld[0] = seconds(st);
+  st = std::chrono::steady_clock::now();
+  for (i=0; i<nt; i++){acc += W.isPhased(tv[i]);};
+  tNew[0] = seconds(st);
+
+  st = std::chrono::steady_clock::now();
+  for (i=0; i<nt; i++){for (j=0; j<nants; j++){acc += oldWeight(j,tv[i],nants,ants.data(),ntimes.data(),times.data());};};
+  tOld[1] = seconds(st);
+  st = std::chrono::steady_clock::now();
+  for (i=0; i<nt; i++){for (j=0; j<nants; j++){acc += W.getWeight(j,tv[i]);};};
+  tNew[1] = seconds(st);
+
+  st = std::chrono::steady_clock::now();
+  for (i=0; i<nt; i++){acc += oldRefAnt(tv[i],nent,t0.data(),t1.data(),refs.data());};
+  tOld[2] = seconds(st);
+  st = std::chrono::steady_clock::now();
+  for (i=0; i<nt; i++){acc += W.getRefAnt(tv[i]);};
+  tNew[2] = seconds(st);
+
+// Same answers?
+  for (i=0; i<nt; i++){
+    if (oldPhased(tv[i],bad.data(),nbad,logF) != W.isPhased(tv[i])){nbadv++;};
+    if (oldRefAnt(tv[i],nent,t0.data(),t1.data(),refs.data()) != W.getRefAnt(tv[i])){nbadr++;};
+    for (j=-1; j<=nants; j++){
+      if (oldWeight(j,tv[i],nants,ants.data(),ntimes.data(),times.data()) != W.getWeight(j,tv[i])){nbadw++;};
+    };
+  };
+
+  std::cout.rdbuf(coutbuf);
+  fclose(logF);
+
+  printf("%li ASDM entries, %i antennas (%li ranges each), %i bad ranges, %li times (%li)\n",
+         nent, nants, ntimes[0], nbad, nt, acc%2);
+  const char *names[3] = {"isPhased","getWeight","getRefAnt"};
+  long ncalls[3] = {nt, nt*nants, nt};
+  for (k=0; k<3; k++){
+    printf("  %-10s %12.1f ns/call (linear) %10.1f ns/call (indexed)  x%.1f\n", names[k],
+           1.e9*tOld[k]/ncalls[k], 1.e9*tNew[k]/ncalls[k], tOld[k]/tNew[k]);
+  };
+  printf("  mismatches: isPhased %li, getWeight %li, getRefAnt %li\n", nbadv, nbadw, nbadr);
+
+  return (nbadv+nbadw+nbadr)>0;
+
+};
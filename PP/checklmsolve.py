@@ -0,0 +1,401 @@
+#!/usr/bin/python
+#
+# Copyright (c) Ivan Marti-Vidal 2015-2023, University of Valencia (Spain)
+#       and Geoffrey Crew 2015-2023, Massachusetts Institute of Technology
+#
+# Script to check the Levenberg-Marquardt cross-gain fit of _PolGainSolve
+#
+'''
+checklmsolve.py -- compare LMSolve with the scipy fits on a synthetic problem
+'''
+
+from __future__ import absolute_import
+from __future__ import print_function
+import argparse
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+def parseOptions():
+    '''
+    Parse the argument list.  A synthetic cross-gain problem is written in
+    the POLCONVERT.FRINGE format (an unpolarized source seen by two linear
+    and three circular antennas, with known X-Y gains and noise) and it is
+    solved, as polconvert does, with _PolGainSolve.LMSolve and with the
+    scipy minimizer of the Chi2 and its gradient (GetChi2Grad).  The fitted
+    gains, the 180-degree flip and the Chi2 of both must agree.  The exit
+    status is the number of fits that do not.
+    '''
+    des = parseOptions.__doc__
+    epi = '''
+    For example, build _PolGainSolve with
+      python setup.py build_ext -f --build-lib ../pc-build
+    and then
+      checklmsolve.py -b ../pc-build -v
+    '''
+    use = ''
+    parser = argparse.ArgumentParser(epilog=epi, description=des, usage=use)
+    parser.add_argument('-v', '--verbose', dest='verb',
+        default=False, action='store_true',
+        help='be chatty about the work (and show the solver output)')
+    parser.add_argument('-b', '--build', dest='build',
+        default='', metavar='DIR',
+        help='directory with the _PolGainSolve build (default: installed)')
+    parser.add_argument('-m', '--method', dest='method',
+        default='BFGS', metavar='STRING',
+        help='scipy method to compare with (BFGS or Newton-CG)')
+    parser.add_argument('-c', '--channels', dest='nchan',
+        type=int, default=64, metavar='INT',
+        help='number of channels of each IF')
+    parser.add_argument('-n', '--times', dest='ntime',
+        type=int, default=30, metavar='INT',
+        help='number of integrations')
+    parser.add_argument('-s', '--seed', dest='seed',
+        type=int, default=1234, metavar='INT',
+        help='seed of the random gains and noise')
+    parser.add_argument('-r', '--noise', dest='noise',
+        type=float, default=0.002, metavar='FLOAT',
+        help='noise (rms) of each visibility and channel')
+    parser.add_argument('-t', '--threads', dest='threads',
+        type=int, default=1, metavar='INT',
+        help='number of threads for the Chi2')
+    parser.add_argument('-g', '--gaintol', dest='gaintol',
+        type=float, default=5.e-3, metavar='FLOAT',
+        help='tolerance of the gains (amplitude, radians, radians/channel)')
+    parser.add_argument('-x', '--chi2tol', dest='chi2tol',
+        type=float, default=1.e-4, metavar='FLOAT',
+        help='relative tolerance of the final Chi2')
+    parser.add_argument('-k', '--keep', dest='keep',
+        default=False, action='store_true',
+        help='keep the directory with the synthetic fringe files')
+    return parser.parse_args()
+
+def checkOptions(o):
+    '''
+    Check the options and load _PolGainSolve.
+    '''
+    o.status = 0
+    if o.method not in ['BFGS', 'Newton-CG']:
+        print('the scipy method (-m) must be BFGS or Newton-CG')
+        o.status += 1
+    if o.nchan < 8 or o.ntime < 4:
+        print('at least 8 channels (-c) and 4 integrations (-n) are needed')
+        o.status += 1
+    if o.build:
+        sys.path.insert(0, os.path.abspath(o.build))
+    try:
+        import _PolGainSolve
+        o.PGS = _PolGainSolve
+    except ImportError as ex:
+        print('cannot import _PolGainSolve: ' + str(ex))
+        o.status += 1
+        return o
+    if o.build and not o.PGS.__file__.startswith(os.path.abspath(o.build)):
+        print('wrong _PolGainSolve loaded: ' + o.PGS.__file__)
+        o.status += 1
+    if not hasattr(o.PGS, 'LMSolve'):
+        print('this _PolGainSolve has no LMSolve')
+        o.status += 1
+    return o
+
+#
+# The synthetic problem
+#
+
+LINANTS = [1, 2]
+CIRCANTS = [3, 4, 5]
+
+# (IF, solveAmp, SBD): one fit mode per IF, with gains that it can model.
+CASES = [(1, True, True), (2, False, True), (3, True, False), (4, False, False)]
+
+def writeFringe(fname, ncomp, freqs, vis, meta):
+    '''
+    Writes a fringe file (see FringeFile.h).  vis has the shape
+    (nvis, ncomp, nchan) and meta is (time, pa1, pa2, uvdist, ant1, ant2).
+    '''
+    nvis, nchan = vis.shape[0], vis.shape[2]
+    visOffset = 64 + 8*len(freqs)
+    metaOffset = visOffset + 8*vis.size
+    OFF = open(fname, 'wb')
+    OFF.write(struct.pack('<8siiiiiiqqqq', b'PCFRINGE', 1, ncomp, nchan,
+        len(freqs), 0, 0, nvis, visOffset, metaOffset, 0))
+    OFF.write(np.asarray(freqs, dtype='<f8').tobytes())
+    OFF.write(np.asarray(vis, dtype='<c8').tobytes())
+    for col in meta[:4]:
+        OFF.write(np.asarray(col, dtype='<f8').tobytes())
+    for col in meta[4:] + (np.zeros(nvis),):
+        OFF.write(np.asarray(col, dtype='<i4').tobytes())
+    OFF.close()
+
+def correction(g1, g2, lin1, lin2):
+    '''
+    The matrix that _PolGainSolve (Chi2Task) applies to the (RR,RL,LR,LL)
+    of a baseline, for the gains g1 and g2 (G1nu and G2nu) of its antennas.
+    '''
+    p1, m1, p2, m2 = 1. + g1, 1. - g1, 1. + g2, 1. - g2
+    if lin1 and lin2:
+        return np.array([[p1*p2, m2*p1, p2*m1, m1*m2],
+                         [p1*m2, p1*p2, m1*m2, m1*p2],
+                         [m1*p2, m1*m2, p1*p2, p1*m2],
+                         [m1*m2, p2*m1, m2*p1, p1*p2]])
+    if lin1:
+        return np.array([[p1, 0., m1, 0.], [0., p1*g2, 0., m1*g2],
+                         [m1, 0., p1, 0.], [0., m1*g2, 0., p1*g2]])
+    if lin2:
+        return np.array([[p2, m2, 0., 0.], [m2, p2, 0., 0.],
+                         [0., 0., p2*g1, m2*g1], [0., 0., m2*g1, p2*g1]])
+    return np.diag([1., g2, g1, g1*g2])
+
+def antennaGains(o, rng):
+    '''
+    The true gains of the linear antennas for each IF, as the parameters
+    of its fit mode (amplitudes and phases, then the SBDs, per antenna).
+    '''
+    truth = {}
+    for IF,amp,sbd in CASES:
+        pars = []
+        for ant in LINANTS:
+            if amp: pars += [rng.uniform(0.7, 1.3), rng.uniform(-1., 1.)]
+            else: pars += [rng.uniform(-1., 1.)]
+# (SetFit only fits the SBDs together with the amplitudes):
+        if sbd:
+            pars += list(rng.uniform(-0.02, 0.02, len(LINANTS))*amp)
+        truth[IF] = np.array(pars)
+    return truth
+
+def channelGains(pars, amp, sbd, nchan):
+    '''
+    The complex gain of each linear antenna at each channel, as in Chi2Task
+    (the SBDs are phase slopes per channel, from the center of the IF).
+    '''
+    nfit = len(LINANTS)
+    chanFreq = np.arange(nchan) - nchan//2
+    gains = {}
+    for i,ant in enumerate(LINANTS):
+        if amp: A, phi = pars[2*i], pars[2*i+1]
+        else: A, phi = 1.0, pars[i]
+        tau = pars[(2 if amp else 1)*nfit + i] if sbd else 0.0
+        gains[ant] = A*np.exp(1.j*(phi + tau*chanFreq))
+    return gains
+
+def makeProblem(o, wdir):
+    '''
+    Writes the fringe files of all IFs into wdir/POLCONVERT.FRINGE and
+    returns the true gains.  The data of each baseline are those that give
+    RR = LL = 1 and RL = LR = 0 once the true gains are applied, plus noise.
+    '''
+    rng = np.random.default_rng(o.seed)
+    truth = antennaGains(o, rng)
+    ants = sorted(LINANTS + CIRCANTS)
+    baselines = [(a1, a2) for i,a1 in enumerate(ants) for a2 in ants[i+1:]]
+    times = 5.e9 + 2.*np.arange(o.ntime)
+    fdir = os.path.join(wdir, 'POLCONVERT.FRINGE')
+    os.mkdir(fdir)
+    for IF,amp,sbd in CASES:
+        freqs = 8.e9 + IF*64.e6 + 64.e6*np.arange(o.nchan)/o.nchan
+        gains = channelGains(truth[IF], amp, sbd, o.nchan)
+        data = {'lin': [], 'circ': []}
+        for a1,a2 in baselines:
+            lin1, lin2 = a1 in LINANTS, a2 in LINANTS
+            vis = np.zeros((4, o.nchan), dtype=np.complex128)
+            for j in range(o.nchan):
+                g1 = gains[a1][j] if lin1 else 1.0
+                g2 = np.conj(gains[a2][j]) if lin2 else 1.0
+                vis[:,j] = np.linalg.solve(correction(g1, g2, lin1, lin2),
+                    np.array([1., 0., 0., 1.]))
+            for t in times:
+                noise = o.noise*(rng.normal(size=vis.shape) +
+                    1.j*rng.normal(size=vis.shape))/np.sqrt(2.)
+                data['lin' if lin1 or lin2 else 'circ'].append(
+                    (vis + noise, t, a1, a2))
+        for key,ncomp,name in [('lin', 12, 'POLCONVERT.FRINGE_IF%i'),
+                               ('circ', 4, 'OTHERS.FRINGE_IF%i')]:
+            rows = data[key]
+            vis = np.zeros((len(rows), ncomp, o.nchan), dtype=np.complex64)
+            off = 4 if ncomp == 12 else 0
+            for i,row in enumerate(rows): vis[i,off:off+4,:] = row[0]
+            meta = (np.array([r[1] for r in rows]), np.zeros(len(rows)),
+                np.zeros(len(rows)), 1000.*np.ones(len(rows)),
+                np.array([r[2] for r in rows]), np.array([r[3] for r in rows]))
+            writeFringe(os.path.join(fdir, name % IF), ncomp, freqs, vis, meta)
+    return truth
+
+def loadSolver(o):
+    '''
+    Reads the synthetic data (from the CWD) into a new solver and fringe
+    fits them, as polconvert does (the first antenna is the reference).
+    '''
+    ants = sorted(LINANTS + CIRCANTS)
+    o.keepArrays = [np.array(ants, dtype=np.int32),
+        np.array(LINANTS, dtype=np.int32),
+        [np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)],
+        np.zeros(max(ants))]
+    PS = o.PGS.Solver()
+    PS.PolGainSolve(1.0, 1.e9, [1, 10], o.keepArrays[0], o.keepArrays[1],
+        o.keepArrays[2], 'PolGainSolve.log')
+    for IF,amp,sbd in CASES:
+        rv = PS.ReadData(IF, 'POLCONVERT.FRINGE/OTHERS.FRINGE_IF%i' % IF,
+            'POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i' % IF, 0.0)
+        if rv != 0:
+            raise Exception('ReadData failed for IF %i (%i)' % (IF, rv))
+    for nsi in range(PS.GetNScan(CASES[0][0])):
+        PS.DoGFF(ants[1:], -1, True, nsi, 5.0)
+    return PS
+
+#
+# The fits
+#
+
+def scipyFit(o, PS, p0, Ch0, Ch1):
+    '''
+    The fit of polconvert (GradMin) with the scipy method o.method.
+    '''
+    import scipy.optimize as spopt
+    def Chi2Grad(p):
+        grad = np.zeros(len(p))
+        Chi2 = PS.GetChi2Grad(np.array(p), Ch0, Ch1, False, grad, None)
+        return Chi2, grad
+    def Chi2Hess(p):
+        grad = np.zeros(len(p))
+        hess = np.zeros((len(p), len(p)))
+        PS.GetChi2Grad(np.array(p), Ch0, Ch1, False, grad, hess)
+        return hess
+    if o.method == 'Newton-CG':
+        mymin = spopt.minimize(Chi2Grad, p0, method=o.method, jac=True,
+            hess=Chi2Hess)
+    else:
+        mymin = spopt.minimize(Chi2Grad, p0, method=o.method, jac=True)
+    FLIP = PS.GetChi2(mymin.x, -1.0, Ch0, Ch1, 1, False) > 0.0
+    return mymin.x, FLIP
+
+def lmFit(o, PS, p0, Ch0, Ch1):
+    '''
+    The fit of polconvert (LMMin), with its default parameters.
+    '''
+    pars = np.array(p0, dtype=np.float64)
+    ret = PS.LMSolve(pars, Ch0, Ch1, False, 20*len(LINANTS), 1.e-5,
+        1.e-3, 5.0, 10.0)
+    if not isinstance(ret, tuple):
+        raise Exception('LMSolve failed (%s)' % str(ret))
+    return pars, ret[1], ret[2], ret[4]
+
+def gainDiff(p1, p2, amp, sbd):
+    '''
+    Largest difference between two sets of gains.  The phases are compared
+    modulo 2 pi and, with amplitudes, the complex gains are compared (a
+    negative amplitude with the phase shifted by pi is the same gain).
+    '''
+    nfit = len(LINANTS)
+    p1 = np.asarray(p1)
+    p2 = np.asarray(p2)
+    if amp:
+        g1 = p1[0:2*nfit:2]*np.exp(1.j*p1[1:2*nfit:2])
+        g2 = p2[0:2*nfit:2]*np.exp(1.j*p2[1:2*nfit:2])
+        diff = list(np.abs(g1 - g2))
+    else:
+        diff = list(np.abs(np.angle(np.exp(1.j*(p1[:nfit] - p2[:nfit])))))
+    if sbd:
+        diff += list(np.abs(p1[-nfit:] - p2[-nfit:]))
+    return np.max(diff)
+
+def checkFit(o, PS, label, amp, sbd, Ch0, Ch1, truth):
+    '''
+    Fits the gains with both methods (from unit gains) and compares them.
+    Returns 1 if they do not agree.
+    '''
+    nfit = len(LINANTS)
+    p0 = ([1.0, 0.0]*nfit if amp else [0.0]*nfit) + ([0.0]*nfit if sbd else [])
+    n0 = PS.GetChi2Count()
+    tic = time.time()
+    pS, flipS = scipyFit(o, PS, p0, Ch0, Ch1)
+    tS = time.time() - tic
+    nS = PS.GetChi2Count() - n0
+    chi2S = PS.GetChi2(pS, -1.0, Ch0, Ch1, 0, False)
+    n0 = PS.GetChi2Count()
+    tic = time.time()
+    pL, flipL, niter, conv = lmFit(o, PS, p0, Ch0, Ch1)
+    tL = time.time() - tic
+    nL = PS.GetChi2Count() - n0
+    chi2L = PS.GetChi2(pL, -1.0, Ch0, Ch1, 0, False)
+    dgain = gainDiff(pL, pS, amp, sbd)
+    dchi2 = abs(chi2L - chi2S)/max(abs(chi2S), 1.e-30)
+    dtrue = gainDiff(pL, truth, amp, sbd) if truth is not None else np.nan
+    bad = dgain > o.gaintol or dchi2 > o.chi2tol or flipL != flipS
+    print('%-16s Chi2 %.6e (LM) %.6e (%s) rel.diff %.1e | gains diff %.1e'
+        ' (%.1e from truth) | flip %s/%s | Chi2 calls %d/%d, %.3f/%.3f s%s' % (
+        label, chi2L, chi2S, o.method, dchi2, dgain, dtrue, flipL, flipS,
+        nL, nS, tL, tS, '' if conv else ' (LM not converged)'))
+    if bad: print('  ** LMSolve and %s do not agree!' % o.method)
+    if o.verb: print('  LM:    %s\n  %-6s %s' % (pL, o.method + ':', pS))
+    return 1 if bad else 0
+
+def quiet(o, func, *args):
+    '''
+    Calls func(*args) with the (C-level) stdout sent to /dev/null,
+    unless verbose: the solver prints a lot while loading the data.
+    '''
+    if o.verb: return func(*args)
+    sys.stdout.flush()
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    stdout = os.dup(1)
+    os.dup2(devnull, 1)
+    try:
+        return func(*args)
+    finally:
+        sys.stdout.flush()
+        os.dup2(stdout, 1)
+        os.close(stdout)
+        os.close(devnull)
+
+def check(o):
+    '''
+    Writes the synthetic problem and checks all fit modes.  The bandpass
+    modes are also checked per channel range, as polconvert fits them.
+    '''
+    cwd = os.getcwd()
+    wdir = tempfile.mkdtemp(prefix='checklmsolve_')
+    nbad = nfits = 0
+    try:
+        os.chdir(wdir)
+        truth = makeProblem(o, wdir)
+        PS = quiet(o, loadSolver, o)
+        for IF,amp,sbd in CASES:
+            nfit = len(LINANTS)
+            Npar = nfit*((2 if amp else 1) + (1 if sbd else 0))
+            PS.SetFit(Npar, [IF], LINANTS, amp, 0, [1., 0., 0., 0.], 1,
+                o.keepArrays[3], o.threads)
+            mode = ('amp' if amp else 'phase') + ('+SBD' if sbd else ' BP')
+            ranges = [(0, o.nchan)]
+            if not sbd:
+                step = o.nchan//4
+                ranges += [(c, c + step) for c in range(0, 4*step, step)]
+            for Ch0,Ch1 in ranges:
+                label = 'IF%i %s %i-%i' % (IF, mode, Ch0, Ch1 - 1)
+                nbad += checkFit(o, PS, label, amp, sbd, Ch0, Ch1, truth[IF])
+                nfits += 1
+        quiet(o, PS.FreeData)
+    finally:
+        os.chdir(cwd)
+        if o.keep: print('synthetic fringe files kept in ' + wdir)
+        else: shutil.rmtree(wdir)
+    print('\n%d fits out of %d disagree' % (nbad, nfits))
+    return nbad
+
+#
+# enter here to do the work
+#
+if __name__ == '__main__':
+    opts = parseOptions()
+    opts = checkOptions(opts)
+    if opts.status != 0:
+        sys.exit(opts.status)
+    sys.exit(check(opts))
+
+#
+# eof
+#
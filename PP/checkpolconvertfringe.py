@@ -129,14 +129,15 @@ def dtype0(fringedata,frfile,quiet):
     )
     return dtype,nchPlot
 
-def dtype1(fringedata,frfile,quiet):
+def dtype1(fringedata,frfile,quiet,nchPlot=None):
     '''
     The version with PANG? and UVDIST..DiFX 2.8.2 (after 2.0.4)
     '''
-    if not quiet: print('Reading',os.path.basename(fringedata),'...',end=' ')
-    alldats = frfile.read(5)
-    nchPlot,isParang = stk.unpack("i?", alldats)
-    if not quiet: print('with Parang?',isParang,'w/UVDIST')
+    if nchPlot is None:
+        if not quiet: print('Reading',os.path.basename(fringedata),'...',end=' ')
+        alldats = frfile.read(5)
+        nchPlot,isParang = stk.unpack("i?", alldats)
+        if not quiet: print('with Parang?',isParang,'w/UVDIST')
     dtype = np.dtype(
         [
             ("FILE", np.int32),
@@ -151,6 +152,42 @@ def dtype1(fringedata,frfile,quiet):
     )
     return dtype,nchPlot
 
+def fringe2(fringedata,quiet):
+    '''
+    The columnar version (see FringeFile.h), which is mapped in memory
+    rather than parsed.  The records are put together here as in the
+    version 1 files, for the rest of this script.
+    '''
+    if not quiet: print('Reading',os.path.basename(fringedata),'...',end=' ')
+    header = np.dtype([("MAGIC","S8"),("VERSION","<i4"),("NCOMP","<i4"),
+        ("NCHAN","<i4"),("NFREQ","<i4"),("PARANG","<i4"),("PAD","<i4"),
+        ("NVIS","<i8"),("VISOFFSET","<i8"),("METAOFFSET","<i8"),
+        ("RESERVED","<i8")])
+    head = np.fromfile(fringedata,dtype=header,count=1)[0]
+    nvis,nchPlot = int(head["NVIS"]),int(head["NCHAN"])
+    if not quiet: print('with Parang?',bool(head["PARANG"]),'(columnar)')
+    raw = np.memmap(fringedata,dtype=np.uint8,mode='r')
+    dtype = dtype1(fringedata,None,True,max(nchPlot,0))[0]
+    fringe = np.zeros(nvis,dtype=dtype)
+    meta = int(head["METAOFFSET"])
+    for i,key in enumerate(["JDT","PANG1","PANG2","UVDIST"]):
+        fringe[key] = np.ndarray((nvis,),dtype="<f8",buffer=raw,
+            offset=meta+8*i*nvis)
+    for i,key in enumerate(["ANT1","ANT2","FILE"]):
+        fringe[key] = np.ndarray((nvis,),dtype="<i4",buffer=raw,
+            offset=meta+32*nvis+4*i*nvis)
+    vis = np.ndarray((nvis,12,max(nchPlot,0)),dtype="<c8",buffer=raw,
+        offset=int(head["VISOFFSET"]))
+    fringe["MATRICES"] = vis.transpose(0,2,1).reshape((nvis,-1))
+    return fringe,nchPlot
+
+def isColumnar(fringedata):
+    '''
+    The columnar files start with a magic string.
+    '''
+    with open(fringedata,"rb") as frfile:
+        return frfile.read(8) == b"PCFRINGE"
+
 def deducePCvers(pcdir, verb):
     '''
     Look for VERSION and make a choice....
@@ -186,21 +223,25 @@ def examineFRINGE_IF(pli, o):
     fringedata = "%s/POLCONVERT.FRINGE/POLCONVERT.FRINGE_%s%i" % (
         o.dir,ifs,pli)
     o.thisIF = pli
-    frfile = open(fringedata,"rb")
+    if o.pcvers == '' and isColumnar(fringedata): o.pcvers = '2'
     if o.pcvers == '': o.pcvers = deducePCvers(o.dir, o.verb)
-    if o.pcvers == '0': dtype,nchPlot = dtype0(fringedata,frfile,o.quiet)
-    elif o.pcvers == '1': dtype,nchPlot = dtype1(fringedata,frfile,o.quiet)
-    else: raise Exception('Unsupported fringe version ' + o.pcvers)
+    if o.pcvers == '2':
+        fringe,nchPlot = fringe2(fringedata,o.quiet)
+    else:
+        frfile = open(fringedata,"rb")
+        if o.pcvers == '0': dtype,nchPlot = dtype0(fringedata,frfile,o.quiet)
+        elif o.pcvers == '1': dtype,nchPlot = dtype1(fringedata,frfile,o.quiet)
+        else: raise Exception('Unsupported fringe version ' + o.pcvers)
+        try:
+            fringe = np.fromfile(frfile,dtype=dtype)
+            frfile.close()
+        except Exception as ex:
+            raise Exception('Unable to read fringe',str(ex))
     o.nchPlot = int(nchPlot)
-    try:
-        fringe = np.fromfile(frfile,dtype=dtype)
-        frfile.close()
-    except Exception as ex:
-        raise Exception('Unable to read fringe',str(ex))
     if o.verb and not o.quiet: print(' ',os.path.basename(fringedata),
         'has ',len(fringe),'time-baseline samples and',o.nchPlot,'channels')
     x = len(fringe)-1
-    if o.pcvers == '1':
+    if o.pcvers in ['1', '2']:
         file0 = fringe[0]['FILE']
         fileX = fringe[x]['FILE']
     else:
@@ -214,7 +255,7 @@ def examineFRINGE_IF(pli, o):
     ant2set = set(list(fringe[:]["ANT2"]))
     if o.verb: print('  ANT1: ', ant1set, ', ANT2: ',ant2set)
     maxUVDIST = ''
-    if o.pcvers == '1' and o.verb and not o.quiet:
+    if o.pcvers in ['1', '2'] and o.verb and not o.quiet:
         maxUVDIST = (
             ' max UVDIST %f'%np.max(fringe[:]["UVDIST"]) + '(units unknown)')
         print('  PANG1: %.2f'%np.rad2deg(np.min(fringe[:]["PANG1"])),
@@ -677,9 +718,10 @@ def parseOptions():
         default='', help='Basename for any plot generated.  If no name'
         ' is supplied, one will be created for you based on the baseline.')
     minor.add_argument('-V', '--pcvers', dest='pcvers',
-        default='', help='Fringe file version: 1 = 2.0.5 and later'
-        ' (with UVDIST), 0 = 2.0.3 and earlier (without UVDIST); or "help"'
-        ' to print out a more complete explanation.')
+        default='', help='Fringe file version: 2 = columnar files,'
+        ' 1 = 2.0.5 and later (with UVDIST), 0 = 2.0.3 and earlier'
+        ' (without UVDIST); or "help" to print out a more complete'
+        ' explanation.')
     minor.add_argument('-s', '--scale', dest='scale',
         default='log10', help='One of "elog" (or "loge"),'
         ' "log10" (the default), "linear", "sqrt".  Use "help" '
@@ -714,7 +756,9 @@ def pcvershelp():
     The early versions had parallactic angles (not implemented)
     and as of 2.0.5 (targetted for DiFX 2.8.2), UVDIST was added.
     Use -V 0 for the earlier format and -V 1 for the later one.
-    The default is to examine the PolConvert.log and make a choice.
+    The current files are columnar (-V 2, see FringeFile.h) and
+    they are recognized by their header.  Otherwise, the default
+    is to examine the PolConvert.log and make a choice.
     '''
 def fringehelp():
     return '''
@@ -36,6 +36,20 @@ if not libdirs is None:
 # change if fitsio.h is found elsewhere:
 cfitsio='/usr/include/cfitsio'
 
+# an option to do all the Jones-matrix algebra of _PolConvert in double
+# precision (slower; useful as a reference, see PP/benchprecision.py).
+# it can also be set with the POLCONVERT_DOUBLE environment variable:
+DOUBLE_JONES = False
+if os.environ.get('POLCONVERT_DOUBLE','0') not in ['','0']:
+  DOUBLE_JONES = True
+
+if DOUBLE_JONES:
+  jonesFlags = ["-DPOLCONVERT_DOUBLE"]
+else:
+  jonesFlags = []
+print('# for PolConvert, Jones matrices in',
+  'double' if DOUBLE_JONES else 'single', 'precision')
+
 # an option to compile the global cross-polarization fringe fitting.
 DO_SOLVE = True
 
@@ -53,30 +67,31 @@ if DO_SOLVE:
   print('# for PolGainSolve, libraries is',pgsliblist)
 
 sourcefiles1 = ['CalTable.cpp', 'DataIO.cpp', 'DataIOFITS.cpp',
-                'DataIOSWIN.cpp', 'Weighter.cpp', '_PolConvert.cpp']
+                'DataIOSWIN.cpp', 'Weighter.cpp', 'FringeFile.cpp',
+                '_PolConvert.cpp']
 
 sourcefiles2 = ['_PolGainSolve.cpp']
 
 sourcefiles3 = ['_getAntInfo.cpp']
 
-sourcefiles4 = ['_XPCal.cpp']
+sourcefiles4 = ['_XPCal.cpp', 'PCalFile.cpp']
 
-sourcefiles5 = ['_XPCalMF.cpp']
+sourcefiles5 = ['_XPCalMF.cpp', 'PCalFile.cpp']
 
 c_ext1 = Extension("_PolConvert", sources=sourcefiles1,
-                  extra_compile_args=["-Wno-deprecated","-O3","-std=c++11"],
+                  extra_compile_args=["-Wno-deprecated","-O3","-std=c++11","-pthread"]+jonesFlags,
                   library_dirs=libdirs,
                   libraries=['cfitsio'],
                   include_dirs=[np.get_include()],
-                  extra_link_args=["-Xlinker", "-export-dynamic"])
+                  extra_link_args=["-Xlinker", "-export-dynamic","-pthread"])
 
 if DO_SOLVE:
   c_ext2 = Extension("_PolGainSolve", sources=sourcefiles2,
                   library_dirs=libdirs,
                   libraries=pgsliblist,
                   include_dirs=[np.get_include()],
-                  extra_compile_args=["-Wno-deprecated","-O3","-std=c++11"],
-                  extra_link_args=["-Xlinker", "-export-dynamic"])
+                  extra_compile_args=["-Wno-deprecated","-O3","-std=c++11","-pthread"],
+                  extra_link_args=["-Xlinker", "-export-dynamic","-pthread"])
 
 c_ext3 = Extension("_getAntInfo", sources=sourcefiles3,
                   extra_compile_args=["-Wno-deprecated","-O3","-std=c++11"],
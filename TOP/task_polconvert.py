@@ -93,6 +93,35 @@ else:
 NEWPCSO = False   # 2.7.2 and later...
 NEWPCSO = True    # 2.7.1 and earlier...
 
+# Header of the (columnar) POLCONVERT.FRINGE files. See FringeFile.h:
+FringeHeader = np.dtype([("MAGIC","S8"),("VERSION","<i4"),("NCOMP","<i4"),
+    ("NCHAN","<i4"),("NFREQ","<i4"),("PARANG","<i4"),("PAD","<i4"),
+    ("NVIS","<i8"),("VISOFFSET","<i8"),("METAOFFSET","<i8"),("RESERVED","<i8")])
+
+def readFringe(fname):
+  """ Maps a POLCONVERT.FRINGE file in memory. Returns a dictionary with
+  the header entries and numpy views of the columns (VIS has the shape
+  (nvis, ncomp, nchan))."""
+  head = np.fromfile(fname, dtype=FringeHeader, count=1)
+  if len(head) == 0 or head[0]["MAGIC"] != b"PCFRINGE":
+    raise Exception("%s is not a (columnar) fringe file" % fname)
+  head = head[0]
+  nvis = int(head["NVIS"]); ncomp = int(head["NCOMP"])
+  nchan = max(int(head["NCHAN"]), 0)
+  raw = np.memmap(fname, dtype=np.uint8, mode="r")
+  def column(offset, dtype, shape):
+    return np.ndarray(shape, dtype=dtype, buffer=raw, offset=offset)
+  meta = int(head["METAOFFSET"])
+  fringe = {"NCHAN": int(head["NCHAN"]), "PARANG": bool(head["PARANG"]),
+    "NVIS": nvis,
+    "FREQS": column(FringeHeader.itemsize, "<f8", (int(head["NFREQ"]),)),
+    "VIS": column(int(head["VISOFFSET"]), "<c8", (nvis, ncomp, nchan))}
+  for i,key in enumerate(["JDT","PANG1","PANG2","UVDIST"]):
+    fringe[key] = column(meta + 8*i*nvis, "<f8", (nvis,))
+  for i,key in enumerate(["ANT1","ANT2","FILE"]):
+    fringe[key] = column(meta + 32*nvis + 4*i*nvis, "<i4", (nvis,))
+  return fringe
+
 # this is the CASA xml-based command sequence
 def polconvert(IDI, OUTPUTIDI, DiFXinput, DiFXcalc, doIF, linAntIdx,
   Range, ALMAant, spw, calAPP, calAPPTime, APPrefant, gains,
@@ -2521,7 +2550,7 @@ def polconvert(IDI, OUTPUTIDI, DiFXinput, DiFXcalc, doIF, linAntIdx,
 # Filter out IFs with no data:
    GoodIFs = []
    for pli in plotIF:
-     if os.stat("POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i"%pli).st_size>10:
+     if os.stat("POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i"%pli).st_size>FringeHeader.itemsize:
        GoodIFs.append(pli)
      else:
        printMsg(("WARNING! IF %i was NOT polconverted properly\n"%pli) +
@@ -2532,46 +2561,11 @@ def polconvert(IDI, OUTPUTIDI, DiFXinput, DiFXcalc, doIF, linAntIdx,
     print('\n\n')
     printMsg("Plotting selected fringe for IF #%i"%pli)
 
-    frfile = open("POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i"%pli,"rb")
-
-### header format changed with addition of "FILE" for difxdfile iteration
-#
-#    alldats = frfile.read(4)
-#    nchPlot = stk.unpack("i",alldats[:4])[0]
-#    dtype = np.dtype([("FILE",np.int32),
-#                      ("JDT",np.float64),("ANT1",np.int32),("ANT2",np.int32),
-#                      ("PANG1",np.float64),("PANG2",np.float64),
-#                      ("MATRICES",np.complex64,12*nchPlot)])
-### and again with UVDIST getting added in 2.0.4-ivan
-
-#   frfile = open("POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i"%pli,"rb")
-
-    alldats = frfile.read(5)
-    #   isParang is a 1-byte bool
-    nchPlot, isParang = stk.unpack("i?", alldats)
-    dtype = np.dtype(
-        [
-            ("FILE", np.int32),
-            ("JDT", np.float64),
-            ("ANT1", np.int32),
-            ("ANT2", np.int32),
-            ("PANG1", np.float64),
-            ("PANG2", np.float64),
-            ("UVDIST", np.float64),
-            ("MATRICES", np.complex64, 12 * nchPlot),
-        ]
-    )
-
-# There is a silly bug in Python 2.7, which generates
-# an "integer is required" error in the first try to read:
-    try:
-      fringe = np.fromfile(frfile,dtype=dtype)
-      printMsg("Read fringe data from file POLCONVERT.FRINGE_IF%i"%pli)
-    except:
-      fringe = np.fromfile(frfile,dtype=dtype)
-      printMsg("Exceptional Read of fringe data POLCONVERT.FRINGE_IF%i"%pli)
-      printMsg("len(fringe) = %d" % len(fringe))
-    frfile.close()
+### The file has the columnar format of FringeFile.h (see readFringe)
+### and it is mapped in memory:
+    fringe = readFringe("POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i"%pli)
+    nchPlot = fringe["NCHAN"]
+    printMsg("Read fringe data from file POLCONVERT.FRINGE_IF%i"%pli)
 
 
     # start of for ant1 in linAntIdx
@@ -2587,12 +2581,12 @@ def polconvert(IDI, OUTPUTIDI, DiFXinput, DiFXcalc, doIF, linAntIdx,
      for ant2 in [plotAnt]:
 
       AntEntry1 = np.logical_and(
-        fringe[:]["ANT1"] == ant1,fringe[:]["ANT2"] == ant2)
+        fringe["ANT1"] == ant1,fringe["ANT2"] == ant2)
       AntEntry2 = np.logical_and(
-        fringe[:]["ANT2"] == ant1,fringe[:]["ANT1"] == ant2)
+        fringe["ANT2"] == ant1,fringe["ANT1"] == ant2)
       ### all the SWIN files (difxdfile) go to the same place
       ### to only plot the first one, AntEntry changes to
-      ### np.logical_and(fringe[:]["FILE"]==0,
+      ### np.logical_and(fringe["FILE"]==0,
       ###        np.logical_or(AntEntry1,AntEntry2))
       AntEntry = np.logical_or(AntEntry1,AntEntry2)
       printMsg("np.sum(AntEntry) > 0: '" + str(np.sum(AntEntry)) + "'")
@@ -2605,11 +2599,11 @@ def polconvert(IDI, OUTPUTIDI, DiFXinput, DiFXcalc, doIF, linAntIdx,
         MixedCalib[ant1][ant2] = []
 
 # This is to store all fringes with linear-feeds involved:
-       # if len(fringe)>0
-       if nchPlot > 0 and len(fringe)>0:
-         uncal = [(fringe[AntEntry]["MATRICES"])[:,i::12] for i in range(4)]
-         cal = [(fringe[AntEntry]["MATRICES"])[:,i::12] for i in range(4,8)]
-         Kmat = [(fringe[AntEntry]["MATRICES"])[:,i::12] for i in range(8,12)]
+       # if fringe["NVIS"]>0
+       if nchPlot > 0 and fringe["NVIS"]>0:
+         uncal = [fringe["VIS"][AntEntry,i,:] for i in range(4)]
+         cal = [fringe["VIS"][AntEntry,i,:] for i in range(4,8)]
+         Kmat = [fringe["VIS"][AntEntry,i,:] for i in range(8,12)]
          rchan = np.shape(uncal[0])[0] 
 
 # Zoom for the image plots: a square centered on nchPlot and rchan:
@@ -2859,7 +2853,7 @@ def polconvert(IDI, OUTPUTIDI, DiFXinput, DiFXcalc, doIF, linAntIdx,
             MAXl[3]/MAX,DLL,
             MAXl[1]/MAX,DRL,
             MAXl[2]/MAX,DLR,
-            MAX/len(fringe),RLRatio]
+            MAX/fringe["NVIS"],RLRatio]
           fringeAmps[ant1].append([pli,MAXl[0],MAXl[0]/DRR,
             MAXl[3],MAXl[3]/DLL,MAXl[1],MAXl[1]/DRL,MAXl[2],MAXl[2]/DLR,
             RLRatio])
@@ -2897,7 +2891,7 @@ def polconvert(IDI, OUTPUTIDI, DiFXinput, DiFXcalc, doIF, linAntIdx,
           pfile.write(pmsg)
           printMsg("wrote FRINGE.PEAKS%i-ANT%i.dat"%(pli,ant1))
          # end of if for this baseline to be plotted
-       # end of if len(fringe)>0
+       # end of if fringe["NVIS"]>0
        else:
           printMsg("Fringe length was zero")
 
@@ -28,9 +28,94 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 #include <fstream>
 #include <cstring>
 #include <complex.h>
+#include <algorithm>
+#include <utility>
 #include "./Weighter.h"
 
 
+
+/* Sorts the intervals by their start. MaxEnd keeps the running maximum of
+   the ends, so that a lookup can stop as soon as no earlier interval
+   reaches the time. Works also for overlapping and unsorted intervals. */
+void IntervalIndex::set(long n, const double *t0, const double *t1, int stride){
+
+  long i;
+  std::vector<std::pair<double,long> > order(n>0?n:0);
+
+// Sorted by start (and by original index, for equal starts):
+  for (i=0; i<n; i++){order[i] = std::make_pair(t0[i*stride],i);};
+  std::sort(order.begin(),order.end());
+
+  Start.resize(order.size()); End.resize(order.size());
+  MaxEnd.resize(order.size()); Index.resize(order.size());
+
+  for (i=0; i<(long)order.size(); i++){
+    Index[i] = order[i].second;
+    Start[i] = order[i].first;
+    End[i] = t1[Index[i]*stride];
+    MaxEnd[i] = (i==0 || End[i]>MaxEnd[i-1])?End[i]:MaxEnd[i-1];
+  };
+
+// With no overlaps, the cached hit is the only interval that contains t:
+  Disjoint = true;
+  for (i=1; i<(long)Start.size(); i++){if (Start[i]<=MaxEnd[i-1]){Disjoint = false;};};
+
+  Hit = -1; Gap = -1;
+
+};
+
+
+// Number of intervals that start at (or before) t:
+long IntervalIndex::upper(double t){
+  return std::upper_bound(Start.begin(),Start.end(),t) - Start.begin();
+};
+
+
+// Whether t falls in the cached gap (after all intervals Gap-1 and before Gap):
+bool IntervalIndex::inGap(double t){
+  return Gap>=0 && (Gap==0 || t>MaxEnd[Gap-1]) && (Gap==(long)Start.size() || t<Start[Gap]);
+};
+
+
+long IntervalIndex::find(double t){
+
+  long i, u, best = -1;
+
+  if (Disjoint && Hit>=0 && Start[Hit]<=t && End[Hit]>=t){return Index[Hit];};
+  if (inGap(t)){return -1;};
+
+  u = upper(t);
+  for (i=u-1; i>=0 && MaxEnd[i]>=t; i--){
+    if (End[i]>=t && (best<0 || Index[i]<best)){best = Index[i]; Hit = i;};
+  };
+
+  if (i==u-1){Gap = u;};
+
+  return best;
+};
+
+
+bool IntervalIndex::contains(double t){
+
+  long i, u;
+
+  if (Hit>=0 && Start[Hit]<=t && End[Hit]>=t){return true;};
+  if (inGap(t)){return false;};
+
+  u = upper(t);
+  for (i=u-1; i>=0 && MaxEnd[i]>=t; i--){
+    if (End[i]>=t){Hit = i; return true;};
+  };
+
+  if (i==u-1){Gap = u;};
+
+  return false;
+};
+
+
+
+
+
 Weighter::~Weighter(){};
 
 
@@ -46,18 +131,27 @@ Weighter::Weighter(int nPhase, long *nASDMtimes, long nASDMentries, int *ASDMant
  logFile = logF;
 
  nants = nPhase;
- nASDMEntries = nASDMentries; 
- ntimes = nASDMtimes; 
- ants = ASDMant; 
- JDtimes = ASDMtimes;
  refAnts = refants;
- Time0 = time0;
- Time1 = time1;
  currTime = 0.0;
  currRefAnt = 0;
  badTimes = BadTimes;
  NbadTimes = NBadTimes;
 
+ int j, maxAnt = -1;
+
+// Antenna index -> slot map (the first slot is used for repeated antennas):
+ for (j=0; j<nants; j++){if (ASDMant[j]>maxAnt){maxAnt = ASDMant[j];};};
+ antSlot.assign(maxAnt+1,-1);
+ for (j=nants-1; j>=0; j--){if (ASDMant[j]>=0){antSlot[ASDMant[j]] = j;};};
+
+ antTimes.resize(nants);
+ for (j=0; j<nants; j++){
+   antTimes[j].set(nASDMtimes[j],&ASDMtimes[j][0],&ASDMtimes[j][1],2);
+ };
+
+ entryTimes.set(nASDMentries,time0,time1,1);
+ if (NbadTimes>0){badRanges.set(NbadTimes,&BadTimes[0],&BadTimes[1],2);};
+
 };
 
 
@@ -69,12 +163,11 @@ bool Weighter::isPhased(double JDTime){
 
   if(nants<0){return Phased;};
 
-  for (i=0; i<NbadTimes; i++){
-    if(JDTime>=badTimes[2*i] && JDTime<=badTimes[2*i+1]){
+  i = (NbadTimes>0)?badRanges.find(JDTime):-1;
+  if (i>=0){
       sprintf(message,"Bad time %i: %.8f |  %.8f %.8f!\n",i,JDTime,badTimes[2*i],badTimes[2*i+1]);
       fprintf(logFile,"%s",message);  std::cout<<message; fflush(logFile);
-      Phased=false;break;
-    };
+      Phased=false;
   };
 
   return Phased;
@@ -85,24 +178,15 @@ bool Weighter::isPhased(double JDTime){
 /* Returns whether the antenna is in the phased sum (true) or not (false) */
 bool Weighter::getWeight(int iant, double JDtime){
 
-  long i;
   int j;
 
   bool inside;
   inside=true;
   if(nants<0){return inside;};
 
-  for (j=0; j<nants; j++){
-    if (ants[j] == iant){break;};
-  };
-
-  inside = false;
+  j = (iant>=0 && iant<(int)antSlot.size())?antSlot[iant]:-1;
 
-  if(j<nants){
-    for (i=0; i<ntimes[j]; i++){
-      if (JDtimes[j][2*i]<=JDtime && JDtimes[j][2*i+1]>=JDtime){inside = true; break;};   
-    };
-  };
+  inside = (j>=0) && antTimes[j].contains(JDtime);
 
 //  if(!inside){
 //    sprintf(message,"T: %.5f ; ANT: %i ; %i\n",JDtime,iant,inside);
@@ -125,11 +209,10 @@ int Weighter::getRefAnt(double JDtime){
 
   if (JDtime == currTime){return currRefAnt;};
 
-  for (i=0; i<nASDMEntries; i++){
-    if (Time0[i]<=JDtime && Time1[i]>=JDtime){
-      currTime = JDtime; currRefAnt = refAnts[i];
-      return currRefAnt;
-    };   
+  i = entryTimes.find(JDtime);
+  if (i>=0){
+    currTime = JDtime; currRefAnt = refAnts[i];
+    return currRefAnt;
   };
 
 // If no refant is found, no X-Y offset will be applied:
@@ -24,6 +24,28 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 
 #include <sys/types.h>
 #include <iostream>
+#include <vector>
+
+
+/* Sorted set of time intervals [t0,t1], for fast lookups. find() returns the
+   (smallest) original index of an interval that contains a time, or -1.
+   The last hit (and the last gap between intervals) is cached, so that
+   sequential times in the same range skip the bisection. */
+class IntervalIndex {
+  public:
+    IntervalIndex(): Disjoint(true), Hit(-1), Gap(-1) {};
+    void set(long n, const double *t0, const double *t1, int stride);
+    long find(double t);
+    bool contains(double t);
+
+  private:
+    std::vector<double> Start, End, MaxEnd;
+    std::vector<long> Index;
+    bool Disjoint;
+    long Hit, Gap;
+    long upper(double t);
+    bool inGap(double t);
+};
 
 
 /* Class to determine whether an ALMA antenna was added to the phased signal and to return the Reference Antenna at any time */
@@ -42,15 +64,17 @@ class Weighter {
     FILE *logFile;
     char message[512];
     int nants;
-    long *ntimes, nASDMEntries; 
-    int *ants; 
     int *refAnts;
     int currRefAnt;
     double currTime;
-    double **JDtimes;
-    double *Time0;
-    double *Time1;
     double *badTimes;
     int NbadTimes;
+
+// Slot (in the ASDM antenna list) of each antenna index (-1 if not there):
+    std::vector<int> antSlot;
+// Phased time ranges of each antenna, ASDM entries and bad times:
+    std::vector<IntervalIndex> antTimes;
+    IntervalIndex entryTimes;
+    IntervalIndex badRanges;
 };
 
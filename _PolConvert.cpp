@@ -89,6 +89,13 @@
 #include "./CalTable.h"
 #include "./Weighter.h"
 #include <sstream> 
+#include <string>
+#include <vector>
+#include <thread>
+#include <atomic>
+#include <mutex>
+#include <unordered_map>
+#include <stdint.h>
 
 
 
@@ -209,17 +216,919 @@ static PyObject *setPCMode(PyObject *self, PyObject *args){
 
 
 
+//////////////////////////////////
+// GET THE DATA OF A NUMPY ARRAY WITHOUT COPYING IT (THROUGH THE BUFFER PROTOCOL).
+// The array is referenced (and its buffer exported) until releaseBuffers is called.
+// Arrays that are not C-contiguous (or not of type npType) are converted first,
+// and the converted copy is kept instead. Returns nullptr on error:
+static void *getBuffer(PyObject *obj, int npType, std::vector<Py_buffer*> *views){
+
+  Py_buffer *view = new Py_buffer;
+  PyObject *contig;
+  const char *fmt;
+  const char *npFmt = (npType==NPY_BOOL)?"?":"d";
+
+  if (PyObject_GetBuffer(obj, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) == 0){
+    fmt = view->format;
+    if (fmt[0]=='@' || fmt[0]=='='){fmt++;};
+#if PY_LITTLE_ENDIAN
+    if (fmt[0]=='<'){fmt++;};
+#endif
+    if (strcmp(fmt,npFmt)==0){
+      views->push_back(view);
+      return view->buf;
+    };
+    PyBuffer_Release(view);
+  } else {
+    PyErr_Clear();
+  };
+
+  PyObject *numpy = PyImport_ImportModule("numpy");
+  contig = nullptr;
+  if (numpy != NULL){
+    contig = PyObject_CallMethod(numpy, "ascontiguousarray", "Os", obj, (npType==NPY_BOOL)?"bool":"float64");
+    Py_DECREF(numpy);
+  };
+  if (contig == NULL || PyObject_GetBuffer(contig, view, PyBUF_C_CONTIGUOUS) != 0){
+    Py_XDECREF(contig);
+    delete view;
+    return nullptr;
+  };
+
+// The exported buffer keeps its own reference to the converted array:
+  Py_DECREF(contig);
+  views->push_back(view);
+  return view->buf;
+
+};
+
+
+static void releaseBuffers(std::vector<Py_buffer*> *views){
+
+  size_t i;
+  for (i=0; i<views->size(); i++){
+    PyBuffer_Release((*views)[i]);
+    delete (*views)[i];
+  };
+  views->clear();
+
+};
+
+
+
+
+
+//////////////////////////////////
+// SETUP SHARED BY ALL THE IF CONVERSIONS (READ-ONLY DURING THE LOOP OVER IFs):
+typedef struct {
+  int nALMA, nnu, maxnchan, nIFplot, calField;
+  int *almanums, *nsumArr, *ngainTabs, *nchans, *IFs2Conv, *IFs2Plot;
+  bool *XYSWAP;
+  bool doNorm, doTest, verbose;
+  std::complex<float> ****PrioriGains;
+  double *doRange, *plRange;
+  FringeWriter **plotFile;
+  FILE *logFile;
+} ConversionSetup;
+
+
+// CACHE OF THE CONVERSION MATRICES OF THE NON-ALMA MODE (PCMode=0).
+// These do not depend on time: only on the a-priori X/Y gains of the 
+// antenna and IF (i.e., XYadd, XYdel, XYratio and the solveAmp results) 
+// and on XYSWAP. They are computed once for each different set of gains 
+// and kept across calls to PolConvert (e.g., for the scans of a job that 
+// share the same calibration). Entries are looked up by a hash of the 
+// gains, which are then compared, so a collision only costs a recomputation:
+typedef struct {
+  bool swap;
+  long nchan;
+  cplx32f *gains;
+  cplxJones *K[2][2];
+} FrozenMatrix;
+
+static std::unordered_map<uint64_t, FrozenMatrix*> FrozenCache;
+static std::mutex FrozenMutex;
+static const size_t MaxFrozenCache = 4096;
+
+
+static uint64_t hashGains(cplx32f *gains, long nchan, bool swap){
+  uint64_t hash = 14695981039346656037ULL;
+  const unsigned char *bytes = (const unsigned char *) gains;
+  size_t i, nbytes = nchan*sizeof(cplx32f);
+  for (i=0; i<nbytes; i++){hash = (hash ^ bytes[i])*1099511628211ULL;};
+  hash = (hash ^ ((uint64_t) swap))*1099511628211ULL;
+  return hash;
+};
+
+
+static void freeFrozen(FrozenMatrix *F){
+  int i, j;
+  for (i=0; i<2; i++){
+    for (j=0; j<2; j++){delete[] F->K[i][j];};
+  };
+  delete[] F->gains;
+  delete F;
+};
+
+
+// Writes into K the conversion matrix for the a-priori gains (computing it, if needed):
+static void getFrozenMatrix(cplxJones *gainRatio, long nchan, bool swap, cplxJones *K[2][2]){
+
+  static const cplxJones oneOverSqrt2 = 0.7071067811;
+  static const cplxJones Im = cplxJones(0.,1.);
+
+  long j;
+  int ij, ik;
+  realJones AntTab;
+  cplxJones H[2][2];
+
+  if (swap){
+    H[0][0] = Im; H[0][1] = 1.;
+    H[1][0] = -Im; H[1][1] = 1.;
+  } else {
+    H[0][0] = 1.; H[0][1] = Im;
+    H[1][0] = 1.; H[1][1] = -Im;
+  };
+
+  cplx32f *gains = new cplx32f[nchan];
+  for (j=0; j<nchan; j++){gains[j] = (cplx32f) gainRatio[j];};
+  uint64_t key = hashGains(gains, nchan, swap);
+
+  std::lock_guard<std::mutex> lock(FrozenMutex);
+
+  std::unordered_map<uint64_t, FrozenMatrix*>::iterator it = FrozenCache.find(key);
+  FrozenMatrix *F = NULL;
+  if (it != FrozenCache.end() && it->second->swap == swap && it->second->nchan == nchan &&
+      memcmp(it->second->gains, gains, nchan*sizeof(cplx32f)) == 0){
+    F = it->second;
+    delete[] gains;
+  };
+
+  if (F == NULL){
+
+    F = new FrozenMatrix;
+    F->swap = swap; F->nchan = nchan; F->gains = gains;
+    for (ij=0; ij<2; ij++){
+      for (ik=0; ik<2; ik++){F->K[ij][ik] = new cplxJones[nchan];};
+    };
+
+    for (j=0; j<nchan; j++) {
+      F->K[0][0][j] = H[0][0]*oneOverSqrt2;
+      F->K[0][1][j] = H[0][1]*oneOverSqrt2/gainRatio[j];
+      F->K[1][0][j] = H[1][0]*oneOverSqrt2;
+      F->K[1][1][j] = H[1][1]*oneOverSqrt2/gainRatio[j];
+
+// Correct for amplitude ratios (put amplitudes back):
+      AntTab = 1./std::abs(F->K[0][0][j]*F->K[1][1][j] - F->K[0][1][j]*F->K[1][0][j]);
+      F->K[0][0][j] *= AntTab;
+      F->K[0][1][j] *= AntTab;
+      F->K[1][0][j] *= AntTab;
+      F->K[1][1][j] *= AntTab;
+    };
+
+    if (it != FrozenCache.end()){
+      freeFrozen(it->second); FrozenCache.erase(it);
+    } else if (FrozenCache.size() >= MaxFrozenCache){
+      for (it=FrozenCache.begin(); it!=FrozenCache.end(); it++){freeFrozen(it->second);};
+      FrozenCache.clear();
+    };
+    FrozenCache[key] = F;
+  };
+
+  for (ij=0; ij<2; ij++){
+    for (ik=0; ik<2; ik++){
+      memcpy(K[ij][ik], F->K[ij][ik], nchan*sizeof(cplxJones));
+    };
+  };
+
+};
+
+
+
+// WORKSPACE OF ONE IF CONVERSION. Each thread owns one of these (i.e., 
+// its own data cursor, calibration interpolators and Jones matrices):
+typedef struct {
+  DataIO *DifXData;
+  CalTable ***allgains;
+  CalTable **alldterms;
+  Weighter *ALMAWeight;
+  cplxJones ****AnG, ****AnDt;
+  bool **Weight;
+  cplxJones **(*K)[2][2];
+  cplxJones **(*Kfrozen)[2][2];
+  cplxJones *(*Ktotal)[2][2];
+  cplxJones *gainRatio;
+  cplx32f *Kvis[2][2];
+  int *frozenFile; // File whose (non-ALMA) matrices are in Ktotal (-1 if none).
+  double *DifXFreqs;
+  double lastTFailed;
+} IFWorker;
+
+
+
+// Allocate the Jones-matrix scratch space of a worker:
+static void allocWorker(ConversionSetup *S, IFWorker *W){
+
+  int ii, ij, ik, il, auxI;
+  int maxnchan = S->maxnchan;
+
+  W->AnG = new cplxJones ***[S->nALMA];
+  W->AnDt = new cplxJones ***[S->nALMA];
+  W->Weight = new bool *[S->nALMA];
+  W->frozenFile = new int[S->nALMA];
+  W->K = new cplxJones **[S->nALMA][2][2];
+  W->Kfrozen = new cplxJones **[S->nALMA][2][2];
+  W->Ktotal = new cplxJones *[S->nALMA][2][2];
+  W->gainRatio = new cplxJones[maxnchan];
+  for (ii=0; ii<2; ii++) {
+    for (ik=0; ik<2; ik++) {
+      W->Kvis[ii][ik] = new cplx32f[maxnchan];
+    };
+  };
+  W->DifXFreqs = new double[maxnchan];
+  W->lastTFailed = 0.0;
+
+  for (ij=0; ij<S->nALMA; ij++) {
+    auxI = S->nsumArr[ij];
+
+    W->AnG[ij] =  new cplxJones **[auxI];
+    W->AnDt[ij] =  new cplxJones **[auxI];
+    W->Weight[ij] =  new bool [auxI];
+
+    for (ii=0; ii<auxI; ii++) {
+      W->AnG[ij][ii] =  new cplxJones *[2];
+      W->AnG[ij][ii][0] = new cplxJones[maxnchan];
+      W->AnG[ij][ii][1] = new cplxJones[maxnchan];
+      W->AnDt[ij][ii] =  new cplxJones *[2];
+      W->AnDt[ij][ii][0] = new cplxJones[maxnchan];
+      W->AnDt[ij][ii][1] = new cplxJones[maxnchan];
+    };
+
+// K matrix:
+    for (ii=0; ii<2; ii++) {
+      for (ik=0; ik<2; ik++) {
+        W->K[ij][ii][ik] =  new cplxJones *[auxI];
+        W->Kfrozen[ij][ii][ik] =  new cplxJones *[auxI];
+        W->Ktotal[ij][ii][ik] = new cplxJones[maxnchan];
+  
+        for (il=0; il<auxI; il++) {
+          W->K[ij][ii][ik][il] =  new cplxJones[maxnchan];
+          W->Kfrozen[ij][ii][ik][il] =  new cplxJones[maxnchan];
+       };
+      };
+    };
+
+  };
+
+};
+
+
+
+static void freeWorker(ConversionSetup *S, IFWorker *W){
+
+  int ii, ij, ik, il, auxI;
+
+  for (ij=0; ij<S->nALMA; ij++) {
+    auxI = S->nsumArr[ij];
+    for (ii=0; ii<auxI; ii++) {
+      delete[] W->AnG[ij][ii][0];
+      delete[] W->AnG[ij][ii][1];
+      delete[] W->AnDt[ij][ii][0];
+      delete[] W->AnDt[ij][ii][1];
+      delete[] W->AnG[ij][ii];
+      delete[] W->AnDt[ij][ii];
+    };
+    delete[] W->AnG[ij];
+    delete[] W->AnDt[ij];
+    delete[] W->Weight[ij];
+
+    for (ii=0; ii<2; ii++) {
+      for (ik=0; ik<2; ik++) {
+        for (il=0; il<auxI; il++) {
+          delete[] W->K[ij][ii][ik][il];
+          delete[] W->Kfrozen[ij][ii][ik][il];
+        };
+        delete[] W->K[ij][ii][ik];
+        delete[] W->Kfrozen[ij][ii][ik];
+        delete[] W->Ktotal[ij][ii][ik];
+      };
+    };
+  };
+
+  delete[] W->AnG;
+  delete[] W->AnDt;
+  delete[] W->Weight;
+  delete[] W->frozenFile;
+  delete[] W->K;
+  delete[] W->Kfrozen;
+  delete[] W->Ktotal;
+  delete[] W->gainRatio;
+  for (ii=0; ii<2; ii++) {
+    for (ik=0; ik<2; ik++) {
+      delete[] W->Kvis[ii][ik];
+    };
+  };
+  delete[] W->DifXFreqs;
+
+};
+
+
+
+
+//////////////////////////////////
+// CONVERT ONE IF (the im-th element of IFs2Conv).
+// The lines for the POLCONVERT.GAINS file are appended to gainsText
+// (the caller writes them in IF order, so the file does not depend
+// on how many threads are used). Returns 0 on success and -1 on error.
+static int convertIF(ConversionSetup *S, IFWorker *W, int im, std::string *gainsText)
+{
+
+  static const cplxJones oneOverSqrt2 = 0.7071067811;
+  static const cplxJones Im = cplxJones(0.,1.);
+
+  long j;
+  int ii, ij, ik, il;
+  int currFile;
+  char message[2048];
+  char gainsLine[256];
+
+// Shared setup:
+  int nALMA = S->nALMA, nnu = S->nnu, nIFplot = S->nIFplot, calField = S->calField;
+  int *almanums = S->almanums, *nsumArr = S->nsumArr, *ngainTabs = S->ngainTabs;
+  int *nchans = S->nchans, *IFs2Conv = S->IFs2Conv, *IFs2Plot = S->IFs2Plot;
+  bool *XYSWAP = S->XYSWAP;
+  bool doNorm = S->doNorm, doTest = S->doTest, verbose = S->verbose;
+  std::complex<float> ****PrioriGains = S->PrioriGains;
+  double *doRange = S->doRange, *plRange = S->plRange;
+  FringeWriter **plotFile = S->plotFile;
+  FILE *logFile = S->logFile;
+
+// Workspace of this thread:
+  DataIO *DifXData = W->DifXData;
+  CalTable ***allgains = W->allgains;
+  CalTable **alldterms = W->alldterms;
+  Weighter *ALMAWeight = W->ALMAWeight;
+  cplxJones ****AnG = W->AnG, ****AnDt = W->AnDt;
+  bool **Weight = W->Weight;
+  cplxJones **(*K)[2][2] = W->K;
+  cplxJones **(*Kfrozen)[2][2] = W->Kfrozen;
+  cplxJones *(*Ktotal)[2][2] = W->Ktotal;
+  cplxJones *gainRatio = W->gainRatio;
+  int *frozenFile = W->frozenFile;
+  double *DifXFreqs = W->DifXFreqs;
+  double &lastTFailed = W->lastTFailed;
+
+  int ALMARefAnt = -1; // If no calAPP is used, do not look for any extra X-Y phase offset.
+
+// Some extra auxiliary variables:
+
+  double currT;
+  int currAnt, currAntIdx = 0, currNant, otherAnt,currF; 
+  bool notinlist, gchanged=true, dtchanged=true, toconj;
+
+  long countNvis;
+
+  cplxJones AD, BC, auxD;
+  auxD = 0.0;
+  realJones NormFac[2];
+  realJones AntTab;
+  cplxJones DetInv;
+  cplxJones Kinv[2][2];
+  cplxJones H[2][2]; 
+  cplxJones HSw[2][2]; 
+
+  H[0][0] = 1.; H[0][1] = Im;
+  H[1][0] = 1.; H[1][1] = -Im;
+
+  HSw[0][0] = Im; HSw[0][1] = 1.;
+  HSw[1][0] = -Im; HSw[1][1] = 1.;
+
+
+  cplxJones gainXY[2]; 
+
+  bool allflagged, auxB1, auxB2, Phased ;
+  ii = IFs2Conv[im];
+  int IFplot = -1;    // flags the no-plot case of ALMA mode
+  char pltmsg[20];
+
+
+  for (ij=0; ij<nIFplot; ij++){
+    if (IFs2Plot[ij]==ii){IFplot=ij; break;};
+  };
+  if (PCMode && IFplot < 0) { sprintf(pltmsg, "not plotted"); }
+  else if (PCMode)          { sprintf(pltmsg, "fringe plot"); }
+  else                      { sprintf(pltmsg, "for solving"); };
+
+  sprintf(message,"\nDoing subband %i of %i (%s)\n",ii+1,nnu,pltmsg);
+  fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+  fflush(logFile);
+  //useful in development, not in production:
+  //printf("\rDoing subband %i of %i   ",ii+1,nnu);
+  //fflush(stdout);
+
+
+
+// Only proceed if IF is OK:
+  if(!DifXData->setCurrentIF(ii)){
+    sprintf(message,
+        "WARNING! DATA DO NOT HAVE SUCH AN IF!! WILL SKIP CONVERSION\n");  
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);} 
+  else {    // IF is OK: the check of IF.
+
+
+// Get the frequencies of the current IF:
+    DifXData->getFrequencies(DifXFreqs);
+
+    for (ij=0; ij<nALMA; ij++) {frozenFile[ij] = -1;};
+
+// Set the VLBI <-> ALMA frequency mapping for the interpolation:
+    for (ij=0; ij<nALMA; ij++) {
+      alldterms[ij]->setMapping(nchans[ii],DifXFreqs);
+      for (ik=0; ik<ngainTabs[ij]; ik++){
+        allgains[ij][ik]->setMapping(nchans[ii],DifXFreqs);
+      };
+    };
+
+
+// Get the next visibility to correct:
+    countNvis = 0;
+
+   // next mixed-vis indent level
+    while(DifXData->getNextMixedVis(
+       currT,currAnt, otherAnt, toconj, currF)){
+
+       countNvis += 1;
+
+       currFile = DifXData->getFileNumber();
+
+
+
+// Check if there was an error in reading:
+       if (!DifXData->succeed()){
+         return -1;
+       };
+
+// Do we have to correct this visibility?
+
+       //indent level for time range
+       if(currT>=doRange[0] && currT<=doRange[1]) {  // vis in time range?
+         //indent level within time range
+
+// Sanity check (if antenna is in the list of linear-pol antennas):
+         notinlist = true;
+         for (ij=0; ij<nALMA; ij++) {
+           if (currAnt == almanums[ij]){
+             currAntIdx = ij; notinlist=false; break;
+           };
+         };
+
+         if (notinlist){
+           sprintf(message,
+             "ERROR: Found linear-pol data for antenna number %i.\n",currAnt);
+           fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+           sprintf(message,
+             "This antenna is not in the list of linear-pol antennas!\n");
+           fprintf(logFile,"%s",message);  std::cout<<message; fflush(logFile);
+           return -1;
+         };
+
+
+
+
+
+//////////////////////////////////////////////////////
+// Set the interpolation time and compute gains:
+         currNant = nsumArr[currAntIdx] ;
+
+// Find the ALMA antennas involved in the phasing:
+
+         if(verbose){printf(" Doing vis %li  -  %.3f  -  %i\n",
+           countNvis, currT, currNant);fflush(stdout);
+         };
+         allflagged = true;
+
+         if (currNant>1 && PCMode){
+           Phased = ALMAWeight->isPhased(currT);
+           if (Phased){
+             for (ij=0; ij<currNant; ij++) {
+               Weight[currAntIdx][ij] = ALMAWeight->getWeight(ij,currT);
+               if (Weight[currAntIdx][ij]){allflagged = false;};
+             };
+           };
+         } else {
+           Phased=true; Weight[currAntIdx][0] = true; allflagged = false;
+         };
+
+// get ALMA refant used in the Phasing (to correct for X-Y phase offset):
+         ALMARefAnt = ALMAWeight->getRefAnt(currT);
+  
+ 
+         for (ij=0; ij<nchans[ii]; ij++){
+           gainRatio[ij] = PrioriGains[currFile][currAntIdx][im][ij]; 
+         };
+
+         if(PCMode && allflagged && currT != lastTFailed){
+           double dayFrac = (currT/86400. - DifXData->getDay0()+2400000.5);
+           int day = (int) dayFrac ;
+           int hour = (int) (dayFrac*24.);
+           int min = (int) ((dayFrac*24. - ((double) hour))*60.);
+           int sec = (int) ((dayFrac*24. - ((double) hour) - ((double) min)/60.)*3600.);
+           if (Phased){
+             sprintf(message,
+                "WARNING: NO VALID ALMA ANTENNAS ON %i-%i:%i:%i ?!?!\n WILL CONVERT ON THIS TIME *WITHOUT* CALIBRATION\n",
+                day,hour,min,sec);
+           } else {
+             sprintf(message,
+                "WARNING: ARRAY WAS UNPHASED AT TIME %i-%i:%i:%i ?!?!\n WILL SET THE WEIGHTS TO ZERO\n",
+                day,hour,min,sec);
+           };
+           fprintf(logFile,"%s",message); fflush(logFile);
+           lastTFailed = currT ;
+         };
+
+
+         //indent level within time range
+         if (PCMode && !allflagged){
+
+           if(verbose){printf(" Computing gains\n");fflush(stdout);};
+
+/////////
+// GAIN:
+  // FIRST GAIN IN NORMAL MODE, 0:
+
+           gchanged = allgains[currAntIdx][0]->setInterpolationTime(currT);
+           for (ij=0; ij<currNant; ij++) {
+             if (Weight[currAntIdx][ij]) {
+             allgains[currAntIdx][0]->applyInterpolation(ij,0,AnG[currAntIdx][ij]); };
+           };
+           if(verbose){printf(" Normal Mode 0\n");fflush(stdout);};
+
+// FURTHER GAIN, IN PRODUCT MODE, 2:
+           for (ik=1; ik<ngainTabs[currAntIdx]; ik++) {
+             auxB1 = allgains[currAntIdx][ik]->setInterpolationTime(currT) ;
+             gchanged = gchanged || auxB1;
+             for (ij=0; ij<currNant; ij++) {
+               if (Weight[currAntIdx][ij]) {
+                 allgains[currAntIdx][ik]->applyInterpolation(
+                     ij,2,AnG[currAntIdx][ij]);  
+               };
+             };
+           };
+           if(verbose){printf(" Product Mode 2\n");fflush(stdout);};
+
+// CROSS-PHASE GAIN AT THE ALMA REFERENCE ANTENNA:
+           cplxJones AuxRatio; 
+           for (ik=0; ik<ngainTabs[currAntIdx]; ik++) {
+             if (ALMARefAnt>=0 && !(allgains[currAntIdx][ik]->isBandpass())){
+               if (allgains[currAntIdx][ik]->getInterpolation(
+                   ALMARefAnt,0,gainXY)){
+                     for (ij=0; ij<nchans[ii]; ij++){
+                        if (std::abs(gainXY[1])>0.0 && std::abs(gainXY[0])>0.0){
+                           AuxRatio = gainXY[0]/gainXY[1];
+                           gainRatio[ij] *= AuxRatio/std::abs(AuxRatio); };
+                     };
+               } else {
+                  sprintf(message,
+                      "ERROR with ALMA Ref. Ant. in gain table!\n");
+                  fprintf(logFile,"%s",message); fflush(logFile);
+                  return -1;
+               };
+             }; 
+           };
+           if(verbose){printf(" Cross Phases Mode\n");fflush(stdout);};
+
+
+/////////
+// DTERM:
+           dtchanged = alldterms[currAntIdx]->setInterpolationTime(currT);
+           for (ij=0; ij<currNant; ij++) {
+             if (Weight[currAntIdx][ij]) {
+               alldterms[currAntIdx]->applyInterpolation(
+                   ij,0,AnDt[currAntIdx][ij]);  
+             };
+           };
+           if(verbose){printf(" D-terms Mode\n");fflush(stdout);};
+
+
+//////////////////////////////////
+
+         };   // Comes from if(!allflagged)
+
+
+
+// NON-ALMA MODE: THE MATRICES ONLY DEPEND ON THE A-PRIORI GAINS:
+         if (!PCMode){
+           gchanged=false; dtchanged=false;
+           if (frozenFile[currAntIdx] != currFile){
+             getFrozenMatrix(gainRatio,nchans[ii],XYSWAP[currAntIdx],Ktotal[currAntIdx]);
+             frozenFile[currAntIdx] = currFile;
+           };
+         };
+
+// FORCE RE-COMPUTATION (TO SET UNITY MATRIX) IF ALL ANTENNAS ARE FLAGGED
+         if (allflagged && PCMode){
+           gchanged=false; dtchanged=false;
+           for (j=0; j<nchans[ii]; j++) {
+             if(XYSWAP[currAntIdx]){
+               Ktotal[currAntIdx][0][0][j] = HSw[0][0]*oneOverSqrt2; //*gainRatio[j];
+               Ktotal[currAntIdx][0][1][j] = HSw[0][1]*oneOverSqrt2/gainRatio[j];
+               Ktotal[currAntIdx][1][0][j] = HSw[1][0]*oneOverSqrt2; //*gainRatio[j];
+               Ktotal[currAntIdx][1][1][j] = HSw[1][1]*oneOverSqrt2/gainRatio[j];} 
+             else {
+               Ktotal[currAntIdx][0][0][j] = H[0][0]*oneOverSqrt2; //*gainRatio[j];
+               Ktotal[currAntIdx][0][1][j] = H[0][1]*oneOverSqrt2/gainRatio[j];
+               Ktotal[currAntIdx][1][0][j] = H[1][0]*oneOverSqrt2; //*gainRatio[j];
+               Ktotal[currAntIdx][1][1][j] = H[1][1]*oneOverSqrt2/gainRatio[j];
+             };
+           //  Ktotal[currAntIdx][0][1][j] *= gainRatio[j];
+           //  Ktotal[currAntIdx][1][1][j] *= gainRatio[j];
+           };
+         };
+
+
+////////////
+// Compute the elements of the K matrix (only those that changed):
+
+ //indent level within time range
+         if (PCMode && (dtchanged || gchanged) && !allflagged) {
+           //indent level if dt or g changed   
+
+// INITIATE K MATRIX:
+           auxD = 0.0;
+           for (ij=0; ij<2; ij++) {
+             for (ik=0; ik<2; ik++) {
+               for (j=0; j<nchans[ii]; j++) {
+                 Ktotal[currAntIdx][ij][ik][j] = 0.0; 
+               };
+             };
+           };
+
+// ADD-UP ALL GAINS:
+
+           //indent level if dt or g changed
+           for (ij=0; ij<currNant; ij++) {
+
+   // BUT ONLY IF ANTENNA WAS USED IN THE PHASING
+   //indent level if ANTENNA WAS USED IN THE PHASING
+             if (Weight[currAntIdx][ij]) {
+
+   // Total weight:
+               auxD += 1.0;
+
+  // Kfrozen is unlikely to change much with time:
+               if (dtchanged) {
+                 for (j=0; j<nchans[ii]; j++) {
+                   gainXY[0] = 1.0 ; 
+                   gainXY[1] = 1.0 ;
+                   Kfrozen[currAntIdx][0][1][ij][j] = 
+                       gainXY[0]*AnDt[currAntIdx][ij][0][j];
+                   Kfrozen[currAntIdx][1][0][ij][j] = 
+                       gainXY[1]*AnDt[currAntIdx][ij][1][j];
+                   Kfrozen[currAntIdx][0][0][ij][j] = gainXY[0];
+                   Kfrozen[currAntIdx][1][1][ij][j] = gainXY[1];
+                 };
+               };
+
+               for (j=0; j<nchans[ii]; j++) {
+                 K[currAntIdx][0][0][ij][j] = 
+                     Kfrozen[currAntIdx][0][0][ij][j]*AnG[currAntIdx][ij][0][j];
+                 K[currAntIdx][1][1][ij][j] = 
+                     Kfrozen[currAntIdx][1][1][ij][j]*AnG[currAntIdx][ij][1][j];
+                 K[currAntIdx][0][1][ij][j] = 
+                     Kfrozen[currAntIdx][0][1][ij][j]*AnG[currAntIdx][ij][0][j];
+                 K[currAntIdx][1][0][ij][j] = 
+                     Kfrozen[currAntIdx][1][0][ij][j]*AnG[currAntIdx][ij][1][j];
+               };
+               // indent within if ANTENNA WAS USED IN THE PHASING
+
+// Add-up all elements:
+               for (il=0; il<2; il++) {
+                 for (ik=0; ik<2; ik++) {
+                   for (j=0; j<nchans[ii]; j++) {
+                     Ktotal[currAntIdx][il][ik][j] += K[currAntIdx][il][ik][ij][j];
+                   };
+                 };
+               };
+
+
+
+             }; // Comes from if(Weight....)
+           };//indent level if dt or g changed
+
+
+
+           NormFac[0] = 0.0; NormFac[1] = 0.0; 
+
+
+// Get the antenna-wise gain average:
+
+//indent level if dt or g changed
+           for (j=0; j<nchans[ii]; j++) {
+
+//indent level within getting average loop
+             for (ij=0; ij<2; ij++) {
+               for (ik=0; ik<2; ik++) {
+                 Ktotal[currAntIdx][ij][ik][j] /= auxD;
+               };
+             };
+//indent level within getting average loop
+
+// Correct the phase offset at the reference antenna:
+             Ktotal[currAntIdx][0][1][j] *= gainRatio[j];
+             Ktotal[currAntIdx][1][1][j] *= gainRatio[j];
+
+////////////
+             //indent level within getting average loop
+             if(verbose && j==0){
+               printf("gainRatio (j=0): %.3e %.3e\n",
+                    gainRatio[j].real(), gainRatio[j].imag());
+               printf("Ktot00: %.3e %.3e\n",
+                    Ktotal[currAntIdx][0][0][j].real(), Ktotal[currAntIdx][0][0][j].imag());
+               printf("Ktot01: %.3e %.3e\n",
+                    Ktotal[currAntIdx][0][1][j].real(), Ktotal[currAntIdx][0][1][j].imag());
+               printf("Ktot10: %.3e %.3e\n",
+                    Ktotal[currAntIdx][1][0][j].real(), Ktotal[currAntIdx][1][0][j].imag());
+               printf("Ktot11: %.3e %.3e\n",
+                    Ktotal[currAntIdx][1][1][j].real(), Ktotal[currAntIdx][1][1][j].imag()); 
+               if (allflagged) {printf("All flagged\n"); }
+               else {printf("Not flagged\n"); };
+             };
+
+
+
+///////////////////////////
+// THIS CODE IS INDEPENDENT OF HOW THE AVERAGE FOR K MATRIX IS IMPLEMENTED
+
+             //indent level within getting average loop
+             AD = Ktotal[currAntIdx][0][0][j]*Ktotal[currAntIdx][1][1][j];
+             BC = Ktotal[currAntIdx][0][1][j]*Ktotal[currAntIdx][1][0][j];
+ // Determinant:
+             DetInv = (AD - BC); // 
+
+ // Inverse of K matrix:
+             if (allflagged) {
+               Kinv[0][0] = 1.0; 
+               Kinv[0][1] = 0.0;
+               Kinv[1][0] = 0.0;
+               Kinv[1][1] = 1.0;} 
+             else {
+               Kinv[0][0] = Ktotal[currAntIdx][1][1][j]/DetInv;
+               Kinv[1][1] = Ktotal[currAntIdx][0][0][j]/DetInv;
+// BEWARE THAT THIS MUST BE IN ACCORDANCE TO THE DEFINITION OF Dx AND Dy!!!
+               Kinv[0][1] = -Ktotal[currAntIdx][0][1][j]/DetInv;
+               Kinv[1][0] = -Ktotal[currAntIdx][1][0][j]/DetInv;
+             };
+
+            //indent level within getting average loop
+             if(doNorm){ 
+               NormFac[0] += std::abs(Kinv[0][0]); 
+               NormFac[1] += std::abs(Kinv[1][1]);
+             };
+
+ // Multiply by conversion (hybrid) matrix and save
+ // result in the "Ktotal" matrix:
+             //indent level within getting average looop
+             if(XYSWAP[currAntIdx]){
+               Ktotal[currAntIdx][0][0][j] = 
+                  (Kinv[0][0]*HSw[0][0]+Kinv[1][0]*HSw[0][1])*oneOverSqrt2;
+               Ktotal[currAntIdx][0][1][j] = 
+                  (Kinv[0][1]*HSw[0][0]+Kinv[1][1]*HSw[0][1])*oneOverSqrt2;
+               Ktotal[currAntIdx][1][0][j] = 
+                  (Kinv[0][0]*HSw[1][0]+Kinv[1][0]*HSw[1][1])*oneOverSqrt2;
+               Ktotal[currAntIdx][1][1][j] = 
+                  (Kinv[0][1]*HSw[1][0]+Kinv[1][1]*HSw[1][1])*oneOverSqrt2;} 
+             else {
+               Ktotal[currAntIdx][0][0][j] = 
+                  (Kinv[0][0]*H[0][0]+Kinv[1][0]*H[0][1])*oneOverSqrt2;
+               Ktotal[currAntIdx][0][1][j] = 
+                  (Kinv[0][1]*H[0][0]+Kinv[1][1]*H[0][1])*oneOverSqrt2;
+               Ktotal[currAntIdx][1][0][j] = 
+                  (Kinv[0][0]*H[1][0]+Kinv[1][0]*H[1][1])*oneOverSqrt2;
+               Ktotal[currAntIdx][1][1][j] = 
+                  (Kinv[0][1]*H[1][0]+Kinv[1][1]*H[1][1])*oneOverSqrt2;
+             };
+             //indent level within getting average looop
+
+////////////////////////////////////
+////////////////////
+
+           };   // Comes from: for(j=0; j<nchans[ii]; j++) 
+           //indent level if dt or g changed
+
+
+         //indent level within time range
+         } else {
+           //indent level if dt or g changed
+           NormFac[0]=((realJones) nchans[ii]); 
+           NormFac[1]=((realJones) nchans[ii]);
+
+
+         }; // Comes from the else of "if(dtchanged||gchanged)"
+
+
+         //indent level within time range
+
+ // Norm. factor will be the geometrical average of gains.
+         if(doNorm && (dtchanged||gchanged)){
+           AntTab = std::sqrt(NormFac[0]*NormFac[1])/((realJones) nchans[ii]);
+           sprintf(gainsLine, "%i  %i  %.10e  %.5e \n",
+                ii+1, currAnt, currT/86400.,AntTab*AntTab/std::abs(auxD));
+           gainsText->append(gainsLine);
+           for(j=0; j<nchans[ii]; j++){
+             Ktotal[currAntIdx][0][0][j] /= AntTab;
+             Ktotal[currAntIdx][0][1][j] /= AntTab;
+             Ktotal[currAntIdx][1][0][j] /= AntTab;
+             Ktotal[currAntIdx][1][1][j] /= AntTab;
+           };
+         };
+         //indent level within time range
+
+
+// Calibrate and convert to circular:
+
+// Shall we write in plot file?
+         auxB2 = (currT>=plRange[0] && currT<=plRange[1] && (calField<0 || currF==calField));
+
+         if (IFplot < 0) { auxB2 = false; };
+
+// NOTE: These files are used to plot in the ALMA case; but are also used
+// when solving for the cross-polarization gains!
+// So they are not only "plot" files.
+
+// Convert:
+         if(Phased){
+           // note that if IFplot < 0, plotFile[IFplot] is
+           // garbage; but auxB2 (just set) prevents its use
+#ifdef POLCONVERT_DOUBLE
+// The visibilities are single precision:
+           for (ij=0; ij<2; ij++) {
+             for (ik=0; ik<2; ik++) {
+               for (j=0; j<nchans[ii]; j++) {
+                 W->Kvis[ij][ik][j] = (cplx32f) Ktotal[currAntIdx][ij][ik][j];
+               };
+             };
+           };
+           DifXData->applyMatrix(
+               W->Kvis,XYSWAP[currAntIdx],auxB2,
+               currAntIdx,plotFile[IFplot]);
+#else
+           DifXData->applyMatrix(
+               Ktotal[currAntIdx],XYSWAP[currAntIdx],auxB2,
+               currAntIdx,plotFile[IFplot]);
+#endif
+         } else {
+           sprintf(message,"WARNING! Zero-ing weights at time %.8f!\n",currT);
+           fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+           DifXData->zeroWeight();
+         };
+
+// Write:
+         if (!doTest){DifXData->setCurrentMixedVis();};
+
+
+
+       };// All this is done only if currT is within doRange.
+       //indent level for time range
+ 
+     };  // Go to next mixed-vis in this IF.
+     // next mixed-vis indent level
+
+   }; // Comes from the check of IF.
+
+  return 0;
+
+};
+
+
+
+
+//////////////////////////////////
+// THREAD THAT CONVERTS IFs UNTIL THERE ARE NO MORE LEFT 
+// (or until any thread finds an error):
+static void convertIFThread(ConversionSetup *S, IFWorker *W, int nIFconv,
+          std::atomic<int> *nextIF, std::atomic<bool> *failed, std::string *gainsText){
+
+  int im;
+  while(!failed->load()){
+    im = nextIF->fetch_add(1);
+    if (im>=nIFconv){break;};
+    if (convertIF(S, W, im, &gainsText[im]) != 0){failed->store(true);};
+  };
+
+};
+
+
+
+
+
 //////////////////////////////////
 // MAIN FUNCTION: 
 static PyObject *PolConvert(PyObject *self, PyObject *args)
 {
 
 
-  static const std::complex<float> oneOverSqrt2 = 0.7071067811;
-  static const cplx32f Im = cplx32f(0.,1.);
-
-  long i,j,k,auxI;
-  int ii, ij, ik, il, im;
+  long i,j,k;
+  int ii, ij, im;
   int IFoffset;
 
   // initialization warnings:
@@ -233,23 +1142,24 @@ static PyObject *PolConvert(PyObject *self, PyObject *args)
   PyObject *antcoordObj, *soucoordObj, *antmountObj, *timeranges; 
   int nALMA, plAnt, nPhase = 0, doTest, doConj, doNorm;
   int calField, verbose, doParI;
-  int currFile;
   double doSolve;
   bool isSWIN, doParang; 
   int AutoCorrMedianWindow;   
+  int nthreads = 1;
 
   printf("Parsing arguments\n");
  
 
 
 
-  if (!PyArg_ParseTuple(args, "iOiOiiOOOOOidiiOOOOOOiOiiOO",
+  if (!PyArg_ParseTuple(args, "iOiOiiOOOOOidiiOOOOOOiOiiOO|i",
     &nALMA, &plIF, &plAnt, &doIF, &IFoffset, &AutoCorrMedianWindow,  // 0-5
     &SWAP, &IDI, &antnum, &plotRange,                                // 6-9
     &Range, &doTest, &doSolve, &doConj,                              // 10-13
     &doNorm, &XYaddObj, &metadata, &soucoordObj,                     // 14-17
     &antcoordObj, &antmountObj, &isLinearObj, &calField,             //18-21
-    &ACorrPy, &doParI, &verbose, &logNameObj, &ALMAstuff)) {         //22-26
+    &ACorrPy, &doParI, &verbose, &logNameObj, &ALMAstuff,            //22-26
+    &nthreads)) {                                                    //27 (optional)
       printf("FAILED PolConvert! Unable to parse arguments!\n");
       fflush(stdout);
       ret = Py_BuildValue("i",-1);
@@ -544,6 +1454,9 @@ static PyObject *PolConvert(PyObject *self, PyObject *args)
   bool ***dtflag = new bool**[nALMA];
   bool *XYSWAP = new bool[nALMA];
 
+// The calibration arrays are used in place (the tables keep their buffers):
+  std::vector<Py_buffer*> calBuffers;
+
   for (i=0;i<nALMA;i++){
     isLinear[i] = (bool *)PyArray_DATA(PyList_GetItem(isLinearObj,i));
     almanums[i] = (int)PyInt_AsLong(PyList_GetItem(antnum,i));
@@ -586,7 +1499,7 @@ if(PCMode){
 
   for (i=0;i<nALMA;i++){
     nchanDt[i] = PyArray_DIM(PyList_GetItem(PyList_GetItem(dterms,i),0),0);
-    dtfreqsArr[i] = (double *)PyArray_DATA(PyList_GetItem(PyList_GetItem(dterms,i),0));
+    dtfreqsArr[i] = (double *)getBuffer(PyList_GetItem(PyList_GetItem(dterms,i),0),NPY_DOUBLE,&calBuffers);
     dttimesArr[i] = new double*[nsumArr[i]];
     ndttimeArr[i] = new long[nsumArr[i]];
     dtflag[i] = new bool*[nsumArr[i]];
@@ -598,23 +1511,23 @@ if(PCMode){
       dttimesArr[i][j] = new double[1];
       dttimesArr[i][j][0] = 0.0;
       ndttimeArr[i][j] = 1;
-      dtermsArrR1[i][j] = (double *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(PyList_GetItem(dterms,i),j+1),0));
-      dtermsArrI1[i][j] = (double *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(PyList_GetItem(dterms,i),j+1),1));
-      dtermsArrR2[i][j] = (double *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(PyList_GetItem(dterms,i),j+1),2));
-      dtermsArrI2[i][j] = (double *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(PyList_GetItem(dterms,i),j+1),3));
-      dtflag[i][j] = (bool *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(PyList_GetItem(dterms,i),j+1),4));
+      dtermsArrR1[i][j] = (double *)getBuffer(
+              PyList_GetItem(PyList_GetItem(PyList_GetItem(dterms,i),j+1),0),NPY_DOUBLE,&calBuffers);
+      dtermsArrI1[i][j] = (double *)getBuffer(
+              PyList_GetItem(PyList_GetItem(PyList_GetItem(dterms,i),j+1),1),NPY_DOUBLE,&calBuffers);
+      dtermsArrR2[i][j] = (double *)getBuffer(
+              PyList_GetItem(PyList_GetItem(PyList_GetItem(dterms,i),j+1),2),NPY_DOUBLE,&calBuffers);
+      dtermsArrI2[i][j] = (double *)getBuffer(
+              PyList_GetItem(PyList_GetItem(PyList_GetItem(dterms,i),j+1),3),NPY_DOUBLE,&calBuffers);
+      dtflag[i][j] = (bool *)getBuffer(
+              PyList_GetItem(PyList_GetItem(PyList_GetItem(dterms,i),j+1),4),NPY_BOOL,&calBuffers);
     };
 
     for (j=0; j<ngainTabs[i]; j++){
       tempPy = PyList_GetItem(PyList_GetItem(gains,i),j);
       kind[i][j] = (int)PyInt_AsLong(PyList_GetItem(PyList_GetItem(ikind,i),j));
       nchanArr[i][j] = PyArray_DIM(PyList_GetItem(tempPy,0),0);
-      freqsArr[i][j] = (double *)PyArray_DATA(PyList_GetItem(tempPy,0));
+      freqsArr[i][j] = (double *)getBuffer(PyList_GetItem(tempPy,0),NPY_DOUBLE,&calBuffers);
       ntimeArr[i][j] = new long[nsumArr[i]];
       timesArr[i][j] = new double*[nsumArr[i]];
       gainsArrR1[i][j] = new double*[nsumArr[i]];
@@ -625,22 +1538,31 @@ if(PCMode){
 
       for (k=0; k<nsumArr[i]; k++){
         ntimeArr[i][j][k] = PyArray_DIM(PyList_GetItem(PyList_GetItem(tempPy,k+1),0),0);
-        timesArr[i][j][k] = (double *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(tempPy,k+1),0));
-        gainsArrR1[i][j][k] = (double *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(tempPy,k+1),1));
-        gainsArrI1[i][j][k] = (double *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(tempPy,k+1),2));
-        gainsArrR2[i][j][k] = (double *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(tempPy,k+1),3));
-        gainsArrI2[i][j][k] = (double *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(tempPy,k+1),4));
-        gainflag[i][j][k] = (bool *)PyArray_DATA(
-              PyList_GetItem(PyList_GetItem(tempPy,k+1),5));
+        timesArr[i][j][k] = (double *)getBuffer(
+              PyList_GetItem(PyList_GetItem(tempPy,k+1),0),NPY_DOUBLE,&calBuffers);
+        gainsArrR1[i][j][k] = (double *)getBuffer(
+              PyList_GetItem(PyList_GetItem(tempPy,k+1),1),NPY_DOUBLE,&calBuffers);
+        gainsArrI1[i][j][k] = (double *)getBuffer(
+              PyList_GetItem(PyList_GetItem(tempPy,k+1),2),NPY_DOUBLE,&calBuffers);
+        gainsArrR2[i][j][k] = (double *)getBuffer(
+              PyList_GetItem(PyList_GetItem(tempPy,k+1),3),NPY_DOUBLE,&calBuffers);
+        gainsArrI2[i][j][k] = (double *)getBuffer(
+              PyList_GetItem(PyList_GetItem(tempPy,k+1),4),NPY_DOUBLE,&calBuffers);
+        gainflag[i][j][k] = (bool *)getBuffer(
+              PyList_GetItem(PyList_GetItem(tempPy,k+1),5),NPY_BOOL,&calBuffers);
       };
     };
   };
 
+  if (PyErr_Occurred()){
+    PyErr_Clear();
+    releaseBuffers(&calBuffers);
+    sprintf(message,"\nERROR READING THE CALIBRATION ARRAYS!\n");
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+    ret = Py_BuildValue("i",-1);
+    return ret;
+  };
+
 };
 
 
@@ -661,7 +1583,7 @@ if(PCMode){
        alldterms[i] = new CalTable(2,dtermsArrR1[i],dtermsArrI1[i],
            dtermsArrR2[i],dtermsArrI2[i],dtfreqsArr[i],dttimesArr[i],
            nsumArr[i],ndttimeArr[i], nchanDt[i],dtflag[i],true,logFile,
-           false); // verbose);
+           false, false); // verbose, copyData);
 
        for (j=0; j<ngainTabs[i];j++){
 /*
@@ -681,7 +1603,7 @@ if(PCMode){
            gainsArrI1[i][j],gainsArrR2[i][j],gainsArrI2[i][j],freqsArr[i][j],
            timesArr[i][j],nsumArr[i],ntimeArr[i][j], nchanArr[i][j],
            gainflag[i][j],isLinear[i][j],logFile,
-           false); // verbose);
+           false, false); // verbose, copyData);
        };
 
      // NON-ALMA CASE: DUMMY GAINS.
@@ -739,132 +1661,43 @@ if(PCMode){
     DifXData = new DataIOSWIN(nSWINFiles, SWINFiles, nALMA, 
            almanums, doRange, SWINnIF, SWINnchan, nIFconv, IFs2Conv, IFoffset, AutoCorrMedianWindow, ACorrs, SWINFreqs, 
            OverWrite, doTest, iDoSolve, calField, jd0, Geometry, doParang, logFile);
-  } else {
-    sprintf(message,"\n\n Opening FITS-IDI file and reading header.\n");
-    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
-    DifXData = new DataIOFITS(outputfits, nALMA, almanums, 
-          doRange, nIFconv, IFs2Conv, OverWrite, doConj, iDoSolve, calField, Geometry, doParang, logFile);
-  };
-
-  if(!DifXData->succeed()){
-     sprintf(message,"\nERROR WITH DATA FILE(S)!\n");
-     fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
-     ret = Py_BuildValue("i",-1);
-     return ret;
-  };
-
-
-  sprintf(message,"\n\nFirst observing Julian day: %11.2f\n",DifXData->getDay0());
-  fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
-
-
-
-  int nnu = DifXData->getNfreqs();
-  int ALMARefAnt = -1; // If no calAPP is used, do not look for any extra X-Y phase offset.
-
-  int nchans[nnu]; 
-  int maxnchan=0;
-  for (ii=0; ii<nnu; ii++) {
-    nchans[ii] = DifXData->getNchan(ii); 
-    if (nchans[ii]>maxnchan) {maxnchan=nchans[ii];};
-  };
-  sprintf(message,"\n The VLBI IFs have a maximum of %i channels\n",maxnchan);
-  fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
-
-
-/////////////////////////////////
-
-
-
-
-/////////////////////////////////
-// ALLOCATE MEMORY FOR CALIBRATION MATRICES:
-
-  double DifXFreqs[maxnchan];
-
-
-
-// Gains:
-  std::complex<float> ***AnG[nALMA], ***AnDt[nALMA];
-  bool *Weight[nALMA];
-
-// K matrix (beware: 3rd dimension of the matrix elements is now real/imag; not X/Y!):
-  std::complex<float> **K[nALMA][2][2];
-
-// part of K matrix that is unlikely to change much with time (i.e., BP, D-terms, X/Y delay):
-  std::complex<float> **Kfrozen[nALMA][2][2]; 
-
-// Ktotal will be the calibration+conversion matrix (i.e., just multiply V by it, to get final V):
-  std::complex<float> *Ktotal[nALMA][2][2];
-
-
-
-  for (ij=0; ij<nALMA; ij++) {
-    auxI = nsumArr[ij];
-
-    AnG[ij] =  new std::complex<float> **[auxI];
-    AnDt[ij] =  new std::complex<float> **[auxI];
-    Weight[ij] =  new bool [auxI];
-
-    for (ii=0; ii<auxI; ii++) {
-      AnG[ij][ii] =  new std::complex<float> *[2];
-      AnG[ij][ii][0] = new std::complex<float>[maxnchan];
-      AnG[ij][ii][1] = new std::complex<float>[maxnchan];
-      AnDt[ij][ii] =  new std::complex<float> *[2];
-      AnDt[ij][ii][0] = new std::complex<float>[maxnchan];
-      AnDt[ij][ii][1] = new std::complex<float>[maxnchan];
-    };
-
-// K matrix:
-    for (ii=0; ii<2; ii++) {
-      for (ik=0; ik<2; ik++) {
-        K[ij][ii][ik] =  new std::complex<float> *[auxI];
-        Kfrozen[ij][ii][ik] =  new std::complex<float> *[auxI];
-        Ktotal[ij][ii][ik] = new std::complex<float>[maxnchan];
-  
-        for (il=0; il<auxI; il++) {
-          K[ij][ii][ik][il] =  new std::complex<float>[maxnchan];
-          Kfrozen[ij][ii][ik][il] =  new std::complex<float>[maxnchan];
-       };
-      };
-    };
-
+  } else {
+    sprintf(message,"\n\n Opening FITS-IDI file and reading header.\n");
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+    DifXData = new DataIOFITS(outputfits, nALMA, almanums, 
+          doRange, nIFconv, IFs2Conv, OverWrite, doConj, iDoSolve, calField, Geometry, doParang, logFile);
   };
 
+  if(!DifXData->succeed()){
+     sprintf(message,"\nERROR WITH DATA FILE(S)!\n");
+     fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+     releaseBuffers(&calBuffers);
+     ret = Py_BuildValue("i",-1);
+     return ret;
+  };
 
 
+  sprintf(message,"\n\nFirst observing Julian day: %11.2f\n",DifXData->getDay0());
+  fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
 
-// Some extra auxiliary variables:
-
-  double currT, lastTFailed;
-  int currAnt, currAntIdx, currNant, otherAnt,currF; 
-  bool notinlist, gchanged=true, dtchanged=true, toconj;
 
-  lastTFailed = 0.0;
 
-  long countNvis;
+  int nnu = DifXData->getNfreqs();
 
-  std::complex<float> AD, BC, auxD;
-  auxD = 0.0;
-  float NormFac[2];
-  float AntTab;
-  std::complex<float> DetInv;
-  std::complex<float> Kinv[2][2];
-  std::complex<float> H[2][2]; 
-  std::complex<float> HSw[2][2]; 
+  int nchans[nnu]; 
+  int maxnchan=0;
+  for (ii=0; ii<nnu; ii++) {
+    nchans[ii] = DifXData->getNchan(ii); 
+    if (nchans[ii]>maxnchan) {maxnchan=nchans[ii];};
+  };
+  sprintf(message,"\n The VLBI IFs have a maximum of %i channels\n",maxnchan);
+  fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
 
-  H[0][0] = 1.; H[0][1] = Im;
-  H[1][0] = 1.; H[1][1] = -Im;
 
-  HSw[0][0] = Im; HSw[0][1] = 1.;
-  HSw[1][0] = -Im; HSw[1][1] = 1.;
+/////////////////////////////////
 
 
-  std::complex<float> gainXY[2]; 
-  std::complex<float> gainRatio[maxnchan];
-  std::complex<float> absGainRatio;
 
-  bool allflagged, auxB1, auxB2, Phased ;
 
   sprintf(message,"\n Will modify %li visibilities (lin-lin counted twice).\n\n",
        DifXData->getMixedNvis());
@@ -885,7 +1718,7 @@ if(PCMode){
 
 
 
-  FILE **plotFile = new FILE*[nIFplot+nIFconv]();
+  FringeWriter **plotFile = new FringeWriter*[nIFplot+nIFconv]();
   FILE *gainsFile = (FILE*)0;
 
 // Prepare plotting or solving files:
@@ -897,43 +1730,33 @@ if(PCMode){
 // conversion time range:
   if (plRange[0]!= plRange[1] && plRange[0]<=doRange[1] && plRange[1]>=doRange[0]) {
 
-// We have added a new boolean to the header (which states whether the
-// parallactic angle correction has been applied).
+// The files have the columnar layout of FringeFile.h (their header also
+// states whether the parallactic angle correction has been applied).
     if (PCMode) {
       for (ii=0; ii<nIFplot; ii++) {    // ALMA plot case
         sprintf(message,"POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i",IFs2Plot[ii]+1);
         fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
         printf("Writing %s\n", message);
-        plotFile[ii] = fopen(message,"wb");
-        if (!plotFile[ii]) {
+        plotFile[ii] = new FringeWriter(message,12,
+          (IFs2Plot[ii]>=0 && IFs2Plot[ii]<nnu)?nchans[IFs2Plot[ii]]:noI,doParang,0,NULL);
+        if (!plotFile[ii]->isOpen()) {
           sprintf(message,"Could not create PCMode plot file "
             "POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i, errno %d\n", IFs2Plot[ii]+1, errno);
           fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
         };
-        if (IFs2Plot[ii]>=0 && IFs2Plot[ii]<nnu){
-          fwrite(&nchans[IFs2Plot[ii]],sizeof(int),1,plotFile[ii]);
-        } else {
-          fwrite(&noI,sizeof(int),1,plotFile[ii]);
-        };
-        fwrite(&doParang,sizeof(bool),1,plotFile[ii]);
       };
     } else {
 
       for (ii=0; ii<nIFconv; ii++) {           // non-ALMA solve case
         sprintf(message,"POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i",IFs2Conv[ii]+1);
         printf("Writing %s\n", message);
-        plotFile[ii] = fopen(message,"wb");
-        if (!plotFile[ii]) {
+        plotFile[ii] = new FringeWriter(message,12,
+          (IFs2Conv[ii]>=0 && IFs2Conv[ii]<nnu)?nchans[IFs2Conv[ii]]:noI,doParang,0,NULL);
+        if (!plotFile[ii]->isOpen()) {
           sprintf(message,"Could not create plot non-PCMode file "
             "POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i, errno %d\n", IFs2Conv[ii]+1, errno);
           fprintf(logFile,"%s\n",message); std::cout<<message; fflush(logFile);
         };
-        if (IFs2Conv[ii]>=0 && IFs2Conv[ii]<nnu){
-          fwrite(&nchans[IFs2Conv[ii]],sizeof(int),1,plotFile[ii]);
-        } else {
-          fwrite(&noI,sizeof(int),1,plotFile[ii]);
-        };
-        fwrite(&doParang,sizeof(bool),1,plotFile[ii]);
       };
     };
   } else {;
@@ -957,6 +1780,7 @@ if(PCMode){
 /////////////////////////////////////
 // APPLY AUTO-CORRELATIONS CORRECTION:
 
+  int currAntIdx;
   for (currAntIdx=0; currAntIdx<nALMA; currAntIdx++) {
 
     for (k=0;k<nSWINFiles;k++){
@@ -982,497 +1806,119 @@ if(PCMode){
 ///////////////////////////////////
 // MAIN LOOP FOR CORRECTION (LOOP OVER IFs):
 
-////////////////////////////////////
-// Start of iteration over IFs
-////////////////////////////////////
-
-  for (im=0; im<nIFconv; im++) {
-
-    ii = IFs2Conv[im];
-    int IFplot = -1;    // flags the no-plot case of ALMA mode
-    char pltmsg[20];
-
-
-    for (ij=0; ij<nIFplot; ij++){
-      if (IFs2Plot[ij]==ii){IFplot=ij; break;};
+  ConversionSetup Setup;
+  Setup.nALMA = nALMA; Setup.nnu = nnu; Setup.maxnchan = maxnchan;
+  Setup.nIFplot = nIFplot; Setup.calField = calField;
+  Setup.almanums = almanums; Setup.nsumArr = nsumArr; Setup.ngainTabs = ngainTabs;
+  Setup.nchans = nchans; Setup.IFs2Conv = IFs2Conv; Setup.IFs2Plot = IFs2Plot;
+  Setup.XYSWAP = XYSWAP;
+  Setup.doNorm = doNorm; Setup.doTest = doTest; Setup.verbose = verbose;
+  Setup.PrioriGains = PrioriGains;
+  Setup.doRange = doRange; Setup.plRange = plRange;
+  Setup.plotFile = plotFile; Setup.logFile = logFile;
+
+
+// One workspace per thread. The first one uses the instances created above. 
+// The others get their own data cursor and their own copies of the 
+// calibration interpolators (the gain tables themselves are shared):
+  if (nthreads > nIFconv){nthreads = nIFconv;};
+  if (nthreads < 1){nthreads = 1;};
+
+  IFWorker *Workers = new IFWorker[nthreads];
+  int nWorkers = 1;
+  Workers[0].DifXData = DifXData;
+  Workers[0].allgains = allgains;
+  Workers[0].alldterms = alldterms;
+  Workers[0].ALMAWeight = ALMAWeight;
+
+  for (ij=1; ij<nthreads; ij++){
+    DataIO *IFCursor = DifXData->newIFCursor();
+    if (!IFCursor || !IFCursor->succeed()){
+      sprintf(message,"\nWARNING! Cannot convert these data with several threads. Will use %i.\n",nWorkers);
+      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+      break;
     };
-    if (PCMode && IFplot < 0) { sprintf(pltmsg, "not plotted"); }
-    else if (PCMode)          { sprintf(pltmsg, "fringe plot"); }
-    else                      { sprintf(pltmsg, "for solving"); };
-
-    sprintf(message,"\nDoing subband %i of %i (%s)\n",ii+1,nnu,pltmsg);
-    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
-    fflush(logFile);
-    //useful in development, not in production:
-    //printf("\rDoing subband %i of %i   ",ii+1,nnu);
-    //fflush(stdout);
-
-
-
-// Only proceed if IF is OK:
-    if(!DifXData->setCurrentIF(ii)){
-      sprintf(message,
-          "WARNING! DATA DO NOT HAVE SUCH AN IF!! WILL SKIP CONVERSION\n");  
-      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);} 
-    else {    // IF is OK: the check of IF.
-
-
-// Get the frequencies of the current IF:
-      DifXData->getFrequencies(DifXFreqs);
-
-// Set the VLBI <-> ALMA frequency mapping for the interpolation:
-      for (ij=0; ij<nALMA; ij++) {
-        alldterms[ij]->setMapping(nchans[ii],DifXFreqs);
-        for (ik=0; ik<ngainTabs[ij]; ik++){
-          allgains[ij][ik]->setMapping(nchans[ii],DifXFreqs);
-        };
+    Workers[ij].DifXData = IFCursor;
+    Workers[ij].allgains = new CalTable**[nALMA];
+    Workers[ij].alldterms = new CalTable*[nALMA];
+    for (i=0; i<nALMA; i++){
+      Workers[ij].allgains[i] = new CalTable*[ngainTabs[i]];
+      for (j=0; j<ngainTabs[i]; j++){
+        Workers[ij].allgains[i][j] = new CalTable(allgains[i][j]);
       };
+      Workers[ij].alldterms[i] = new CalTable(alldterms[i]);
+    };
+    Workers[ij].ALMAWeight = new Weighter(*ALMAWeight);
+    nWorkers += 1;
+  };
 
+  for (ij=0; ij<nWorkers; ij++){
+    allocWorker(&Setup, &Workers[ij]);
+  };
 
-// Get the next visibility to correct:
-      countNvis = 0;
-
-     // next mixed-vis indent level
-      while(DifXData->getNextMixedVis(
-         currT,currAnt, otherAnt, toconj, currF)){
-
-         countNvis += 1;
-
-         currFile = DifXData->getFileNumber();
-
-
-
-// Check if there was an error in reading:
-         if (!DifXData->succeed()){
-           fclose(gainsFile);
-           DifXData->finish();
-           return ret;
-         };
-
-// Do we have to correct this visibility?
-
-         //indent level for time range
-         if(currT>=doRange[0] && currT<=doRange[1]) {  // vis in time range?
-           //indent level within time range
-
-// Sanity check (if antenna is in the list of linear-pol antennas):
-           notinlist = true;
-           for (ij=0; ij<nALMA; ij++) {
-             if (currAnt == almanums[ij]){
-               currAntIdx = ij; notinlist=false; break;
-             };
-           };
-
-           if (notinlist){
-             sprintf(message,
-               "ERROR: Found linear-pol data for antenna number %i.\n",currAnt);
-             fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
-             sprintf(message,
-               "This antenna is not in the list of linear-pol antennas!\n");
-             fprintf(logFile,"%s",message);  std::cout<<message; fflush(logFile);
-             DifXData->finish(); 
-             return ret;
-           };
-
-
-
-
-
-//////////////////////////////////////////////////////
-// Set the interpolation time and compute gains:
-           currNant = nsumArr[currAntIdx] ;
-
-// Find the ALMA antennas involved in the phasing:
-
-           if(verbose){printf(" Doing vis %li  -  %.3f  -  %i\n",
-             countNvis, currT, currNant);fflush(stdout);
-           };
-           allflagged = true;
-
-           if (currNant>1 && PCMode){
-             Phased = ALMAWeight->isPhased(currT);
-             if (Phased){
-               for (ij=0; ij<currNant; ij++) {
-                 Weight[currAntIdx][ij] = ALMAWeight->getWeight(ij,currT);
-                 if (Weight[currAntIdx][ij]){allflagged = false;};
-               };
-             };
-           } else {
-             Phased=true; Weight[currAntIdx][0] = true; allflagged = false;
-           };
-
-// get ALMA refant used in the Phasing (to correct for X-Y phase offset):
-           ALMARefAnt = ALMAWeight->getRefAnt(currT);
-    
- 
-           for (ij=0; ij<nchans[ii]; ij++){
-             gainRatio[ij] = PrioriGains[currFile][currAntIdx][im][ij]; 
-           };
-
-           if(PCMode && allflagged && currT != lastTFailed){
-             double dayFrac = (currT/86400. - DifXData->getDay0()+2400000.5);
-             int day = (int) dayFrac ;
-             int hour = (int) (dayFrac*24.);
-             int min = (int) ((dayFrac*24. - ((double) hour))*60.);
-             int sec = (int) ((dayFrac*24. - ((double) hour) - ((double) min)/60.)*3600.);
-             if (Phased){
-               sprintf(message,
-                  "WARNING: NO VALID ALMA ANTENNAS ON %i-%i:%i:%i ?!?!\n WILL CONVERT ON THIS TIME *WITHOUT* CALIBRATION\n",
-                  day,hour,min,sec);
-             } else {
-               sprintf(message,
-                  "WARNING: ARRAY WAS UNPHASED AT TIME %i-%i:%i:%i ?!?!\n WILL SET THE WEIGHTS TO ZERO\n",
-                  day,hour,min,sec);
-             };
-             fprintf(logFile,"%s",message); fflush(logFile);
-             lastTFailed = currT ;
-           };
-
-
-           //indent level within time range
-           if (PCMode && !allflagged){
-
-             if(verbose){printf(" Computing gains\n");fflush(stdout);};
-
-/////////
-// GAIN:
-    // FIRST GAIN IN NORMAL MODE, 0:
-
-             gchanged = allgains[currAntIdx][0]->setInterpolationTime(currT);
-             for (ij=0; ij<currNant; ij++) {
-               if (Weight[currAntIdx][ij]) {
-               allgains[currAntIdx][0]->applyInterpolation(ij,0,AnG[currAntIdx][ij]); };
-             };
-             if(verbose){printf(" Normal Mode 0\n");fflush(stdout);};
-
-// FURTHER GAIN, IN PRODUCT MODE, 2:
-             for (ik=1; ik<ngainTabs[currAntIdx]; ik++) {
-               auxB1 = allgains[currAntIdx][ik]->setInterpolationTime(currT) ;
-               gchanged = gchanged || auxB1;
-               for (ij=0; ij<currNant; ij++) {
-                 if (Weight[currAntIdx][ij]) {
-                   allgains[currAntIdx][ik]->applyInterpolation(
-                       ij,2,AnG[currAntIdx][ij]);  
-                 };
-               };
-             };
-             if(verbose){printf(" Product Mode 2\n");fflush(stdout);};
-
-// CROSS-PHASE GAIN AT THE ALMA REFERENCE ANTENNA:
-             cplx32f AuxRatio; 
-             for (ik=0; ik<ngainTabs[currAntIdx]; ik++) {
-               if (ALMARefAnt>=0 && !(allgains[currAntIdx][ik]->isBandpass())){
-                 if (allgains[currAntIdx][ik]->getInterpolation(
-                     ALMARefAnt,0,gainXY)){
-                       for (ij=0; ij<nchans[ii]; ij++){
-                          if (std::abs(gainXY[1])>0.0 && std::abs(gainXY[0])>0.0){
-                             AuxRatio = gainXY[0]/gainXY[1];
-                             gainRatio[ij] *= AuxRatio/std::abs(AuxRatio); };
-                       };
-                 } else {
-                    sprintf(message,
-                        "ERROR with ALMA Ref. Ant. in gain table!\n");
-                    fprintf(logFile,"%s",message); fflush(logFile);
-                    DifXData->finish(); 
-                    return ret;
-                 };
-               }; 
-             };
-             if(verbose){printf(" Cross Phases Mode\n");fflush(stdout);};
-
-
-/////////
-// DTERM:
-             dtchanged = alldterms[currAntIdx]->setInterpolationTime(currT);
-             for (ij=0; ij<currNant; ij++) {
-               if (Weight[currAntIdx][ij]) {
-                 alldterms[currAntIdx]->applyInterpolation(
-                     ij,0,AnDt[currAntIdx][ij]);  
-               };
-             };
-             if(verbose){printf(" D-terms Mode\n");fflush(stdout);};
-
-
-//////////////////////////////////
-
-           };   // Comes from if(!allflagged)
-
-
-
-// FORCE RE-COMPUTATION (TO SET UNITY MATRIX) IF ALL ANTENNAS ARE FLAGGED
-           if (allflagged || !PCMode){
-             gchanged=false; dtchanged=false;
-             for (j=0; j<nchans[ii]; j++) {
-               if(XYSWAP[currAntIdx]){
-                 Ktotal[currAntIdx][0][0][j] = HSw[0][0]*oneOverSqrt2; //*gainRatio[j];
-                 Ktotal[currAntIdx][0][1][j] = HSw[0][1]*oneOverSqrt2/gainRatio[j];
-                 Ktotal[currAntIdx][1][0][j] = HSw[1][0]*oneOverSqrt2; //*gainRatio[j];
-                 Ktotal[currAntIdx][1][1][j] = HSw[1][1]*oneOverSqrt2/gainRatio[j];} 
-               else {
-                 Ktotal[currAntIdx][0][0][j] = H[0][0]*oneOverSqrt2; //*gainRatio[j];
-                 Ktotal[currAntIdx][0][1][j] = H[0][1]*oneOverSqrt2/gainRatio[j];
-                 Ktotal[currAntIdx][1][0][j] = H[1][0]*oneOverSqrt2; //*gainRatio[j];
-                 Ktotal[currAntIdx][1][1][j] = H[1][1]*oneOverSqrt2/gainRatio[j];
-               };
-             //  Ktotal[currAntIdx][0][1][j] *= gainRatio[j];
-             //  Ktotal[currAntIdx][1][1][j] *= gainRatio[j];
-             };
-           };
-
-
-////////////
-// Compute the elements of the K matrix (only those that changed):
-
-   //indent level within time range
-           if (PCMode && (dtchanged || gchanged) && !allflagged) {
-             //indent level if dt or g changed   
-
-// INITIATE K MATRIX:
-             auxD = 0.0;
-             for (ij=0; ij<2; ij++) {
-               for (ik=0; ik<2; ik++) {
-                 for (j=0; j<nchans[ii]; j++) {
-                   Ktotal[currAntIdx][ij][ik][j] = 0.0; 
-                 };
-               };
-             };
-
-// ADD-UP ALL GAINS:
-
-             //indent level if dt or g changed
-             for (ij=0; ij<currNant; ij++) {
-
-     // BUT ONLY IF ANTENNA WAS USED IN THE PHASING
-     //indent level if ANTENNA WAS USED IN THE PHASING
-               if (Weight[currAntIdx][ij]) {
-
-     // Total weight:
-                 auxD += 1.0;
-
-    // Kfrozen is unlikely to change much with time:
-                 if (dtchanged) {
-                   for (j=0; j<nchans[ii]; j++) {
-                     gainXY[0] = 1.0 ; 
-                     gainXY[1] = 1.0 ;
-                     Kfrozen[currAntIdx][0][1][ij][j] = 
-                         gainXY[0]*AnDt[currAntIdx][ij][0][j];
-                     Kfrozen[currAntIdx][1][0][ij][j] = 
-                         gainXY[1]*AnDt[currAntIdx][ij][1][j];
-                     Kfrozen[currAntIdx][0][0][ij][j] = gainXY[0];
-                     Kfrozen[currAntIdx][1][1][ij][j] = gainXY[1];
-                   };
-                 };
-
-                 for (j=0; j<nchans[ii]; j++) {
-                   K[currAntIdx][0][0][ij][j] = 
-                       Kfrozen[currAntIdx][0][0][ij][j]*AnG[currAntIdx][ij][0][j];
-                   K[currAntIdx][1][1][ij][j] = 
-                       Kfrozen[currAntIdx][1][1][ij][j]*AnG[currAntIdx][ij][1][j];
-                   K[currAntIdx][0][1][ij][j] = 
-                       Kfrozen[currAntIdx][0][1][ij][j]*AnG[currAntIdx][ij][0][j];
-                   K[currAntIdx][1][0][ij][j] = 
-                       Kfrozen[currAntIdx][1][0][ij][j]*AnG[currAntIdx][ij][1][j];
-                 };
-                 // indent within if ANTENNA WAS USED IN THE PHASING
-
-// Add-up all elements:
-                 for (il=0; il<2; il++) {
-                   for (ik=0; ik<2; ik++) {
-                     for (j=0; j<nchans[ii]; j++) {
-                       Ktotal[currAntIdx][il][ik][j] += K[currAntIdx][il][ik][ij][j];
-                     };
-                   };
-                 };
-
-
-
-               }; // Comes from if(Weight....)
-             };//indent level if dt or g changed
-
-
-
-             NormFac[0] = 0.0; NormFac[1] = 0.0; 
-
-
-// Get the antenna-wise gain average:
-
-//indent level if dt or g changed
-             for (j=0; j<nchans[ii]; j++) {
-
-//indent level within getting average loop
-               for (ij=0; ij<2; ij++) {
-                 for (ik=0; ik<2; ik++) {
-                   Ktotal[currAntIdx][ij][ik][j] /= auxD;
-                 };
-               };
-//indent level within getting average loop
-
-// Correct the phase offset at the reference antenna:
-               Ktotal[currAntIdx][0][1][j] *= gainRatio[j];
-               Ktotal[currAntIdx][1][1][j] *= gainRatio[j];
-
-////////////
-               //indent level within getting average loop
-               if(verbose && j==0){
-                 printf("gainRatio (j=0): %.3e %.3e\n",
-                      gainRatio[j].real(), gainRatio[j].imag());
-                 printf("Ktot00: %.3e %.3e\n",
-                      Ktotal[currAntIdx][0][0][j].real(), Ktotal[currAntIdx][0][0][j].imag());
-                 printf("Ktot01: %.3e %.3e\n",
-                      Ktotal[currAntIdx][0][1][j].real(), Ktotal[currAntIdx][0][1][j].imag());
-                 printf("Ktot10: %.3e %.3e\n",
-                      Ktotal[currAntIdx][1][0][j].real(), Ktotal[currAntIdx][1][0][j].imag());
-                 printf("Ktot11: %.3e %.3e\n",
-                      Ktotal[currAntIdx][1][1][j].real(), Ktotal[currAntIdx][1][1][j].imag()); 
-                 if (allflagged) {printf("All flagged\n"); }
-                 else {printf("Not flagged\n"); };
-               };
-
-
-
-///////////////////////////
-// THIS CODE IS INDEPENDENT OF HOW THE AVERAGE FOR K MATRIX IS IMPLEMENTED
-
-               //indent level within getting average loop
-               AD = Ktotal[currAntIdx][0][0][j]*Ktotal[currAntIdx][1][1][j];
-               BC = Ktotal[currAntIdx][0][1][j]*Ktotal[currAntIdx][1][0][j];
-   // Determinant:
-               DetInv = (AD - BC); // 
-
-   // Inverse of K matrix:
-               if (allflagged) {
-                 Kinv[0][0] = 1.0; 
-                 Kinv[0][1] = 0.0;
-                 Kinv[1][0] = 0.0;
-                 Kinv[1][1] = 1.0;} 
-               else {
-                 Kinv[0][0] = Ktotal[currAntIdx][1][1][j]/DetInv;
-                 Kinv[1][1] = Ktotal[currAntIdx][0][0][j]/DetInv;
-// BEWARE THAT THIS MUST BE IN ACCORDANCE TO THE DEFINITION OF Dx AND Dy!!!
-                 Kinv[0][1] = -Ktotal[currAntIdx][0][1][j]/DetInv;
-                 Kinv[1][0] = -Ktotal[currAntIdx][1][0][j]/DetInv;
-               };
-
-              //indent level within getting average loop
-               if(doNorm){ 
-                 NormFac[0] += std::abs(Kinv[0][0]); 
-                 NormFac[1] += std::abs(Kinv[1][1]);
-               };
+  sprintf(message,"\nJones matrices computed in %s precision\n",
+    (sizeof(realJones)==sizeof(double)) ? "double" : "single");
+  fprintf(logFile,"%s",message); fflush(logFile);
 
-   // Multiply by conversion (hybrid) matrix and save
-   // result in the "Ktotal" matrix:
-               //indent level within getting average looop
-               if(XYSWAP[currAntIdx]){
-                 Ktotal[currAntIdx][0][0][j] = 
-                    (Kinv[0][0]*HSw[0][0]+Kinv[1][0]*HSw[0][1])*oneOverSqrt2;
-                 Ktotal[currAntIdx][0][1][j] = 
-                    (Kinv[0][1]*HSw[0][0]+Kinv[1][1]*HSw[0][1])*oneOverSqrt2;
-                 Ktotal[currAntIdx][1][0][j] = 
-                    (Kinv[0][0]*HSw[1][0]+Kinv[1][0]*HSw[1][1])*oneOverSqrt2;
-                 Ktotal[currAntIdx][1][1][j] = 
-                    (Kinv[0][1]*HSw[1][0]+Kinv[1][1]*HSw[1][1])*oneOverSqrt2;} 
-               else {
-                 Ktotal[currAntIdx][0][0][j] = 
-                    (Kinv[0][0]*H[0][0]+Kinv[1][0]*H[0][1])*oneOverSqrt2;
-                 Ktotal[currAntIdx][0][1][j] = 
-                    (Kinv[0][1]*H[0][0]+Kinv[1][1]*H[0][1])*oneOverSqrt2;
-                 Ktotal[currAntIdx][1][0][j] = 
-                    (Kinv[0][0]*H[1][0]+Kinv[1][0]*H[1][1])*oneOverSqrt2;
-                 Ktotal[currAntIdx][1][1][j] = 
-                    (Kinv[0][1]*H[1][0]+Kinv[1][1]*H[1][1])*oneOverSqrt2;
-               };
-               //indent level within getting average looop
+// The entries of the gains file are kept per IF, and written in IF order at the end:
+  std::string *gainsText = new std::string[nIFconv];
+  int convStatus = 0;
 
 ////////////////////////////////////
-////////////////////
-
-             };   // Comes from: for(j=0; j<nchans[ii]; j++) 
-             //indent level if dt or g changed
-
-
-           //indent level within time range
-           } else {
-             //indent level if dt or g changed
-             NormFac[0]=((float) nchans[ii]); 
-             NormFac[1]=((float) nchans[ii]);
-
-
-           }; // Comes from the else of "if(dtchanged||gchanged)"
-
-
-           //indent level within time range
-
- // Norm. factor will be the geometrical average of gains.
-           if(doNorm && (dtchanged||gchanged)){
-             AntTab = std::sqrt(NormFac[0]*NormFac[1])/((float) nchans[ii]);
-             fprintf(gainsFile, "%i  %i  %.10e  %.5e \n",
-                  ii+1, currAnt, currT/86400.,AntTab*AntTab/std::abs(auxD));
-             for(j=0; j<nchans[ii]; j++){
-               Ktotal[currAntIdx][0][0][j] /= AntTab;
-               Ktotal[currAntIdx][0][1][j] /= AntTab;
-               Ktotal[currAntIdx][1][0][j] /= AntTab;
-               Ktotal[currAntIdx][1][1][j] /= AntTab;
-             };
-           };
-           //indent level within time range
-
-
-  // Correct for amplitude ratios (put amplitudes back):
-           if(!PCMode){
-          //   printf("%.2f %i |",std::abs(gainRatio[10]),currAntIdx);fflush(stdout);
-             for(j=0; j<nchans[ii]; j++){
-              //  AntTab = std::abs(gainRatio[j]); 
-                AntTab = 1./std::abs(Ktotal[currAntIdx][0][0][j]*Ktotal[currAntIdx][1][1][j] - Ktotal[currAntIdx][0][1][j]*Ktotal[currAntIdx][1][0][j]);
-             //   if(j==0 && currAntIdx==2){printf("%.2e ",AntTab);fflush(stdout);};
-                Ktotal[currAntIdx][0][0][j] *= AntTab;
-                Ktotal[currAntIdx][0][1][j] *= AntTab;
-                Ktotal[currAntIdx][1][0][j] *= AntTab;
-                Ktotal[currAntIdx][1][1][j] *= AntTab;
-             };
-           };
-
-// Calibrate and convert to circular:
+// Start of iteration over IFs
+////////////////////////////////////
 
-// Shall we write in plot file?
-           auxB2 = (currT>=plRange[0] && currT<=plRange[1] && (calField<0 || currF==calField));
+  if (nWorkers == 1){
 
-           if (IFplot < 0) { auxB2 = false; };
+    for (im=0; im<nIFconv; im++) {
+      convStatus = convertIF(&Setup, &Workers[0], im, &gainsText[im]);
+      if (convStatus != 0){break;};
+    };
 
-// NOTE: These files are used to plot in the ALMA case; but are also used
-// when solving for the cross-polarization gains!
-// So they are not only "plot" files.
+  } else {
 
-// Convert:
-           if(Phased){
-             // note that if IFplot < 0, plotFile[IFplot] is
-             // garbage; but auxB2 (just set) prevents its use
-             DifXData->applyMatrix(
-                 Ktotal[currAntIdx],XYSWAP[currAntIdx],auxB2,
-                 currAntIdx,plotFile[IFplot]);
-           } else {
-             sprintf(message,"WARNING! Zero-ing weights at time %.8f!\n",currT);
-             fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
-             DifXData->zeroWeight();
-           };
+    sprintf(message,"\n Converting %i IFs with %i threads.\n",nIFconv,nWorkers);
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
 
-// Write:
-           if (!doTest){DifXData->setCurrentMixedVis();};
+    std::atomic<int> nextIF(0);
+    std::atomic<bool> failedIF(false);
+    std::vector<std::thread> IFThreads;
 
+    Py_BEGIN_ALLOW_THREADS
+    for (ij=0; ij<nWorkers; ij++){
+      IFThreads.push_back(std::thread(convertIFThread, &Setup, &Workers[ij],
+                          nIFconv, &nextIF, &failedIF, gainsText));
+    };
+    for (ij=0; ij<nWorkers; ij++){
+      IFThreads[ij].join();
+    };
+    Py_END_ALLOW_THREADS
 
+    if (failedIF.load()){convStatus = -1;};
 
-         };// All this is done only if currT is within doRange.
-         //indent level for time range
- 
-       };  // Go to next mixed-vis in this IF.
-       // next mixed-vis indent level
-  
-     }; // Comes from the check of IF.
+  };
 
-   }; ///////////////////////////////
+///////////////////////////////
 // End of iteration over IFs
 ////////////////////////////////////
 
 
+  if(doNorm){
+    for (im=0; im<nIFconv; im++){
+      fprintf(gainsFile,"%s",gainsText[im].c_str());
+    };
+  };
+  delete[] gainsText;
+
+  if (convStatus != 0){
+    if(doNorm){fclose(gainsFile);};
+    for (ij=1; ij<nWorkers; ij++){Workers[ij].DifXData->finish();};
+    DifXData->finish();
+    releaseBuffers(&calBuffers);
+    return ret;
+  };
+
+
 
 
   sprintf(message,"\nDONE WITH ITERATION over IFs!\n");
@@ -1481,15 +1927,13 @@ if(PCMode){
 if(plRange[0]<=doRange[1] && plRange[1]>=doRange[0]){
   if(PCMode) {
     for (ij=0;ij<nIFplot;ij++){
-      if(plotFile[ij]) {
-        fclose(plotFile[ij]);
-      };
+      delete plotFile[ij];
+      plotFile[ij] = NULL;
     };
   } else {
     for (ij=0;ij<nIFconv;ij++){
-      if(plotFile[ij]) {
-        fclose(plotFile[ij]);
-      };
+      delete plotFile[ij];
+      plotFile[ij] = NULL;
     };
   }
 };
@@ -1520,32 +1964,24 @@ if(plRange[0]<=doRange[1] && plRange[1]>=doRange[0]){
 // Free memory:
 
 
-  for (ij=0; ij<nALMA; ij++) {
-    auxI = nsumArr[ij];
-    for (ii=0; ii<auxI; ii++) {
-      delete[] AnG[ij][ii][0];
-      delete[] AnG[ij][ii][1];
-      delete[] AnDt[ij][ii][0];
-      delete[] AnDt[ij][ii][1];
-      delete[] AnG[ij][ii];
-      delete[] AnDt[ij][ii];
-    };
-    delete[] AnG[ij];
-    delete[] AnDt[ij];
-    delete[] Weight[ij];
+  for (ij=0; ij<nWorkers; ij++) {
+    freeWorker(&Setup, &Workers[ij]);
+  };
 
-    for (ii=0; ii<2; ii++) {
-      for (ik=0; ik<2; ik++) {
-        for (il=0; il<auxI; il++) {
-          delete[] K[ij][ii][ik][il];
-          delete[] Kfrozen[ij][ii][ik][il];
-        };
-        delete[] K[ij][ii][ik];
-        delete[] Kfrozen[ij][ii][ik];
-        delete[] Ktotal[ij][ii][ik];
+  for (ij=1; ij<nWorkers; ij++) {
+    for (i=0;i<nALMA;i++){
+      for (j=0; j<ngainTabs[i]; j++){
+        delete Workers[ij].allgains[i][j];
       };
+      delete Workers[ij].alldterms[i];
+      delete[] Workers[ij].allgains[i];
     };
+    delete[] Workers[ij].allgains;
+    delete[] Workers[ij].alldterms;
+    delete Workers[ij].ALMAWeight;
+    delete Workers[ij].DifXData;
   };
+  delete[] Workers;
 
   for (i=0;i<nALMA;i++){
 
@@ -1602,6 +2038,9 @@ if(plRange[0]<=doRange[1] && plRange[1]>=doRange[0]){
   delete[] PrioriGains;
   delete[] alldterms;
   delete[] allgains;
+
+// The calibration tables are gone. Release their arrays:
+  releaseBuffers(&calBuffers);
   delete[] nsumArr;
   delete[] almanums;
 
@@ -40,7 +40,19 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 #include <math.h>
 #include <complex>
 #include <dirent.h>
+#include <thread>
+#include <atomic>
+#include <mutex>
+#include <vector>
+#include <algorithm>
+#include <map>
+#include <string>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <fcntl.h>
+#include <unistd.h>
 #include <fftw3.h>
+#include "./FringeFile.h"
 //#include <gsl/gsl_errno.h>
 //#include <gsl/gsl_linalg.h>
 
@@ -87,46 +99,314 @@ static char module_docstring[] =
 static char PolGainSolve_docstring[] =
     "Solves for cross-polarization gains from mixed-polarization visibilities";
 static char ReadData_docstring[] =
-    "Reads data (one IF) for PolGainSolve";
+    "Reads data (one IF) for PolGainSolve, from the (columnar) OTHERS.FRINGE and POLCONVERT.FRINGE files";
 static char FreeData_docstring[] =
     "Releases the data pointers of PolGainSolve";
 static char GetChi2_docstring[] =
-    "Computes the Chi2 for a given set of cross-pol gains";
+    "Computes the Chi2 for a given set of cross-pol gains (an array with all the parameters of SetFit)";
+static char GetChi2Grad_docstring[] =
+    "Computes the Chi2, its gradient and (optionally) the Gauss-Newton Hessian for a given set of cross-pol gains";
 static char GetIFs_docstring[] =
     "Returns the array of frequencies for a given IF";
 static char DoGFF_docstring[] =
-    "Performs a simplified GFF (delays and rates). The reference antenna is set by not adding it to the list of fittable antennas";
+    "Performs a simplified GFF (delays and rates). The reference antenna is set by not adding it to the list of fittable antennas. An optional last argument is the name of an FFTW wisdom file, which is read (if it exists) and updated with the new FFT plans";
 static char SetFringeRates_docstring[] =
     "Forces the antenna fringe-rates to the list give, before the GCPFF is performed";
 static char GetNScan_docstring[] =
     "Returns the number of scans for the given IF.";
 static char SetFit_docstring[] =
-    "Allocates memory for the GCPFF.";
+    "Allocates memory for the GCPFF. An optional last argument sets the number of threads used to compute the Chi2.";
 static char GetNchan_docstring[] =
     "Returns the number of channels for the given IF.";
+static char LMSolve_docstring[] =
+    "Fits the cross-pol gains (from, and into, the given array) with a Levenberg-Marquardt solver. Returns the Chi2, whether the gains are flipped, the number of iterations and of Chi2 evaluations, whether the fit converged and the final relative change of the Chi2";
+static char GetChi2Count_docstring[] =
+    "Returns the number of Chi2 evaluations (by GetChi2, GetChi2Grad or LMSolve) done so far.";
+static char PreAverage_docstring[] =
+    "Averages the data (after DoGFF) in cells of the given time (seconds) and number of channels, for each baseline and scan, to speed up the GCPFF. The visibilities are corrected for the parallactic angle before averaging, and the decorrelation expected from the GFF rates and delays is reported. Channel ranges passed to GetChi2 are still in units of the original channels";
 
 
 
-/* Available functions */
-static PyObject *PolGainSolve(PyObject *self, PyObject *args);
-static PyObject *ReadData(PyObject *self, PyObject *args);
-static PyObject *GetChi2(PyObject *self, PyObject *args);
-static PyObject *GetIFs(PyObject *self, PyObject *args);
-static PyObject *GetNchan(PyObject *self, PyObject *args);
-static PyObject *DoGFF(PyObject *self, PyObject *args);
-static PyObject *SetFringeRates(PyObject *self, PyObject *args);
-static PyObject *GetNScan(PyObject *self, PyObject *args);
-static PyObject *FreeData(PyObject *self, PyObject *args);
-static PyObject *SetFit(PyObject *self, PyObject *args);
+static char Solver_docstring[] =
+    "Independent cross-polarization gain-solver state. It has the same methods as the module functions (which act on a default instance)";
+
+
 
 bool solveSystem(int Neq, double *Hessian, double *Residuals, double *Solution, double *Errors);
 
+static double TWOPI = 6.283185307179586;
+
+
+
+// FFTW plans of DoGFF, one per (Nvis, Nchan) shape. They are made once (with 
+// FFTW_MEASURE) and executed on the buffers of any solver with fftw_execute_dft:
+static std::map<std::pair<int,int>, fftw_plan> FFTPlans;
+static bool newFFTPlans = false;
+
+// Optional FFTW wisdom file (given to DoGFF). It is read once and it is 
+// written again whenever new plans are made:
+static std::string WisdomFile;
+
+static fftw_plan getFFTPlan(int n0, int n1, fftw_complex *in, fftw_complex *out){
+  std::pair<int,int> shape(n0,n1);
+  std::map<std::pair<int,int>, fftw_plan>::iterator it = FFTPlans.find(shape);
+  if (it != FFTPlans.end()){return it->second;};
+  fftw_plan plan = fftw_plan_dft_2d(n0, n1, in, out, FFTW_FORWARD, FFTW_MEASURE);
+  FFTPlans[shape] = plan;
+  newFFTPlans = true;
+  return plan;
+};
+
+
+
+
+// A fringe file (see FringeFile.h) mapped in memory:
+typedef struct {
+  FringeHeader *head;
+  double *Freqs, *Time, *PA1, *PA2, *UVDist;
+  int *Ant1, *Ant2;
+  cplx32f *Vis;
+  void *map;
+  size_t size;
+} FringeMap;
+
+static void unmapFringe(FringeMap *F){
+  if (F->map){munmap(F->map,F->size);};
+  F->map = NULL;
+};
+
+// Maps a fringe file and checks its header. Returns false if it is missing
+// or it is not a fringe file with ncomp products per record:
+static bool mapFringe(const char *name, int ncomp, FringeMap *F){
+
+  struct stat info;
+  F->map = NULL;
+  int fd = open(name,O_RDONLY);
+  if (fd<0){return false;};
+  if (fstat(fd,&info)!=0 || info.st_size < (off_t) sizeof(FringeHeader)){close(fd); return false;};
+  F->size = info.st_size;
+  F->map = mmap(NULL,F->size,PROT_READ,MAP_PRIVATE,fd,0);
+  close(fd);
+  if (F->map == MAP_FAILED){F->map = NULL; return false;};
+
+  char *base = (char *) F->map;
+  F->head = (FringeHeader *) base;
+  long nvis = F->head->nvis;
+  long nchan = F->head->nchan>0?F->head->nchan:0;
+  if (memcmp(F->head->magic,FRINGE_MAGIC,8)!=0 || F->head->version != FRINGE_VERSION ||
+      F->head->ncomp != ncomp || nvis < 0 ||
+      F->head->visOffset + nvis*ncomp*nchan*((long) sizeof(cplx32f)) > F->head->metaOffset ||
+      F->head->metaOffset + nvis*(4*sizeof(double)+3*sizeof(int)) > F->size){
+    unmapFringe(F); return false;
+  };
+
+  F->Freqs = (double *) (base + sizeof(FringeHeader));
+  F->Vis = (cplx32f *) (base + F->head->visOffset);
+  F->Time = (double *) (base + F->head->metaOffset);
+  F->PA1 = F->Time + nvis;
+  F->PA2 = F->PA1 + nvis;
+  F->UVDist = F->PA2 + nvis;
+  F->Ant1 = (int *) (F->UVDist + nvis);
+  F->Ant2 = F->Ant1 + nvis;
+  return true;
+};
+
+
+
+/* Work of one Chi2 computation, split in tasks (one per IF and baseline) 
+   that can be run by several threads. Each task writes its own partial results, 
+   which are added in task order at the end. */
+struct Chi2Work {
+    double *CrossG;
+    int Ch0, Ch1, end, NGrad;
+    bool useRates;
+    double RefNu;
+    double **chanFreq;
+    int nTask;
+    int *TaskStart, *VisIdx; // The visibilities of task t are VisIdx[TaskStart[t]:TaskStart[t+1]]
+    double *TaskChi2, *TaskGrad, *TaskHess;
+    int *TaskFlip;
+    std::atomic<int> nextTask;
+};
+
+
+
+/* All the data of a solve problem (set up by PolGainSolve, ReadData and SetFit).
+   The module functions work on a default instance, and each Solver object 
+   (see below) owns its own instance, so several problems can be held at once. */
+class GainSolver {
+  public:
+    GainSolver();
+    ~GainSolver();
+
+    PyObject *PolGainSolve(PyObject *args);
+    PyObject *ReadData(PyObject *args);
+    PyObject *GetChi2(PyObject *args);
+    PyObject *GetChi2Grad(PyObject *args);
+    PyObject *GetIFs(PyObject *args);
+    PyObject *GetNchan(PyObject *args);
+    PyObject *DoGFF(PyObject *args);
+    PyObject *SetFringeRates(PyObject *args);
+    PyObject *GetNScan(PyObject *args);
+    PyObject *FreeData(PyObject *args);
+    PyObject *SetFit(PyObject *args);
+    PyObject *PreAverage(PyObject *args);
+    PyObject *GetChi2Count(PyObject *args);
+    PyObject *LMSolve(PyObject *args);
+// Runs one of the methods above with the solver lock held:
+    PyObject *call(PyObject *(GainSolver::*method)(PyObject *), PyObject *args);
+
+  private:
+
+// Computes the Chi2 for the cross-gains in CrossG. If Grad is not NULL, it also
+// accumulates there the analytic gradient of the Chi2 (for the first NGrad 
+// parameters) and, if Hess is not NULL, the Gauss-Newton Hessian (NGrad x NGrad).
+// Returns false if the channel range is wrong.
+    bool Chi2Core(double *CrossG, int Ch0, int Ch1, int end, bool useRates, int NGrad, double *Grad, double *Hess, double *Chi2Out);
+// Iterations of the Levenberg-Marquardt solver (see LMSolve):
+    bool LMCore(double *CrossG, int Ch0, int Ch1, bool useRates, int MaxIter, double Tol, double LMLambda, double KRaise, double KDecr, int *NIter, double *RelChange, bool *Converged, double *Chi2Out);
+    void Chi2Thread(Chi2Work *W);
+// The fitted parameters, as a 1D array of Npar doubles (NULL, with a Python
+// exception set, if pars does not fit or SetFit was not run):
+    PyArrayObject *parArray(PyObject *pars, bool inout, const char *caller);
+    void Chi2Task(Chi2Work *W, int task, cplx64f **aux);
+    bool releaseData();
+    void releaseFit(int NparFit);
+    void setFitIdx();
+    void releaseChi2Tables();
+    int calIndex(int ant){return (ant>0 && ant<=MaxAnt) ? CalIdx[ant-1] : -1;};
+// Number of original channels in channel j of an IF, and their mean frequency:
+    int chanWidth(int IF, int j){return std::min((j+1)*ChanBin[IF], Nchan[IF]) - j*ChanBin[IF];};
+    double chanNu(int IF, int j){return 0.5*(Frequencies[IF][j*ChanBin[IF]] + Frequencies[IF][j*ChanBin[IF]+chanWidth(IF,j)-1]);};
+
+    char message[512];
+
+    bool doParang;
+
+    long chisqcount = 0;
+    int nthreads = 1; // Threads used to compute the Chi2 (set by SetFit).
+// Only one method runs at a time for each solver (the GIL may be released in them):
+    std::mutex Chi2Lock;
+    int MaxChan = 1;
+    int MAXIF = 8; // Will reallocate if needed.
+    int MaxAnt = 0;
+    int NCalAnt = 0, Nlin = 0, Ncirc, *Nchan = nullptr, SolMode, SolAlgor;
+    int *IFNum = nullptr;
+    int *Lant, *Cant, *NVis = nullptr, *NLVis = nullptr, *NCVis = nullptr, *CalAnts, *NScan = nullptr;
+    int *Twins[2], Ntwin;
+    int solveAmp, useCov, solveQU;
+    int *LinBasNum = nullptr, NLinBas = 0;
+    int NIF = 0, NIFComp = 0;
+    int NBas = 0, NantFit = 0, Npar=-1;
+    int npix = 0;
+    double **Frequencies = nullptr, ***Rates[5], ***Delays[5];
+    double *Tm = nullptr;
+    double *BasWgt = nullptr;
+    int *doIF = nullptr, *antFit = nullptr; 
+
+// Lookup tables (indexed by antenna number - 1): index of the antenna in CalAnts 
+// and in antFit (-1 if it is not there) and whether it is linear:
+    int *CalIdx = nullptr, *FitIdx = nullptr;
+    bool *IsLin = nullptr;
+// Baseline of each visibility (-1 if it is not used):
+    int **VisBas = nullptr;
+// Original channels averaged in each channel of the data of each IF
+// (see PreAverage) and whether the data have been pre-averaged:
+    int *ChanBin = nullptr;
+    bool PreAveraged = false;
+// Channel offsets (for the MBDs) of each fitted IF, and visibilities
+// of each fitted IF and baseline (i.e., of each Chi2 task):
+    double **ChanFreq = nullptr;
+    int *FitVisStart = nullptr, *FitVisIdx = nullptr;
+   
+    double *feedAngle;
+    double **DStokes = nullptr; // = new double*[1];
+    double UVTAPER = 1.e9;
+
+    double Chi2Old = 0.0;
+    double TAvg = 1.0;
+    double RelWeight = 1.0;
+    double T0, T1, DT;
+    int **Ant1 = nullptr, **Ant2 = nullptr, **BasNum = nullptr, **Scan = nullptr;
+    double **Times = nullptr, **ScanDur = nullptr, **Weights = nullptr, *CovMat = nullptr, *IndVec = nullptr, *SolVec = nullptr;
+    double **UVGauss = nullptr;
+    cplx64f **PA1 = nullptr, **PA2 = nullptr, **auxC00 = nullptr, **auxC01 = nullptr, **auxC10 = nullptr, **auxC11 = nullptr;
+    cplx64f **auxC00Flp = nullptr, **auxC11Flp = nullptr; // To better check Parangle Flip.
+    cplx64f ***RR = nullptr, ***RL = nullptr, ***LR = nullptr, ***LL = nullptr, **CrossSpec00 = nullptr, **CrossSpec11 = nullptr;
+    double *UVWeights = nullptr;
+    double SNR_CUTOFF;
+    double Lambda;
+    bool doCov;
+    double Stokes[4];
+
+ //  gsl_matrix_view m; 
+ //  gsl_vector_view x, v;
+ //  gsl_permutation *perm;
+
+    bool AddCrossHand = true;
+    bool AddParHand = true;
+    bool StokesSolve;
+
+    cplx64f *G1 = nullptr, *G2 = nullptr, *G1nu = nullptr, *G2nu = nullptr; 
+    double *DirDer = nullptr, *MBD1 = nullptr, *MBD2 = nullptr;
+    int *DerIdx = nullptr, *AvVis = nullptr;
+
+
+    FILE *logFile = nullptr;
+
+// FFT buffers of DoGFF (kept between calls):
+    fftw_complex *FFTIn[4] = {nullptr, nullptr, nullptr, nullptr};
+    fftw_complex *FFTOut[4] = {nullptr, nullptr, nullptr, nullptr};
+    fftw_complex *FFTAux = nullptr;
+    long FFTSize = 0;
+
+};
+
+
+
+
+/* Python type for the independent solver instances */
+typedef struct {
+    PyObject_HEAD
+    GainSolver *S;
+} SolverObject;
+
+
+// The instance used by the module-level functions:
+static GainSolver *DefaultSolver = nullptr;
+static GainSolver *getDefaultSolver(){
+  if (!DefaultSolver){DefaultSolver = new GainSolver();};
+  return DefaultSolver;
+};
+
+
+#define GAINSOLVER_WRAPPERS(name) \
+  static PyObject *name(PyObject *self, PyObject *args){return getDefaultSolver()->call(&GainSolver::name, args);}; \
+  static PyObject *Solver_##name(PyObject *self, PyObject *args){return ((SolverObject *) self)->S->call(&GainSolver::name, args);};
+
+GAINSOLVER_WRAPPERS(PolGainSolve)
+GAINSOLVER_WRAPPERS(ReadData)
+GAINSOLVER_WRAPPERS(GetChi2)
+GAINSOLVER_WRAPPERS(GetChi2Grad)
+GAINSOLVER_WRAPPERS(GetIFs)
+GAINSOLVER_WRAPPERS(GetNchan)
+GAINSOLVER_WRAPPERS(DoGFF)
+GAINSOLVER_WRAPPERS(SetFringeRates)
+GAINSOLVER_WRAPPERS(GetNScan)
+GAINSOLVER_WRAPPERS(FreeData)
+GAINSOLVER_WRAPPERS(SetFit)
+GAINSOLVER_WRAPPERS(PreAverage)
+GAINSOLVER_WRAPPERS(GetChi2Count)
+GAINSOLVER_WRAPPERS(LMSolve)
+
+
 
 /* Module specification */
 static PyMethodDef module_methods[] = {
     {"PolGainSolve", PolGainSolve, METH_VARARGS, PolGainSolve_docstring},
     {"ReadData", ReadData, METH_VARARGS, ReadData_docstring},
     {"GetChi2", GetChi2, METH_VARARGS, GetChi2_docstring},
+    {"GetChi2Grad", GetChi2Grad, METH_VARARGS, GetChi2Grad_docstring},
     {"GetIFs", GetIFs, METH_VARARGS, GetIFs_docstring},
     {"DoGFF", DoGFF, METH_VARARGS, DoGFF_docstring},
     {"SetFringeRates", SetFringeRates, METH_VARARGS, SetFringeRates_docstring},
@@ -134,9 +414,58 @@ static PyMethodDef module_methods[] = {
     {"GetNchan",GetNchan, METH_VARARGS, GetNchan_docstring},
     {"FreeData", FreeData, METH_VARARGS, FreeData_docstring},
     {"SetFit", SetFit, METH_VARARGS, SetFit_docstring},
+    {"PreAverage", PreAverage, METH_VARARGS, PreAverage_docstring},
+    {"GetChi2Count", GetChi2Count, METH_VARARGS, GetChi2Count_docstring},
+    {"LMSolve", LMSolve, METH_VARARGS, LMSolve_docstring},
     {NULL, NULL, 0, NULL} /* terminated by list of NULLs, apparently */
 };
 
+static PyMethodDef solver_methods[] = {
+    {"PolGainSolve", Solver_PolGainSolve, METH_VARARGS, PolGainSolve_docstring},
+    {"ReadData", Solver_ReadData, METH_VARARGS, ReadData_docstring},
+    {"GetChi2", Solver_GetChi2, METH_VARARGS, GetChi2_docstring},
+    {"GetChi2Grad", Solver_GetChi2Grad, METH_VARARGS, GetChi2Grad_docstring},
+    {"GetIFs", Solver_GetIFs, METH_VARARGS, GetIFs_docstring},
+    {"DoGFF", Solver_DoGFF, METH_VARARGS, DoGFF_docstring},
+    {"SetFringeRates", Solver_SetFringeRates, METH_VARARGS, SetFringeRates_docstring},
+    {"GetNScan",Solver_GetNScan, METH_VARARGS, GetNScan_docstring},
+    {"GetNchan",Solver_GetNchan, METH_VARARGS, GetNchan_docstring},
+    {"FreeData", Solver_FreeData, METH_VARARGS, FreeData_docstring},
+    {"SetFit", Solver_SetFit, METH_VARARGS, SetFit_docstring},
+    {"PreAverage", Solver_PreAverage, METH_VARARGS, PreAverage_docstring},
+    {"GetChi2Count", Solver_GetChi2Count, METH_VARARGS, GetChi2Count_docstring},
+    {"LMSolve", Solver_LMSolve, METH_VARARGS, LMSolve_docstring},
+    {NULL, NULL, 0, NULL}
+};
+
+
+static PyObject *Solver_new(PyTypeObject *type, PyObject *args, PyObject *kwds){
+  SolverObject *self = (SolverObject *) type->tp_alloc(type, 0);
+  if (self != NULL){self->S = new GainSolver();};
+  return (PyObject *) self;
+};
+
+static void Solver_dealloc(PyObject *self){
+  delete ((SolverObject *) self)->S;
+  Py_TYPE(self)->tp_free(self);
+};
+
+static PyTypeObject SolverType = {PyVarObject_HEAD_INIT(NULL, 0)};
+
+// Registers the Solver type in the module:
+static int addSolverType(PyObject *m){
+  SolverType.tp_name = "_PolGainSolve.Solver";
+  SolverType.tp_basicsize = sizeof(SolverObject);
+  SolverType.tp_flags = Py_TPFLAGS_DEFAULT;
+  SolverType.tp_doc = Solver_docstring;
+  SolverType.tp_methods = solver_methods;
+  SolverType.tp_new = Solver_new;
+  SolverType.tp_dealloc = Solver_dealloc;
+  if (PyType_Ready(&SolverType) < 0){return -1;};
+  Py_INCREF(&SolverType);
+  return PyModule_AddObject(m, "Solver", (PyObject *) &SolverType);
+};
+
 
 
 
@@ -154,7 +483,6 @@ static PyMethodDef module_methods[] = {
 //    gsl_death_by = gsl_errno;
 //}
  
-static long chisqcount = 0;
 //static long twincounter = 0;
 
 
@@ -174,8 +502,9 @@ static struct PyModuleDef pc_module_def = {
 PyMODINIT_FUNC PyInit__PolGainSolve(void)
 {
     PyObject *m = PyModule_Create(&pc_module_def);
-  //  import_array();
+    import_array();
   //  (void)gsl_set_error_handler(gsl_death);
+    if (m == NULL || addSolverType(m) < 0){return NULL;};
     return(m);
 }
 #else
@@ -185,68 +514,62 @@ PyMODINIT_FUNC init_PolGainSolve(void)
   //  (void)gsl_set_error_handler(gsl_death);
     if (m == NULL)
         return;
+    addSolverType(m);
 
 }
 #endif
 ///////////////////////
 
 
-   char message[512];
 
-   bool doParang;
 
-   static double TWOPI = 6.283185307179586;
+GainSolver::GainSolver(){
+  int i;
+  for(i=0;i<5;i++){Rates[i] = nullptr; Delays[i] = nullptr;};
+};
 
-   int MaxChan = 1;
-   int MAXIF = 8; // Will reallocate if needed.
-   int NCalAnt, Nlin, Ncirc, *Nchan, SolMode, SolAlgor;
-   int *IFNum;
-   int *Lant, *Cant, *NVis, *NLVis, *NCVis, *CalAnts, *NScan;
-   int *Twins[2], Ntwin;
-   int solveAmp, useCov, solveQU;
-   int *LinBasNum, NLinBas;
-   int NIF, NIFComp;
-   int NBas, NantFit, Npar=-1;
-   int npix = 0;
-   double **Frequencies, ***Rates[5], ***Delays[5];
-   double *Tm = nullptr;
-   double *BasWgt;
-   int *doIF, *antFit; 
-   
-   double *feedAngle;
-   double **DStokes; // = new double*[1];
-   double UVTAPER = 1.e9;
-
-   double Chi2Old = 0.0;
-   double TAvg = 1.0;
-   double RelWeight = 1.0;
-   double T0, T1, DT;
-   int **Ant1, **Ant2, **BasNum, **Scan;
-   double **Times, **ScanDur, **Weights, *CovMat, *IndVec, *SolVec;
-   double **UVGauss;
-   cplx64f **PA1, **PA2, **auxC00, **auxC01, **auxC10, **auxC11;
-   cplx64f **auxC00Flp, **auxC11Flp; // To better check Parangle Flip.
-   cplx64f ***RR, ***RL, ***LR, ***LL, **CrossSpec00, **CrossSpec11;
-   double *UVWeights;
-   double SNR_CUTOFF;
-   double Lambda;
-   bool doCov;
-   double Stokes[4];
 
- //  gsl_matrix_view m; 
- //  gsl_vector_view x, v;
- //  gsl_permutation *perm;
 
-   bool AddCrossHand = true;
-   bool AddParHand = true;
-   bool StokesSolve;
+// The lock is taken with the GIL released, so that a thread waiting for it
+// does not block a Chi2 (or LMSolve) that is running without the GIL:
+PyObject *GainSolver::call(PyObject *(GainSolver::*method)(PyObject *), PyObject *args){
+
+  std::unique_lock<std::mutex> Guard(Chi2Lock, std::defer_lock);
 
-   cplx64f *G1,*G2, *G1nu, *G2nu; 
-   double *DirDer,*MBD1,*MBD2;
-   int *DerIdx,*AvVis;
+  Py_BEGIN_ALLOW_THREADS
+  Guard.lock();
+  Py_END_ALLOW_THREADS
 
+  return (this->*method)(args);
 
-   FILE *logFile = nullptr;
+};
+
+
+
+GainSolver::~GainSolver(){
+  int i;
+  if (Tm){releaseFit(Npar);};
+  if (NIF>0){releaseData();};
+  if (BasNum){
+    for(i=0;i<MaxAnt;i++){delete[] BasNum[i];};
+    delete[] BasNum;
+    delete[] LinBasNum;
+    delete[] BasWgt;
+    for(i=0;i<NBas;i++){
+      delete[] auxC00[i]; delete[] auxC01[i]; delete[] auxC10[i]; delete[] auxC11[i];
+      delete[] auxC00Flp[i]; delete[] auxC11Flp[i];
+      free(CrossSpec00[i]); free(CrossSpec11[i]);
+    };
+    delete[] auxC00; delete[] auxC01; delete[] auxC10; delete[] auxC11;
+    delete[] auxC00Flp; delete[] auxC11Flp;
+    free(CrossSpec00); free(CrossSpec11);
+    delete[] UVWeights;
+    delete[] CalIdx; delete[] FitIdx; delete[] IsLin;
+  };
+  for(i=0;i<4;i++){fftw_free(FFTIn[i]); fftw_free(FFTOut[i]);};
+  fftw_free(FFTAux);
+  if (logFile){fclose(logFile);};
+};
 
 
 
@@ -471,7 +794,7 @@ bool solveSystem(int Neq, double *HessianOrig, double *ResidualsOrig, double *So
 
 
 
-static PyObject *GetNchan(PyObject *self, PyObject *args){
+PyObject *GainSolver::GetNchan(PyObject *args){
   int cIF, k, j;
   PyObject *ret;
 
@@ -509,7 +832,7 @@ static PyObject *GetNchan(PyObject *self, PyObject *args){
 
 
 
-static PyObject *GetNScan(PyObject *self, PyObject *args){
+PyObject *GainSolver::GetNScan(PyObject *args){
   int cIF, k, j;
   PyObject *ret;
 
@@ -549,7 +872,16 @@ static PyObject *GetNScan(PyObject *self, PyObject *args){
 
 
 
-static PyObject *PolGainSolve(PyObject *self, PyObject *args){
+// Number of Chi2 evaluations (e.g., to compare the convergence of the fits):
+PyObject *GainSolver::GetChi2Count(PyObject *args){
+  PyObject *ret = Py_BuildValue("l",chisqcount);
+  return ret;
+};
+
+
+
+
+PyObject *GainSolver::PolGainSolve(PyObject *args){
 
   PyObject *calant, *linant, *solints, *flagBas, *logNameObj;
 
@@ -618,13 +950,28 @@ static PyObject *PolGainSolve(PyObject *self, PyObject *args){
   int i,j,k,l;
   k=0;
 
-  int MaxAnt = 0;
+  MaxAnt = 0;
   for(i=0;i<NCalAnt;i++){
     if(CalAnts[i]>MaxAnt){
       MaxAnt=CalAnts[i];
     };
   };
 
+// Antenna lookup tables:
+  delete[] CalIdx; delete[] FitIdx; delete[] IsLin;
+  CalIdx = new int[MaxAnt];
+  FitIdx = new int[MaxAnt];
+  IsLin = new bool[MaxAnt];
+  for(i=0;i<MaxAnt;i++){
+    CalIdx[i] = -1; FitIdx[i] = -1; IsLin[i] = false;
+  };
+  for(i=0;i<NCalAnt;i++){
+    if(CalAnts[i]>0){CalIdx[CalAnts[i]-1] = i;};
+  };
+  for(i=0;i<Nlin;i++){
+    if(Lant[i]>0 && Lant[i]<=MaxAnt){IsLin[Lant[i]-1] = true;};
+  };
+
   BasNum = new int*[MaxAnt];
   LinBasNum = new int[MaxAnt*(MaxAnt-1)/2];
   NLinBas = 0;
@@ -716,6 +1063,9 @@ static PyObject *PolGainSolve(PyObject *self, PyObject *args){
   LR = (cplx64f***) malloc(MAXIF*sizeof(cplx64f**));
   RL = (cplx64f***) malloc(MAXIF*sizeof(cplx64f**));
   LL = (cplx64f***) malloc(MAXIF*sizeof(cplx64f**));
+  VisBas = (int**) malloc(MAXIF*sizeof(int*));
+  ChanBin = (int*) malloc(MAXIF*sizeof(int));
+  PreAveraged = false;
  // Rates = (double ***) malloc(MAXIF*sizeof(double**));
   for(i=0;i<5;i++){
     Rates[i] = (double ***) malloc(MAXIF*sizeof(double**));
@@ -733,14 +1083,29 @@ static PyObject *PolGainSolve(PyObject *self, PyObject *args){
 
 
 
-static PyObject *FreeData(PyObject *self, PyObject *args) {
-
-  int i,j; 
+PyObject *GainSolver::FreeData(PyObject *args) {
 
   if (!logFile) logFile = fopen("PolConvert.GainSolve.log","a");
   sprintf(message,"Freeing Data NIF = %d\n", NIF);
   fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
 
+  if(releaseData()){
+    PyObject *ret = Py_BuildValue("i",0);
+    return ret;
+  };
+
+// Problem with NIF. Returns error:
+  PyObject *ret = Py_BuildValue("i",1);
+  return ret;
+};
+
+
+
+// Releases the memory of the data read by ReadData. 
+// Returns false if there was no data:
+bool GainSolver::releaseData() {
+
+  int i,j; 
 
   for(i=0;i<NIF;i++){
     for(j=0;j<NVis[i]+1;j++){
@@ -750,23 +1115,30 @@ static PyObject *FreeData(PyObject *self, PyObject *args) {
     free(Ant1[i]);free(Ant2[i]);free(Scan[i]);free(Times[i]);
     free(PA1[i]);free(PA2[i]);free(RR[i]);free(RL[i]);free(UVGauss[i]);
     free(LR[i]);free(LL[i]);free(ScanDur[i]);free(Weights[i]);
+    free(VisBas[i]);
     delete Frequencies[i];
   };
 
-  delete(UVWeights);
+  delete[] UVWeights;
+  UVWeights = nullptr;
+
+// The Chi2 tasks refer to these data:
+  releaseChi2Tables();
 
   if(NIF>0){
     free(NScan);free(Nchan);free(NVis);
     free(NCVis);free(NLVis);free(IFNum);
     free(Frequencies); free(Scan);
+    free(Ant1); free(Ant2); free(Times); free(Weights); free(ScanDur);
+    free(PA1); free(PA2); free(UVGauss);
+    free(RR); free(LR); free(RL); free(LL); free(VisBas); free(ChanBin);
+    for(i=0;i<5;i++){free(Rates[i]); free(Delays[i]);};
     NIF = -1;
-    PyObject *ret = Py_BuildValue("i",0);
-    return ret;
+    PreAveraged = false;
+    return true;
   };
 
-// Problem with NIF. Returns error:
-  PyObject *ret = Py_BuildValue("i",1);
-  return ret;
+  return false;
 };
 
 
@@ -778,11 +1150,11 @@ static PyObject *FreeData(PyObject *self, PyObject *args) {
 // In addition, arrange the data in scans.
 // MaxDT is the maximum allowed time separation between 
 // neighboring entries of the same scan (in seconds).
-static PyObject *ReadData(PyObject *self, PyObject *args) {
+PyObject *GainSolver::ReadData(PyObject *args) {
 
   int IFN;
   const char *file1, *file2;
-  std::ifstream CPfile, MPfile;
+  FringeMap CPfile, MPfile;
   double MaxDT;
 
   if (!logFile) logFile = fopen("PolConvert.GainSolve.log","a");
@@ -801,12 +1173,28 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
 
 
   int i, j, k;
+  long v;
   double AuxT, AuxPA1, AuxPA2, AuxUV;
   bool is1, is2;
 
 
-  CPfile.open(file1, std::ios::in | std::ios::binary);
-  MPfile.open(file2, std::ios::in | std::ios::binary);
+// Map the files (Circ Pol, with the frequencies, and Mix Pol):
+  if (!mapFringe(file1,4,&CPfile) || CPfile.head->nfreq != CPfile.head->nchan ||
+      CPfile.head->nchan <= 0){
+     unmapFringe(&CPfile);
+     sprintf(message,"Failed ReadData! %s is missing or bad (return -6)\n",file1); 
+     fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+     PyObject *ret = Py_BuildValue("i",-6);
+     return ret;
+  };
+  if (!mapFringe(file2,12,&MPfile) ||
+      (MPfile.head->nvis > 0 && MPfile.head->nchan != CPfile.head->nchan)){
+     unmapFringe(&CPfile); unmapFringe(&MPfile);
+     sprintf(message,"Failed ReadData! %s is missing or bad (return -6)\n",file2); 
+     fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+     PyObject *ret = Py_BuildValue("i",-6);
+     return ret;
+  };
 
 
 
@@ -845,14 +1233,16 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
     LR = (cplx64f***) realloc(LR,MAXIF*sizeof(cplx64f**));
     RL = (cplx64f***) realloc(RL,MAXIF*sizeof(cplx64f**));
     LL = (cplx64f***) realloc(LL,MAXIF*sizeof(cplx64f**));
+    VisBas = (int**) realloc(VisBas,MAXIF*sizeof(int*));
+    ChanBin = (int*) realloc(ChanBin,MAXIF*sizeof(int));
    // Rates = (double ***) realloc(Rates,MAXIF*sizeof(double**));
     for(i=0;i<5;i++){
       Delays[i] = (double ***) realloc(Delays[i],MAXIF*sizeof(double**));
       Rates[i] = (double ***) realloc(Rates[i],MAXIF*sizeof(double**));
     };
-    if(!Ant1 || !Ant2 || !Times || !Weights || !PA1 || !PA2 || !RR || !LR || !RL || !LL){
+    if(!Ant1 || !Ant2 || !Times || !Weights || !PA1 || !PA2 || !RR || !LR || !RL || !LL || !VisBas || !ChanBin){
       Ant1=nullptr; Ant2=nullptr; Times=nullptr; PA1=nullptr; PA2=nullptr; UVGauss=nullptr;
-      RR=nullptr; LR=nullptr; RL=nullptr; LL=nullptr; ScanDur=nullptr; Weights=nullptr;
+      RR=nullptr; LR=nullptr; RL=nullptr; LL=nullptr; ScanDur=nullptr; Weights=nullptr; VisBas=nullptr; ChanBin=nullptr;
       fprintf(logFile,"(return -3)"); fflush(logFile);
       PyObject *ret = Py_BuildValue("i",-3);
       return ret;
@@ -870,8 +1260,9 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
 // IF NUMBER:
   IFNum[NIF-1] = IFN;
 
-// Number of channels for this IF:
-  CPfile.read(reinterpret_cast<char*>(&Nchan[NIF-1]), sizeof(int));
+// Number of channels for this IF (not averaged):
+  Nchan[NIF-1] = CPfile.head->nchan;
+  ChanBin[NIF-1] = 1;
   fprintf(logFile, "IF%d has %i channels\n",IFN,Nchan[NIF-1]); fflush(logFile);
   printf("IF%d (%i) has %i channels\n",IFN,NIF,Nchan[NIF-1]); fflush(stdout);
 
@@ -891,16 +1282,13 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
   };
 
 
-// ignores noI
-  MPfile.ignore(sizeof(int));
-
 // Have we applied parang??
-  MPfile.read(reinterpret_cast<char*>(&doParang), sizeof(bool));
+  doParang = MPfile.head->doParang != 0;
 
 
 // Get frequencies for this IF:
   Frequencies[NIF-1] = new double[Nchan[NIF-1]];
-  CPfile.read(reinterpret_cast<char*>(Frequencies[NIF-1]), Nchan[NIF-1]*sizeof(double));
+  memcpy(Frequencies[NIF-1],CPfile.Freqs,Nchan[NIF-1]*sizeof(double));
 
   fprintf(logFile,"Freqs. %.8e  %.8e\n",
       Frequencies[NIF-1][0],Frequencies[NIF-1][Nchan[NIF-1]-1]);
@@ -922,22 +1310,14 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
 
   fprintf(logFile,"Reading CPfile...(NCalAnt=%d)\n", NCalAnt); fflush(logFile);
 
-// eof() doesn't do what everyone thinks....
-  while(!CPfile.eof() && CPfile.peek() >= 0){
-    is1 = false; is2 = false;
-  //  CPfile.ignore(sizeof(int));
-    CPfile.ignore(sizeof(double));   // daytemp
-    CPfile.read(reinterpret_cast<char*>(&AuxA1), sizeof(int));
-    CPfile.read(reinterpret_cast<char*>(&AuxA2), sizeof(int));
-    for (i=0; i<NCalAnt; i++) {
-      if (AuxA1 == CalAnts[i]){is1=true;}; 
-      if (AuxA2 == CalAnts[i]){is2=true;};
-    };
+  for (v=0; v<CPfile.head->nvis; v++){
+    AuxA1 = CPfile.Ant1[v];
+    AuxA2 = CPfile.Ant2[v];
+    is1 = calIndex(AuxA1)>=0;
+    is2 = calIndex(AuxA2)>=0;
     if(is1 && is2 && AuxA1 != AuxA2){
       NCVis[NIF-1] += 1;
     };
-// here we are ignoring all the visibility data
-  CPfile.ignore(3*sizeof(double)+4*Nchan[NIF-1]*sizeof(cplx32f)); 
   };
   fprintf(logFile,"Finished CPfile...\n"); fflush(logFile);
 
@@ -947,21 +1327,14 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
 
 
   fprintf(logFile,"Reading MPfile... (NCalAnt=%d)\n", NCalAnt); fflush(logFile);
-// eof() doesn't do what everyone thinks....
-  while(!MPfile.eof() && MPfile.peek() >= 0){
-    is1 = false; is2 = false;
-    MPfile.ignore(sizeof(int));
-    MPfile.ignore(sizeof(double)); // Time
-    MPfile.read(reinterpret_cast<char*>(&AuxA1), sizeof(int));
-    MPfile.read(reinterpret_cast<char*>(&AuxA2), sizeof(int));
-    for (i=0; i<NCalAnt; i++) {
-      if (AuxA1 == CalAnts[i]){is1=true;}; 
-      if (AuxA2 == CalAnts[i]){is2=true;};
-    };
+  for (v=0; v<MPfile.head->nvis; v++){
+    AuxA1 = MPfile.Ant1[v];
+    AuxA2 = MPfile.Ant2[v];
+    is1 = calIndex(AuxA1)>=0;
+    is2 = calIndex(AuxA2)>=0;
     if(is1 && is2 && AuxA1 != AuxA2){
       NLVis[NIF-1] += 1;
     };
-    MPfile.ignore(3*sizeof(double)+12*Nchan[NIF-1]*sizeof(cplx32f)); 
   };
 
   fprintf(logFile,"Finished MPfile...\n"); fflush(logFile);
@@ -993,40 +1366,30 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
     LL[NIF-1][i] = (cplx64f*) malloc(Nchan[NIF-1]*sizeof(cplx64f)); 
   };
 
-// Rewind files:
-  CPfile.clear();
-  CPfile.seekg(sizeof(int)+Nchan[NIF-1]*sizeof(double),CPfile.beg);
-
-  MPfile.clear();
-  MPfile.seekg(sizeof(int)+sizeof(bool),MPfile.beg);
-
-  fprintf(logFile, "\nFiles rewound\n"); fflush(logFile);
-
 // Read visibilities (Mix Pol):
   int currI = 0;
   bool isGood, isFlipped;
   cplx64f Exp1, Exp2;
   cplx32f AuxRR, AuxRL, AuxLR, AuxLL;
-
-  i=0;
-  while(!MPfile.eof() && MPfile.peek() >= 0){
-// MPfile timestamp is here
-    MPfile.ignore(sizeof(int));
-    MPfile.read(reinterpret_cast<char*>(&AuxT), sizeof(double));
-    MPfile.read(reinterpret_cast<char*>(&AuxA1), sizeof(int));
-    MPfile.read(reinterpret_cast<char*>(&AuxA2), sizeof(int));
-    MPfile.read(reinterpret_cast<char*>(&AuxPA1), sizeof(double));
-    MPfile.read(reinterpret_cast<char*>(&AuxPA2), sizeof(double));
-    MPfile.read(reinterpret_cast<char*>(&AuxUV), sizeof(double));
+  cplx32f *VisRow;
+  long nch = Nchan[NIF-1];
+
+  for (v=0; v<MPfile.head->nvis; v++){
+    AuxT = MPfile.Time[v];
+    AuxA1 = MPfile.Ant1[v];
+    AuxA2 = MPfile.Ant2[v];
+    AuxPA1 = MPfile.PA1[v];
+    AuxPA2 = MPfile.PA2[v];
+    AuxUV = MPfile.UVDist[v];
+// Calibrated products (the 4 after the uncalibrated ones):
+    VisRow = &MPfile.Vis[v*12*nch + 4*nch];
     
 // Check if visib is observed by CalAnts:
     isGood = false; is1 = false; is2 = false;
     isFlipped = false;
 
-    for (j=0; j<NCalAnt; j++) {
-      if (AuxA1 == CalAnts[j]){is1=true;}; 
-      if (AuxA2 == CalAnts[j]){is2=true;};
-    };
+    is1 = calIndex(AuxA1)>=0;
+    is2 = calIndex(AuxA2)>=0;
 
     if (is1 && is2 && AuxA1 != AuxA2){
       isFlipped = AuxA1 > AuxA2;
@@ -1059,15 +1422,10 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
      };
 
      for (k=0;k<Nchan[NIF-1];k++){
-// Jump Uncal Data:
-       MPfile.ignore(4*sizeof(cplx32f));
-// Read Cal Data:
-       MPfile.read(reinterpret_cast<char*>(&AuxRR), sizeof(cplx32f));
-       MPfile.read(reinterpret_cast<char*>(&AuxRL), sizeof(cplx32f));
-       MPfile.read(reinterpret_cast<char*>(&AuxLR), sizeof(cplx32f));
-       MPfile.read(reinterpret_cast<char*>(&AuxLL), sizeof(cplx32f));
-// Jump Matrix:
-       MPfile.ignore(4*sizeof(cplx32f));
+       AuxRR = VisRow[k];
+       AuxRL = VisRow[nch+k];
+       AuxLR = VisRow[2*nch+k];
+       AuxLL = VisRow[3*nch+k];
 // Apply ParAng to antennas with Circ Pol:
        if (isFlipped){
          RR[NIF-1][currI][k] = conj((cplx64f) AuxRR);
@@ -1092,9 +1450,6 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
      };
      currI += 1; isGood = true;
    };
-   if(!isGood){
-     MPfile.ignore(12*Nchan[NIF-1]*sizeof(cplx32f));
-   };
 
   };
   printf("Reached MP eof\n");
@@ -1107,27 +1462,22 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
 
 // Read visibilities (Circ Pol):
 
-  while(!CPfile.eof() && CPfile.peek() >= 0){
-// CPfile timestamp is here
-//    CPfile.ignore(sizeof(int));
-
-
-    CPfile.read(reinterpret_cast<char*>(&AuxT), sizeof(double));
-    CPfile.read(reinterpret_cast<char*>(&AuxA1), sizeof(int));
-    CPfile.read(reinterpret_cast<char*>(&AuxA2), sizeof(int));
-    CPfile.read(reinterpret_cast<char*>(&AuxPA1), sizeof(double));
-    CPfile.read(reinterpret_cast<char*>(&AuxPA2), sizeof(double));
-    CPfile.read(reinterpret_cast<char*>(&AuxUV), sizeof(double));
+  for (v=0; v<CPfile.head->nvis; v++){
+    AuxT = CPfile.Time[v];
+    AuxA1 = CPfile.Ant1[v];
+    AuxA2 = CPfile.Ant2[v];
+    AuxPA1 = CPfile.PA1[v];
+    AuxPA2 = CPfile.PA2[v];
+    AuxUV = CPfile.UVDist[v];
+    VisRow = &CPfile.Vis[v*4*nch];
 // Check if visib is observed by CalAnts:
     isGood = false; is1 = false; is2 = false;
     isFlipped = false;
 
 
 
-    for (j=0; j<NCalAnt; j++) {
-      if (AuxA1 == CalAnts[j]){is1=true;}; 
-      if (AuxA2 == CalAnts[j]){is2=true;};
-    };
+    is1 = calIndex(AuxA1)>=0;
+    is2 = calIndex(AuxA2)>=0;
 
 
     if (is1 && is2 && AuxA1 != AuxA2){
@@ -1175,10 +1525,10 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
     for (k=0;k<Nchan[NIF-1];k++){
 
 
-      CPfile.read(reinterpret_cast<char*>(&AuxRR), sizeof(cplx32f));
-      CPfile.read(reinterpret_cast<char*>(&AuxRL), sizeof(cplx32f));
-      CPfile.read(reinterpret_cast<char*>(&AuxLR), sizeof(cplx32f));
-      CPfile.read(reinterpret_cast<char*>(&AuxLL), sizeof(cplx32f));
+      AuxRR = VisRow[k];
+      AuxRL = VisRow[nch+k];
+      AuxLR = VisRow[2*nch+k];
+      AuxLL = VisRow[3*nch+k];
 
 
       if (isFlipped){
@@ -1196,17 +1546,11 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
     currI += 1; isGood = true;
   };
 
-
-  if(!isGood){
-    CPfile.ignore(4*Nchan[NIF-1]*sizeof(cplx32f));
-  };
-
-
   };
 
   printf("DONE READ!\n"); fflush(stdout);
-  CPfile.close();
-  MPfile.close();
+  unmapFringe(&CPfile);
+  unmapFringe(&MPfile);
 
 
 
@@ -1266,6 +1610,14 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
 
 
 
+// Baseline of each visibility:
+  VisBas[NIF-1] = (int*) malloc(NVis[NIF-1]*sizeof(int));
+  for(j=0;j<NVis[NIF-1];j++){
+    VisBas[NIF-1][j] = BasNum[Ant1[NIF-1][j]-1][Ant2[NIF-1][j]-1];
+  };
+
+
+
 // FOR TESTING: PRINT PARANGLES AT START OF EACH SCAN:
 //int kk;
 //for(i=0;i<NScan[NIF-1];i++){
@@ -1320,7 +1672,7 @@ static PyObject *ReadData(PyObject *self, PyObject *args) {
 #if 0
 /// GetIFs(ifNr) for invocation from Python like
 ///    AllFreqs = []; ifsofIF = PS.GetIFs(pli); AllFreqs.append(ifsofIF)
-static PyObject *GetIFs(PyObject *self, PyObject *args) {
+PyObject *GainSolver::GetIFs(PyObject *args) {
 int i,j,k;
 
   PyObject *FreqsObj = PyList_New(0);
@@ -1362,7 +1714,7 @@ int i,j,k;
 #else
 /// GetIFs(ifNr) for invocation from Python like
 ///    AllFreqs = [];  AllFreqs.append(np.zeros(PS.GetNchan(pli), order="C", dtype=np.float)); rc = PS.GetIFs(pli, AllFreqs[-1])
-static PyObject *GetIFs(PyObject *self, PyObject *args) {  
+PyObject *GainSolver::GetIFs(PyObject *args) {  
 int i,j,k;
 
   PyObject *FreqsObj;
@@ -1446,7 +1798,7 @@ double QuinnEstimate(cplx64f *FFTVec){
 
 
 
-static PyObject *SetFringeRates(PyObject *self, PyObject *args) {
+PyObject *GainSolver::SetFringeRates(PyObject *args) {
 
 
   int i,j,k,NantFix,cIF,cScan;
@@ -1487,7 +1839,15 @@ static PyObject *SetFringeRates(PyObject *self, PyObject *args) {
 
 
 
-static PyObject *DoGFF(PyObject *self, PyObject *args) {
+PyObject *GainSolver::DoGFF(PyObject *args) {
+
+  if (PreAveraged){
+    if (!logFile) logFile = fopen("PolConvert.GainSolve.log","a");
+    sprintf(message,"DoGFF needs the original data, but they have been pre-averaged! (return -2)\n");
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
+    PyObject *ret = Py_BuildValue("i",-2);
+    return ret;
+  };
 
   int i,j,k,l,m, a1,a2, af1, af2, BNum,cScan;
   double *T0 = new double[NBas];  
@@ -1503,9 +1863,10 @@ static PyObject *DoGFF(PyObject *self, PyObject *args) {
   };
 
   PyObject *antList;
+  const char *wisdom = "";
 
   if (!logFile) logFile = fopen("PolConvert.GainSolve.log","a");
-  if (!PyArg_ParseTuple(args, "Oiiid", &antList,&npix, &applyRate,&cScan,&SNR_CUTOFF)){
+  if (!PyArg_ParseTuple(args, "Oiiid|s", &antList,&npix, &applyRate,&cScan,&SNR_CUTOFF,&wisdom)){
      sprintf(message,"Failed DoGFF! Check inputs!\n"); 
      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
      fclose(logFile);
@@ -1513,6 +1874,18 @@ static PyObject *DoGFF(PyObject *self, PyObject *args) {
      return ret;
   };
 
+// Read the FFTW wisdom (only the first time that we see the file):
+  bool useWisdom = strlen(wisdom)>0;
+  if (useWisdom && WisdomFile != wisdom){
+    WisdomFile = wisdom;
+    if (fftw_import_wisdom_from_filename(wisdom)){
+      sprintf(message,"Read FFTW wisdom from %s\n",wisdom);
+    } else {
+      sprintf(message,"No FFTW wisdom read from %s. Will write it there.\n",wisdom);
+    };
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+  };
+
 
   if (applyRate==0){
     sprintf(message,"\n\n   DoGFF: Residual rate will NOT be estimated\n\n");
@@ -1530,6 +1903,7 @@ static PyObject *DoGFF(PyObject *self, PyObject *args) {
   for (i=0; i<NantFit; i++){
     antFit[i] = (int) PyInt_AsLong(PyList_GetItem(antList,i));
   };
+  setFitIdx();
 
 // One element per polarization product:
   double ***BLRates = new double **[4];
@@ -1546,30 +1920,29 @@ static PyObject *DoGFF(PyObject *self, PyObject *args) {
     };
   };
 
-  int prevChan = Nchan[0];
-  int prevNvis = NVis[0]/NBas;
+  int prevChan = -1;
+  int prevNvis = -1;
 
 // FFT FOR EACH BASELINE:
   int TotDim = NVis[0]*Nchan[0];
   int MaxDim = TotDim;
   for (j=1; j<NIF; j++){if(NVis[j]*Nchan[j]>MaxDim){MaxDim=NVis[j]*Nchan[j];};};
 
-    fftw_complex **BufferVis = new fftw_complex *[4];
-    fftw_complex **out = new fftw_complex *[4];
-    BufferVis[0] = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
-    BufferVis[1] = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
-    BufferVis[2] = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
-    BufferVis[3] = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
-    fftw_complex *AUX = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
-    out[0] = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
-    out[1] = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
-    out[2] = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
-    out[3] = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
-    fftw_plan *pFT = new fftw_plan[4];
-    pFT[0] = fftw_plan_dft_2d(prevNvis, Nchan[0], BufferVis[0], out[0], FFTW_FORWARD, FFTW_MEASURE);
-    pFT[1] = fftw_plan_dft_2d(prevNvis, Nchan[0], BufferVis[1], out[1], FFTW_FORWARD, FFTW_MEASURE);
-    pFT[2] = fftw_plan_dft_2d(prevNvis, Nchan[0], BufferVis[2], out[2], FFTW_FORWARD, FFTW_MEASURE);
-    pFT[3] = fftw_plan_dft_2d(prevNvis, Nchan[0], BufferVis[3], out[3], FFTW_FORWARD, FFTW_MEASURE);
+// The buffers are only reallocated if they are too small:
+    if (MaxDim > FFTSize){
+      for (k=0; k<4; k++){
+        fftw_free(FFTIn[k]); fftw_free(FFTOut[k]);
+        FFTIn[k] = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
+        FFTOut[k] = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
+      };
+      fftw_free(FFTAux);
+      FFTAux = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * MaxDim);
+      FFTSize = MaxDim;
+    };
+    fftw_complex **BufferVis = FFTIn;
+    fftw_complex **out = FFTOut;
+    fftw_complex *AUX = FFTAux;
+    fftw_plan pFT = NULL;
 
     cplx64f *Temp[4];
     cplx64f *BufferC[4];
@@ -1629,9 +2002,7 @@ static PyObject *DoGFF(PyObject *self, PyObject *args) {
 
 // Arrange data for this baseline:
         for (k=0; k<NVis[i]; k++){
-          a1 = Ant1[i][k];
-          a2 = Ant2[i][k];
-          BNum = BasNum[a1-1][a2-1];
+          BNum = VisBas[i][k];
           if (BNum==j && Scan[i][k]==cScan){
             inMatrix[NinMatrix]=k;
             NinMatrix += 1;
@@ -1681,18 +2052,13 @@ static PyObject *DoGFF(PyObject *self, PyObject *args) {
           fprintf(logFile,"%s",message); // std::cout<<message; 
           fflush(logFile);  
 
-// Re-define the FFTW plan if dimensions changed:
+// Get the FFTW plan if dimensions changed (the planner 
+// only overwrites the scratch buffer AUX and out[0]):
           if (Nchan[i] != prevChan || NcurrVis != prevNvis){
             prevChan = Nchan[i]; prevNvis = NcurrVis;
-
-            for(k=0;k<4;k++){
-              memcpy(&AUX[0],&BufferVis[k][0],NcurrVis*Nchan[i]*sizeof(fftw_complex));
-              fftw_destroy_plan(pFT[k]);  
-              pFT[k] = fftw_plan_dft_2d(NcurrVis, Nchan[i], BufferVis[k], out[k], FFTW_FORWARD, FFTW_MEASURE);
-              memcpy(&BufferVis[k][0],&AUX[0],NcurrVis*Nchan[i]*sizeof(fftw_complex));
-            };
+            pFT = getFFTPlan(NcurrVis, Nchan[i], AUX, out[0]);
           };
-          for(k=0;k<4;k++){fftw_execute(pFT[k]);};
+          for(k=0;k<4;k++){fftw_execute_dft(pFT, BufferVis[k], out[k]);};
         };
 
 
@@ -1973,11 +2339,8 @@ static PyObject *DoGFF(PyObject *self, PyObject *args) {
         for (a1=0; a1<NCalAnt; a1++){
           for (a2=a1+1;a2<NCalAnt;a2++){
 
-            af1 = -1; af2 = -1;
-            for(j=0; j<NantFit; j++) {
-              if (CalAnts[a1]==antFit[j]){af1 = j;};
-              if (CalAnts[a2]==antFit[j]){af2 = j;};
-            };
+            af1 = FitIdx[CalAnts[a1]-1];
+            af2 = FitIdx[CalAnts[a2]-1];
             BNum = BasNum[CalAnts[a1]-1][CalAnts[a2]-1];
 
             for(j=0;j<Ntwin;j++){
@@ -2106,14 +2469,7 @@ static PyObject *DoGFF(PyObject *self, PyObject *args) {
 
 
       for(j=0;j<5;j++){Delays[j][0][i][cScan] = 0.0; Rates[j][0][i][cScan] = 0.0;};
-        af1 = -1;
-
-        for(j=0; j<NantFit; j++) {
-          if (CalAnts[i]==antFit[j]){
-            af1 = j; 
-            break;
-          };
-        };
+        af1 = FitIdx[CalAnts[i]-1];
        if (af1 >=0){
          if(applyRate>0){
            Rates[4][0][i][cScan] = 0.0;
@@ -2167,12 +2523,18 @@ static PyObject *DoGFF(PyObject *self, PyObject *args) {
   };
 
 
-// Release memory:
-
-  for(m=0;m<4;m++){
-    fftw_free(BufferVis[m]); fftw_free(out[m]);
+// Save the new FFT plans:
+  if (useWisdom && newFFTPlans){
+    if (fftw_export_wisdom_to_filename(WisdomFile.c_str())){newFFTPlans = false;}
+    else {
+      sprintf(message,"WARNING! Could not write FFTW wisdom to %s\n",WisdomFile.c_str());
+      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+    };
   };
 
+
+// Release memory:
+
   delete[] T0;
   delete[] T1;
 
@@ -2240,9 +2602,76 @@ static PyObject *DoGFF(PyObject *self, PyObject *args) {
 
 
 
-static PyObject *SetFit(PyObject *self, PyObject *args) {
+// Releases the memory allocated by SetFit (for NparFit parameters):
+void GainSolver::releaseFit(int NparFit) {
+
+  int i;
+
+  delete[] Tm;
+  delete[] doIF;
+  delete[] antFit;
+  delete[] CovMat;
+  delete[] IndVec;
+  delete[] SolVec;
+  delete[] G1;
+  delete[] G2;
+  delete[] G1nu;
+  delete[] G2nu;
+  for(i=0;i<NparFit+1;i++){delete[] DStokes[i];};
+  delete[] DStokes;
+  delete[] DirDer;
+  delete[] MBD1;
+  delete[] MBD2;
+  delete[] DerIdx;
+  delete[] AvVis;
+  Tm = nullptr;
+  releaseChi2Tables();
+
+};
+
+
+
+
+// Releases the lookup tables of the Chi2 tasks (made by SetFit):
+void GainSolver::releaseChi2Tables() {
+
+  int i;
+
+  if (ChanFreq){
+    for(i=0;i<NIFComp;i++){delete[] ChanFreq[i];};
+    delete[] ChanFreq;
+    ChanFreq = nullptr;
+  };
+  delete[] FitVisStart;
+  delete[] FitVisIdx;
+  FitVisStart = nullptr;
+  FitVisIdx = nullptr;
+
+};
+
+
+
+
+// Fills the index of each antenna in antFit:
+void GainSolver::setFitIdx() {
+
+  int i;
+
+  for(i=0;i<MaxAnt;i++){FitIdx[i] = -1;};
+  for(i=0;i<NantFit;i++){
+    if(antFit[i]>0 && antFit[i]<=MaxAnt){FitIdx[antFit[i]-1] = i;};
+  };
+
+};
+
+
+
+
+
+PyObject *GainSolver::SetFit(PyObject *args) {
 
   int i, j, k, oldNpar = Npar;
+  int nthr = 1;
   bool foundit;
 
   if (!logFile) logFile = fopen("PolConvert.GainSolve.log","a");
@@ -2251,8 +2680,8 @@ static PyObject *SetFit(PyObject *self, PyObject *args) {
 
   PyObject *IFlist, *antList, *calstokes, *ret, *feedPy;
 
-  if (!PyArg_ParseTuple(args, "iOOiiOiO", 
-     &Npar, &IFlist, &antList, &solveAmp, &solveQU, &calstokes, &useCov, &feedPy)){
+  if (!PyArg_ParseTuple(args, "iOOiiOiO|i", 
+     &Npar, &IFlist, &antList, &solveAmp, &solveQU, &calstokes, &useCov, &feedPy, &nthr)){
         sprintf(message,"Failed SetFit! Check inputs!\n"); 
         fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
         fclose(logFile);
@@ -2264,28 +2693,13 @@ static PyObject *SetFit(PyObject *self, PyObject *args) {
   if (Tm){
    // sprintf(message,"Clearing previous allocation objects\n");
    // fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);
-    delete[] Tm;
-    delete[] doIF;
-    delete[] antFit;
-    delete[] CovMat;
-    delete[] IndVec;
-    delete[] SolVec;
-    delete[] G1;
-    delete[] G2;
-    delete[] G1nu;
-    delete[] G2nu;
-    for(i=0;i<oldNpar+1;i++){delete[] DStokes[i];};
-    delete[] DStokes;
-    delete[] DirDer;
-    delete[] MBD1;
-    delete[] MBD2;
-    delete[] DerIdx;
-    delete[] AvVis;
+    releaseFit(oldNpar);
     sprintf(message,"Clearing previous allocation objects\n");
     fprintf(logFile,"%s",message); // std::cout<<message; fflush(logFile);
   };
 
   Tm = new double[NBas];
+  nthreads = nthr;
 
   T0 = Times[0][0];
   T1 = Times[0][NVis[0]-1];
@@ -2308,6 +2722,7 @@ static PyObject *SetFit(PyObject *self, PyObject *args) {
   for (i=0; i<NantFit; i++){
     antFit[i] = (int) PyInt_AsLong(PyList_GetItem(antList,i));
   };
+  setFitIdx();
 
   for (i=0; i<NIFComp; i++){
     foundit = false;
@@ -2324,6 +2739,45 @@ static PyObject *SetFit(PyObject *self, PyObject *args) {
     };
   };
 
+
+
+// Channel offsets (for the MBDs) and visibilities of each IF and baseline. 
+// The visibilities of each baseline are listed in time order:
+  int BNum, task;
+  ChanFreq = new double*[NIFComp];
+  FitVisStart = new int[NIFComp*NBas+1];
+  for (task=0; task<NIFComp*NBas+1; task++){FitVisStart[task] = 0;};
+
+  for (i=0; i<NIFComp; i++){
+    ChanFreq[i] = new double[Nchan[doIF[i]]];
+// (for pre-averaged data, the offset of the mean original channel):
+    for (j=0;j*ChanBin[doIF[i]]<Nchan[doIF[i]];j++){
+      ChanFreq[i][j] = (double) (j*ChanBin[doIF[i]]-Nchan[doIF[i]]/2) + 0.5*(chanWidth(doIF[i],j)-1);
+    };
+    for (k=0; k<NVis[doIF[i]]; k++){
+      BNum = VisBas[doIF[i]][k];
+      if (BNum>=0){FitVisStart[i*NBas+BNum+1] += 1;};
+    };
+  };
+
+  for (task=0; task<NIFComp*NBas; task++){FitVisStart[task+1] += FitVisStart[task];};
+  FitVisIdx = new int[FitVisStart[NIFComp*NBas]];
+
+  int *TaskFill = new int[NIFComp*NBas];
+  for (task=0; task<NIFComp*NBas; task++){TaskFill[task] = FitVisStart[task];};
+  for (i=0; i<NIFComp; i++){
+    for (k=0; k<NVis[doIF[i]]; k++){
+      BNum = VisBas[doIF[i]][k];
+      if (BNum>=0){
+        task = i*NBas+BNum;
+        FitVisIdx[TaskFill[task]] = k;
+        TaskFill[task] += 1;
+      };
+    };
+  };
+  delete[] TaskFill;
+
+
   CovMat = new double[Npar*Npar];
   IndVec = new double[Npar];
   SolVec = new double[Npar];
@@ -2379,76 +2833,548 @@ static PyObject *SetFit(PyObject *self, PyObject *args) {
 
 
 
-static PyObject *GetChi2(PyObject *self, PyObject *args) { 
+// Averages the data of all the IFs in cells of (baseline, scan, time bin 
+// and channel bin), to reduce the cost of the GCPFF. It must be run after 
+// DoGFF (which needs the original data and sets the weights). Each 
+// visibility is rotated to the mean parallactic angles of its cell before 
+// the averaging, so the feed rotation that GetChi2 applies to the cell is 
+// the one that it would apply to each visibility. The cells keep the sums of 
+// their visibilities (and UV weights), so the scale of the Chi2 is kept.
+PyObject *GainSolver::PreAverage(PyObject *args) {
 
-  int Ch0, Ch1;
-  int i, k,l, end;
-  int j= -1;
-  double *CrossG;
-//  double dx = 1.0e-8;
-  double Drate1R, Drate1L, Drate2R, Drate2L, Ddelay1R, Ddelay2R, Ddelay1L, Ddelay2L;
-//  double *DerAux1, *DerAux2;
-//  DerAux1 = new double[2];
-//  DerAux2 = new double[2];
-  PyObject *pars, *ret,*LPy;
-  bool useRates;
+  double TBin;
+  int ChBin;
 
   if (!logFile) logFile = fopen("PolConvert.GainSolve.log","a");
-  if (!PyArg_ParseTuple(args, "OOiiib", &pars, &LPy, &Ch0, &Ch1,&end,&useRates)){
-     sprintf(message,"Failed GetChi2! Check inputs!\n"); 
+
+  if (!PyArg_ParseTuple(args, "di", &TBin, &ChBin)){
+     sprintf(message,"Failed PreAverage! Check inputs! (return -1)\n"); 
      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
-     fclose(logFile);
-    ret = Py_BuildValue("i",-1);
-    return ret;
+     PyObject *ret = Py_BuildValue("i",-1);
+     return ret;
   };
 
+  if (NIF<=0 || PreAveraged){
+     sprintf(message,"PreAverage needs the original data (read them again)! (return -2)\n"); 
+     fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+     PyObject *ret = Py_BuildValue("i",-2);
+     return ret;
+  };
 
-  bool useDelay = false;
-
+  if (ChBin<1){ChBin=1;};
 
-  chisqcount++;
-//  FILE *auxFile;
-//  if (chisqcount==1){auxFile = fopen("PolConvert.GainSolve.Calls","a");};
+  sprintf(message,"Pre-averaging the data in cells of %.1f seconds and %i channels\n",TBin,ChBin);
+  fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
 
 
-  Lambda = PyFloat_AsDouble(LPy);
-  doCov = Lambda >= 0.0;
+  int i, j, k, l, c, s, ac1, ac2, cb, NCell, NBinCh, nb;
+  long TBinIdx;
+  double Rate, Delay, TimeCoh, ChanCoh, CellCoh, MinCoh, SumCoh, SumN;
+  double TotCoh = 0.0, TotN = 0.0, TotMin = 1.0;
+  cplx64f RotRR, RotRL, auxC;
 
+  for (i=0; i<NIF; i++){
 
+    cb = std::min(ChBin, Nchan[i]);
+    NBinCh = (Nchan[i]+cb-1)/cb;
 
-// Find out IFs to compute and do sanity checks:
+// Start time of each scan:
+    std::vector<double> ScanT0(NScan[i], 0.0);
+    std::vector<bool> gotScan(NScan[i], false);
+    for (k=0; k<NVis[i]; k++){
+      s = Scan[i][k];
+      if (!gotScan[s] || Times[i][k]<ScanT0[s]){ScanT0[s] = Times[i][k]; gotScan[s] = true;};
+    };
 
-  for (i=0; i<NIFComp; i++){
-    if (Ch1 > Nchan[doIF[i]]){
-      sprintf(message,"IF %i ONLY HAS %i CHANNELS. CHANNEL %i DOES NOT EXIST! \n",j,Nchan[doIF[i]], Ch1); 
-      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
-      fclose(logFile);
-      ret = Py_BuildValue("i",-1);
-      return ret;
+// Cell of each visibility (the cells are numbered in order of appearance).
+// With no time bin, each visibility has its own cell:
+    std::map<std::pair<long,long>, int> CellMap;
+    std::map<std::pair<long,long>, int>::iterator CellIt;
+    std::vector<int> Cell(NVis[i], -1), CellVis, CellN;
+    std::vector<double> CellT, CellUV;
+    std::vector<cplx64f> CellPA1, CellPA2, CellRate;
+
+    for (k=0; k<NVis[i]; k++){
+      if (VisBas[i][k]<0){continue;};
+      if (TBin>0.0){
+        TBinIdx = (long) std::floor((Times[i][k]-ScanT0[Scan[i][k]])/TBin);
+      } else {
+        TBinIdx = k;
+      };
+      std::pair<long,long> key((long) VisBas[i][k]*NScan[i] + Scan[i][k], TBinIdx);
+      CellIt = CellMap.find(key);
+      if (CellIt == CellMap.end()){
+        c = (int) CellVis.size();
+        CellMap[key] = c;
+        CellVis.push_back(k); CellN.push_back(0);
+        CellT.push_back(0.0); CellUV.push_back(0.0);
+        CellPA1.push_back(0.0); CellPA2.push_back(0.0); CellRate.push_back(0.0);
+      } else {
+        c = CellIt->second;
+      };
+      Cell[k] = c;
+      CellN[c] += 1;
+      CellT[c] += Times[i][k];
+      CellUV[c] += UVGauss[i][k];
+      CellPA1[c] += PA1[i][k];
+      CellPA2[c] += PA2[i][k];
     };
-  };
 
+    NCell = (int) CellVis.size();
+
+
+// Memory for the averaged data:
+    j = NCell+1;
+    int *AvAnt1 = (int*) malloc(j*sizeof(int));
+    int *AvAnt2 = (int*) malloc(j*sizeof(int));
+    int *AvScan = (int*) malloc(j*sizeof(int));
+    int *AvBas = (int*) malloc(j*sizeof(int));
+    double *AvTimes = (double*) malloc(j*sizeof(double));
+    double *AvWeights = (double*) malloc(j*sizeof(double));
+    double *AvUVGauss = (double*) malloc(j*sizeof(double));
+    cplx64f *AvPA1 = (cplx64f*) malloc(j*sizeof(cplx64f));
+    cplx64f *AvPA2 = (cplx64f*) malloc(j*sizeof(cplx64f));
+    cplx64f **AvRR = (cplx64f**) malloc(j*sizeof(cplx64f*));
+    cplx64f **AvRL = (cplx64f**) malloc(j*sizeof(cplx64f*));
+    cplx64f **AvLR = (cplx64f**) malloc(j*sizeof(cplx64f*));
+    cplx64f **AvLL = (cplx64f**) malloc(j*sizeof(cplx64f*));
+    for (c=0; c<j; c++){
+      AvRR[c] = (cplx64f*) calloc(NBinCh,sizeof(cplx64f));
+      AvRL[c] = (cplx64f*) calloc(NBinCh,sizeof(cplx64f));
+      AvLR[c] = (cplx64f*) calloc(NBinCh,sizeof(cplx64f));
+      AvLL[c] = (cplx64f*) calloc(NBinCh,sizeof(cplx64f));
+    };
 
+// Metadata of each cell (the parallactic angles are the mean phasors):
+    for (c=0; c<NCell; c++){
+      k = CellVis[c];
+      AvAnt1[c] = Ant1[i][k]; AvAnt2[c] = Ant2[i][k];
+      AvScan[c] = Scan[i][k]; AvBas[c] = VisBas[i][k];
+      AvWeights[c] = Weights[i][k];
+      AvTimes[c] = CellT[c]/((double) CellN[c]);
+      AvUVGauss[c] = CellUV[c];
+      AvPA1[c] = (std::abs(CellPA1[c])>0.0) ? CellPA1[c]/std::abs(CellPA1[c]) : PA1[i][k];
+      AvPA2[c] = (std::abs(CellPA2[c])>0.0) ? CellPA2[c]/std::abs(CellPA2[c]) : PA2[i][k];
+    };
 
-  if (Ch0<0 || Ch0>Ch1){
-    sprintf(message,"BAD CHANNEL RANGE: %i TO %i. SHOULD ALL BE POSITIVE AND Ch0 < Ch1\n",Ch0,Ch1); 
-    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
-    fclose(logFile);
-    ret = Py_BuildValue("i",-1);
-    return ret;
-  };
 
+// Add the visibilities (rotated to the parallactic angles of their cell).
+// The residual GFF rate of each visibility is also added, to estimate the
+// decorrelation:
+    for (k=0; k<NVis[i]; k++){
+      c = Cell[k];
+      if (c<0){continue;};
+      RotRR = (PA1[i][k]/PA2[i][k])/(AvPA1[c]/AvPA2[c]);
+      RotRL = (PA1[i][k]*PA2[i][k])/(AvPA1[c]*AvPA2[c]);
+      for (j=0; j<Nchan[i]; j++){
+        l = j/cb;
+        AvRR[c][l] += RR[i][k][j]*RotRR;
+        AvLL[c][l] += LL[i][k][j]*std::conj(RotRR);
+        AvRL[c][l] += RL[i][k][j]*RotRL;
+        AvLR[c][l] += LR[i][k][j]*std::conj(RotRL);
+      };
+      ac1 = CalIdx[Ant1[i][k]-1]; ac2 = CalIdx[Ant2[i][k]-1]; s = Scan[i][k];
+      Rate = Rates[4][0][ac1][s] - Rates[4][0][ac2][s];
+      CellRate[c] += std::polar(1.0, TWOPI*Rate*(Times[i][k]-ScanT0[s]));
+    };
 
 
-// Reference frequency for the MBD:
-  double RefNu = Frequencies[doIF[0]][0];
+// Expected decorrelation of each cell, from the GFF rates (in time) and 
+// delays (in frequency), weighted by the number of visibilities:
+    SumCoh = 0.0; SumN = 0.0; MinCoh = 1.0;
+    for (c=0; c<NCell; c++){
+      ac1 = CalIdx[AvAnt1[c]-1]; ac2 = CalIdx[AvAnt2[c]-1]; s = AvScan[c];
+      Delay = Delays[4][0][ac1][s] - Delays[4][0][ac2][s];
+      TimeCoh = std::abs(CellRate[c])/((double) CellN[c]);
+      ChanCoh = 0.0;
+      for (l=0; l<NBinCh; l++){
+        auxC = 0.0;
+        nb = std::min((l+1)*cb, Nchan[i]);
+        for (j=l*cb; j<nb; j++){
+          auxC += std::polar(1.0, TWOPI*Delay*(Frequencies[i][j]-Frequencies[i][l*cb]));
+        };
+        ChanCoh += std::abs(auxC);
+      };
+      ChanCoh /= (double) Nchan[i];
+      CellCoh = TimeCoh*ChanCoh;
+      SumCoh += CellCoh*CellN[c]; SumN += CellN[c];
+      if (CellCoh<MinCoh){MinCoh = CellCoh;};
+    };
 
-// Memory to store the current gain ratios:
-  CrossG = (double *) PyArray_DATA(pars);
+    sprintf(message,"IF %i: %i visibilities of %i channels averaged into %i of %i channels (%.1f times less data)\n",
+        IFNum[i], NVis[i], Nchan[i], NCell, NBinCh,
+        ((double) NVis[i]*Nchan[i])/((double) std::max(NCell*NBinCh,1)));
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+    if (SumN>0.0){
+      sprintf(message,"  Expected decorrelation (from the GFF rates and delays): %.2f%% (mean), %.2f%% (worst cell)\n",
+          100.*(1.-SumCoh/SumN), 100.*(1.-MinCoh));
+      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+      TotCoh += SumCoh; TotN += SumN;
+      if (MinCoh<TotMin){TotMin = MinCoh;};
+    };
+
+
+// Replace the original data:
+    for (k=0; k<NVis[i]+1; k++){
+      free(RR[i][k]); free(RL[i][k]); free(LR[i][k]); free(LL[i][k]);
+    };
+    free(RR[i]); free(RL[i]); free(LR[i]); free(LL[i]);
+    free(Ant1[i]); free(Ant2[i]); free(Scan[i]); free(VisBas[i]);
+    free(Times[i]); free(Weights[i]); free(UVGauss[i]); free(PA1[i]); free(PA2[i]);
+
+    RR[i] = AvRR; RL[i] = AvRL; LR[i] = AvLR; LL[i] = AvLL;
+    Ant1[i] = AvAnt1; Ant2[i] = AvAnt2; Scan[i] = AvScan; VisBas[i] = AvBas;
+    Times[i] = AvTimes; Weights[i] = AvWeights; UVGauss[i] = AvUVGauss;
+    PA1[i] = AvPA1; PA2[i] = AvPA2;
+    NVis[i] = NCell;
+    ChanBin[i] = cb;
+
+  };
+
+  if (TotN>0.0){
+    sprintf(message,"Expected decorrelation of the averaged data: %.2f%% (mean), %.2f%% (worst cell)\n",
+        100.*(1.-TotCoh/TotN), 100.*(1.-TotMin));
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+  };
+
+  PreAveraged = true;
+
+// The visibility lists of a previous SetFit refer to the original data:
+  releaseChi2Tables();
+
+  PyObject *ret = Py_BuildValue("i",0);
+  return ret;
+
+};
+
+
+
+
+
+
+// The parameters of GetChi2, GetChi2Grad and LMSolve. With inout (the fitted
+// values are written back), pars must be a writeable array (if it is not of
+// doubles, the copy is written back by PyArray_ResolveWritebackIfCopy):
+PyArrayObject *GainSolver::parArray(PyObject *pars, bool inout, const char *caller) {
+
+  PyArrayObject *arr;
+
+  if (!Tm || Npar <= 0){
+    PyErr_Format(PyExc_ValueError,"%s needs SetFit first!",caller);
+    return NULL;
+  };
+
+  arr = (PyArrayObject *) PyArray_FROM_OTF(pars, NPY_DOUBLE, 
+         inout ? NPY_ARRAY_INOUT_ARRAY2 : NPY_ARRAY_IN_ARRAY);
+  if (arr == NULL){
+    PyErr_Format(PyExc_TypeError,"%s: the parameters must be %s array of floats!",
+                 caller, inout ? "a (writeable)" : "an");
+    return NULL;
+  };
+
+  if (PyArray_NDIM(arr) != 1 || PyArray_DIM(arr,0) != Npar){
+    PyErr_Format(PyExc_ValueError,"%s: the parameters must be a 1D array of %i elements (see SetFit)!",
+                 caller, Npar);
+    if (inout){PyArray_DiscardWritebackIfCopy(arr);};
+    Py_DECREF(arr);
+    return NULL;
+  };
+
+  return arr;
+
+};
+
+
+
+
+
+PyObject *GainSolver::GetChi2(PyObject *args) { 
+
+  int Ch0, Ch1, end;
+  double Chi2;
+  double *CrossG;
+  PyObject *pars, *ret,*LPy;
+  PyArrayObject *parsArr;
+  bool useRates, Chi2OK;
+
+  if (!logFile) logFile = fopen("PolConvert.GainSolve.log","a");
+  if (!PyArg_ParseTuple(args, "OOiiib", &pars, &LPy, &Ch0, &Ch1,&end,&useRates)){
+     sprintf(message,"Failed GetChi2! Check inputs!\n"); 
+     fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+     fclose(logFile);
+    ret = Py_BuildValue("i",-1);
+    return ret;
+  };
+
+  parsArr = parArray(pars, false, "GetChi2");
+  if (parsArr == NULL){return NULL;};
+
+  Lambda = PyFloat_AsDouble(LPy);
+  doCov = Lambda >= 0.0;
+
+  CrossG = (double *) PyArray_DATA(parsArr);
+
+// Release the GIL while the Chi2 is computed:
+  Py_BEGIN_ALLOW_THREADS
+  Chi2OK = Chi2Core(CrossG, Ch0, Ch1, end, useRates, 0, NULL, NULL, &Chi2);
+  Py_END_ALLOW_THREADS
+
+  Py_DECREF(parsArr);
+
+  if (!Chi2OK){
+    ret = Py_BuildValue("i",-1);
+    return ret;
+  };
+
+  ret = Py_BuildValue("d",Chi2);
+  return ret;
+
+};
+
+
+
+
+
+// Same as GetChi2 (with end=0), but also fills the gradient array (and 
+// the Hessian matrix, if it is not None) in one pass over the data:
+PyObject *GainSolver::GetChi2Grad(PyObject *args) { 
+
+  int i, Ch0, Ch1, NGrad;
+  double Chi2;
+  double *CrossG, *Grad, *Hess;
+  PyObject *pars, *ret, *gradPy, *hessPy;
+  PyArrayObject *parsArr;
+  bool useRates, Chi2OK;
+
+  if (!logFile) logFile = fopen("PolConvert.GainSolve.log","a");
+  if (!PyArg_ParseTuple(args, "OiibOO", &pars, &Ch0, &Ch1, &useRates, &gradPy, &hessPy)){
+     sprintf(message,"Failed GetChi2Grad! Check inputs!\n"); 
+     fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+     fclose(logFile);
+    ret = Py_BuildValue("i",-1);
+    return ret;
+  };
+
+  parsArr = parArray(pars, false, "GetChi2Grad");
+  if (parsArr == NULL){return NULL;};
+
+// The gradient (and Hessian) are filled in place, so they must be arrays of 
+// doubles (of Npar and Npar x Npar elements):
+  if (!PyArray_Check(gradPy) || PyArray_TYPE((PyArrayObject *) gradPy) != NPY_DOUBLE || 
+      !PyArray_ISCARRAY((PyArrayObject *) gradPy) || PyArray_SIZE((PyArrayObject *) gradPy) != Npar ||
+      (hessPy != Py_None && (!PyArray_Check(hessPy) || PyArray_TYPE((PyArrayObject *) hessPy) != NPY_DOUBLE || 
+      !PyArray_ISCARRAY((PyArrayObject *) hessPy) || PyArray_SIZE((PyArrayObject *) hessPy) != Npar*Npar))){
+    PyErr_Format(PyExc_TypeError,"GetChi2Grad: the gradient (and Hessian) must be writeable arrays of %i (and %i x %i) floats!",
+                 Npar, Npar, Npar);
+    Py_DECREF(parsArr);
+    return NULL;
+  };
+
+  Lambda = -1.0;
+  doCov = false;
+
+  NGrad = (int) PyArray_SIZE((PyArrayObject *) gradPy);
+  Grad = (double *) PyArray_DATA(gradPy);
+  for (i=0; i<NGrad; i++){Grad[i] = 0.0;};
+  if (hessPy == Py_None){
+    Hess = NULL;
+  } else {
+    Hess = (double *) PyArray_DATA(hessPy);
+    for (i=0; i<NGrad*NGrad; i++){Hess[i] = 0.0;};
+  };
+
+  CrossG = (double *) PyArray_DATA(parsArr);
+
+  Py_BEGIN_ALLOW_THREADS
+  Chi2OK = Chi2Core(CrossG, Ch0, Ch1, 0, useRates, NGrad, Grad, Hess, &Chi2);
+  Py_END_ALLOW_THREADS
+
+  Py_DECREF(parsArr);
+
+  if (!Chi2OK){
+    ret = Py_BuildValue("i",-1);
+    return ret;
+  };
+
+  ret = Py_BuildValue("d",Chi2);
+  return ret;
+
+};
+
+
+
+
+
+// Levenberg-Marquardt fit of the cross-gains, with no calls to Python
+// between the iterations. The solution is returned in the parameter array:
+PyObject *GainSolver::LMSolve(PyObject *args) { 
+
+  int Ch0, Ch1, MaxIter, NIter = 0;
+  double Tol, Chi2 = 0.0, FlipChi2, RelChange = 1.0;
+  double LMLambda = 1.0e-3, KRaise = 5.0, KDecr = 10.0;
+  double *CrossG;
+  PyObject *pars, *ret;
+  PyArrayObject *parsArr;
+  bool useRates, LMOK = false, Converged = false;
+
+  if (!logFile) logFile = fopen("PolConvert.GainSolve.log","a");
+  if (!PyArg_ParseTuple(args, "Oiibid|ddd", &pars, &Ch0, &Ch1, &useRates, &MaxIter, &Tol, 
+       &LMLambda, &KRaise, &KDecr)){
+     sprintf(message,"Failed LMSolve! Check inputs!\n"); 
+     fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+    ret = Py_BuildValue("i",-1);
+    return ret;
+  };
+
+// The fitted gains are written back into pars:
+  parsArr = parArray(pars, true, "LMSolve");
+  if (parsArr == NULL){return NULL;};
+
+  Lambda = -1.0;
+  doCov = false;
+
+  CrossG = (double *) PyArray_DATA(parsArr);
+  long NCalls = chisqcount;
+
+// Release the GIL during the whole fit:
+  Py_BEGIN_ALLOW_THREADS
+  LMOK = LMCore(CrossG, Ch0, Ch1, useRates, MaxIter, Tol, LMLambda, KRaise, KDecr, 
+                &NIter, &RelChange, &Converged, &Chi2);
+  if (LMOK){LMOK = Chi2Core(CrossG, Ch0, Ch1, 1, useRates, 0, NULL, NULL, &FlipChi2);};
+  Py_END_ALLOW_THREADS
 
+  PyArray_ResolveWritebackIfCopy(parsArr);
+  Py_DECREF(parsArr);
+
+  if (!LMOK){
+    ret = Py_BuildValue("i",-1);
+    return ret;
+  };
+
+  sprintf(message,"LMSolve: Chi2 %.5e after %i iterations (%li Chi2 evaluations). Rel. change %.3e\n",
+      Chi2, NIter, chisqcount-NCalls, RelChange); 
+  fprintf(logFile,"%s",message); fflush(logFile);  
+
+  ret = Py_BuildValue("(dNilNd)", Chi2, PyBool_FromLong(FlipChi2>0.0), NIter, 
+      chisqcount-NCalls, PyBool_FromLong(Converged), RelChange);
+  return ret;
+
+};
+
+
+
+
+// Iterations of LMSolve. Each one solves the damped Gauss-Newton system of 
+// Chi2Core (with solveSystem) and computes the Chi2, gradient and Hessian at 
+// the new gains (in one pass). The step is taken if the Chi2 decreases (and 
+// the damping is relaxed); otherwise, the damping is raised. It stops when 
+// the relative Chi2 decrease is below Tol, or after MaxIter iterations.
+// Returns false if the Chi2 cannot be computed:
+bool GainSolver::LMCore(double *CrossG, int Ch0, int Ch1, bool useRates, int MaxIter, double Tol, 
+                        double LMLambda, double KRaise, double KDecr, int *NIter, double *RelChange,
+                        bool *Converged, double *Chi2Out) { 
+
+  int i, N = Npar;
+  double Chi2, Chi2Test, LMTune = LMLambda;
+  double *Grad = new double[N], *Hess = new double[N*N];
+  double *GradTest = new double[N], *HessTest = new double[N*N];
+  double *Damped = new double[N*N], *Rhs = new double[N], *Step = new double[N];
+  double *Errors = new double[N], *PTest = new double[N];
+  double *swap;
+  bool OK;
+
+  *NIter = 0; *RelChange = 1.0; *Converged = false;
+
+  for (i=0; i<N; i++){Grad[i] = 0.0;};
+  for (i=0; i<N*N; i++){Hess[i] = 0.0;};
+  OK = Chi2Core(CrossG, Ch0, Ch1, 0, useRates, N, Grad, Hess, &Chi2);
+
+  while (OK && *NIter < MaxIter){
+
+    *NIter += 1;
+
+// Damped system (Marquardt scaling). Parameters with no data have null rows, 
+// and solveSystem does not change them:
+    for (i=0; i<N*N; i++){Damped[i] = Hess[i];};
+    for (i=0; i<N; i++){
+      Damped[i*N+i] *= 1.0 + LMTune;
+      Rhs[i] = -Grad[i];
+    };
+    solveSystem(N, Damped, Rhs, Step, Errors);
+    for (i=0; i<N; i++){PTest[i] = CrossG[i] + Step[i];};
+
+    for (i=0; i<N; i++){GradTest[i] = 0.0;};
+    for (i=0; i<N*N; i++){HessTest[i] = 0.0;};
+    OK = Chi2Core(PTest, Ch0, Ch1, 0, useRates, N, GradTest, HessTest, &Chi2Test);
+    if (!OK){break;};
+
+    if (Chi2Test < Chi2){
+      *RelChange = (Chi2 > 0.0) ? (Chi2 - Chi2Test)/Chi2 : 0.0;
+      for (i=0; i<N; i++){CrossG[i] = PTest[i];};
+      swap = Grad; Grad = GradTest; GradTest = swap;
+      swap = Hess; Hess = HessTest; HessTest = swap;
+      Chi2 = Chi2Test;
+      LMTune /= KDecr;
+      if (*RelChange < Tol){*Converged = true; break;};
+    } else {
+      LMTune *= KRaise;
+// No step decreases the Chi2 (i.e., we are at the minimum, within precision):
+      if (LMTune > 1.e12){*Converged = true; *RelChange = 0.0; break;};
+    };
+
+  };
+
+  *Chi2Out = Chi2;
+
+  delete[] Grad; delete[] Hess; delete[] GradTest; delete[] HessTest;
+  delete[] Damped; delete[] Rhs; delete[] Step; delete[] Errors; delete[] PTest;
+
+  return OK;
+
+};
+
+
+
+
+
+bool GainSolver::Chi2Core(double *CrossG, int Ch0, int Ch1, int end, bool useRates, int NGrad, double *Grad, double *Hess, double *Chi2Out) { 
+
+  int i, l, t;
+  int j= -1;
+  bool doGrad = Grad != NULL;
+
+
+  chisqcount++;
+//  FILE *auxFile;
+//  if (chisqcount==1){auxFile = fopen("PolConvert.GainSolve.Calls","a");};
+
+
+
+// Find out IFs to compute and do sanity checks:
+
+  if (!FitVisStart){
+    sprintf(message,"THERE IS NO FIT SET FOR THESE DATA! (RUN SetFit FIRST)\n"); 
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+    return false;
+  };
+
+  for (i=0; i<NIFComp; i++){
+    if (Ch1 > Nchan[doIF[i]]){
+      sprintf(message,"IF %i ONLY HAS %i CHANNELS. CHANNEL %i DOES NOT EXIST! \n",j,Nchan[doIF[i]], Ch1); 
+      fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+      fclose(logFile);
+      return false;
+    };
+  };
 
 
 
+  if (Ch0<0 || Ch0>Ch1){
+    sprintf(message,"BAD CHANNEL RANGE: %i TO %i. SHOULD ALL BE POSITIVE AND Ch0 < Ch1\n",Ch0,Ch1); 
+    fprintf(logFile,"%s",message); std::cout<<message; fflush(logFile);  
+    fclose(logFile);
+    return false;
+  };
 
 
 
@@ -2459,13 +3385,242 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
   };
 
 
+
+// Split the work in tasks (one per IF and baseline). The visibilities 
+// of each task are listed by SetFit:
+  Chi2Work Work;
+  Work.CrossG = CrossG;
+  Work.Ch0 = Ch0; Work.Ch1 = Ch1; Work.end = end;
+  Work.useRates = useRates;
+  Work.NGrad = NGrad;
+  Work.nTask = NIFComp*NBas;
+  Work.chanFreq = ChanFreq;
+  Work.TaskStart = FitVisStart;
+  Work.VisIdx = FitVisIdx;
+
+// Reference frequency for the MBD:
+  Work.RefNu = Frequencies[doIF[0]][0];
+
+
+// Partial results of each task:
+  Work.TaskChi2 = new double[Work.nTask];
+  Work.TaskFlip = new int[Work.nTask];
+  Work.TaskGrad = nullptr;
+  Work.TaskHess = nullptr;
+  if(doGrad){Work.TaskGrad = new double[Work.nTask*NGrad];};
+  if(Hess != NULL){Work.TaskHess = new double[Work.nTask*NGrad*NGrad];};
+
+
+
+// Run the tasks:
+  int nWorkers = nthreads;
+  if (nWorkers > Work.nTask){nWorkers = Work.nTask;};
+  if (nWorkers < 1){nWorkers = 1;};
+
+  Work.nextTask.store(0);
+
+  if (nWorkers == 1){
+    Chi2Thread(&Work);
+  } else {
+    std::vector<std::thread> Chi2Threads;
+    for (t=0; t<nWorkers; t++){
+      Chi2Threads.push_back(std::thread(&GainSolver::Chi2Thread, this, &Work));
+    };
+    for (t=0; t<nWorkers; t++){
+      Chi2Threads[t].join();
+    };
+  };
+
+
+
+// Add the partial results in task order (so that the Chi2 does
+// not depend on the number of threads):
+  double Chi2 = 0.0;
+  int Nflipped = 0;
+
+  for (t=0; t<Work.nTask; t++){
+    Chi2 += Work.TaskChi2[t];
+    Nflipped += Work.TaskFlip[t];
+    if(doGrad){
+      for (l=0; l<NGrad; l++){Grad[l] += Work.TaskGrad[t*NGrad+l];};
+    };
+    if(Hess != NULL){
+      for (l=0; l<NGrad*NGrad; l++){Hess[l] += Work.TaskHess[t*NGrad*NGrad+l];};
+    };
+  };
+
+  delete[] Work.TaskChi2;
+  delete[] Work.TaskFlip;
+  delete[] Work.TaskGrad;
+  delete[] Work.TaskHess;
+
+
+
+
+//double TheorImpr = 0.0;
+
+//if(doCov){
+// Solve the system:
+
+// Find the largest gradient:
+//double Largest = 0.0;
+//for(i=0;i<Npar;i++){
+//  if(CovMat[i*Npar+i]>Largest){Largest=CovMat[i*Npar+i];};
+//};
+
+// Fill in the Hessian's lower part:
+//for(i=0;i<Npar;i++){
+//  DirDer[i] = CovMat[i*Npar+i];
+//  CovMat[i*Npar+i] += Lambda*(Largest);
+//};
+
+
+/*
+gsl_death_by = GSL_SUCCESS;
+if (useCov){
+  gsl_linalg_LU_decomp (&m.matrix, perm, &s);
+  gsl_linalg_LU_solve(&m.matrix, perm, &v.vector, &x.vector);
+} else {
+  for(i=0;i<Npar;i++){SolVec[i] = IndVec[i]/CovMat[i*Npar+i];};
+};
+if (gsl_death_by != GSL_SUCCESS) {
+    PyObject *ret = Py_BuildValue("d",-13);
+    return ret;
+};
+*/
+
+
+//for(i=0;i<Npar;i++){SolVec[i] = Lambda*IndVec[i]/CovMat[i*Npar+i];};
+
+//for(i=0;i<Npar;i++){
+//  TheorImpr += DirDer[i]*SolVec[i]*SolVec[i] - 2.*IndVec[i]*SolVec[i];
+//  CrossG[i] += SolVec[i];
+//};
+
+
+//}; // comes from if(doCov)
+
+
+
+/*
+if (chisqcount==0){
+  sprintf(message,"%i %i-%i ",doIF[0], Ch0, Ch1);
+  fprintf(auxFile,"%s",message);
+
+  for(i=0;i<Npar;i++){
+    sprintf(message,"%.3e ",CrossG[i]); 
+    fprintf(auxFile,"%s",message);
+  };
+
+  sprintf(message," | %.3e \n",Chi2); 
+  fprintf(auxFile,"%s",message);
+  fclose(auxFile);
+};
+*/
+
+ // if (SolAlgor==0){
+ //    printf("\n Chi Squared: %.5e. Expected improvement: %.5e",Chi2,TheorImpr);
+ //  };
+
+  Chi2Old = Chi2;
+
+    if (end==1){Chi2 = (Nflipped>0)?1.0:-1.0;};
+
+    *Chi2Out = Chi2;
+
+
+//  delete[] AvPA1;
+//  delete[] AvPA2;
+
+
+
+  return true;
+
+};
+
+
+
+
+
+
+
+//////////////////////////////////
+// THREAD THAT COMPUTES Chi2 TASKS UNTIL THERE ARE NO MORE LEFT:
+void GainSolver::Chi2Thread(Chi2Work *W) {
+
+  int l, task;
+
+// Visibility averages of the current task (and their derivatives):
+  cplx64f *aux[6];
+  for (l=0; l<6; l++){aux[l] = new cplx64f[Npar+1];};
+
+  while(true){
+    task = W->nextTask.fetch_add(1);
+    if (task>=W->nTask){break;};
+    Chi2Task(W, task, aux);
+  };
+
+  for (l=0; l<6; l++){delete[] aux[l];};
+
+};
+
+
+
+
+
+// Contribution of one baseline in one IF (i.e., one task) to the Chi2 and its gradient. 
+// It only writes into the partial results of the task and into aux, so several
+// tasks can run at once:
+void GainSolver::Chi2Task(Chi2Work *W, int task, cplx64f **aux) { 
+
+  int j, k, l, v;
+//  double dx = 1.0e-8;
+  double Drate1R, Drate1L, Drate2R, Drate2L, Ddelay1R, Ddelay2R, Ddelay1L, Ddelay2L;
+//  double *DerAux1, *DerAux2;
+//  DerAux1 = new double[2];
+//  DerAux2 = new double[2];
+
+  double *CrossG = W->CrossG;
+  int Ch0 = W->Ch0, Ch1 = W->Ch1, end = W->end, NGrad = W->NGrad;
+  bool useRates = W->useRates;
+  bool doGrad = W->TaskGrad != nullptr;
+  double *Grad = nullptr, *Hess = nullptr;
+  double RefNu = W->RefNu;
+  double *chanFreq = W->chanFreq[task/NBas];
+  int BNum = task%NBas;
+
+// Gains of the current visibility and channel (local to the task, 
+// they hide the members with the same names):
+  cplx64f G1[1], G2[1], G1nu[1], G2nu[1];
+  double MBD1[1], MBD2[1];
+
+// Visibility averages of the baseline:
+  cplx64f *BasC00 = aux[0], *BasC01 = aux[1], *BasC10 = aux[2], *BasC11 = aux[3];
+  cplx64f *BasC00Flp = aux[4], *BasC11Flp = aux[5];
+  double TmBas, UVWgtBas;
+  int AvVisBas;
+
+// For the gradient: indices of the parameters of the two antennas (amplitude, 
+// phase and MBD of antenna 1, then of antenna 2), derivatives of G1nu and G2nu 
+// w.r.t. them and derivatives of the visibility terms w.r.t. G1nu and G2nu:
+  int ParIdx[6], n, m;
+  bool ParNew[6];
+  double dItot;
+  cplx64f dG[6], dR01[6], dR10[6], dRPH[6], U1, U2;
+  cplx64f D001, D002, D111, D112, D011, D012, D101, D102;
+  cplx64f I = cplx64f(0.,1.);
+
+  bool useDelay = false;
+
+
+
   int currIF, a1, a2, ac1,ac2,af1, af2, currDer, currScan, nextScan;
   int is1, is2; //, auxI1, auxI2;
   //auxI1 = 0;
 
 
 
-  cplx64f Error;
+  cplx64f Error = cplx64f(0., 0.);
   cplx64f oneC, RateFactor, FeedFactor1, FeedFactor2, RRRate, RLRate, LRRate, LLRate; 
 
   cplx64f RM1, RP1; 
@@ -2486,79 +3641,60 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
 
 
 
-//  for(i=0;i<Npar;i++){
-//    IndVec[i] = 0.0;
-//   for(j=0;j<Npar;j++){
-//      CovMat[i*Npar+j]=0.0;
-//    };
-//  };
-
-
   oneC= cplx64f(1.0,0.0);
 
  // int Nder = 0;
   int MBD1p, MBD2p, G1pA,G1pF, G2pA, G2pF;
-  int BNum;
   double Chi2 = 0.0;
   double auxD1, auxD2;
-  double *chanFreq; 
-
-//  for(l=0;l<Npar+1;l++){
-//    for(i=0;i<4;i++){DStokes[l][i] = Stokes[i];};
-//  };
-
 
 
 
+  W->TaskChi2[task] = 0.0;
+  W->TaskFlip[task] = 0;
+  if(doGrad){
+    Grad = &W->TaskGrad[task*NGrad];
+    for (l=0; l<NGrad; l++){Grad[l] = 0.0;};
+  };
+  if(W->TaskHess != nullptr){
+    Hess = &W->TaskHess[task*NGrad*NGrad];
+    for (l=0; l<NGrad*NGrad; l++){Hess[l] = 0.0;};
+  };
 
-/// Loop over IFs:
-  for (i=0; i<NIFComp; i++){
-
-    chanFreq = new double[Nchan[doIF[i]]];
-    for (j=0;j<Nchan[doIF[i]];j++){
-      chanFreq[j] = (double) (j-Nchan[doIF[i]]/2);
-    };
+  if (W->TaskStart[task]==W->TaskStart[task+1]){return;};
 
 
 
 // Reset temporary arrays to store visibilities:
-    currIF = doIF[i];
-    for (k=0;k<NBas;k++){
-      UVWeights[k]= 0.0;
-      for(j=0;j<Npar+1;j++){
-        auxC00[k][j] = cplx64f(0., 0.);
-        auxC01[k][j] = cplx64f(0., 0.);
-        auxC10[k][j] = cplx64f(0., 0.);
-        auxC11[k][j] = cplx64f(0., 0.);
-        auxC00Flp[k][j] = cplx64f(0., 0.);
-        auxC11Flp[k][j] = cplx64f(0., 0.);
-      };
-      AvVis[k] = 0;
-   //   AvPA1[k] = oneC; AvPA2[2] = oneC;
-    };
-    for(k=0;k<NBas;k++){
-      Tm[k]=Times[currIF][0];
-    };
+  currIF = doIF[task/NBas];
+
+// Channel range in the (maybe pre-averaged) channels of the IF:
+  int cBin = ChanBin[currIF];
+  Ch0 = Ch0/cBin; Ch1 = (Ch1+cBin-1)/cBin;
+  for(j=0;j<Npar+1;j++){
+    BasC00[j] = cplx64f(0., 0.);
+    BasC01[j] = cplx64f(0., 0.);
+    BasC10[j] = cplx64f(0., 0.);
+    BasC11[j] = cplx64f(0., 0.);
+    BasC00Flp[j] = cplx64f(0., 0.);
+    BasC11Flp[j] = cplx64f(0., 0.);
+  };
+  AvVisBas = 0;
+  UVWgtBas = 0.0;
+  TmBas = Times[currIF][0];
 
 
 // Figure out which antennas do we have now
 // and whether we solve for them:
    // currScan = Scan[currIF][0];
-    for (k=0; k<NVis[currIF]; k++){
+    for (v=W->TaskStart[task]; v<W->TaskStart[task+1]; v++){
+      k = W->VisIdx[v];
       a1 = Ant1[currIF][k];
       a2 = Ant2[currIF][k];
       currScan = Scan[currIF][k];
       if(k<NVis[currIF]-1){nextScan=Scan[currIF][k+1];}else{nextScan=currScan+1;};
-      ac1 = -1; ac2 = -1;
-      for(j=0; j<NCalAnt; j++) {
-        if (a1==CalAnts[j]){ac1 = j;};
-        if (a2==CalAnts[j]){ac2 = j;};
-      };
-      af1 = -1; af2 = -1;
-      for(j=0; j<NantFit; j++) {
-        if (a1==antFit[j]){af1 = j;};
-        if (a2==antFit[j]){af2 = j;};
-      };
+      ac1 = CalIdx[a1-1]; ac2 = CalIdx[a2-1];
+      af1 = FitIdx[a1-1]; af2 = FitIdx[a2-1];
 
 
 
@@ -2567,15 +3703,9 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
 // ONLY IF THE ANTENNA GAINS ARE TO BE FITTED:
 
 // Find which antenna(s) are linear:
-    is1 = false ; is2 = false;
 // (Notice that we can also solve for R/L gains 
 // for the circular antennas)
-
-    BNum = BasNum[a1-1][a2-1];
-    for(j=0; j<Nlin; j++) {
-      if (a1==Lant[j]){is1 = true;};
-      if (a2==Lant[j]){is2 = true;};
-    };
+    is1 = IsLin[a1-1]; is2 = IsLin[a2-1];
 
 
 
@@ -2653,9 +3783,26 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
 
 
 
-    if(BNum>=0){
+    if(doGrad){
+      ParIdx[0] = G1pA; ParIdx[1] = G1pF; ParIdx[2] = -1;
+      ParIdx[3] = G2pA; ParIdx[4] = G2pF; ParIdx[5] = -1;
+      if (SolAlgor == 0){
+        if (af1 >= 0){ParIdx[2] = (solveAmp==0)?NantFit+af1:NantFit*2+af1;};
+        if (af2 >= 0){ParIdx[5] = (solveAmp==0)?NantFit+af2:NantFit*2+af2;};
+      };
+      for(l=0;l<6;l++){
+        if(ParIdx[l]>=NGrad){ParIdx[l] = -1;};
+        ParNew[l] = ParIdx[l]>=0;
+        for(m=0;m<l;m++){if(ParIdx[m]==ParIdx[l]){ParNew[l]=false;};};
+      };
+      if (G1pA>=0){U1 = std::polar(1.0, CrossG[G1pF]);};
+      if (G2pA>=0){U2 = std::polar(1.0, -CrossG[G2pF]);};
+    };
+
+
+
 
-      AvVis[BNum] += 1;
+      AvVisBas += 1;
       FeedFactor1 = std::polar(1.0, feedAngle[a1-1])*PA1[currIF][k]; 
       FeedFactor2 = std::polar(1.0, feedAngle[a2-1])*PA2[currIF][k];
     //  AvPA1[BNum] *= FeedFactor1;
@@ -2729,6 +3876,16 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
    //     };
      };
 
+// Derivatives of the gains w.r.t. amplitudes, phases and MBDs:
+     if(doGrad){
+       dG[0] = (G1pA>=0)?U1*((SolAlgor==0 && af1>=0)?std::polar(1.0,MBD1[0]):oneC):cplx64f(0.,0.);
+       dG[1] = I*G1nu[0];
+       dG[2] = I*chanFreq[j]*G1nu[0];
+       dG[3] = (G2pA>=0)?U2*((SolAlgor==0 && af2>=0)?std::polar(1.0,-MBD2[0]):oneC):cplx64f(0.,0.);
+       dG[4] = -I*G2nu[0];
+       dG[5] = -I*chanFreq[j]*G2nu[0];
+     };
+
    //  if(StokesSolve){
    //    DerIdx[Nder]=Npar-1; DStokes[Npar-1][1] = DStokes[0][1]+dx; Nder += 1;
    //    DerIdx[Nder]=Npar; DStokes[Npar][2] = DStokes[0][2]+dx; Nder += 1;
@@ -2749,8 +3906,8 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
   Ddelay2R = 0.0; Ddelay2L = 0.0; Drate2R = 0.0; Drate2L = 0.0;
 
     if(ac1>=0){ // and !is1){
-            Ddelay1R = TWOPI*((Delays[0][0][ac1][currScan])*(Frequencies[currIF][j]-RefNu));
-            Ddelay1L = TWOPI*((Delays[1][0][ac1][currScan])*(Frequencies[currIF][j]-RefNu));
+            Ddelay1R = TWOPI*((Delays[0][0][ac1][currScan])*(chanNu(currIF,j)-RefNu));
+            Ddelay1L = TWOPI*((Delays[1][0][ac1][currScan])*(chanNu(currIF,j)-RefNu));
 	    if(useRates){
               Drate1R =  TWOPI*((Rates[0][0][ac1][currScan])*(Times[currIF][k]-T0));
               Drate1L =  TWOPI*((Rates[1][0][ac1][currScan])*(Times[currIF][k]-T0));
@@ -2759,8 +3916,8 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
     };
  
     if(ac2>=0){ // and !is2){
-            Ddelay2R = TWOPI*((Delays[0][0][ac2][currScan])*(Frequencies[currIF][j]-RefNu));
-            Ddelay2L = TWOPI*((Delays[1][0][ac2][currScan])*(Frequencies[currIF][j]-RefNu));
+            Ddelay2R = TWOPI*((Delays[0][0][ac2][currScan])*(chanNu(currIF,j)-RefNu));
+            Ddelay2L = TWOPI*((Delays[1][0][ac2][currScan])*(chanNu(currIF,j)-RefNu));
             if(useRates){
 	      Drate2R =  TWOPI*((Rates[0][0][ac2][currScan])*(Times[currIF][k]-T0));
 	      Drate2L =  TWOPI*((Rates[1][0][ac2][currScan])*(Times[currIF][k]-T0));
@@ -2817,19 +3974,19 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
      if(AddCrossHand){
        if (is1 && is2){
       //   printf("Cis12\n");fflush(stdout);
-         auxC01[BNum][currDer] += (RP1*RP2*RL[currIF][k][j] + RM1*RP2*LL[currIF][k][j] + RP1*RM2*RR[currIF][k][j] + RM1*RM2*LR[currIF][k][j])*RLRate;
-         auxC10[BNum][currDer] += (RP1*RP2*LR[currIF][k][j] + RM1*RP2*RR[currIF][k][j] + RP1*RM2*LL[currIF][k][j] + RM1*RM2*RL[currIF][k][j])*LRRate;
+         BasC01[currDer] += (RP1*RP2*RL[currIF][k][j] + RM1*RP2*LL[currIF][k][j] + RP1*RM2*RR[currIF][k][j] + RM1*RM2*LR[currIF][k][j])*RLRate;
+         BasC10[currDer] += (RP1*RP2*LR[currIF][k][j] + RM1*RP2*RR[currIF][k][j] + RP1*RM2*LL[currIF][k][j] + RM1*RM2*RL[currIF][k][j])*LRRate;
        } else if (is1){
       //   printf("Cis1\n");fflush(stdout);
-         auxC01[BNum][currDer] += (RP1*RL[currIF][k][j] + RM1*LL[currIF][k][j])*G2nu[currDer]*RLRate;
-         auxC10[BNum][currDer] += (RP1*LR[currIF][k][j] + RM1*RR[currIF][k][j])*LRRate;
+         BasC01[currDer] += (RP1*RL[currIF][k][j] + RM1*LL[currIF][k][j])*G2nu[currDer]*RLRate;
+         BasC10[currDer] += (RP1*LR[currIF][k][j] + RM1*RR[currIF][k][j])*LRRate;
        } else if (is2){
       //   printf("Cis2\n");fflush(stdout);
-         auxC01[BNum][currDer] += (RP2*RL[currIF][k][j] + RM2*RR[currIF][k][j])*RLRate;
-         auxC10[BNum][currDer] += (RP2*LR[currIF][k][j] + RM2*LL[currIF][k][j])*G1nu[currDer]*LRRate;
+         BasC01[currDer] += (RP2*RL[currIF][k][j] + RM2*RR[currIF][k][j])*RLRate;
+         BasC10[currDer] += (RP2*LR[currIF][k][j] + RM2*LL[currIF][k][j])*G1nu[currDer]*LRRate;
        } else {
-         auxC01[BNum][currDer] += (RL[currIF][k][j])*G2nu[currDer]*RLRate;
-         auxC10[BNum][currDer] += (LR[currIF][k][j])*G1nu[currDer]*LRRate;
+         BasC01[currDer] += (RL[currIF][k][j])*G2nu[currDer]*RLRate;
+         BasC10[currDer] += (LR[currIF][k][j])*G1nu[currDer]*LRRate;
        };
      };
 
@@ -2839,34 +3996,91 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
       //   printf("Pis12\n");fflush(stdout);
          auxC1 = (RP1*RP2*RR[currIF][k][j] + RP2*RM1*LR[currIF][k][j] + RM2*RP1*RL[currIF][k][j] + RM1*RM2*LL[currIF][k][j])*RRRate;
          auxC2 = (RP1*RP2*LL[currIF][k][j] + RP2*RM1*RL[currIF][k][j] + RM2*RP1*LR[currIF][k][j] + RM1*RM2*RR[currIF][k][j])*LLRate;
-         auxC00[BNum][currDer] += auxC1;
-         auxC11[BNum][currDer] += auxC2;
+         BasC00[currDer] += auxC1;
+         BasC11[currDer] += auxC2;
        } else if (is1){
       //   printf("Pis1\n");fflush(stdout);
          auxC1 = (RP1*RR[currIF][k][j] + RM1*LR[currIF][k][j])*RRRate;
          auxC2 = (RP1*LL[currIF][k][j] + RM1*RL[currIF][k][j])*G2nu[currDer]*LLRate;
-         auxC00[BNum][currDer] += auxC1;
-         auxC11[BNum][currDer] += auxC2;
+         BasC00[currDer] += auxC1;
+         BasC11[currDer] += auxC2;
        } else if (is2){
       //   printf("Pis2\n");fflush(stdout);
          auxC1 = (RP2*RR[currIF][k][j] + RM2*RL[currIF][k][j])*RRRate;
          auxC2 = (RP2*LL[currIF][k][j] + RM2*LR[currIF][k][j])*G1nu[currDer]*LLRate;
-         auxC00[BNum][currDer] += auxC1;
-         auxC11[BNum][currDer] += auxC2;
+         BasC00[currDer] += auxC1;
+         BasC11[currDer] += auxC2;
        } else {
          auxC1 = RR[currIF][k][j]*RRRate;
          auxC2 = LL[currIF][k][j]*G2nu[currDer]*G1nu[currDer]*LLRate;
-         auxC00[BNum][currDer] += auxC1;
-         auxC11[BNum][currDer] += auxC2;
+         BasC00[currDer] += auxC1;
+         BasC11[currDer] += auxC2;
        };
   //   };
 
+// Accumulate the derivatives of the visibility averages w.r.t. each parameter
+// (in the slot of the parameter, i.e., BasC00[ParIdx+1], etc.):
+       if(doGrad){
+         D011 = 0.0; D012 = 0.0; D101 = 0.0; D102 = 0.0;
+         if(AddCrossHand){
+           if (is1 && is2){
+             D011 = (RP2*RL[currIF][k][j] - RP2*LL[currIF][k][j] + RM2*RR[currIF][k][j] - RM2*LR[currIF][k][j])*RLRate;
+             D012 = (RP1*RL[currIF][k][j] + RM1*LL[currIF][k][j] - RP1*RR[currIF][k][j] - RM1*LR[currIF][k][j])*RLRate;
+             D101 = (RP2*LR[currIF][k][j] - RP2*RR[currIF][k][j] + RM2*LL[currIF][k][j] - RM2*RL[currIF][k][j])*LRRate;
+             D102 = (RP1*LR[currIF][k][j] + RM1*RR[currIF][k][j] - RP1*LL[currIF][k][j] - RM1*RL[currIF][k][j])*LRRate;
+           } else if (is1){
+             D011 = (RL[currIF][k][j] - LL[currIF][k][j])*G2nu[0]*RLRate;
+             D012 = (RP1*RL[currIF][k][j] + RM1*LL[currIF][k][j])*RLRate;
+             D101 = (LR[currIF][k][j] - RR[currIF][k][j])*LRRate;
+           } else if (is2){
+             D012 = (RL[currIF][k][j] - RR[currIF][k][j])*RLRate;
+             D101 = (RP2*LR[currIF][k][j] + RM2*LL[currIF][k][j])*LRRate;
+             D102 = (LR[currIF][k][j] - LL[currIF][k][j])*G1nu[0]*LRRate;
+           } else {
+             D012 = RL[currIF][k][j]*RLRate;
+             D101 = LR[currIF][k][j]*LRRate;
+           };
+         };
+         if (is1 && is2){
+           D001 = (RP2*RR[currIF][k][j] - RP2*LR[currIF][k][j] + RM2*RL[currIF][k][j] - RM2*LL[currIF][k][j])*RRRate;
+           D002 = (RP1*RR[currIF][k][j] + RM1*LR[currIF][k][j] - RP1*RL[currIF][k][j] - RM1*LL[currIF][k][j])*RRRate;
+           D111 = (RP2*LL[currIF][k][j] - RP2*RL[currIF][k][j] + RM2*LR[currIF][k][j] - RM2*RR[currIF][k][j])*LLRate;
+           D112 = (RP1*LL[currIF][k][j] + RM1*RL[currIF][k][j] - RP1*LR[currIF][k][j] - RM1*RR[currIF][k][j])*LLRate;
+         } else if (is1){
+           D001 = (RR[currIF][k][j] - LR[currIF][k][j])*RRRate;
+           D002 = 0.0;
+           D111 = (LL[currIF][k][j] - RL[currIF][k][j])*G2nu[0]*LLRate;
+           D112 = (RP1*LL[currIF][k][j] + RM1*RL[currIF][k][j])*LLRate;
+         } else if (is2){
+           D001 = 0.0;
+           D002 = (RR[currIF][k][j] - RL[currIF][k][j])*RRRate;
+           D111 = (RP2*LL[currIF][k][j] + RM2*LR[currIF][k][j])*LLRate;
+           D112 = (LL[currIF][k][j] - LR[currIF][k][j])*G1nu[0]*LLRate;
+         } else {
+           D001 = 0.0; D002 = 0.0;
+           D111 = LL[currIF][k][j]*G2nu[0]*LLRate;
+           D112 = LL[currIF][k][j]*G1nu[0]*LLRate;
+         };
+         for(l=0;l<6;l++){
+           if(ParIdx[l]>=0){
+             n = ParIdx[l]+1;
+             if(l<3){
+               BasC00[n] += D001*dG[l]; BasC11[n] += D111*dG[l];
+               BasC01[n] += D011*dG[l]; BasC10[n] += D101*dG[l];
+             } else {
+               BasC00[n] += D002*dG[l]; BasC11[n] += D112*dG[l];
+               BasC01[n] += D012*dG[l]; BasC10[n] += D102*dG[l];
+             };
+           };
+         };
+       };
+
 // Accumulate the parallel hands with the flipped parangle:
        if(currDer==0){
          auxC3 = (PA2[currIF][k]/PA1[currIF][k])*(PA2[currIF][k]/PA1[currIF][k]);
-         auxC00Flp[BNum][0] += auxC1*auxC3;
-         auxC11Flp[BNum][0] += auxC2/auxC3;
-         UVWeights[BNum] += UVGauss[currIF][k];
+         BasC00Flp[0] += auxC1*auxC3;
+         BasC11Flp[0] += auxC2/auxC3;
+         UVWgtBas += UVGauss[currIF][k]*chanWidth(currIF,j);
        };
 
 
@@ -2886,20 +4100,20 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
 // 
 // 
 // Did we reach the pre-averaging time?? If so, update the covariance+residuals:
-  //  if ((Times[currIF][k]>=Tm[BNum] + ScanDur[currIF][currScan]/DT) || !(currScan==nextScan)){
-    if ((Times[currIF][k]>=Tm[BNum] + DT) || !(currScan==nextScan)){
+  //  if ((Times[currIF][k]>=TmBas + ScanDur[currIF][currScan]/DT) || !(currScan==nextScan)){
+    if ((Times[currIF][k]>=TmBas + DT) || !(currScan==nextScan)){
 
 
 
 
 
 
-      if(k<NVis[currIF]-1){Tm[BNum] = Times[currIF][k+1];};
+      if(k<NVis[currIF]-1){TmBas = Times[currIF][k+1];};
 
-      Itot = 0.5*(std::abs(auxC00[BNum][0]) + std::abs(auxC11[BNum][0]));
+      Itot = 0.5*(std::abs(BasC00[0]) + std::abs(BasC11[0]));
 
-      if (abs(auxC11[BNum][0])>0.0){
-        Error = auxC00[BNum][0] - auxC11[BNum][0];
+      if (abs(BasC11[0])>0.0){
+        Error = BasC00[0] - BasC11[0];
       };
 
 
@@ -2910,10 +4124,10 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
 	
 ////////////////////////////////////////////
 // CONTRIBUTION FROM THE PARALLEL HANDS:
-        if (RelWeight>0.0 && abs(auxC11[BNum][0])>0.0){
+        if (RelWeight>0.0 && abs(BasC11[0])>0.0){
           for(j=1;j<Nder;j++){
             auxI1 = DerIdx[j];
-            auxC1 = (auxC00[BNum][auxI1]-auxC11[BNum][auxI1]-Error)/dx;
+            auxC1 = (BasC00[auxI1]-BasC11[auxI1]-Error)/dx;
 // Incoherent approach:
             DerAux1[0] = auxC1.real()*auxC1.real(); DerAux1[1] = auxC1.imag()*auxC1.imag();
             CovMat[(auxI1-1)*(Npar+1)] += (DerAux1[0] + DerAux1[1])*ParHandWgt*BasWgt[BNum];
@@ -2921,7 +4135,7 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
               for(l=j+1;l<Nder;l++){
                 auxI2 = DerIdx[l];
 // Incoherent approach:
-                 auxC2 = (auxC00[BNum][auxI2]-auxC11[BNum][auxI2]-Error)/dx;
+                 auxC2 = (BasC00[auxI2]-BasC11[auxI2]-Error)/dx;
                  DerAux2[0] = auxC1.real()*auxC2.real(); DerAux2[1] = auxC1.imag()*auxC2.imag();
                  CovMat[(auxI1-1)*Npar+auxI2-1] += (DerAux2[0] + DerAux2[1])*ParHandWgt*BasWgt[BNum];
                  CovMat[(auxI2-1)*Npar+auxI1-1] = CovMat[(auxI1-1)*Npar+auxI2-1];
@@ -2939,8 +4153,8 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
         if (AddCrossHand){
           for(j=1;j<Nder;j++){
             auxI1 = DerIdx[j];
-            auxC1 = auxC01[BNum][auxI1];
-            auxC1 -= auxC01[BNum][0];
+            auxC1 = BasC01[auxI1];
+            auxC1 -= BasC01[0];
             auxC1 /= dx;
 // Incoherent approach:
             DerAux1[0] = auxC1.real()*auxC1.real(); DerAux1[1] = auxC1.imag()*auxC1.imag();
@@ -2948,8 +4162,8 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
             if (useCov){
               for(l=j+1;l<Nder;l++){
                 auxI2 = DerIdx[l];
-                auxC3 = auxC01[BNum][auxI2];
-                auxC3 -= auxC01[BNum][0];
+                auxC3 = BasC01[auxI2];
+                auxC3 -= BasC01[0];
                 auxC3 /= dx;
 // Incoherent approach:
                 DerAux2[0] = auxC1.real()*auxC3.real(); DerAux2[1] = auxC1.imag()*auxC3.imag();
@@ -2957,7 +4171,7 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
                 CovMat[(auxI2-1)*Npar+auxI1-1] = CovMat[(auxI1-1)*Npar+auxI2-1];
               };  
             };
-            auxC3 = auxC01[BNum][0];
+            auxC3 = BasC01[0];
 // Incoherent approach:
             DerAux2[0] = auxC3.real()*auxC1.real(); DerAux2[1] = auxC3.imag()*auxC1.imag();
             IndVec[auxI1-1] -= (DerAux2[0] + DerAux2[1])*CrossHandWgt*BasWgt[BNum]; 
@@ -2965,8 +4179,8 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
 
 /////////////////////////////////////////////
 // CONTRIBUTION FROM THE CROSS HANDS: LR    
-            auxC1 = auxC10[BNum][auxI1];
-            auxC1 -= auxC10[BNum][0];
+            auxC1 = BasC10[auxI1];
+            auxC1 -= BasC10[0];
             auxC1 /= dx;
 // Incoherent approach:
             DerAux1[0] = auxC1.real()*auxC1.real(); DerAux1[1] = auxC1.imag()*auxC1.imag();
@@ -2974,8 +4188,8 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
             if (useCov){
               for(l=j+1;l<Nder;l++){
                 auxI2 = DerIdx[l];
-                auxC3 = auxC10[BNum][auxI2];
-                auxC3 -= auxC10[BNum][0];
+                auxC3 = BasC10[auxI2];
+                auxC3 -= BasC10[0];
                 auxC3 /= dx;
 // Incoherent approach:
                DerAux2[0] = auxC1.real()*auxC3.real(); DerAux2[1] = auxC1.imag()*auxC3.imag();
@@ -2983,7 +4197,7 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
                CovMat[(auxI2-1)*Npar+auxI1-1] = CovMat[(auxI1-1)*Npar+auxI2-1];
              };  
            };
-           auxC3 = auxC10[BNum][0];
+           auxC3 = BasC10[0];
 // Incoherent approach:
            DerAux2[0] = auxC3.real()*auxC1.real(); DerAux2[1] = auxC3.imag()*auxC1.imag();
            IndVec[auxI1-1] -= (DerAux2[0] + DerAux2[1])*CrossHandWgt*BasWgt[BNum]; 
@@ -2997,20 +4211,20 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
 //////////////////////////
 // UPDATE THE CHI SQUARE
      if(AddCrossHand){
-       auxD1 = std::abs(auxC01[BNum][0])/Itot; auxD2 = std::abs(auxC10[BNum][0])/Itot; 
-       Chi2 += (auxD1*auxD1 + auxD2*auxD2)*CrossHandWgt*BasWgt[BNum]*Weights[currIF][k]*UVWeights[BNum]; 
+       auxD1 = std::abs(BasC01[0])/Itot; auxD2 = std::abs(BasC10[0])/Itot; 
+       Chi2 += (auxD1*auxD1 + auxD2*auxD2)*CrossHandWgt*BasWgt[BNum]*Weights[currIF][k]*UVWgtBas; 
      };
      if (RelWeight>0.0){
-       if (abs(auxC11[BNum][0])>0.0){
+       if (abs(BasC11[0])>0.0){
 // ALTERNATIVE OPTION: DIFFERENCE OF PARALLEL HANDS:
          auxC1 = Error - ((Stokes[0]+Stokes[3]) - (Stokes[0]-Stokes[3]));
          auxD1 = auxC1.real()*auxC1.real() + auxC1.imag()*auxC1.imag();
-         Chi2 += auxD1*ParHandWgt*BasWgt[BNum]*Weights[currIF][k]*UVWeights[BNum];
+         Chi2 += auxD1*ParHandWgt*BasWgt[BNum]*Weights[currIF][k]*UVWgtBas;
 
 // XPOLGFF OPTION: RATIO OF PARALLEL HANDS:
 //         auxC1 = Error - (Stokes[0]+Stokes[3])/(Stokes[0]-Stokes[3]);
 //         auxD1 = auxC1.real()*auxC1.real() + auxC1.imag()*auxC1.imag();
-//         Chi2 += auxD1*ParHandWgt*BasWgt[BNum]*Weights[currIF][k]*UVWeights[BNum];
+//         Chi2 += auxD1*ParHandWgt*BasWgt[BNum]*Weights[currIF][k]*UVWgtBas;
        };
      };
      if(end==1){
@@ -3019,12 +4233,12 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
          if (LinBasNum[l]==BNum){  
 // ALTERNATIVE OPTION:
            double GoodAmp = std::abs(Error);
-	   double FlippedAmp = std::abs(auxC00Flp[BNum][0]-auxC11Flp[BNum][0]);
+	   double FlippedAmp = std::abs(BasC00Flp[0]-BasC11Flp[0]);
            if (FlippedAmp<GoodAmp){Nflipped += 1;}else{Nflipped -= 1;};	 
 
 // XPOLGFF OPTION:
 //           double GoodPhase = std::arg(Error);
-//	   double FlippedPhase = std::arg(auxC00Flp[BNum][0]/auxC11Flp[BNum][0]);
+//	   double FlippedPhase = std::arg(BasC00Flp[0]/BasC11Flp[0]);
 //           if (std::abs(FlippedPhase)<std::abs(GoodPhase)){Nflipped += 1;}else{Nflipped -= 1;};	 
            break;
          };
@@ -3033,123 +4247,68 @@ static PyObject *GetChi2(PyObject *self, PyObject *args) {
 
 
 
+//////////////////////////
+// UPDATE THE GRADIENT (AND THE GAUSS-NEWTON HESSIAN).
+// The residuals are auxC01/Itot and auxC10/Itot (cross hands) 
+// and Error - (RR-LL model) (parallel hands):
+     if(doGrad){
+       auxD2 = BasWgt[BNum]*Weights[currIF][k]*UVWgtBas;
+       auxC1 = Error - ((Stokes[0]+Stokes[3]) - (Stokes[0]-Stokes[3]));
+       for(l=0;l<6;l++){
+         dR01[l] = 0.0; dR10[l] = 0.0; dRPH[l] = 0.0;
+         if(!ParNew[l]){continue;};
+         n = ParIdx[l]+1;
+         if(AddCrossHand){
+           dItot = 0.0;
+           if (std::abs(BasC00[0])>0.0){dItot += 0.5*std::real(std::conj(BasC00[0])*BasC00[n])/std::abs(BasC00[0]);};
+           if (std::abs(BasC11[0])>0.0){dItot += 0.5*std::real(std::conj(BasC11[0])*BasC11[n])/std::abs(BasC11[0]);};
+           dR01[l] = (BasC01[n] - BasC01[0]*dItot/Itot)/Itot;
+           dR10[l] = (BasC10[n] - BasC10[0]*dItot/Itot)/Itot;
+           Grad[n-1] += 2.*(std::real(std::conj(BasC01[0])*dR01[l]) + std::real(std::conj(BasC10[0])*dR10[l]))/Itot*CrossHandWgt*auxD2;
+         };
+         if (RelWeight>0.0 && abs(BasC11[0])>0.0){
+           dRPH[l] = BasC00[n] - BasC11[n];
+           Grad[n-1] += 2.*std::real(std::conj(auxC1)*dRPH[l])*ParHandWgt*auxD2;
+         };
+       };
+       if (Hess != NULL){
+         for(l=0;l<6;l++){
+           if(!ParNew[l]){continue;};
+           for(m=0;m<6;m++){
+             if(!ParNew[m]){continue;};
+             Hess[ParIdx[l]*NGrad+ParIdx[m]] += 2.*(CrossHandWgt*(std::real(std::conj(dR01[l])*dR01[m]) + std::real(std::conj(dR10[l])*dR10[m]))
+                                               + ParHandWgt*std::real(std::conj(dRPH[l])*dRPH[m]))*auxD2;
+           };
+         };
+       };
+     };
+
+
+
 // Reset temporal visibility averages:
     for(j=0;j<Npar+1;j++){
-      auxC00[BNum][j] = cplx64f(0., 0.);
-      auxC01[BNum][j] = cplx64f(0., 0.);
-      auxC10[BNum][j] = cplx64f(0., 0.);
-      auxC11[BNum][j] = cplx64f(0., 0.);
-      auxC00Flp[BNum][j] = cplx64f(0., 0.);
-      auxC11Flp[BNum][j] = cplx64f(0., 0.);
+      BasC00[j] = cplx64f(0., 0.);
+      BasC01[j] = cplx64f(0., 0.);
+      BasC10[j] = cplx64f(0., 0.);
+      BasC11[j] = cplx64f(0., 0.);
+      BasC00Flp[j] = cplx64f(0., 0.);
+      BasC11Flp[j] = cplx64f(0., 0.);
 
     };
-    AvVis[BNum] = 0;
-    UVWeights[BNum] = 0.0;
+    AvVisBas = 0;
+    UVWgtBas = 0.0;
 // TODO: DIVIDE AvPA BY NUMBER OF VISIBS!!!!!
 //    AvPA1[BNum] = oneC; AvPA2[BNum] = oneC;
 
-   }; // Comes from:   if (Times[currIF][k]>=Tm[BNum] + DT)
+   }; // Comes from:   if (Times[currIF][k]>=TmBas + DT)
 
-   }; // Comes from if(BNum>=0) 
 
   };  // Comes from loop over visibilities
 
-  delete[] chanFreq;
-
-};  // Comes from loop over NIFComp
-
-
-
-//double TheorImpr = 0.0;
-
-//if(doCov){
-// Solve the system:
-
-// Find the largest gradient:
-//double Largest = 0.0;
-//for(i=0;i<Npar;i++){
-//  if(CovMat[i*Npar+i]>Largest){Largest=CovMat[i*Npar+i];};
-//};
-
-// Fill in the Hessian's lower part:
-//for(i=0;i<Npar;i++){
-//  DirDer[i] = CovMat[i*Npar+i];
-//  CovMat[i*Npar+i] += Lambda*(Largest);
-//};
-
-
-/*
-gsl_death_by = GSL_SUCCESS;
-if (useCov){
-  gsl_linalg_LU_decomp (&m.matrix, perm, &s);
-  gsl_linalg_LU_solve(&m.matrix, perm, &v.vector, &x.vector);
-} else {
-  for(i=0;i<Npar;i++){SolVec[i] = IndVec[i]/CovMat[i*Npar+i];};
-};
-if (gsl_death_by != GSL_SUCCESS) {
-    PyObject *ret = Py_BuildValue("d",-13);
-    return ret;
-};
-*/
-
-
-//for(i=0;i<Npar;i++){SolVec[i] = Lambda*IndVec[i]/CovMat[i*Npar+i];};
-
-//for(i=0;i<Npar;i++){
-//  TheorImpr += DirDer[i]*SolVec[i]*SolVec[i] - 2.*IndVec[i]*SolVec[i];
-//  CrossG[i] += SolVec[i];
-//};
-
-
-//}; // comes from if(doCov)
-
-
-
-/*
-if (chisqcount==0){
-  sprintf(message,"%i %i-%i ",doIF[0], Ch0, Ch1);
-  fprintf(auxFile,"%s",message);
-
-  for(i=0;i<Npar;i++){
-    sprintf(message,"%.3e ",CrossG[i]); 
-    fprintf(auxFile,"%s",message);
-  };
-
-  sprintf(message," | %.3e \n",Chi2); 
-  fprintf(auxFile,"%s",message);
-  fclose(auxFile);
-};
-*/
-
- // if (SolAlgor==0){
- //    printf("\n Chi Squared: %.5e. Expected improvement: %.5e",Chi2,TheorImpr);
- //  };
-
-  Chi2Old = Chi2;
-
-    if (end==1){Chi2 = (Nflipped>0)?1.0:-1.0;};
-
-    ret = Py_BuildValue("d",Chi2);
-
-
-//  delete[] AvPA1;
-//  delete[] AvPA2;
-
-
-
-  return ret;
+  W->TaskChi2[task] = Chi2;
+  W->TaskFlip[task] = Nflipped;
 
 };
 
 
 // eof
-
-
-
-
-
-
-
-
-
-
@@ -47,6 +47,8 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 #include <complex>
 #include <sstream> 
 #include <iomanip>
+#include <vector>
+#include "./PCalFile.h"
 
 #define EPSILON 0.00001
 
@@ -90,15 +92,21 @@ static char XPConvert_docstring[] =
     "Overwrites the pcal DiFX file with a new version, where X and Y are substitued by R and L. In this version, both the R and L entries are exact copies of X.";
 
 
+static char PCalTones_docstring[] =
+    "Returns the contents of a DiFX phasecal file as a dictionary of numpy arrays.\n The first argument is the name of the phasecal file. If the second (optional) argument is 1 (default), the parsed file is saved to a binary cache (file name + '.PCALCACHE'), which is used instead of the text as long as the phasecal file is not modified.\n\n Keys: 'ANTENNAS' (list of antenna names), one entry per line of the file: 'ANT' (index in ANTENNAS), 'MJD', 'INTTIME' (days), 'DSID', 'NBAND', 'NTONE' (tones per band), 'FIRST' (index of the first tone of the line) and 'NTONES' (tones in the line); one entry per tone: 'LINE', 'FREQ' (MHz), 'POL', 'RE' and 'IM'.";
+
+
 /* Available functions */
 static PyObject *XPCal(PyObject *self, PyObject *args);
 static PyObject *XPConvert(PyObject *self, PyObject *args);
+static PyObject *PCalTones(PyObject *self, PyObject *args);
 
 
 /* Module specification */
 static PyMethodDef module_methods[] = {
     {"XPCal", XPCal, METH_VARARGS, XPCal_docstring},
     {"XPConvert", XPConvert, METH_VARARGS, XPConvert_docstring},
+    {"PCalTones", PCalTones, METH_VARARGS, PCalTones_docstring},
     {NULL, NULL, 0, NULL}   /* terminated by list of NULLs, apparently */
 };
 
@@ -165,24 +173,22 @@ static PyObject *XPCal(PyObject *self, PyObject *args)
   
   GrDel *= 1.e-3*(2.*PI);
   
-// OPEN PHASECAL FILE:
+// READ (AND TOKENIZE) THE PHASECAL FILE, OR TAKE IT FROM ITS CACHE:
   std::string PcalFile = PyString_AsString(pFName);
-  std::ifstream PcalF;
-  PcalF.open(PcalFile.c_str(), std::ios::in);
+  PCalFile PCal(PcalFile.c_str(),true);
+  if (!PCal.isOpen()){printf("ERROR! Cannot open %s\n",PcalFile.c_str()); fflush(stdout); return ret;};
 
 
   
-  double T, inT, Tini, Tbuf; 
+  double T = 0.0, Tini, Tbuf; 
   double Re=0.0, Im=0.0, nui=0.0;
   double NEntry, *NWrap;
   NWrap = nullptr;
 
   int Aux = 0; int Aux2 = 0;
-  int auxNTone, NTone, NToneHf=0, TPI, i,j,l;
-  long k;
+  int auxNTone, NTone=0, NToneHf=0, TPI, i,j,l;
+  long k, iline, it, FirstLine = 0;
   char Pol;
-  std::string TelName, line, auxStr;
-  std::istringstream tempStr, auxTempStr;
 
   cplx64d *PCalsX=nullptr, *PCalsY=nullptr, PCalTemp, *PCalsD=nullptr; 
   double *PCalsAX=nullptr, *PCalsAY= nullptr; 
@@ -202,14 +208,11 @@ static PyObject *XPCal(PyObject *self, PyObject *args)
   NEntry = 0.0;
 
   Pol='R';
-// Read line by line. The frequencies of all tones will be read from the first line 
-// (i.e., when start = false).  
-
-  while (!PcalF.eof()){
-    std::getline(PcalF,line);
-    if (line.length() > 10 && line[0] != '#'){  // good line
-       tempStr.str(line);
-       tempStr.clear();
+// Read line by line. The frequencies of all tones will be read from the lines
+// of the first integration time (i.e., when start = 1). For multi-file
+// stations, these are the lines from FirstLine to the current one.
+
+  for (iline=0; iline<PCal.nLines; iline++){
        if(start == 2){
        	 // After this line, 'Aux' is the number of tones with
        	 // successful detections.
@@ -221,22 +224,15 @@ static PyObject *XPCal(PyObject *self, PyObject *args)
        
          // Now, we read the phase values:
 
-         tempStr >> TelName;
-         tempStr >> Tbuf;
-         tempStr >> inT;
-         tempStr >> Aux2;
-         tempStr >> NTone;
-         tempStr >> TPI;
+         Tbuf = PCal.Time[iline];
+         Aux2 = PCal.DsId[iline];
+         NTone = PCal.NBand[iline];
+         TPI = PCal.NToneBand[iline];
        
-         i=0; j=0;
-         while(std::getline(tempStr,auxStr,' ')){
-           if (auxStr.length() > 0){
-             switch(i){
+         for (it=PCal.FirstTone[iline]; it<PCal.FirstTone[iline]+PCal.NTones[iline]; it++){
 
 	       // Remember the format: 'FREQ POL RE IM':
-	       // (i.e., case 0, 1, 2, 3).
-
-               case 0: nui = atof(auxStr.c_str());
+               nui = PCal.Freq[it];
                  RepNu = false; // Is this tone NEW (i.e., not found in the previous times??)
                  if (nui<0.0){j=-1;} else {
 	  	 for(j=0;j<Aux;j++){
@@ -247,21 +243,14 @@ static PyObject *XPCal(PyObject *self, PyObject *args)
                    };
                  }; // In case of a new tone, add it to the data (and update 'Aux'):
                  if (!RepNu && nui >0.0){PCalNus[Aux]=nui; j=Aux; Aux+=1; printf("NEW %.3f, %.3f\n, aux es %i",nui,nui,Aux);}; 
-                 i+= 1; break;
-
-               case 1: Pol = auxStr.c_str()[0]; i += 1; break;
-
-               case 2: Re = atof(auxStr.c_str()); i += 1; break;
 
-               case 3: Im = atof(auxStr.c_str()); i=0; k+=1;
+               Pol = PCal.Pol[it];
+               Re = PCal.Re[it];
+               Im = PCal.Im[it]; k+=1;
                 if(j>=0){
                  if (Pol == 'X' || Pol == 'R'){PCalsX[j] = cplx64d(Re,Im); goodX[j]=true;}; 
                  if (Pol == 'Y' || Pol == 'L'){PCalsY[j] = cplx64d(Re,Im); goodY[j]=true;};  
                 }; 
-                 break;
-		
-             };
-           };
          };
        		
 	// Time in seconds, referred to the first integration: 
@@ -351,15 +340,11 @@ static PyObject *XPCal(PyObject *self, PyObject *args)
 	 };
 	}else if(start == 1){
         // Check if we are still in the same integration time (multi-file case)
-	 tempStr >> TelName;
-         tempStr >> Tbuf;
-         tempStr >> inT;
-         tempStr >> Aux;
-         tempStr >> auxNTone;
-         tempStr >> TPI; // Tone per IF
+         Tbuf = PCal.Time[iline];
+         Aux = PCal.DsId[iline];
+         auxNTone = PCal.NBand[iline];
+         TPI = PCal.NToneBand[iline]; // Tone per IF
 	 if (areSame(Tbuf, T)){
-		std::getline(tempStr,auxStr);
-		auxTempStr.str(auxTempStr.str()+' '+auxStr);
 		NTone += auxNTone;
 	 }else{
 	 	//printf("T is %.7f and Tbuf is %.7f\n",T,Tbuf);
@@ -433,90 +418,29 @@ static PyObject *XPCal(PyObject *self, PyObject *args)
         	   goodX[j]=false; goodY[j]=false;
 	         };
         	 j = 0; i = 0; Aux = 0;
-	//	for (j=0;j<NToneHf;j++){
-	//		std::cout << PCalNus[j];
-	//	};
 
 		 // START READING THE PHASE VALUES!!!
 		 // The format is 'FREQ POL RE IM', and now 
-		 // we are only interested in FREQ:
+		 // we are only interested in FREQ (the phases of
+		 // the first integration time are not used):
 
 		 // First the initial integration time
-		 auxTempStr >> TelName;
-         	 auxTempStr >> T;
-         	 auxTempStr >> inT;
-        	 auxTempStr >> Aux;
-        	 auxTempStr >> auxNTone;
-	         auxTempStr >> TPI; // Tone per IF
+         	 T = PCal.Time[FirstLine];
+         	 TPI = PCal.NToneBand[FirstLine]; // Tone per IF
         	 j = 0; i = 0; Aux = 0;
 		 
-	// 	 std::cout << auxTempStr.str() << '\n';
-		 while(std::getline(auxTempStr,auxStr,' ')){
-		   if (auxStr.length() > 0){
-		     switch(i){
-		       case 0: nui = atof(auxStr.c_str()); i+= 1;
+		 for (it=PCal.FirstTone[FirstLine]; it<PCal.FirstTone[iline]; it++){
+		       nui = PCal.Freq[it];
 			 RepNu = false; // Is this frequency repeated???
                          for (j=0;j<Aux;j++){
                            if (PCalNus[j]==nui){RepNu=true;break;};
                          }; // Add to the list if it is not repeated:
                          if(!RepNu && nui>0.0){PCalNus[Aux]=nui;Aux+=1;};
-                         break;
-		       case 1: i+= 1; break;
-                       case 2: i+= 1; break;
-                       case 3: i=0; break;
-                     };
-                   };
                  };
-		auxTempStr.clear();
-
-		// Now, we read the phase values:
-		// Aux must keep total number of tones
-
-         	auxTempStr >> TelName;
-         	auxTempStr >> T;
-         	auxTempStr >> inT;
-         	auxTempStr >> Aux2;
-         	auxTempStr >> NTone;
-         	auxTempStr >> TPI;
 
   		// Time in seconds, referred to the first integration:
        		T -= Tini; T *= 86400. ; 
 
-         	i=0; j=0;
-         	while(std::getline(auxTempStr,auxStr,' ')){
-           		if (auxStr.length() > 0){
-             			switch(i){
-
-              			 // Remember the format: 'FREQ POL RE IM':
-               			// (i.e., case 0, 1, 2, 3).
-
-               				case 0: nui = atof(auxStr.c_str());
-                 				RepNu = false; // Is this tone NEW (i.e., not found in the previous times??)
-                 				if (nui<0.0){j=-1;} else {
-                 					for(j=0;j<Aux;j++){
-                     						if(nui==PCalNus[j]){
-                       							RepNu = true;
-                       							break;
-                     						};
-                   					};
-                 				}; // In case of a new tone, add it to the data (and update 'Aux'):
-                 				if (!RepNu && nui >0.0){PCalNus[Aux]=nui; j=Aux; Aux+=1; printf("NEW %.3f\n",nui);};
-                 				i+= 1; break;
-
-               				case 1: Pol = auxStr.c_str()[0]; i += 1; break;
-
-               				case 2: Re = atof(auxStr.c_str()); i += 1; break;
-
-               				case 3: Im = atof(auxStr.c_str()); i=0; k+=1;
-                				if(j>=0){
-                 					if (Pol == 'X' || Pol == 'R'){PCalsX[j] = cplx64d(Re,Im); goodX[j]=true;};
-                 					if (Pol == 'Y' || Pol == 'L'){PCalsY[j] = cplx64d(Re,Im); goodY[j]=true;};
-                				};
-                 				break;
-
-             			};
-           		};
-         	};
 	    	NEntry += 1.0;   
 
 		// Now, partial second integration time already read
@@ -524,15 +448,10 @@ static PyObject *XPCal(PyObject *self, PyObject *args)
 		// Time in seconds, referred to the first integration:
                 T -= Tini; T *= 86400. ;
 		i=0; j=0; 
-                while(std::getline(tempStr,auxStr,' ')){
-                        if (auxStr.length() > 0){
-                                switch(i){
+                for (it=PCal.FirstTone[iline]; it<PCal.FirstTone[iline]+PCal.NTones[iline]; it++){
 
                                  // Remember the format: 'FREQ POL RE IM':
-                                // (i.e., case 0, 1, 2, 3).
-
-                                        case 0: nui = atof(auxStr.c_str());
-                                                Pol = 'R';
+                                        nui = PCal.Freq[it];
                                                 RepNu = false; // Is this tone NEW (i.e., not found in the previous times??)
                                                 if (nui<0.0){j=-1;} else {
                                                         for(j=0;j<Aux;j++){
@@ -543,42 +462,30 @@ static PyObject *XPCal(PyObject *self, PyObject *args)
                                                         };
                                                 }; // In case of a new tone, add it to the data (and update 'Aux'):
                                                 if (!RepNu && nui >0.0){PCalNus[Aux]=nui; j=Aux; Aux+=1; printf("NEW %.3f\n",nui);};
-                                                i+= 1; break;
 
-                                        case 1: Pol = auxStr.c_str()[0]; i += 1; break;
-
-                                        case 2: Re = atof(auxStr.c_str()); i += 1; break;
-
-                                        case 3: Im = atof(auxStr.c_str()); i=0; k+=1;
+                                        Pol = PCal.Pol[it];
+                                        Re = PCal.Re[it];
+                                        Im = PCal.Im[it]; k+=1;
                                                 if(j>=0){
                                                         if (Pol == 'X' || Pol == 'R'){PCalsX[j] = cplx64d(Re,Im); goodX[j]=true;};
                                                         if (Pol == 'Y' || Pol == 'L'){PCalsY[j] = cplx64d(Re,Im); goodY[j]=true;};
                                                 };
-                                                break;
-
-                                };
-                        };
                 };
 
-         auxTempStr.clear();
-         tempStr.clear();
 	};
 	}else{
 	// Case for first data line in file
 	// First elements in line:       
-         tempStr >> TelName;
-         tempStr >> T;
-         tempStr >> inT;
-         tempStr >> Aux;
-         tempStr >> NTone;
-         tempStr >> TPI; // Tone per IF
+         T = PCal.Time[iline];
+         Aux = PCal.DsId[iline];
+         NTone = PCal.NBand[iline];
+         TPI = PCal.NToneBand[iline]; // Tone per IF
          Tini = T;
-	 auxTempStr.str(tempStr.str());
+         FirstLine = iline;
          start = 1;
 	 printf("\n");
     	};
   };
-};
 
 
 
@@ -598,6 +505,9 @@ int FirstGood = -1;
 // Arrange some results:
 for(j=0;j<Aux;j++){
 
+  // (the IF delays are only set at the last tone of each IF):
+  Delays[j] = 0.0; RefPhases[j] = 0.0; RefFreqs[j] = 0.0;
+
   // We add a new point at 10s after the last int. time,
   // to avoid silly scipy extrapolation errors:	
   Ti[j][NTimes[j]] = Ti[j][NTimes[j]-1] + 10.;
@@ -804,94 +714,42 @@ static PyObject *XPConvert(PyObject *self, PyObject *args)
   if (!PyArg_ParseTuple(args, "O", &pFName)){printf("FAILED XPConvert! Wrong arguments!\n"); fflush(stdout);  return ret;};
 
 
-  double T;
-  int i, j, k, nui=0.0; 
+  int j, k, nui=0; 
   bool isX = false, RepNu = false;
   char Pol;
-  long currP=0, lastP, Nbytes;
+  long it;
 
 // Size of pcal buffer:
   int BuffSize = 1024;
   int NewBuffSize = BuffSize;
 
-// Buffers for pcals:
-  int *PCalNus = (int *) malloc(BuffSize*sizeof(int));
-  double *LastPcalRe = (double *) malloc(BuffSize*sizeof(double));
-  double *LastPcalIm = (double *) malloc(BuffSize*sizeof(double));
-  int NPCals = 0;
-
-  for (i=0; i<BuffSize; i++){
-    PCalNus[i] = -1; LastPcalRe[i] = 0.0; LastPcalIm[i] = 0.0;
-  };
-
-
 
-// MAKE A BACKUP OF THE PCAL FILE:
+// READ (AND TOKENIZE) THE PHASECAL FILE:
   std::string PcalFile = PyString_AsString(pFName);
-  std::ifstream PcalF;
-  PcalF.open(PcalFile.c_str(), std::ios::in | std::ios::binary);
+  PCalFile PCal(PcalFile.c_str());
+  if (!PCal.isOpen()){printf("ERROR! Cannot open %s\n",PcalFile.c_str()); fflush(stdout); return ret;};
 
+// MAKE A BACKUP OF THE PCAL FILE:
   std::string SUFFIX(".ORIGINAL");
   std::string outname = PcalFile + SUFFIX;  
-  std::ofstream OutPcal(outname.c_str(), std::ios::out | std::ios::binary);
-
-//  char buf[1028];
-//  while(PcalF.gcount()>0){PcalF.read(&buf[0],1028); OutPcal.write(&buf[0],PcalF.gcount());};
-
-  OutPcal << PcalF.rdbuf();
-
-  PcalF.close();
-  OutPcal.close();
-
-
-    
-
-///////////////////////////////
-// OPEN PHASECAL FILE:
-  PcalF.open(outname.c_str(), std::ios::in);
-
-// OPEN OUTPUT FILE:
-  OutPcal.open(PcalFile.c_str(), std::ios::out);
+  PCal.write(outname.c_str(),true);
 
 
+// Buffers for pcals:
+  int *PCalNus = (int *) malloc(BuffSize*sizeof(int));
+  double *LastPcalRe = (double *) malloc(BuffSize*sizeof(double));
+  double *LastPcalIm = (double *) malloc(BuffSize*sizeof(double));
+  int NPCals = 0;
 
-  std::string TelName, line, auxStr;
-  std::stringstream tempStr;
- // std::stringbuf *linePos;
-
-
-  while (!PcalF.eof()){
-
-    // Read original line:
-    std::getline(PcalF,line);
-    tempStr.str(line);
-
-    // Change entries: (X,Y) -> (R,L) and R = L = X.
-    if (line.length() > 10 && line[0] != '#'){
-       tempStr.clear();
-       tempStr.precision(5);
-     //  tempStr.setw(12);
-
-     //  linePos = tempStr.rdbuf();
-
-	// First elements in line (dummy reads):       
-         tempStr >> TelName;
-         tempStr >> T;
-         tempStr >> T;
-         tempStr >> i;
-         tempStr >> i;
-         tempStr >> i;
-
+  for (k=0; k<BuffSize; k++){
+    PCalNus[k] = -1; LastPcalRe[k] = 0.0; LastPcalIm[k] = 0.0;
+  };
 
-       i=0; j=0;
-       while(std::getline(tempStr,auxStr,' ')){
-         if (auxStr.length() > 0){
-           switch(i){
 
-	     // Remember the format: 'FREQ POL RE IM':
-	     // (i.e., case 0, 1, 2, 3).
+// Change entries: (X,Y) -> (R,L) and R = L = X.
+  for (it=0; it<PCal.nTones; it++){
 
-             case 0: nui = atoi(auxStr.c_str());
+     nui = (int) PCal.Freq[it];
                RepNu = false; // Is this tone NEW (i.e., not found in the previous times??)
                if (nui<0){j=-1;} else {
                  for(j=0;j<NPCals;j++){
@@ -916,80 +774,117 @@ static PyObject *XPConvert(PyObject *self, PyObject *args)
 	       };
                //////////////
 
-               i+= 1; break;
+     if(nui<=0){continue;};
 
+     Pol = PCal.Pol[it];
+     isX = Pol=='X';
+     if (Pol=='X'){  // If X, keep its Re and Im; Change to R
+       PCal.setPol(it,'R');
+     } else if (Pol=='Y'){ // If Y, change Re and Im; Change to L
+       PCal.setPol(it,'L');
+     };
 
-             case 1: if(nui<=0){i+=1; break;} Pol = auxStr.c_str()[0];
+     if (isX){
+       LastPcalRe[j] = PCal.Re[it]; LastPcalIm[j] = PCal.Im[it];
+     } else {
+       PCal.setValue(it,LastPcalRe[j],LastPcalIm[j]);
+     };
 
-	       if (Pol=='X'){  // If X, keep next Re and Im; Change to R
-                 isX = true;
-		 currP = tempStr.tellg();
-                 tempStr.seekp(currP-2);
-		 tempStr << 'R';
+  };
 
 
-	       } else if (Pol=='Y'){ // If Y, change Re and Im; Change to L
-                 isX = false;
-                 currP = tempStr.tellg();
-                 tempStr.seekp(currP-2);
-		 tempStr << 'L';
+// Write the new file:
+  if (!PCal.write(PcalFile.c_str(),false)){
+    printf("ERROR! Cannot write %s\n",PcalFile.c_str()); fflush(stdout);
+  };
+  
+  free(PCalNus); 
+  free(LastPcalRe);
+  free(LastPcalIm);
+  
 
-	       };	       
-		     
-	       i += 1; break;
-
-
-             case 2: if(nui<=0){i+=1; break;};
-		if (isX){
-		  LastPcalRe[j] = atof(auxStr.c_str());
-		} else {
-	          lastP = tempStr.tellg();		
-                  tempStr.seekp(currP);
-                  Nbytes = lastP - currP-1;
-		  currP = lastP;
-		  tempStr << std::setw(Nbytes) << std::scientific << LastPcalRe[j];
-		};	
-		i += 1; break;
-
-
-             case 3: if(nui<=0){i = 0; isX = false; break;};
-		if(isX){
-		  LastPcalIm[j] = atof(auxStr.c_str());
-		} else {
-	          lastP = tempStr.tellg();		
-                  tempStr.seekp(currP);
-                  Nbytes = lastP - currP-1;
-		  tempStr << std::setw(Nbytes) << LastPcalIm[j];
-		};
+// Return with no problems:
+ret = Py_BuildValue("i",0);
+return ret;
+
+
+};
 
-		i = 0; isX = false; break;
 
-           };
-         };
-       };
 
 
 
-  };
 
-  // Write new lines:
-  OutPcal << tempStr.str() << std::endl ;
 
 
+
+
+
+
+
+// Copies a column into a new numpy array, and puts it in the dictionary:
+static void addColumn(PyObject *dict, const char *key, int type, long n, const void *data, size_t itemSize){
+  npy_intp dims[1];
+  dims[0] = (npy_intp) n;
+  PyObject *arr = PyArray_New(&PyArray_Type, 1, dims, type, NULL, NULL, (int) itemSize, 0, NULL);
+  if (n>0){memcpy(PyArray_DATA((PyArrayObject *) arr), data, n*itemSize);};
+  PyDict_SetItemString(dict, key, arr);
+  Py_DECREF(arr);
 };
 
-  OutPcal.close();
-  PcalF.close();
-  
-  free(PCalNus); 
-  free(LastPcalRe);
-  free(LastPcalIm);
+
+
+static PyObject *PCalTones(PyObject *self, PyObject *args)
+{
+
+  // Object to return:
+  PyObject *ret; 
+
+  ret = Py_BuildValue("i",-1);
   
+  // Function arguments:
+  PyObject *pFName;
+  int useCache = 1;
+  if (!PyArg_ParseTuple(args, "O|i", &pFName, &useCache)){printf("FAILED PCalTones! Wrong arguments!\n"); fflush(stdout);  return ret;};
 
-// Return with no problems:
-ret = Py_BuildValue("i",0);
-return ret;
+  long i, it;
 
+// READ (AND TOKENIZE) THE PHASECAL FILE, OR TAKE IT FROM ITS CACHE:
+  std::string PcalFile = PyString_AsString(pFName);
+  PCalFile PCal(PcalFile.c_str(),useCache!=0);
+  if (!PCal.isOpen()){printf("ERROR! Cannot open %s\n",PcalFile.c_str()); fflush(stdout); return ret;};
 
-};
 
+// Index of the line of each tone:
+  std::vector<long> Line(PCal.nTones);
+  for (i=0; i<PCal.nLines; i++){
+    for (it=PCal.FirstTone[i]; it<PCal.FirstTone[i]+PCal.NTones[i]; it++){Line[it] = i;};
+  };
+
+  PyObject *Ants = PyList_New(PCal.AntNames.size());
+  for (i=0; i<(long)PCal.AntNames.size(); i++){
+    PyList_SetItem(Ants, i, PyString_FromString(PCal.AntNames[i].c_str()));
+  };
+
+  Py_DECREF(ret);
+  ret = PyDict_New();
+  PyDict_SetItemString(ret, "ANTENNAS", Ants);
+  Py_DECREF(Ants);
+
+  addColumn(ret, "ANT", NPY_INT, PCal.nLines, PCal.Ant.data(), sizeof(int));
+  addColumn(ret, "MJD", NPY_FLOAT64, PCal.nLines, PCal.Time.data(), sizeof(double));
+  addColumn(ret, "INTTIME", NPY_FLOAT64, PCal.nLines, PCal.IntTime.data(), sizeof(double));
+  addColumn(ret, "DSID", NPY_INT, PCal.nLines, PCal.DsId.data(), sizeof(int));
+  addColumn(ret, "NBAND", NPY_INT, PCal.nLines, PCal.NBand.data(), sizeof(int));
+  addColumn(ret, "NTONE", NPY_INT, PCal.nLines, PCal.NToneBand.data(), sizeof(int));
+  addColumn(ret, "FIRST", NPY_LONG, PCal.nLines, PCal.FirstTone.data(), sizeof(long));
+  addColumn(ret, "NTONES", NPY_LONG, PCal.nLines, PCal.NTones.data(), sizeof(long));
+  addColumn(ret, "LINE", NPY_LONG, PCal.nTones, Line.data(), sizeof(long));
+  addColumn(ret, "FREQ", NPY_FLOAT64, PCal.nTones, PCal.Freq.data(), sizeof(double));
+  addColumn(ret, "POL", NPY_STRING, PCal.nTones, PCal.Pol.data(), sizeof(char));
+  addColumn(ret, "RE", NPY_FLOAT64, PCal.nTones, PCal.Re.data(), sizeof(double));
+  addColumn(ret, "IM", NPY_FLOAT64, PCal.nTones, PCal.Im.data(), sizeof(double));
+
+  return ret;
+
+};
@@ -47,6 +47,11 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 #include <complex>
 #include <sstream> 
 #include <iomanip>
+#include <vector>
+#include <map>
+#include <algorithm>
+#include <math.h>
+#include "./PCalFile.h"
 
 #define EPSILON 0.00001
 
@@ -136,6 +141,77 @@ bool areSame(double a, double b){
 }
 
 
+
+// In-place (forward) FFT of a power-of-two number of samples:
+static void fftRadix2(std::vector<cplx64d> &a){
+
+  long n = a.size(), i, j, k, len;
+  double PI = 3.14159265358979323846;
+
+  for (i=1, j=0; i<n; i++){
+    for (k=n>>1; j&k; k>>=1){j ^= k;};
+    j ^= k;
+    if (i<j){std::swap(a[i],a[j]);};
+  };
+
+  for (len=2; len<=n; len<<=1){
+    cplx64d wl = std::polar(1.0,-2.*PI/((double) len));
+    for (i=0; i<n; i+=len){
+      cplx64d w = 1.0;
+      for (k=0; k<len/2; k++){
+        cplx64d u = a[i+k], v = a[i+k+len/2]*w;
+        a[i+k] = u+v; a[i+k+len/2] = u-v;
+        w *= wl;
+      };
+    };
+  };
+
+};
+
+
+
+// Coarse delay (in cycles per MHz, i.e., in mus) of a set of tones (in
+// increasing frequency), from the peak of their zero-padded delay spectrum.
+// The tones are put on a grid with the spacing of the closest ones (tones
+// that are not on the grid just make the peak broader):
+static double coarseDelay(const double *Nus, const double *Phases, const int *tones, int n){
+
+  const long MAXGRID = 65536;
+  double dnu = 0.0, d;
+  long i, p, npad, ngrid;
+
+  if (n<2){return 0.0;};
+
+  for (i=1; i<n; i++){
+    d = Nus[tones[i]] - Nus[tones[i-1]];
+    if (d>0.0 && (dnu==0.0 || d<dnu)){dnu = d;};
+  };
+  if (dnu<=0.0 || (Nus[tones[n-1]]-Nus[tones[0]])/dnu > MAXGRID){return 0.0;};
+
+  ngrid = (long) ((Nus[tones[n-1]]-Nus[tones[0]])/dnu + 1.5);
+  for (npad=2; npad<4*ngrid; npad*=2){};
+
+  std::vector<cplx64d> Spec(npad,0.0);
+  for (i=0; i<n; i++){
+    Spec[((long) ((Nus[tones[i]]-Nus[tones[0]])/dnu + 0.5))%npad] += std::polar(1.0,Phases[tones[i]]);
+  };
+  fftRadix2(Spec);
+
+  p = 0;
+  for (i=1; i<npad; i++){if (std::abs(Spec[i])>std::abs(Spec[p])){p = i;};};
+
+// Parabolic interpolation of the peak:
+  double y0 = std::abs(Spec[(p+npad-1)%npad]), y1 = std::abs(Spec[p]), y2 = std::abs(Spec[(p+1)%npad]);
+  double peak = (double) p;
+  if (y0-2.*y1+y2 < 0.0){peak += 0.5*(y0-y2)/(y0-2.*y1+y2);};
+  if (peak > 0.5*npad){peak -= (double) npad;};
+
+  return peak/(((double) npad)*dnu);
+
+};
+
+
+
 //////////////////////////////////
 // MAIN FUNCTION: 
 static PyObject *XPCalMF(PyObject *self, PyObject *args)
@@ -151,25 +227,18 @@ static PyObject *XPCalMF(PyObject *self, PyObject *args)
 
   int overWrite;
   int iMode, IFoffset;
-//  double PI = 3.1415926535; 
-//  double R2D = 180./PI; 
-//  double GrDel;
   // Object to return:
   PyObject *ret; 
 
   ret = Py_BuildValue("i",-1);
   
   // Function arguments:
-//  int Ref, NIFs;
   PyObject *pFName, *pZero, *pFreqInfo;
   if (!PyArg_ParseTuple(args, "OOiiOi", &pFName, &pZero, &overWrite, &iMode, &pFreqInfo, &IFoffset)){printf("FAILED XPCalMF! Wrong arguments!\n"); fflush(stdout);  return ret;};
 
- // if (Ref<0 || Ref>2){printf("ERROR! Ref should be >=0 and <= 2\n"); fflush(stdout); return ret;}
-
 
   int NIF = 0;
-  double *FRINI;
-  double *FREND;
+  std::vector<double> FRINI, FREND;
   double AuxF0, AuxF1, AuxF2;
   int i;
   
@@ -182,8 +251,8 @@ static PyObject *XPCalMF(PyObject *self, PyObject *args)
     
     NIF = PyList_Size(PyFreqs);
     if (NIF>IFoffset){NIF = IFoffset;};
-    FRINI = new double[NIF];
-    FREND = new double[NIF];
+    FRINI.resize(NIF);
+    FREND.resize(NIF);
     
     for (i=0;i<NIF;i++){
       AuxF0 = PyFloat_AsDouble( PyList_GetItem(PyFreqs,i) );
@@ -194,249 +263,100 @@ static PyObject *XPCalMF(PyObject *self, PyObject *args)
       } else {
         FRINI[i] = AuxF0; FREND[i] = AuxF0 + AuxF1;
       };
-     // printf("IF %i: FROM %.4e TO %.4e\n",i,FRINI[i],FREND[i]);
     };
   };
 
   
-  // GrDel *= 1.e-3*(2.*PI);
-
   bool connectPhase = iMode<=0;
   if(iMode <0){iMode = -iMode;}; 
  
-// OPEN PHASECAL FILE:
+// READ (AND TOKENIZE) THE PHASECAL FILE, OR TAKE IT FROM ITS CACHE
+// IF THE FILE IS ONLY READ:
   std::string PcalFile = PyString_AsString(pFName);
-  std::ifstream PcalF;
-  PcalF.open(PcalFile.c_str(), std::ios::in);
+  PCalFile PCal(PcalFile.c_str(),overWrite==0);
+  if (!PCal.isOpen()){printf("ERROR! Cannot open %s\n",PcalFile.c_str()); fflush(stdout); return ret;};
   
 
-
-  
- // double T, inT, Tini, Tbuf; 
-  double Re=0.0, Im=0.0, nui=0.0;
-  double Tbuf, inT;
-  int BUFF = 1024;
-
-
-  int NTone=0,j,k,l, Aux, Aux2, Aux3;
-  long currP, lastP, Nbytes;
-
-
 // LISTs OF FREQUENCIES TO ZERO:
   int nIFZero = PyList_Size(pZero);
-  double *IFini = new double[nIFZero];
-  double *IFend = new double[nIFZero];
+  std::vector<double> IFini(nIFZero), IFend(nIFZero);
   for (i=0;i<nIFZero;i++){
     IFini[i] = (int)PyFloat_AsDouble( PyList_GetItem(PyList_GetItem(pZero,i),0) );
     IFend[i] = (int)PyFloat_AsDouble( PyList_GetItem(PyList_GetItem(pZero,i),1) );
   };
 
 
-
-  char Pol;
-  std::string TelName, line, auxStr;
-  std::istringstream tempStr, auxTempStr;
-
-  cplx64d **PCalsX= new cplx64d*[BUFF];
-  cplx64d **PCalsY= new cplx64d*[BUFF]; 
-  bool **goodX = new bool*[BUFF];
-  bool **goodY = new bool*[BUFF];
-
-  double **PCalTimes= new double*[BUFF];
-  double *PCalNus= new double[BUFF];
-  bool *ZeroIt = new bool[BUFF];
-  int *NTimes= new int[BUFF];
-
-  bool RepNu;
-
-  int NuOver = 1;
-  int *TOver = new int[BUFF];
-  for(i=0;i<BUFF;i++){
-    TOver[i] = 1;
-  };
-
-// Read line by line. Update frequency list on the fly:
-
-  while (!PcalF.eof()){
-    std::getline(PcalF,line);
-    if (line.length() > 10 && line[0] != '#'){  // good line
-       tempStr.str(line);
-       tempStr.clear();
-
-         tempStr >> TelName;
-         tempStr >> Tbuf;
-         tempStr >> inT;
-         tempStr >> Aux;
-         tempStr >> Aux2;
-         tempStr >> Aux3;
-
-         i=0; j=0; l=0; Pol = 'R';
-       
-         while(std::getline(tempStr,auxStr,' ')){
-           if (auxStr.length() > 0){
-             switch(i){
-
-	       // Remember the format: 'FREQ POL RE IM':
-	       // (i.e., case 0, 1, 2, 3).
-               case 0: nui = atof(auxStr.c_str());
-
-                 j=0; l=-1;
-
-
-                 RepNu = false; // Is this tone NEW (i.e., not found in the previous times??)
-                 if (nui<=0.0){j=-1;} else {
-	  	 for(j=0;j<NTone;j++){
-                     if(nui==PCalNus[j]){
-                       RepNu = true;
-                       break;
-                     };
-                   };
-                 };
-
-                // In case of a new tone, add it to the data:
-                 if (!RepNu && nui >0.0){
-
-                  // printf(" NEW TONE at %s (%i): %.3f MHz.\n",TelName.c_str(),NTone,nui);
-
-                   if(NTone+1>BUFF*NuOver){
-                    // printf("Resizing Tones\n");fflush(stdout);
-                     NuOver +=1;
-                     ZeroIt = (bool *) realloc((void *)ZeroIt, BUFF*NuOver*sizeof(bool));
-                     PCalNus = (double *) realloc((void *)PCalNus, BUFF*NuOver*sizeof(double));
-                     PCalsX = (cplx64d **) realloc((void *)PCalsX,  BUFF*NuOver*sizeof(cplx64d*));
-                     PCalsY = (cplx64d **) realloc((void *)PCalsY,  BUFF*NuOver*sizeof(cplx64d*));
-                     PCalTimes = (double **) realloc((void *)PCalTimes, BUFF*NuOver*sizeof(double*));
-                     goodX = (bool **) realloc((void *)goodX,  BUFF*NuOver*sizeof(bool*));
-                     goodY = (bool **) realloc((void *)goodY,  BUFF*NuOver*sizeof(bool*));
-                     NTimes = (int *) realloc((void *)NTimes, BUFF*NuOver*sizeof(int));
-                     TOver = (int *) realloc((void *)TOver,  BUFF*NuOver*sizeof(int));
-                     for(l=0;l<BUFF;l++){TOver[BUFF*(NuOver-1)+l] = 1;};
-                   };
-
-                   PCalNus[NTone]=nui;
-                 //  printf("SET %i to %.8e\n",NTone,nui);fflush(stdout); 
-                   ZeroIt[NTone] = false;
-                   for(j=0;j<nIFZero;j++){
-                     if (PCalNus[NTone]>=IFini[j] && PCalNus[NTone]<=IFend[j]){ZeroIt[NTone] = true; break;};
-                   };                 
-  
-                   PCalTimes[NTone] = new double[BUFF];
-                   PCalsX[NTone] = new cplx64d[BUFF];
-                   PCalsY[NTone] = new cplx64d[BUFF];
-                   goodX[NTone] = new bool[BUFF];
-                   goodY[NTone] = new bool[BUFF];
-                   NTimes[NTone]=0;
-
-                   j=NTone; NTone+=1; 
-                 };
-
-
-             // Check whether this is a new integration time:
-             if(j>=0){
-               RepNu = false;
-               for(l=0;l<NTimes[j];l++){
-                 if( areSame(Tbuf,PCalTimes[j][l])){RepNu=true;break;};
-               };
-               if(!RepNu){
-
-                  if(NTimes[j]+1>BUFF*TOver[j]){
-                   //  printf("Resizing Times\n");fflush(stdout);
-                    TOver[j] += 1;
-                    PCalTimes[j] = (double *) realloc((void *)PCalTimes[j],BUFF*TOver[j]*sizeof(double));
-                    PCalsX[j] = (cplx64d *) realloc((void *)PCalsX[j],BUFF*TOver[j]*sizeof(cplx64d));
-                    PCalsY[j] = (cplx64d *) realloc((void *)PCalsY[j],BUFF*TOver[j]*sizeof(cplx64d));
-                    goodX[j] = (bool *) realloc((void *)goodX[j],BUFF*TOver[j]*sizeof(bool));
-                    goodY[j] = (bool *) realloc((void *)goodY[j],BUFF*TOver[j]*sizeof(bool));
-                  };
-
-                  PCalTimes[j][NTimes[j]] = Tbuf;
-                  goodX[j][NTimes[j]] = false; goodY[j][NTimes[j]] = false;
-                  l=NTimes[j]; NTimes[j] += 1;
-               };
-             };
-
-             i+= 1; break;
-
-             case 1: Pol = auxStr.c_str()[0]; i += 1; break;
-             case 2: Re = atof(auxStr.c_str()); i += 1; break;
-             case 3: Im = atof(auxStr.c_str()); i=0;
-               if(j>=0 && l >=0){
-                 if (Pol == 'X' || Pol == 'R'){PCalsX[j][l] = cplx64d(Re,Im); goodX[j][l]=true;}; 
-                 if (Pol == 'Y' || Pol == 'L'){PCalsY[j][l] = cplx64d(Re,Im); goodY[j][l]=true;};  
-               }; 
-               break;
-		
-             };
-           };
-         };
-       	
-    };
-  };
-
+  std::string SUFFIX(".CROSSPOL"); // = PyString_AsString(SuffixObj);
+  std::string outname = PcalFile + SUFFIX;  
+  bool written = true;
 
 
-  PcalF.close();
+// No Python objects are used from here on, so that several antennas (i.e.,
+// PCAL files) can be processed at once, from different threads:
+  Py_BEGIN_ALLOW_THREADS
 
- // printf("NTONE: %i\n",NTone);fflush(stdout);
 
-// Variables to store final results:
-  double *Phases = new double[NTone];
-  double *Amps = new double[NTone];
-  double AmpsX, AmpsY;
-
-  double *Delays = new double[NTone];
-  double *RefPhases = new double[NTone];
-  double *RefFreqs = new double[NTone];
-  int *IF = new int[NTone];   
+  double nui, Tbuf;
+  int NTone=0, NTime=0, lastTime=-1, j, k, l;
+  long iline, it, c;
+  char Pol;
 
-// Auxiliary variables:
-//int FirstGood = -1;
+// Index all the tones (by frequency) and integration times (within
+// EPSILON) of the file first, so that the pcals fill a tone x time matrix:
+  std::vector<int> ToneIdx(PCal.nTones,-1), TimeIdx(PCal.nLines,-1);
+  std::map<double,int> ToneMap, TimeMap;
+  std::map<double,int>::iterator found;
+  std::vector<double> PCalNus, PCalTimes;
 
-  //printf("STAGE 2\n");fflush(stdout);
+  for (iline=0; iline<PCal.nLines; iline++){
 
-// Compute the average cross-polarization phases:
-  cplx64d PCalTemp;
-  int NPCals;
-  for(j=0;j<NTone;j++){
-    Delays[j] = 0.0;
-    RefPhases[j] = 0.0;
-    RefFreqs[j] = 0.0;
-    IF[j] = 0;
-    PCalTemp = 0.0;
-    NPCals = 0;
-    AmpsX = 0.0; AmpsY = 0.0;
-    for (i=0; i<NTimes[j]; i++){
-    //  printf("TONE %i; TIME %i of %i \n",j,i,NTimes[j]);fflush(stdout);
-      if(goodX[j][i] && goodY[j][i]){
-        NPCals += 1;
-        switch (iMode) {
-          case 0:
-            PCalTemp += PCalsY[j][i]/PCalsX[j][i]; break;
-          case 1:
-            PCalTemp += PCalsX[j][i]; break;
-          default: PCalTemp += PCalsY[j][i]/PCalsX[j][i];
-        };
-        AmpsX += std::abs(PCalsX[j][i]);
-        AmpsY += std::abs(PCalsY[j][i]);
+    Tbuf = PCal.Time[iline];
+    if (lastTime<0 || !areSame(Tbuf,PCalTimes[lastTime])){
+      found = TimeMap.upper_bound(Tbuf-EPSILON);
+      if (found != TimeMap.end() && areSame(Tbuf,found->first)){
+        lastTime = found->second;
+      } else {
+        lastTime = NTime; TimeMap[Tbuf] = NTime; PCalTimes.push_back(Tbuf); NTime += 1;
       };
     };
-    if(NPCals>0){
-      Phases[j] = (double) std::arg(PCalTemp);
-      switch (iMode){
-        case 0:
-          Amps[j] = AmpsY/AmpsX; break;
-        case 1:
-          Amps[j] = AmpsX; break;
-        default: Amps[j] = AmpsY/AmpsX;
+    TimeIdx[iline] = lastTime;
+
+    for (it=PCal.FirstTone[iline]; it<PCal.FirstTone[iline]+PCal.NTones[iline]; it++){
+      nui = PCal.Freq[it];
+      if (nui<=0.0){continue;};
+      found = ToneMap.find(nui);
+      if (found == ToneMap.end()){
+        ToneMap[nui] = NTone; PCalNus.push_back(nui); ToneIdx[it] = NTone; NTone += 1;
+      } else {
+        ToneIdx[it] = found->second;
       };
-    } else {
-      Phases[j] = 0.0; Amps[j] = 1.;
     };
-  };
-
 
+  };
 
+  std::vector<char> ZeroIt(NTone,0);
+  for (j=0; j<NTone; j++){
+    for (k=0; k<nIFZero; k++){
+      if (PCalNus[j]>=IFini[k] && PCalNus[j]<=IFend[k]){ZeroIt[j] = 1; break;};
+    };
+  };
 
+// Fill the matrices (the last entry of a tone, time and pol is kept):
+  long NCell = ((long) NTone)*((long) NTime);
+  std::vector<cplx64d> PCalsX(NCell), PCalsY(NCell);
+  std::vector<char> goodX(NCell,0), goodY(NCell,0);
+
+  for (iline=0; iline<PCal.nLines; iline++){
+    l = TimeIdx[iline];
+    for (it=PCal.FirstTone[iline]; it<PCal.FirstTone[iline]+PCal.NTones[iline]; it++){
+      j = ToneIdx[it];
+      if (j<0){continue;};
+      c = ((long) j)*NTime + l;
+      Pol = PCal.Pol[it];
+      if (Pol == 'X' || Pol == 'R'){PCalsX[c] = cplx64d(PCal.Re[it],PCal.Im[it]); goodX[c] = 1;}; 
+      if (Pol == 'Y' || Pol == 'L'){PCalsY[c] = cplx64d(PCal.Re[it],PCal.Im[it]); goodY[c] = 1;};  
+    };
+  };
 
 
 
@@ -444,264 +364,175 @@ static PyObject *XPCalMF(PyObject *self, PyObject *args)
 
   if(overWrite != 0){
 
-//  bool isX;
-
 // MAKE A BACKUP OF THE PCAL FILE:
-  PcalF.open(PcalFile.c_str(), std::ios::in | std::ios::binary);
   std::string ORIGSUFFIX(".ORIGINAL");
-  std::string outname = PcalFile + ORIGSUFFIX;  
-  std::ofstream OutPcal(outname.c_str(), std::ios::out | std::ios::binary);
-  OutPcal << PcalF.rdbuf();
+  std::string origname = PcalFile + ORIGSUFFIX;  
+  PCal.write(origname.c_str(),true);
 
-  PcalF.close();
-  OutPcal.close();
 
-////////////////////////////////
-// OPEN PHASECAL FILE:
-  PcalF.open(outname.c_str(), std::ios::in);
+// Change entries: (X,Y) -> (R,L) and R = L = X.
+  for (iline=0; iline<PCal.nLines; iline++){
 
+    l = TimeIdx[iline];
+    for (it=PCal.FirstTone[iline]; it<PCal.FirstTone[iline]+PCal.NTones[iline]; it++){
 
-// OPEN OUTPUT FILE:
-  OutPcal.open(PcalFile.c_str(), std::ios::out);
+      j = ToneIdx[it];
+      if (j<0){continue;};
+      c = ((long) j)*NTime + l;
 
+      if(ZeroIt[j]){PCalsX[c]=cplx64d(-1.0,0.0); PCalsY[c]=cplx64d(-1.0,0.0);};
 
-  
-//  for (i=0; i<NTone; i++){
-//     printf(" %i  -   %.3f  %i \n",nIFZero,PCalNus[i],ZeroIt[i]);
-//  };
-
-  std::string TelName, line, auxStr;
-  std::stringstream tempStr;
- // std::stringbuf *linePos;
-
-
-  while (!PcalF.eof()){
-
-    // Read original line:
-    std::getline(PcalF,line);
-    tempStr.str(line);
-
-    // Change entries: (X,Y) -> (R,L) and R = L = X.
-    if (line.length() > 10 && line[0] != '#'){
-       tempStr.clear();
-       tempStr.precision(5);
-
-	// First elements in line:       
-         tempStr >> TelName;
-         tempStr >> Tbuf;
-         tempStr >> inT;
-         tempStr >> Aux;
-         tempStr >> Aux2;
-         tempStr >> Aux3;
-
-
-       i=0; j=0; currP = 0; //isX = true;
-       l=-1; Pol='R';
-       while(std::getline(tempStr,auxStr,' ')){
-         if (auxStr.length() > 0){
-           switch(i){
-
-             case 0: nui = atoi(auxStr.c_str());
-
-               RepNu = false; // Is this tone NEW (i.e., not found in the previous times??)
-               if (nui<0){j=-1; l=-1;} else {
-                 for(j=0;j<NTone;j++){
-                   if(nui==PCalNus[j]){
-                     RepNu = true;
-                     break;
-                   };
-                 };
-
-                 for(l=0;l<NTimes[j];l++){
-                     if(areSame(Tbuf,PCalTimes[j][l])){break;};
-                 };
-               };
-
-               if(ZeroIt[j]){PCalsX[j][l]=cplx64d(-1.0,0.0); PCalsY[j][l]=cplx64d(-1.0,0.0);};
-
-               i += 1; break;
-
-             case 1: if(nui<=0){i+=1; break;} Pol = auxStr.c_str()[0];
-
-	       if (Pol=='X' || Pol=='R'){  // If X, keep next Re and Im; Change to R
-               //  isX = true;
-		 currP = tempStr.tellg();
-                 tempStr.seekp(currP-2);
-		 tempStr << 'R';
-	       } else if (Pol=='Y' || Pol=='L'){ // If Y, change Re and Im; Change to L
-               //  isX = false;
-                 currP = tempStr.tellg();
-                 tempStr.seekp(currP-2);
-		 tempStr << 'L';
-	       };	       	     
-	       i += 1; break;
-
-             case 2: if(nui<=0){i+=1; break;};
-	//	if (!isX){
-	          lastP = tempStr.tellg();		
-                  tempStr.seekp(currP);
-                  Nbytes = lastP - currP-1;
-		  currP = lastP;
-		  tempStr << std::setw(Nbytes) << std::scientific << PCalsX[j][l].real();
-	//	};	
-		i += 1; break;
-
-
-             case 3: if(nui<=0){i=0; break;};
-	//	if (!isX){
-	          lastP = tempStr.tellg();		
-                  tempStr.seekp(currP);
-                  Nbytes = lastP - currP-1;
-		  currP = lastP;
-		  tempStr << std::setw(Nbytes) << std::scientific << PCalsX[j][l].imag();
-	//	};	
-		i = 0; break;
-
-           };
-         };
-       };
-
+      Pol = PCal.Pol[it];
+      if (Pol=='X' || Pol=='R'){
+        PCal.setPol(it,'R');
+      } else if (Pol=='Y' || Pol=='L'){
+        PCal.setPol(it,'L');
+      };
+      PCal.setValue(it,PCalsX[c].real(),PCalsX[c].imag());
 
     };
 
-  // Write new lines:
-  OutPcal << tempStr.str() << std::endl ;
-
-
-
   };
 
-  PcalF.close();
-  OutPcal.close();
-
+  written = PCal.write(PcalFile.c_str(),false);
+  if (!written){
+    printf("ERROR! Cannot write %s\n",PcalFile.c_str()); fflush(stdout);
   };
 
 
+  } else {
 
 
 
+// Compute the average cross-polarization phases (one pass over the
+// time axis of each tone), in order of increasing frequency:
+  std::vector<int> Order(NTone);
+  for (j=0; j<NTone; j++){Order[j] = j;};
+  std::sort(Order.begin(),Order.end(),[&PCalNus](int a, int b){return PCalNus[a]<PCalNus[b];});
 
+  std::vector<double> Nus(NTone), Phases(NTone), Amps(NTone);
+  std::vector<double> Delays(NTone,0.0), RefPhases(NTone,0.0), RefFreqs(NTone,0.0);
+  std::vector<int> IF(NTone,0);
 
-  if(overWrite!=0){
-    //printf("Overwrite\n");fflush(stdout);
-    ret = Py_BuildValue("i",0);
-    return ret;
-
-  };
+  cplx64d PCalTemp;
+  double AmpsX, AmpsY;
+  int NPCals;
 
-  double FrAux, PhAux, AuxA; 
-  double ZeroAux;
-// Sort the data in order of increasing frequency:
-  for (i=0; i<NTone-1; i++){
-    for (j=i+1; j<NTone; j++){
-      if (PCalNus[i]>PCalNus[j]){
-        FrAux=PCalNus[i]; PCalNus[i]=PCalNus[j]; PCalNus[j]=FrAux;
-        PhAux=Phases[i]; Phases[i]=Phases[j]; Phases[j]=PhAux;
-        AuxA = Amps[i]; Amps[i] = Amps[j]; Amps[j] = AuxA;
-        ZeroAux = ZeroIt[i]; ZeroIt[i]=ZeroIt[j]; ZeroIt[j] = ZeroAux;
+  for (i=0; i<NTone; i++){
+    j = Order[i];
+    Nus[i] = PCalNus[j];
+    const cplx64d *X = &PCalsX[((long) j)*NTime], *Y = &PCalsY[((long) j)*NTime];
+    const char *gX = &goodX[((long) j)*NTime], *gY = &goodY[((long) j)*NTime];
+    PCalTemp = 0.0;
+    NPCals = 0;
+    AmpsX = 0.0; AmpsY = 0.0;
+    for (l=0; l<NTime; l++){
+      if(gX[l] && gY[l]){
+        NPCals += 1;
+        if (iMode==1){PCalTemp += X[l];} else {PCalTemp += Y[l]/X[l];};
+        AmpsX += std::abs(X[l]);
+        AmpsY += std::abs(Y[l]);
       };
-    }; 
-  //  printf("TONE %i: %.8e\n",i,PCalNus[i]);fflush(stdout);
+    };
+    if(NPCals>0){
+      Phases[i] = (double) std::arg(PCalTemp);
+      if (iMode==1){Amps[i] = AmpsX;} else {Amps[i] = AmpsY/AmpsX;};
+    } else {
+      Phases[i] = 0.0; Amps[i] = 1.;
+    };
   };
 
 
 
-// Connect phases among tones for each IF:
-
-
-  double DNu = PCalNus[1] - PCalNus[0];
-//  double FracP, IntP;
-  double IFDel00, IFDel01, IFDel0, IFDel1, NtoneIF;
-  double *NWrap = new double[NTone];
-  cplx64d AvPhasor;
-  double fitDelay, IFPhase;
-
+  double DNu = (NTone>1)?(Nus[1] - Nus[0]):0.0;
 
  // If freq. info was not provided, guess the IFs:
  
-   if (NIF==0){
+   if (NIF==0 && NTone>0){
      int AuxIF = 0;
-     FRINI = new double[NTone]; FREND = new double[NTone];
      for (i=0; i<NTone-1; i++){
-        if(PCalNus[i+1]-PCalNus[i] > 1.01*DNu){
-          FRINI[NIF] = PCalNus[AuxIF]; FREND[NIF] = PCalNus[i]; NIF += 1; AuxIF = i+1;
+        if(Nus[i+1]-Nus[i] > 1.01*DNu){
+          FRINI.push_back(Nus[AuxIF]); FREND.push_back(Nus[i]); NIF += 1; AuxIF = i+1;
         };
      };
-     FRINI[NIF] = PCalNus[AuxIF]; FREND[NIF] = PCalNus[NTone-1]; NIF += 1;
+     FRINI.push_back(Nus[AuxIF]); FREND.push_back(Nus[NTone-1]); NIF += 1;
    }; 
 
 
 
+// Tones of each IF:
+  std::vector<std::vector<int> > IFTones(NIF);
+  std::vector<int> ToneIF(NTone,-1);
+  for (k=0; k<NIF; k++){
+    for (j=0; j<NTone; j++){
+      if (Nus[j]>= FRINI[k] && Nus[j]<= FREND[k]){
+        IFTones[k].push_back(j);
+        if (ToneIF[j]<0){ToneIF[j] = k;};
+      };
+    };
+  };
 
 
   if(connectPhase){
 
-  for (i=0; i<NTone; i++){
-    /////////////////////////	  
-    // First, a simple connection between neighoring tones:
-   
-   if(i<NTone-1){ 
-    
-     if(PCalNus[i+1]-PCalNus[i] < 1.01*DNu){
-       if (Phases[i+1]-Phases[i] > PI){
-         for(j=i+1;j<NTone;j++){Phases[j] -= 2.*PI;};
-       };
+  // Coarse delay of each IF, from its delay spectrum:
+    std::vector<double> IFDelay(NIF,0.0);
+    std::vector<int> IFFirst(NIF,-1);
+    for (k=0; k<NIF; k++){
+      IFDelay[k] = coarseDelay(Nus.data(),Phases.data(),IFTones[k].data(),IFTones[k].size());
+    };
 
-      if (Phases[i+1]-Phases[i] < -PI){
-        for(j=i+1;j<NTone;j++){Phases[j] += 2.*PI;};
+  // Connect the phases. Each tone is placed within half a turn of the
+  // coarse-delay model of its IF (anchored at the first tone of the IF), so
+  // no wraps are tracked from tone to tone. The first tone of an IF (or a
+  // tone out of all IFs) is connected to the previous one, if they are
+  // neighbors, or just keeps the turns added to the previous one:
+    double PhRef, Turns = 0.0;
+    for (i=0; i<NTone; i++){
+      k = ToneIF[i];
+      if (k>=0 && IFFirst[k]>=0){
+        PhRef = Phases[IFFirst[k]] + 2.*PI*IFDelay[k]*(Nus[i]-Nus[IFFirst[k]]);
+      } else if (i>0 && Nus[i]-Nus[i-1] < 1.01*DNu){
+        PhRef = Phases[i-1];
+      } else {
+        PhRef = Phases[i] + 2.*PI*Turns;
       };
+      Turns = floor((PhRef-Phases[i])/(2.*PI) + 0.5);
+      Phases[i] += 2.*PI*Turns;
+      if (k>=0 && IFFirst[k]<0){IFFirst[k] = i;};
     };
-    
-    };
-    
-  };
-  
-  };
-  
-  
-//// LOOP OVER IFS:  
 
- int nUsableTones;
- int *usableTones = new int[NTone];
-    
- for (k=0; k<NIF; k++){
- 
-   //printf("%i %i\n",NIF,k);
- 
-   // Figure out list of pcal tones inside this IF:
-   nUsableTones = 0;
-   for (j=0;j<NTone;j++){
-     if (PCalNus[j]>= FRINI[k] && PCalNus[j]<= FREND[k]){
-       usableTones[nUsableTones] = j;
-       nUsableTones += 1;
-     };
-   }; 
-    
-    /////////////////////////
+  // Least-squares delay and phase of each IF:
+    double IFDel00, IFDel01, IFDel0, IFDel1, NtoneIF;
+    double fitDelay, IFPhase;
+    cplx64d AvPhasor;
 
-  if(connectPhase){
+    for (k=0; k<NIF; k++){
 
-      IFDel00 = 0.0; IFDel01 = 0.0; IFDel0 = 0.0; IFDel1 = 0.0; 
+      const std::vector<int> &usableTones = IFTones[k];
+      int nUsableTones = usableTones.size();
+      if (nUsableTones==0){continue;};
 
+      IFDel00 = 0.0; IFDel01 = 0.0; IFDel0 = 0.0; IFDel1 = 0.0; 
       NtoneIF = (double) (nUsableTones); // Number of phasecal tones within the IF.
 
-      
       for(j=0; j<nUsableTones; j++){
         l = usableTones[j];
-        IFDel00 += PCalNus[l]*PCalNus[l]; IFDel0 += PCalNus[l];
-	IFDel01 += PCalNus[l]*Phases[l]; IFDel1 += Phases[l];
+        IFDel00 += Nus[l]*Nus[l]; IFDel0 += Nus[l];
+        IFDel01 += Nus[l]*Phases[l]; IFDel1 += Phases[l];
       };	
 
       IFDel0 /= NtoneIF ; IFDel1 /= NtoneIF;
 
-      // Estimate the cross-polarization tone delay for this IF:
-      fitDelay = (IFDel01 - NtoneIF*IFDel0*IFDel1)/(IFDel00 - NtoneIF*IFDel0*IFDel0);
+      // Estimate the cross-polarization tone delay for this IF (zero for
+      // a single tone):
+      fitDelay = (nUsableTones>1)?(IFDel01 - NtoneIF*IFDel0*IFDel1)/(IFDel00 - NtoneIF*IFDel0*IFDel0):0.0;
 
       // Estimate the cross-polarization tone phase:
       AvPhasor = 0.0;
       for(j=0; j<nUsableTones; j++){
         l = usableTones[j];
-        AvPhasor += std::polar(1.0,(Phases[l] - fitDelay*(PCalNus[l] - IFDel0)));
+        AvPhasor += std::polar(1.0,(Phases[l] - fitDelay*(Nus[l] - IFDel0)));
       };
       IFPhase = std::arg(AvPhasor);
 
@@ -711,88 +542,44 @@ static PyObject *XPCalMF(PyObject *self, PyObject *args)
         Delays[l] = fitDelay/(2.*PI); RefPhases[l] = IFPhase; 
         RefFreqs[l] = IFDel0; 
         IF[l] = k+1;
-     //   printf("%.8e   %.8e   %.8e  %i\n",Delays[j],RefPhases[j],RefFreqs[j],j);
       };
-      
-      // Estimated phase of the iJump-th tone (group-delay extrapolation from the previous IF):
-      NWrap[i] = fitDelay*(PCalNus[i+1]-PCalNus[i]) + Phases[i]-Phases[i+1];
 
-      // Convert this difference into an integer number of wraps:
-  //    NWrap[i] /= 2.*PI; FracP = modf(NWrap[i], &IntP);
-  //    if (FracP>0.5){IntP += 1.;} else if(FracP<-0.5){IntP -= 1.;}; // Difference will always be <180 degrees.
-
-
-  //    for(j=i+1;j<NTone;j++){Phases[j] += 2.*PI*IntP;};
-
-    
-
-  };
+    };
 
   };
 
 
-  std::string SUFFIX(".CROSSPOL"); // = PyString_AsString(SuffixObj);
-  std::string outname = PcalFile + SUFFIX;  
   FILE *outFile = fopen(outname.c_str(),"w");
+  written = outFile != NULL;
+  if (written){
 
- // printf("NTone = %i\n",NTone); fflush(stdout);
+    fprintf(outFile,"# Freq (MHz) | X-Y Phase (deg.) | Amps (Norm.) | X-Y Delay (mus) | Av Phase (deg.) | Ref. Freq. (MHz) | IF \n");
   
-  fprintf(outFile,"# Freq (MHz) | X-Y Phase (deg.) | Amps (Norm.) | X-Y Delay (mus) | Av Phase (deg.) | Ref. Freq. (MHz) | IF \n");
-  
-  for (i=0;i<NTone;i++){
-   //   printf(" WRITING %i\n",i);fflush(stdout);
-   //    printf("%i %.8e  %.8e  %.8e\n",i,PCalNus[i],Phases[i],Amps[i]); fflush(stdout);
-      fprintf(outFile,"%.8e  %.8e  %.8e  %.8e  %.8e  %.8e  %i\n", PCalNus[i], Phases[i]*R2D, Amps[i], Delays[i], RefPhases[i]*R2D, RefFreqs[i], IF[i]);
-  };
+    for (i=0;i<NTone;i++){
+      fprintf(outFile,"%.8e  %.8e  %.8e  %.8e  %.8e  %.8e  %i\n", Nus[i], Phases[i]*R2D, Amps[i], Delays[i], RefPhases[i]*R2D, RefFreqs[i], IF[i]);
+    };
 
-  fflush(outFile);
+    fclose(outFile);
 
- // Release memory:
-  for (i=0; i<NTone; i++){
-    //printf(" DELETING %i\n",i);fflush(stdout);    
-    delete[] PCalsX[i];
-    delete[] PCalsY[i];
-    delete[] PCalTimes[i];
-    delete[] goodX[i];
-    delete[] goodY[i];
+  } else {
+    printf("ERROR! Cannot write %s\n",outname.c_str()); fflush(stdout);
   };
-    delete[] PCalsX;
-    delete[] PCalsY;
-    delete[] PCalTimes;
-    delete[] goodX;
-    delete[] goodY;
-    delete[] PCalNus;
-    delete[] Phases;
-    delete[] Amps;
-    delete[] Delays;
-    delete[] RefPhases;
-    delete[] RefFreqs;
-    delete[] NTimes;
-    delete[] ZeroIt;
-
-/*
-  // Arrange data for output to Python:
-  npy_intp dims[1];
-  dims[0] = NTone;
-  PyObject *XYadd = (PyObject *) PyArray_SimpleNewFromData(1, dims, NPY_FLOAT64, (void *) Phases);
-  PyObject *XYnu =  (PyObject *) PyArray_SimpleNewFromData(1, dims, NPY_FLOAT64, (void *) PCalNus);
-  PyObject *XAmps = (PyObject *) PyArray_SimpleNewFromData(1, dims, NPY_FLOAT64, (void *) Amps);
-  ret = Py_BuildValue("[O,O,O]",XYnu,XYadd,XAmps);
-*/
-
-  //printf("Xcross %i\n",NTone);fflush(stdout);
-  
-  ret = Py_BuildValue("s",outname.c_str());
-  return ret;
-
-
-};
-
 
+  };
 
 
+  Py_END_ALLOW_THREADS
 
 
+  if (!written){return ret;};
 
+  Py_DECREF(ret);
+  if(overWrite!=0){
+    ret = Py_BuildValue("i",0);
+  } else {
+    ret = Py_BuildValue("s",outname.c_str());
+  };
+  return ret;
 
 
+};
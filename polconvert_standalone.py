@@ -116,6 +116,93 @@ import sys
 import pickle as pk
 
 
+# With solveProcs > 1, the channel ranges of the BP mode are solved in
+# processes forked after the data have been loaded in _PolGainSolve (so
+# they share the data, read-only). The solver of a channel range is set
+# here before the processes are forked, so that they inherit it:
+_BPRangeSolver = None
+
+def _solveBPRange(p0, Ch0, Ch1):
+    return _BPRangeSolver(p0, Ch0, Ch1)
+
+
+# Header of the (columnar) POLCONVERT.FRINGE files. See FringeFile.h:
+FringeHeader = np.dtype(
+    [
+        ("MAGIC", "S8"),
+        ("VERSION", "<i4"),
+        ("NCOMP", "<i4"),
+        ("NCHAN", "<i4"),
+        ("NFREQ", "<i4"),
+        ("PARANG", "<i4"),
+        ("PAD", "<i4"),
+        ("NVIS", "<i8"),
+        ("VISOFFSET", "<i8"),
+        ("METAOFFSET", "<i8"),
+        ("RESERVED", "<i8"),
+    ]
+)
+
+
+def readFringe(fname):
+    """Maps a POLCONVERT.FRINGE (or OTHERS.FRINGE) file in memory.
+
+    Nothing is parsed or copied: the returned dictionary holds the header
+    entries and numpy views of the columns (FREQS, JDT, PANG1, PANG2, UVDIST,
+    ANT1, ANT2 and FILE). VIS has the shape (nvis, ncomp, nchan), so that
+    VIS[:, i, :] is the i-th product of all the records."""
+    head = np.fromfile(fname, dtype=FringeHeader, count=1)
+    if len(head) == 0 or head[0]["MAGIC"] != b"PCFRINGE":
+        raise Exception("%s is not a (columnar) fringe file" % fname)
+    head = head[0]
+    nvis = int(head["NVIS"])
+    ncomp = int(head["NCOMP"])
+    nchan = max(int(head["NCHAN"]), 0)
+    raw = np.memmap(fname, dtype=np.uint8, mode="r")
+
+    def column(offset, dtype, shape):
+        return np.ndarray(shape, dtype=dtype, buffer=raw, offset=offset)
+
+    meta = int(head["METAOFFSET"])
+    fringe = {
+        "NCHAN": int(head["NCHAN"]),
+        "PARANG": bool(head["PARANG"]),
+        "NVIS": nvis,
+        "FREQS": column(FringeHeader.itemsize, "<f8", (int(head["NFREQ"]),)),
+        "VIS": column(int(head["VISOFFSET"]), "<c8", (nvis, ncomp, nchan)),
+    }
+    for i, key in enumerate(["JDT", "PANG1", "PANG2", "UVDIST"]):
+        fringe[key] = column(meta + 8 * i * nvis, "<f8", (nvis,))
+    for i, key in enumerate(["ANT1", "ANT2", "FILE"]):
+        fringe[key] = column(meta + 8 * 4 * nvis + 4 * i * nvis, "<i4", (nvis,))
+    return fringe
+
+
+def loadSolCache(fname):
+    """Reads a cache of cross-gain solutions (see saveSolCache). Returns an
+    empty cache if the file does not exist or cannot be read."""
+    cache = {"GAINS": {}, "CALLS": {}}
+    if os.path.exists(fname):
+        try:
+            IFF = open(fname, "rb")
+            cache.update(pk.load(IFF))
+            IFF.close()
+        except Exception:
+            print("WARNING! Cannot read the solution cache %s" % fname)
+    return cache
+
+
+def saveSolCache(fname, cache):
+    """Writes a cache of cross-gain solutions. GAINS has the fitted parameters
+    of each antenna, keyed by (experiment, antenna code, IF, first channel,
+    last channel + 1, mode). CALLS has a list of (warm start, Chi2 evaluations)
+    for the fits of each (experiment, IF, first channel, last channel + 1, mode)."""
+    OFF = open(fname + ".tmp", "wb")
+    pk.dump(cache, OFF)
+    OFF.close()
+    os.rename(fname + ".tmp", fname)
+
+
 def polconvert(
     IDI="",
     OUTPUTIDI="",
@@ -156,7 +243,11 @@ def polconvert(
     XYpcalMode="bandpass",
     UVTaper=1.e9,
     useRates = False,
-    mounts = {}
+    mounts = {},
+    nthreads = 1,
+    solveProcs = 1,
+    preAvg = [0.0, 1],
+    solCache = ""
 ):
 
     """POLCONVERT - STANDALONE VERSION 2.0.1b.
@@ -197,6 +288,33 @@ def polconvert(
                 Example: if antenna Yebes-40m (code YB) has Nasmyth left, and all the other antennas
                 have alt-az mounts, then: mounts = {'YB':'NL'}
 
+       nthreads:  Number of threads used to convert the IFs in parallel (only for SWIN data;
+                  FITS-IDI files are always converted serially). Default is 1.
+                  It is also the number of threads used to compute the Chi2 of the
+                  cross-polarization gain solver.
+
+       solveProcs: Number of processes used to solve the channel ranges of the
+                  cross-polarization gains in parallel (BP mode, i.e., solint[0] != 0).
+                  With more than one, all the ranges of an IF start from the same
+                  initial gains (instead of from the solution of the previous range).
+                  Only used where processes can be forked (e.g., Linux). Default is 1.
+
+       preAvg:  Time (in seconds) and number of channels of the cells in which the data 
+                of each baseline and scan are averaged (after the fringe fitting) before
+                the cross-polarization gains are estimated. The visibilities are corrected
+                for the parallactic angle before the averaging, and the decorrelation 
+                expected from the fringe-fitted rates and delays is reported. The time
+                should not exceed solint[1]. In BP mode, the channel cells never cross 
+                the channel ranges of solint[0]. Default is [0.0, 1] (no averaging).
+
+       solCache:  Name of a file with a cache of cross-polarization gain solutions. If
+                  given, the fit of each IF and channel range starts from the cached
+                  gains of the same experiment (i.e., the IDI name without extension
+                  and DiFX job number), antennas, IF and channels, where there are any.
+                  The new solutions, and the number of Chi2 evaluations of each fit
+                  (with or without the warm start), are then saved in the cache.
+                  Default is "" (no cache).
+
     """
 
     if saveArgs:
@@ -237,7 +355,11 @@ def polconvert(
             "XYpcalMode": XYpcalMode,
             "UVTaper": UVTaper,
             "useRates":useRates,
-            "mounts":mounts
+            "mounts":mounts,
+            "nthreads":nthreads,
+            "solveProcs":solveProcs,
+            "preAvg":preAvg,
+            "solCache":solCache
         }
 
         OFF = open("PolConvert_standalone.last", "wb")
@@ -876,14 +998,15 @@ def polconvert(
 
     #######
     # WARNING! UNCOMMENT THIS IF NOT DEBUGGING!
+    # (timestamps are preserved, so that the SWIN record indices stay valid)
     if os.path.exists(OUTPUTIDI) and IDI != OUTPUTIDI:
         printMsg("Will REMOVE the existing OUTPUT file (or directory)!\n")
         printMsg("Copying IDI to OUTPUTIDI!\n")
         os.system("rm -rf %s" % OUTPUTIDI)
-        os.system("cp -r %s %s" % (IDI, OUTPUTIDI))
+        os.system("cp -rp %s %s" % (IDI, OUTPUTIDI))
     elif not os.path.exists(OUTPUTIDI):
         printMsg("Copying IDI to OUTPUTIDI!\n")
-        os.system("cp -r %s %s" % (IDI, OUTPUTIDI))
+        os.system("cp -rp %s %s" % (IDI, OUTPUTIDI))
     #
     #######
 
@@ -1410,6 +1533,7 @@ def polconvert(
             DEBUG,
             logName,
             ALMAstuff,
+            int(nthreads),
         )
 
     except Exception as ex:
@@ -1418,6 +1542,17 @@ def polconvert(
         # didit = 0
         printError("\n###\n### Done with PolConvert (status %d).\n###" % (didit))
 
+    # Keep the SWIN record indices (.DIFX_*.pcidx) with the input data,
+    # so that the next runs can skip the header scan:
+    if isSWIN and IDI != OUTPUTIDI:
+        for fi in OUTPUT:
+            pcidx = os.path.join(os.path.dirname(fi), ".%s.pcidx" % os.path.basename(fi))
+            if os.path.exists(pcidx):
+                try:
+                    shutil.copy2(pcidx, os.path.join(IDI, os.path.relpath(pcidx, OUTPUTIDI)))
+                except Exception as ex:
+                    printMsg("Could not keep record index %s: %s" % (pcidx, str(ex)))
+
     # GENERATE ANTAB FILE(s):
 
     if doAmpNorm:
@@ -1525,8 +1660,11 @@ def polconvert(
         # Load the solver library:
         # try:
         if True:
-            import _PolGainSolve as PS
+            import _PolGainSolve
 
+            # This run has its own solver instance (the data are not shared
+            # with other polconvert calls in the same process):
+            PS = _PolGainSolve.Solver()
             goodclib = True
             print("\nC++ shared library loaded successfully (first try)\n")
         # except:
@@ -1539,8 +1677,9 @@ def polconvert(
 
         if not goodclib:
             try:
-                import _PolGainSolve as PS
+                import _PolGainSolve
 
+                PS = _PolGainSolve.Solver()
                 goodclib = True
                 print("\nC++ shared library loaded successfully (2nd try)\n")
             except:
@@ -1552,121 +1691,17 @@ def polconvert(
         ############################################################
         # Levenberg-Marquardt minimizer of the GCPFF problem:
 
-        ### NOTE: CURRENTLY BROKEN!!
+        # The iterations run in _PolGainSolve (with the gradient and the
+        # Gauss-Newton Hessian of Chi2Core). The gains are fitted in place.
 
         def LMMin(p0, Ch0, Ch1):
 
             MAXIT = maxIter * len(fitAnts)
-            relchange = 1.0
-
-            i = 0
-
-            # First iteration:
-            pini = np.array(p0)
-
-            ptst0 = np.copy(pini)
-            ptst1 = np.copy(pini)
-
-            LMTune = LMLambda
-
-            minChi2 = 0.0
-            minGains = np.copy(pini)
-
-            currP = np.copy(pini)
-
-            while i < MAXIT:
-
-                ptst0 = np.copy(currP)
-                currChi2 = PS.GetChi2(ptst0, LMTune, Ch0, Ch1, 0,useRates)
-                Chi2_0 = PS.GetChi2(ptst0, -1.0, Ch0, Ch1, 0,useRates)
-                #  sys.stdout.write('%.3g/1 '%Chi2_0) ; sys.stdout.flush()
-
-                if i == 0 or currChi2 < minChi2:
-                    minChi2 = currChi2
-                    minGains[:] = currP
-
-                i += 1
+            minGains = np.array(p0, dtype=np.float64)
 
-                while Chi2_0 >= currChi2:
-
-                    LMTune *= KFacRaise
-                    ptst0 = np.copy(currP)
-
-                    Chi2_ini = PS.GetChi2(ptst0, LMTune, Ch0, Ch1, 0,useRates)
-                    Chi2_0 = PS.GetChi2(ptst0, -1.0, Ch0, Ch1, 0,useRates)
-                    #    sys.stdout.write('%.3g/2 '%Chi2_0) ; sys.stdout.flush()
-                    i += 1
-
-                    if i >= MAXIT:
-                        break
-
-                if Chi2_0 > 0.0:
-                    relchange = (currChi2 - Chi2_0) / Chi2_0
-                else:
-                    printError("\n\n  Problem in PolGainSolve.\n")
-
-                # No improvement:
-                if currChi2 < minChi2:
-                    minChi2 = currChi2
-                    minGains[:] = currP
-
-                # Improvement:
-                if Chi2_0 < currChi2:
-                    currP = np.copy(ptst0)
-                    currChi2 = Chi2_0
-                    # Absolute improvement:
-                    if Chi2_0 < minChi2:
-                        minChi2 = Chi2_0
-                        minGains[:] = ptst0
-
-                if i >= MAXIT or np.abs(relchange) < maxErr:
-                    break
-
-                ptst0 = np.copy(currP)
-                Chi2_ini = PS.GetChi2(ptst0, LMTune, Ch0, Ch1, 0, useRates)
-                Chi2_0 = PS.GetChi2(ptst0, -1.0, Ch0, Ch1, 0, useRates)
-                #   sys.stdout.write('%.3g/3 '%Chi2_0) ; sys.stdout.flush()
-
-                i += 1
-
-                if Chi2_0 > currChi2:
-                    LMTune *= KFacRaise
-
-                else:
-
-                    while True:  # Chi2_0<currChi2:
-                        i += 1
-                        LMTune /= KFacDecr
-                        ptst0 = np.copy(currP)
-                        Chi2_ini = PS.GetChi2(ptst0, LMTune, Ch0, Ch1, 0, useRates)
-                        Chi2_1 = PS.GetChi2(ptst0, -1.0, Ch0, Ch1, 0, useRates)
-                        #       sys.stdout.write('%.3g/4'%Chi2_1)
-                        if Chi2_1 < minChi2:
-                            minChi2 = Chi2_1
-                            minGains = np.copy(ptst0)
-                            currP = np.copy(ptst0)
-                            currChi2 = Chi2_1
-                        #        sys.stdout.write('a')
-
-                        if Chi2_1 < Chi2_0 and i <= MAXIT:
-                            relchange = (currChi2 - Chi2_0) / Chi2_0
-                            Chi2_0 = Chi2_1
-                            ptst1[:] = ptst0
-                            currP = np.copy(ptst0)
-                            currChi2 = Chi2_1
-                        #        sys.stdout.write('b')
-                        else:
-                            break
-                    #      sys.stdout.write(' ') ; sys.stdout.flush()
-
-                    #   relchange = (currChi2 - Chi2_0)/Chi2_0
-                    LMTune *= KFacDecr  # Come back to state of last successful decrease
-
-                    if i >= MAXIT or np.abs(relchange) < maxErr:
-                        break
-
-            Chi2_final = PS.GetChi2(minGains, LMTune, Ch0, Ch1, 1, useRates)
-            FLIP = Chi2_final > 0.0  # Flip gains by 180 degrees.
+            Chi2_final, FLIP, Niter, Ncalls, converged, relchange = PS.LMSolve(
+                minGains, Ch0, Ch1, useRates, MAXIT, maxErr, LMLambda, KFacRaise, KFacDecr
+            )
 
             # GBC debugging:
             if FLIP:
@@ -1674,15 +1709,11 @@ def polconvert(
             else:
                 sys.stdout.write(" NotFlip\n")
             printMsg("    Final error: %.3e in ChSq" % (np.abs(relchange)))
-            if i >= MAXIT:
-                if np.abs(relchange) > maxErr:
-                    printMsg(
-                        "    WARNING! Slow cross-pol gain convergence (%d)! | Chan(s): %i-%i !"
-                        % (i, Ch0, Ch1 - 1)
-                    )
-                else:
-                    printMsg("    Warning: too many iterations (%d) why is that?" % i)
-            # printMsg("\n    Final error: %.3e in ChSq / %.3e in gains\n"%(np.abs(relchange),Gchange))
+            if not converged:
+                printMsg(
+                    "    WARNING! Slow cross-pol gain convergence (%d)! | Chan(s): %i-%i !"
+                    % (Niter, Ch0, Ch1 - 1)
+                )
 
             return [minGains, FLIP]
 
@@ -1726,10 +1757,137 @@ def polconvert(
 
             return [bestP, FLIP]
 
+        ########################################
+        ### Chi2 with analytic derivatives (for the scipy minimizers).
+        ### The last nfixed parameters (i.e., the delays in the
+        ### preliminary fits) are not fitted and are set to zero.
+
+        def Chi2Grad(p, Ch0, Ch1, nfixed=0):
+            pfull = np.zeros(len(p) + nfixed)
+            pfull[:len(p)] = p
+            grad = np.zeros(len(pfull))
+            Chi2 = PS.GetChi2Grad(pfull, Ch0, Ch1, useRates, grad, None)
+            return Chi2, grad[:len(p)]
+
+        def Chi2Hess(p, Ch0, Ch1, nfixed=0):
+            pfull = np.zeros(len(p) + nfixed)
+            pfull[:len(p)] = p
+            grad = np.zeros(len(pfull))
+            hess = np.zeros((len(pfull), len(pfull)))
+            PS.GetChi2Grad(pfull, Ch0, Ch1, useRates, grad, hess)
+            return hess[:len(p), :len(p)]
+
+        def GradMin(p0, Ch0, Ch1, nfixed=0):
+            if fitMethod == "Newton-CG":
+                return spopt.minimize(Chi2Grad, p0, args=(Ch0, Ch1, nfixed),
+                    method=fitMethod, jac=True, hess=Chi2Hess)
+            return spopt.minimize(Chi2Grad, p0, args=(Ch0, Ch1, nfixed),
+                method=fitMethod, jac=True)
+
+        ########################################
+        ### Solves the cross-gains of one channel range (BP mode).
+
+        def BPMin(p0, Ch0, Ch1):
+            ncalls = PS.GetChi2Count()
+            if fitMethod not in scipyMethods:
+                if fitMethod == "Levenberg-Marquardt":
+                    myfit, FLIP = LMMin(p0, Ch0, Ch1)
+                if fitMethod == "gradient":
+                    myfit, FLIP = GrMin(p0, Ch0, Ch1)
+            else:
+
+                if fitMethod in ["BFGS", "Newton-CG", "SLSQP"]:
+
+                    mymin = GradMin(p0, Ch0, Ch1)
+
+                else:
+
+                    mymin = spopt.minimize(
+                        PS.GetChi2,
+                        p0,
+                        args=(-1.0, Ch0, Ch1, 0, useRates),
+                        method=fitMethod,
+                    )
+
+                Chi2_final = PS.GetChi2(mymin.x, -1, Ch0, Ch1, 1, useRates)
+                FLIP = Chi2_final > 0.0
+                myfit = mymin.x
+            return [myfit, FLIP, PS.GetChi2Count() - ncalls]
+
+        ########################################
+        ### Solves all the channel ranges of an IF in parallel processes
+        ### (each one from its initial gains in p0s). Returns None if the
+        ### processes cannot be forked here.
+
+        def BPMinParallel(p0s, BPChan):
+            global _BPRangeSolver
+            import multiprocessing
+            from concurrent import futures
+            if "fork" not in multiprocessing.get_all_start_methods():
+                return None
+            _BPRangeSolver = BPMin
+            nproc = min(int(solveProcs), len(BPChan) - 1)
+            try:
+                with futures.ProcessPoolExecutor(max_workers=nproc,
+                        mp_context=multiprocessing.get_context("fork")) as executor:
+                    jobs = [executor.submit(_solveBPRange, p0s[chran], BPChan[chran], BPChan[chran + 1])
+                            for chran in range(len(BPChan) - 1)]
+                    return [job.result() for job in jobs]
+            finally:
+                _BPRangeSolver = None
+
+        ########################################
+        ### Warm start from the solution cache. The parameters of antenna ci
+        ### are its gain(s) and (in SBD mode) its delay:
+
+        def antPars(ci, npar):
+            npg = {True: 2, False: 1}[solveAmp]
+            idx = list(range(npg * ci, npg * (ci + 1)))
+            if npar > npg * len(fitAnts):
+                idx.append(npg * len(fitAnts) + ci)
+            return idx
+
+        def warmStart(p0, pli, Ch0, Ch1, mode):
+            p0 = list(p0)
+            warm = False
+            if SolCache is None:
+                return p0, warm
+            for ci, calant in enumerate(fitAnts):
+                key = (cacheExp, antcodes[calant - 1], pli, int(Ch0), int(Ch1), mode)
+                idx = antPars(ci, len(p0))
+                cached = SolCache["GAINS"].get(key, [])
+                if len(cached) == len(idx):
+                    for k, val in zip(idx, cached):
+                        p0[k] = val
+                    warm = True
+            return p0, warm
+
+        def storeSolution(myfit, pli, Ch0, Ch1, mode, warm, ncalls):
+            ChiCalls[warm] += ncalls
+            if SolCache is None:
+                return
+            for ci, calant in enumerate(fitAnts):
+                key = (cacheExp, antcodes[calant - 1], pli, int(Ch0), int(Ch1), mode)
+                SolCache["GAINS"][key] = [float(myfit[k]) for k in antPars(ci, len(myfit))]
+            key = (cacheExp, pli, int(Ch0), int(Ch1), mode)
+            SolCache["CALLS"].setdefault(key, []).append((warm, int(ncalls)))
+
         if goodclib:
 
             selAnts = np.array(calAnts, dtype=np.int32)
 
+            # Cache of cross-gain solutions (for the warm starts):
+            SolCache = None
+            cacheExp = os.path.basename(IDI.rstrip("/"))
+            if "." in cacheExp:
+                cacheExp = "-".join(cacheExp.split(".")[:-1])
+            cacheExp = re.sub(r"_[0-9]+$", "", cacheExp)
+            if len(solCache) > 0:
+                SolCache = loadSolCache(solCache)
+                printMsg("Solution cache %s: %i gains (experiment %s)" % (solCache, len(SolCache["GAINS"]), cacheExp))
+            # Chi2 evaluations of the cold- and warm-started fits:
+            ChiCalls = {False: 0, True: 0}
+
             doSolveD = float(doSolve)
 
             if doSolveD > 0.0:
@@ -1752,7 +1910,7 @@ def polconvert(
                 [FlagBas1, FlagBas2],
                 "PolGainSolve%s.log" % plotSuffix,
             )
-            printMsg(PS.__doc__ + ("\nInitialization rv %d\n" % MySolve) + "%%%\n")
+            printMsg(_PolGainSolve.__doc__ + ("\nInitialization rv %d\n" % MySolve) + "%%%\n")
 
             AllFreqs = []
 
@@ -1780,8 +1938,20 @@ def polconvert(
             dropAnt = calAnts.index(plotAnt)
             rateAnts = calAnts[:dropAnt] + calAnts[dropAnt + 1 :]
             printMsg("\n Estimate antenna delays & rates\n")
+            # FFTW wisdom file (optional) for the fringe-fitting FFT plans:
+            fftWisdom = os.environ.get("POLCONVERTWISDOM", "")
             for nsi in range(NScan):
-                PS.DoGFF(rateAnts, npix, True, nsi, 5.0)
+                PS.DoGFF(rateAnts, npix, True, nsi, 5.0, fftWisdom)
+
+            # Average the data (in time and frequency) for the gain estimates:
+            avgChan = int(preAvg[1])
+            if solint[0] != 0 and avgChan > 1:
+                avgChan = int(np.gcd(avgChan, abs(solint[0])))
+            if float(preAvg[0]) > 0.0 or avgChan > 1:
+                printMsg("\n Pre-average the data: %.1f seconds, %d channels\n" % (float(preAvg[0]), avgChan))
+                rv = PS.PreAverage(float(preAvg[0]), avgChan)
+                if rv != 0:
+                    printMsg("  PS.PreAverage rv %d" % rv)
 
             for ci in antcodes:
                 CGains["XYadd"][ci] = {}
@@ -1807,9 +1977,11 @@ def polconvert(
                         BPChan.append(Nchans - 1)
                     BPChan = np.array(BPChan, dtype=np.int32)
                     Npar = len(fitAnts) * {True: 2, False: 1}[solveAmp]
+                    solMode = "BP" + {True: "A", False: ""}[solveAmp]
                     laux = [pli]
                     rv = PS.SetFit(
-                        Npar, laux, fitAnts, solveAmp, solveQU, Stokes, useCov, feedRot
+                        Npar, laux, fitAnts, solveAmp, solveQU, Stokes, useCov, feedRot,
+                        int(nthreads)
                     )
                     if rv != 0:
                         printMsg("  PS.SetFit rv %d" % rv)
@@ -1820,8 +1992,9 @@ def polconvert(
                     ]
                     interpChan = np.zeros(len(BPChan) - 1)
 
-                    for chran in range(len(BPChan) - 1):
-                        if chran == 0 and plii == 0:
+                    BPFits = None
+                    if solveProcs > 1 and len(BPChan) > 2:
+                        if plii == 0:
                             p0 = []
                             for ci in fitAnts:
                                 if solveAmp:
@@ -1830,54 +2003,43 @@ def polconvert(
                                     p0 += [0.0]
                         else:
                             p0 = list(myfit)
-
-                        laux = [pli]
-                        sys.stdout.write(
-                            "\r Apply rates and estimate cross-gains for IF #%i, channels %i to %i   "
-                            % (pli, BPChan[chran], BPChan[chran + 1] - 1)
+                        p0s = [warmStart(p0, pli, BPChan[chran], BPChan[chran + 1], solMode)
+                               for chran in range(len(BPChan) - 1)]
+                        printMsg(
+                            "\n Apply rates and estimate cross-gains for IF #%i, %i channel ranges in %i processes"
+                            % (pli, len(BPChan) - 1, min(solveProcs, len(BPChan) - 1))
                         )
-                        sys.stdout.flush()
-
+                        BPFits = BPMinParallel([pw[0] for pw in p0s], BPChan)
+                        if BPFits is None:
+                            printMsg("\n Cannot fork processes here. Will solve the channel ranges serially.")
 
-                        if fitMethod not in scipyMethods:
-                            if fitMethod == "Levenberg-Marquardt":
-                                myfit, FLIP = LMMin(
-                                    p0, BPChan[chran], BPChan[chran + 1]
-                                )
-                            if fitMethod == "gradient":
-                                myfit, FLIP = GrMin(
-                                    p0, BPChan[chran], BPChan[chran + 1]
-                                )
+                    for chran in range(len(BPChan) - 1):
+                        if BPFits is not None:
+                            myfit, FLIP, ncalls = BPFits[chran]
+                            warm = p0s[chran][1]
                         else:
+                            if chran == 0 and plii == 0:
+                                p0 = []
+                                for ci in fitAnts:
+                                    if solveAmp:
+                                        p0 += [1.0, 0.0]
+                                    else:
+                                        p0 += [0.0]
+                            else:
+                                p0 = list(myfit)
+                            p0, warm = warmStart(p0, pli, BPChan[chran], BPChan[chran + 1], solMode)
 
-                            if fitMethod in ["BFGS", "Newton-CG", "SLSQP"]:
-
-                                def Fmini(p):
-                                    return PS.GetChi2(
-                                        p, -1.0, BPChan[chran], BPChan[chran + 1], 0, useRates
-                                    )
+                            laux = [pli]
+                            sys.stdout.write(
+                                "\r Apply rates and estimate cross-gains for IF #%i, channels %i to %i   "
+                                % (pli, BPChan[chran], BPChan[chran + 1] - 1)
+                            )
+                            sys.stdout.flush()
 
-                                def Fgrad(p):
-                                    return spopt.approx_fprime(p, Fmini, 1.0e-8)
+                            myfit, FLIP, ncalls = BPMin(p0, BPChan[chran], BPChan[chran + 1])
 
-                                mymin = spopt.minimize(
-                                    Fmini, p0, method=fitMethod, jac=Fgrad
-                                )
+                        storeSolution(myfit, pli, BPChan[chran], BPChan[chran + 1], solMode, warm, ncalls)
 
-                            else:
-
-                                mymin = spopt.minimize(
-                                    PS.GetChi2,
-                                    p0,
-                                    args=(-1.0, BPChan[chran], BPChan[chran + 1], 0, useRates),
-                                    method=fitMethod,
-                                )
-
-                            Chi2_final = PS.GetChi2(
-                                mymin.x, -1, BPChan[chran], BPChan[chran + 1], 1, useRates
-                            )
-                            FLIP = Chi2_final > 0.0
-                            myfit = mymin.x
                         interpChan[chran] = 0.5 * (BPChan[chran] + BPChan[chran + 1])
                         for ci, calant in enumerate(fitAnts):
                             PhasFactor = {True: np.pi, False: 0.0}[
@@ -1980,32 +2142,55 @@ def polconvert(
                     for ci in fitAnts:
                         p0 += [0.0]
                     laux = [pli]  # list(doIF)
-                    Npar = len(fitAnts) * {True: 3, False: 2}[solveAmp]
+                    nfitAnt = len(fitAnts)
+                    Npar = nfitAnt * {True: 3, False: 2}[solveAmp]
                     rv = PS.SetFit(
-                        Npar, laux, fitAnts, solveAmp, solveQU, Stokes, useCov, feedRot
+                        Npar, laux, fitAnts, solveAmp, solveQU, Stokes, useCov, feedRot,
+                        int(nthreads)
                     )
                     if rv != 0:
                         printMsg("  PS.SetFit rv %d" % rv)
                     Nchans = np.shape(AllFreqs[plii])[0]
                     FreqChan = np.linspace(-Nchans / 2.0, Nchans / 2.0, Nchans)
-                    if fitMethod not in scipyMethods:  # =='Levenberg-Marquardt':
-                        myfit = LMMin(p0, 0, MaxChan - 1)
+                    solMode = "SBD" + {True: "A", False: ""}[solveAmp]
+                    p0, warm = warmStart(p0, pli, 0, Nchans, solMode)
+                    ncalls = PS.GetChi2Count()
+                    if fitMethod not in scipyMethods:
+                        if fitMethod == "Levenberg-Marquardt":
+                            myfit, FLIP = LMMin(p0, 0, Nchans)
+                        if fitMethod == "gradient":
+                            myfit, FLIP = GrMin(p0, 0, Nchans)
                         sys.stdout.write(".")
                         sys.stdout.flush()
+                    elif fitMethod in ["BFGS", "Newton-CG", "SLSQP"]:
+
+                        # Preliminary fit (with no delays, unless they come from the cache):
+                        if not warm:
+                            mymin = GradMin(p0[:-nfitAnt], 0, Nchans, nfixed=nfitAnt)
+                            p0[:-nfitAnt] = mymin.x
+
+                        # Now, fit the delays as well:
+                        mymin = GradMin(p0, 0, Nchans)
+
                     else:
 
-                        # Preliminary fit (with no delays):
-                        mymin = spopt.minimize(
-                            PS.GetChi2, p0[:-nfitAnt], args=(-1.0, 0, Nchans, 0, useRates), method=fitMethod)
-                        p0[:-nfitAnt] = mymin.x
+                        # Preliminary fit (with no delays, unless they come from the cache).
+                        # GetChi2 takes all the parameters, so the delays are passed as zeros:
+                        if not warm:
+                            mymin = spopt.minimize(
+                                lambda p, *a: PS.GetChi2(np.concatenate([p, np.zeros(nfitAnt)]), *a),
+                                p0[:-nfitAnt], args=(-1.0, 0, Nchans, 0, useRates), method=fitMethod)
+                            p0[:-nfitAnt] = mymin.x
 
                         # Now, fit the delays as well:
                         mymin = spopt.minimize(
                             PS.GetChi2, p0, args=(-1.0, 0, Nchans, 0, useRates), method=fitMethod)
 
-                    Chi2_final = PS.GetChi2(mymin.x, -1, 0, Nchans, 1, useRates)
-                    FLIP = Chi2_final > 0.0
-                    myfit = mymin.x
+                    if fitMethod in scipyMethods:
+                        Chi2_final = PS.GetChi2(mymin.x, -1, 0, Nchans, 1, useRates)
+                        FLIP = Chi2_final > 0.0
+                        myfit = mymin.x
+                    storeSolution(myfit, pli, 0, Nchans, solMode, warm, PS.GetChi2Count() - ncalls)
 
                     for ci, calant in enumerate(fitAnts):
                         PhasFactor = {True: np.pi, False: 0.0}[
@@ -2048,6 +2233,10 @@ def polconvert(
 
                 printMsg("Done with SBD mode\n")
 
+            printMsg("Chi2 evaluations: %i in cold-started fits, %i in warm-started fits\n" % (ChiCalls[False], ChiCalls[True]))
+            if SolCache is not None:
+                saveSolCache(solCache, SolCache)
+
             ## These arrays can be very large!
 
             #    try:
@@ -2157,7 +2346,7 @@ def polconvert(
         # Filter out IFs with no data:
         GoodIFs = []
         for pli in plotIF:
-            if os.stat("POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i" % pli).st_size > 10:
+            if os.stat("POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i" % pli).st_size > FringeHeader.itemsize:
                 GoodIFs.append(pli)
             else:
                 printMsg("WARNING! IF %i was NOT polconverted properly\n" % pli)
@@ -2169,33 +2358,10 @@ def polconvert(
             print("\n\n")
             printMsg("Plotting selected fringe for IF #%i" % pli)
 
-            frfile = open("POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i" % pli, "rb")
-
-            alldats = frfile.read(5)
-            nchPlot, isParang = stk.unpack("ib", alldats)
-            dtype = np.dtype(
-                [
-                    ("FILE", np.int32),
-                    ("JDT", np.float64),
-                    ("ANT1", np.int32),
-                    ("ANT2", np.int32),
-                    ("PANG1", np.float64),
-                    ("PANG2", np.float64),
-                    ("UVDIST", np.float64),
-                    ("MATRICES", np.complex64, 12 * nchPlot),
-                ]
-            )
-
-            # There is a silly bug in Python 2.7, which generates
-            # an "integer is required" error in the first try to read:
-            try:
-                fringe = np.fromfile(frfile, dtype=dtype)
-                printMsg("Read fringe data from file POLCONVERT.FRINGE_IF%i" % pli)
-            except:
-                fringe = np.fromfile(frfile, dtype=dtype)
-                printMsg("Exceptional Read of fringe data POLCONVERT.FRINGE_IF%i" % pli)
-                printMsg("len(fringe) = %d" % len(fringe))
-            frfile.close()
+            # The file is mapped in memory (columnar format, see readFringe):
+            fringe = readFringe("POLCONVERT.FRINGE/POLCONVERT.FRINGE_IF%i" % pli)
+            nchPlot = fringe["NCHAN"]
+            printMsg("Read fringe data from file POLCONVERT.FRINGE_IF%i" % pli)
 
             # start of for ant1 in linAntIdx
             NBinFringes = np.max(fringe["FILE"]) + 1
@@ -2210,15 +2376,15 @@ def polconvert(
                 for ant2 in [plotAnt]:
 
                     AntEntry1 = np.logical_and(
-                        fringe[:]["ANT1"] == ant1, fringe[:]["ANT2"] == ant2
+                        fringe["ANT1"] == ant1, fringe["ANT2"] == ant2
                     )
                     AntEntry2 = np.logical_and(
-                        fringe[:]["ANT2"] == ant1, fringe[:]["ANT1"] == ant2
+                        fringe["ANT2"] == ant1, fringe["ANT1"] == ant2
                     )
                     AntennasIn = np.logical_or(AntEntry1, AntEntry2)
                     for NBF in range(NBinFringes):
                         AntEntry = np.logical_and(
-                            fringe[:]["FILE"] == NBF,
+                            fringe["FILE"] == NBF,
                             np.logical_or(AntEntry1, AntEntry2),
                         )
                         if np.sum(AntEntry) > 0:
@@ -2234,20 +2400,11 @@ def polconvert(
 
                         # This is to store all fringes with linear-feeds involved:
 
-                        if nchPlot > 0 and len(fringe) > 0:
+                        if nchPlot > 0 and fringe["NVIS"] > 0:
 
-                            uncal = [
-                                (fringe[AntEntry]["MATRICES"])[:, i::12]
-                                for i in range(4)
-                            ]
-                            cal = [
-                                (fringe[AntEntry]["MATRICES"])[:, i::12]
-                                for i in range(4, 8)
-                            ]
-                            Kmat = [
-                                (fringe[AntEntry]["MATRICES"])[:, i::12]
-                                for i in range(8, 12)
-                            ]
+                            uncal = [fringe["VIS"][AntEntry, i, :] for i in range(4)]
+                            cal = [fringe["VIS"][AntEntry, i, :] for i in range(4, 8)]
+                            Kmat = [fringe["VIS"][AntEntry, i, :] for i in range(8, 12)]
 
                             rchan = np.shape(uncal[0])[0]
 
@@ -2660,7 +2817,7 @@ def polconvert(
                                     DRL,
                                     MAXl[2] / MAX,
                                     DLR,
-                                    MAX / len(fringe),
+                                    MAX / fringe["NVIS"],
                                     RLRatio,
                                 ]
                                 fringeAmps[ant1].append(
@@ -2742,7 +2899,7 @@ def polconvert(
                                     "wrote FRINGE.PEAKS_IF%i-ANT%i.dat" % (pli, ant1)
                                 )
                             # end of if for this baseline to be plotted
-                        # end of if len(fringe)>0
+                        # end of if fringe["NVIS"]>0
                         else:
                             printMsg("Fringe length was zero")
 
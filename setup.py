@@ -1,5 +1,6 @@
 from distutils.core import setup, Extension
 import numpy as np
+import os
 
 printM  = '\n'
 printM += '#######################################################################\n'
@@ -17,6 +18,18 @@ DO_SOLVE = True
 ## CHANGE IF NEEDED:
 cfitsio='/usr/include/cfitsio'
 
+# DO ALL THE JONES-MATRIX ALGEBRA OF _PolConvert IN DOUBLE PRECISION
+# (SLOWER; USEFUL AS A REFERENCE, SEE PP/benchprecision.py).
+# IT CAN ALSO BE SET WITH THE POLCONVERT_DOUBLE ENVIRONMENT VARIABLE:
+DOUBLE_JONES = False
+if os.environ.get('POLCONVERT_DOUBLE','0') not in ['','0']:
+  DOUBLE_JONES = True
+
+if DOUBLE_JONES:
+  jonesFlags = ["-DPOLCONVERT_DOUBLE"]
+else:
+  jonesFlags = []
+
 
 
 
@@ -26,21 +39,22 @@ cfitsio='/usr/include/cfitsio'
 
 
 sourcefiles1 = ['CalTable.cpp', 'DataIO.cpp', 'DataIOFITS.cpp',
-                'DataIOSWIN.cpp', 'Weighter.cpp', '_PolConvert.cpp']
+                'DataIOSWIN.cpp', 'Weighter.cpp', 'FringeFile.cpp',
+                '_PolConvert.cpp']
 
 sourcefiles2 = ['_PolGainSolve.cpp']
 
 sourcefiles3 = ['_getAntInfo.cpp']
 
-sourcefiles4 = ['_XPCal.cpp']
+sourcefiles4 = ['_XPCal.cpp', 'PCalFile.cpp']
 
-sourcefiles5 = ['_XPCalMF.cpp']
+sourcefiles5 = ['_XPCalMF.cpp', 'PCalFile.cpp']
 
 c_ext1 = Extension("_PolConvert", sources=sourcefiles1,
-                  extra_compile_args=["-Wno-deprecated","-O3","-std=c++11"],
+                  extra_compile_args=["-Wno-deprecated","-O3","-std=c++11","-pthread"]+jonesFlags,
                   libraries=['cfitsio'],
                   include_dirs=[np.get_include()],
-                  extra_link_args=["-Xlinker", "-export-dynamic"])
+                  extra_link_args=["-Xlinker", "-export-dynamic","-pthread"])
 
 c_ext3 = Extension("_getAntInfo", sources=sourcefiles3,
                   extra_compile_args=["-Wno-deprecated","-O3","-std=c++11"],
@@ -62,8 +76,8 @@ if DO_SOLVE:
   c_ext2 = Extension("_PolGainSolve", sources=sourcefiles2,
                   libraries=['fftw3'],
                   include_dirs=[np.get_include()],
-                  extra_compile_args=["-Wno-deprecated","-O3","-std=c++11"],
-                  extra_link_args=["-Xlinker", "-export-dynamic"])
+                  extra_compile_args=["-Wno-deprecated","-O3","-std=c++11","-pthread"],
+                  extra_link_args=["-Xlinker", "-export-dynamic","-pthread"])
 
 setup(
     ext_modules=[c_ext1], include_dirs=[cfitsio,'./'],